@@ -0,0 +1,95 @@
+"""Benchmark building the full flat config from the bundled standards.
+
+Reports the median wall time of ``build_full_flat_config_dict`` plus the
+peak memory allocated during a build and the memory still held by the
+built config afterwards, both as measured by tracemalloc.
+
+With ``--compare-rev``, the same measurements are also taken for the
+metameq package as of the given git revision (run in a subprocess from a
+``git archive`` export of that revision), so the current code can be
+compared against a baseline; e.g., the figures for sharing inherited field
+definitions instead of deep-copying them were taken with:
+
+    python benchmarks/bench_config_build.py --compare-rev ea09760
+
+Usage:
+    python benchmarks/bench_config_build.py [--repeats N] [--compare-rev REV]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from metameq.src.metadata_configurator import build_full_flat_config_dict
+from metameq.src.util import extract_stds_config
+
+
+def _time_builds(repeats):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        build_full_flat_config_dict()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def _measure_memory():
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    config_dict = build_full_flat_config_dict()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # keep the result alive until after measuring what it retains
+    del config_dict
+    return peak - baseline, retained - baseline
+
+
+def _run_at_rev(rev, repeats):
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as rev_dir:
+        archive = subprocess.run(
+            ["git", "-C", repo_dir, "archive", rev, "metameq"],
+            check=True, capture_output=True).stdout
+        subprocess.run(["tar", "-x", "-C", rev_dir], input=archive,
+                       check=True)
+        env = dict(os.environ, PYTHONPATH=rev_dir)
+        # run from the export so its metameq, not this checkout's, is found
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__),
+             "--repeats", str(repeats)],
+            cwd=rev_dir, env=env, check=True)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--repeats", type=int, default=20)
+    arg_parser.add_argument(
+        "--compare-rev", default=None,
+        help="git revision to also benchmark, as a baseline")
+    args = arg_parser.parse_args()
+
+    if args.compare_rev is not None:
+        print(f"at {args.compare_rev}:", flush=True)
+        _run_at_rev(args.compare_rev, args.repeats)
+        print("current:")
+
+    # warm up (imports, yaml memo) so only the build itself is measured
+    extract_stds_config(None)
+    build_full_flat_config_dict()
+
+    median_secs = _time_builds(args.repeats)
+    peak_bytes, retained_bytes = _measure_memory()
+    print(f"median build time: {median_secs * 1000:.1f} ms "
+          f"(over {args.repeats} builds)")
+    print(f"peak memory during build: {peak_bytes / 1024 / 1024:.2f} MiB")
+    print(f"memory retained by built config: "
+          f"{retained_bytes / 1024 / 1024:.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Benchmark parsing dates with and without the shared date parse cache.
+
+Reports the median wall time of the date parsing done to format a date
+column with the ``transform_date_to_formatted_date`` transformer and then
+check it with the ``date_not_in_future`` validator rule, for a synthetic
+column of distinct timestamps (mostly in one format, with a few
+outliers), at several row counts.  "dateutil" parses every value with
+``dateutil.parser.parse`` in both steps, as before the cache was added;
+"cached" uses the transformer's vectorized version and then parses the
+formatted values as ``validate_metadata_df`` does, both through the shared
+cache.  The cache is cleared before each run.
+
+Usage:
+    python benchmarks/bench_date_parsing.py [--rows N [N ...]] [--repeats N]
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import pandas
+from dateutil import parser
+
+from metameq.src.date_parse_cache import clear_date_parse_cache, \
+    parse_date, parse_dates
+from metameq.src.metadata_transformers import \
+    transform_date_to_formatted_date, get_vectorized_version
+
+
+def _make_metadata_df(num_rows):
+    start = datetime(2020, 1, 1)
+    timestamps = [(start + timedelta(minutes=i)).strftime("%Y-%m-%d %H:%M")
+                  for i in range(num_rows)]
+    # a few outliers in other formats
+    timestamps[::100] = ["Jan 2 2021"] * len(timestamps[::100])
+    return pandas.DataFrame({"collection_date": timestamps})
+
+
+def _run_dateutil(metadata_df):
+    formatted = [parser.parse(x).strftime("%Y-%m-%d %H:%M")
+                 for x in metadata_df["collection_date"]]
+    return [parser.parse(x, fuzzy=True, dayfirst=False) > datetime.now()
+            for x in formatted]
+
+
+def _run_cached(metadata_df):
+    formatted = get_vectorized_version(transform_date_to_formatted_date)(
+        metadata_df, ["collection_date"])
+    parse_dates(formatted.unique(), fuzzy=True)
+    return [parse_date(x, fuzzy=True) > datetime.now() for x in formatted]
+
+
+def _time_run(run_func, metadata_df, repeats):
+    durations = []
+    for _ in range(repeats):
+        clear_date_parse_cache()
+        start = time.perf_counter()
+        run_func(metadata_df)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10000, 100000])
+    arg_parser.add_argument("--repeats", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    for num_rows in args.rows:
+        metadata_df = _make_metadata_df(num_rows)
+        dateutil_secs = _time_run(_run_dateutil, metadata_df, args.repeats)
+        cached_secs = _time_run(_run_cached, metadata_df, args.repeats)
+        print(f"{dateutil_secs * 1000:.1f} ms with dateutil, "
+              f"{cached_secs * 1000:.1f} ms cached "
+              f"(median over {args.repeats} runs of {num_rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
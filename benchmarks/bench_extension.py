@@ -0,0 +1,92 @@
+"""Benchmark generating host- and sample-type-specific metadata.
+
+Reports the median wall time of ``_generate_metadata_for_host_types`` on
+synthetic metadata spread across several bundled host+sample types, once
+with the default per-type engine and once with the group-broadcast engine
+(the ``group_broadcast_extension`` config setting).  Validation usually
+dominates the total; ``--skip_validation`` leaves it out so the engines
+themselves can be compared.  ``--n_jobs`` also times each engine with
+that many worker processes; ``--single_group`` makes every sample human
+stool, the case where only splitting the rows into blocks can help.
+``--compact_default_columns`` turns on the config setting of that name;
+the memory taken by each engine's output is reported either way.
+
+Usage:
+    python benchmarks/bench_extension.py [--rows N] [--repeats N]
+        [--skip_validation] [--n_jobs N] [--single_group]
+        [--compact_default_columns]
+"""
+import argparse
+import random
+import statistics
+import time
+
+import pandas
+
+import metameq.src.metadata_extender as metadata_extender
+from metameq.src.flat_config import build_lazy_flat_config_dict
+from metameq.src.util import SAMPLE_NAME_KEY, HOSTTYPE_SHORTHAND_KEY, \
+    SAMPLETYPE_SHORTHAND_KEY, QC_NOTE_KEY, GROUP_BROADCAST_EXTENSION_KEY, \
+    COMPACT_DEFAULT_COLS_KEY
+
+_TYPE_PAIRS = [(h, s) for h in ("human", "mouse")
+               for s in ("stool", "saliva", "blood", "plasma")]
+
+
+def _make_metadata_df(num_rows, type_pairs):
+    rng = random.Random(0)
+    pairs = [rng.choice(type_pairs) for _ in range(num_rows)]
+    return pandas.DataFrame({
+        SAMPLE_NAME_KEY: [f"sample{i}" for i in range(num_rows)],
+        HOSTTYPE_SHORTHAND_KEY: [h for h, _ in pairs],
+        SAMPLETYPE_SHORTHAND_KEY: [s for _, s in pairs],
+        QC_NOTE_KEY: [""] * num_rows})
+
+
+def _time_generation(metadata_df, config_dict, repeats, n_jobs=None):
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output_df, _ = metadata_extender._generate_metadata_for_host_types(
+            metadata_df, config_dict, n_jobs)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations), output_df
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--rows", type=int, default=2000)
+    arg_parser.add_argument("--repeats", type=int, default=5)
+    arg_parser.add_argument("--skip_validation", action="store_true")
+    arg_parser.add_argument("--n_jobs", type=int, default=None)
+    arg_parser.add_argument("--single_group", action="store_true")
+    arg_parser.add_argument("--compact_default_columns", action="store_true")
+    args = arg_parser.parse_args()
+
+    if args.skip_validation:
+        metadata_extender.validate_metadata_df = lambda *_: []
+
+    type_pairs = _TYPE_PAIRS[:1] if args.single_group else _TYPE_PAIRS
+    metadata_df = _make_metadata_df(args.rows, type_pairs)
+    for use_group_broadcast in (False, True):
+        config_dict = dict(build_lazy_flat_config_dict(None, None, None))
+        config_dict[GROUP_BROADCAST_EXTENSION_KEY] = use_group_broadcast
+        config_dict[COMPACT_DEFAULT_COLS_KEY] = args.compact_default_columns
+        # warm up (config resolution, schema compilation)
+        metadata_extender._generate_metadata_for_host_types(
+            metadata_df.head(len(_TYPE_PAIRS) * 4), config_dict)
+
+        engine_name = "group-broadcast" if use_group_broadcast else "per-type"
+        for n_jobs in [None] if args.n_jobs is None else [None, args.n_jobs]:
+            median_secs, output_df = _time_generation(
+                metadata_df, config_dict, args.repeats, n_jobs)
+            output_mb = output_df.memory_usage(deep=True).sum() / 2 ** 20
+            jobs_str = "" if n_jobs is None else f", n_jobs={n_jobs}"
+            print(f"{engine_name} engine{jobs_str}: "
+                  f"{median_secs * 1000:.1f} ms "
+                  f"(median over {args.repeats} runs of {args.rows} rows), "
+                  f"output {output_mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark passing rows to row-wise transformers as views or as Series.
+
+Reports the median wall time of ``update_metadata_df_field`` calling a
+row-wise transformer on every row of a synthetic metadata frame with a few
+dozen columns, with each row passed as a pandas.Series of the whole row
+(as for transformers declared with row_series_transformer) and as a
+lightweight view of just its source field values (the default), for a
+custom transformer, ``pass_through`` and one using
+``help_transform_mapping``, at several row counts.  Vectorized versions
+and memoization of pure transformers are not used, so every row is passed
+to the transformer.
+
+Usage:
+    python benchmarks/bench_row_transformers.py [--rows N [N ...]] [--repeats N]
+"""
+import argparse
+import statistics
+import time
+
+import pandas
+
+from metameq.src.metadata_transformers import pass_through, \
+    help_transform_mapping
+from metameq.src.util import update_metadata_df_field
+
+_NUM_OTHER_COLS = 30
+_SEX_MAPPING = {"f": "female", "m": "male"}
+
+
+def _make_metadata_df(num_rows):
+    metadata_df = pandas.DataFrame({
+        f"col{i}": [f"val{i}"] * num_rows for i in range(_NUM_OTHER_COLS)})
+    metadata_df["site"] = [f"site{i % 100}" for i in range(num_rows)]
+    metadata_df["sex"] = ["f", "m"] * (num_rows // 2) + ["f"] * (num_rows % 2)
+    return metadata_df
+
+
+def _join_sources(row, source_fields):
+    return "_".join(str(row[x]) for x in source_fields)
+
+
+def _map_sex(row, source_fields):
+    return help_transform_mapping(row, source_fields, _SEX_MAPPING)
+
+
+def _time_update(metadata_df, row_func, source_fields, use_row_view,
+                 repeats):
+    durations = []
+    for _ in range(repeats):
+        working_df = metadata_df.copy()
+        start = time.perf_counter()
+        update_metadata_df_field(
+            working_df, "new", row_func, source_fields,
+            use_row_view=use_row_view)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10000, 100000])
+    arg_parser.add_argument("--repeats", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    cases = [
+        ("custom, two sources", _join_sources, ["site", "sex"]),
+        ("pass_through", pass_through, ["site"]),
+        ("help_transform_mapping", _map_sex, ["sex"])]
+    for num_rows in args.rows:
+        metadata_df = _make_metadata_df(num_rows)
+        for case_name, row_func, sources in cases:
+            series_secs = _time_update(
+                metadata_df, row_func, sources, False, args.repeats)
+            view_secs = _time_update(
+                metadata_df, row_func, sources, True, args.repeats)
+            print(f"{case_name}: {series_secs * 1000:.1f} ms as Series, "
+                  f"{view_secs * 1000:.1f} ms as views "
+                  f"(median over {args.repeats} runs of {num_rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark setting a metadata field with update_metadata_df_field.
+
+Reports the median wall time of ``update_metadata_df_field`` on a
+synthetic metadata frame with a few dozen columns, for constant fills and
+function fills of a new column, of every row of an existing column, and of
+only the NaN rows of an existing (half-empty) column, at several row
+counts.  Function fills are dominated by the per-row python calls, so the
+largest sizes take a while.
+
+Usage:
+    python benchmarks/bench_update_field.py [--rows N [N ...]] [--repeats N]
+"""
+import argparse
+import statistics
+import time
+
+import numpy as np
+import pandas
+
+from metameq.src.util import update_metadata_df_field
+
+_NUM_OTHER_COLS = 30
+
+
+def _make_metadata_df(num_rows):
+    metadata_df = pandas.DataFrame({
+        f"col{i}": [f"val{i}"] * num_rows for i in range(_NUM_OTHER_COLS)})
+    metadata_df["source"] = [f"s{i}" for i in range(num_rows)]
+    metadata_df["target"] = pandas.Series(
+        ["x", np.nan] * (num_rows // 2) + ["x"] * (num_rows % 2), dtype="str")
+    return metadata_df
+
+
+def _copy_source(row, source_fields):
+    return row[source_fields[0]]
+
+
+def _time_update(metadata_df, field_name, field_val_or_func, source_fields,
+                 overwrite_non_nans, repeats):
+    durations = []
+    for _ in range(repeats):
+        working_df = metadata_df.copy()
+        start = time.perf_counter()
+        update_metadata_df_field(
+            working_df, field_name, field_val_or_func, source_fields,
+            overwrite_non_nans=overwrite_non_nans)
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    arg_parser.add_argument("--repeats", type=int, default=3)
+    args = arg_parser.parse_args()
+
+    cases = [
+        ("constant, new column", "new", "filled", None, True),
+        ("constant, all rows", "target", "filled", None, True),
+        ("constant, NaN rows", "target", "filled", None, False),
+        ("function, new column", "new", _copy_source, ["source"], True),
+        ("function, all rows", "target", _copy_source, ["source"], True),
+        ("function, NaN rows", "target", _copy_source, ["source"], False)]
+    for num_rows in args.rows:
+        metadata_df = _make_metadata_df(num_rows)
+        for case_name, field_name, val_or_func, sources, overwrite in cases:
+            median_secs = _time_update(
+                metadata_df, field_name, val_or_func, sources, overwrite,
+                args.repeats)
+            print(f"{case_name}: {median_secs * 1000:.1f} ms "
+                  f"(median over {args.repeats} runs of {num_rows} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,19 +5,29 @@ from metameq.src.util import HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY, \
     FUNCTION_KEY, PRE_TRANSFORMERS_KEY, POST_TRANSFORMERS_KEY, \
     extract_config_dict, deepcopy_dict, load_df_with_best_fit_encoding
 from metameq.src.metadata_configurator import build_full_flat_config_dict
+from metameq.src.flat_config import FlatConfig, build_lazy_flat_config_dict
+from metameq.src.config_artifact import build_config_artifact, \
+    write_config_artifact, load_config_artifact
+from metameq.src.compiled_schema import SampleTypeSchema, \
+    compile_metadata_fields, compile_flat_hosts_dict
+from metameq.src.transformer_plan import TransformerPlan, \
+    build_transformer_plan
 from metameq.src.metadata_extender import \
     write_extended_metadata, write_extended_metadata_from_df, \
     write_validator_metadata, \
     get_reserved_cols, extend_metadata_df_from_yamls, \
     write_metadata_results, id_missing_cols, find_standard_cols, \
-    find_nonstandard_cols, get_qc_failures, extend_metadata_df
+    find_nonstandard_cols, get_qc_failures, extend_metadata_df, \
+    expand_compact_cols, extend_metadata_df_incrementally
+from metameq.src.study_context import StudyContext
 from metameq.src.metadata_merger import merge_sample_and_subject_metadata, \
     merge_many_to_one_metadata, merge_one_to_one_metadata, \
     find_common_col_names, find_common_df_cols
 from metameq.src.metadata_transformers import \
     format_a_datetime, standardize_input_sex, set_life_stage_from_age_yrs, \
     transform_input_sex_to_std_sex, transform_age_to_life_stage, \
-    transform_date_to_formatted_date
+    transform_date_to_formatted_date, vectorized_transformer, \
+    pure_transformer, row_series_transformer
 
 __all__ = ["HOSTTYPE_SHORTHAND_KEY", "SAMPLETYPE_SHORTHAND_KEY",
            "SAMPLE_TYPE_KEY", "QC_NOTE_KEY", "LEAVE_BLANK_VAL",
@@ -27,6 +37,12 @@ __all__ = ["HOSTTYPE_SHORTHAND_KEY", "SAMPLETYPE_SHORTHAND_KEY",
            "SOURCES_KEY", "FUNCTION_KEY", "PRE_TRANSFORMERS_KEY",
            "POST_TRANSFORMERS_KEY",
            "extract_config_dict", "build_full_flat_config_dict",
+           "FlatConfig", "build_lazy_flat_config_dict",
+           "SampleTypeSchema", "compile_metadata_fields",
+           "compile_flat_hosts_dict",
+           "TransformerPlan", "build_transformer_plan",
+           "build_config_artifact", "write_config_artifact",
+           "load_config_artifact",
            "deepcopy_dict", "load_df_with_best_fit_encoding",
            "merge_sample_and_subject_metadata", "merge_many_to_one_metadata",
            "merge_one_to_one_metadata", "find_common_col_names",
@@ -39,7 +55,10 @@ __all__ = ["HOSTTYPE_SHORTHAND_KEY", "SAMPLETYPE_SHORTHAND_KEY",
            "format_a_datetime", "standardize_input_sex",
            "set_life_stage_from_age_yrs", "transform_input_sex_to_std_sex",
            "transform_age_to_life_stage", "transform_date_to_formatted_date",
-           "extend_metadata_df"]
+           "vectorized_transformer", "pure_transformer",
+           "row_series_transformer",
+           "extend_metadata_df", "expand_compact_cols", "StudyContext",
+           "extend_metadata_df_incrementally"]
 
 from . import _version
 __version__ = _version.get_versions()['version']
@@ -1,5 +1,9 @@
 import click
 from metameq import write_extended_metadata as _write_extended_metadata
+from metameq.src.config_cache import ConfigCache, format_cache_entries
+from metameq.src.config_artifact import \
+    build_config_artifact as _build_config_artifact, FINGERPRINT_KEY
+from metameq.src.util import extract_config_dict
 
 
 @click.group()
@@ -23,11 +27,93 @@ def root():
 @click.option('--suppress_fails_files', is_flag=True,
               help='suppress output of QC and validation error files if no'
                    'errors found.  Default is to output empty files.')
+@click.option('--chunk_size', default=None, type=click.IntRange(min=1),
+              help='extend the metadata this many rows at a time, to bound '
+                   'memory use on very large files; rows are then grouped '
+                   'by host and sample type within each chunk. Default is '
+                   'to extend the whole file at once. Not applicable to '
+                   'excel files')
+@click.option('--preserve_input_order', is_flag=True,
+              help='with --chunk_size, write rows in their input order')
+@click.option('--n_jobs', default=None, type=int,
+              help='number of worker processes to extend the different '
+                   'host and sample type combinations in; -1 uses one per '
+                   'CPU. Default is to extend them all in this process')
 def write_extended_metadata(metadata_file_path, config_fp,
-                            out_dir, name_base, sep, suppress_fails_files):
+                            out_dir, name_base, sep, suppress_fails_files,
+                            chunk_size, preserve_input_order, n_jobs):
     _write_extended_metadata(
         metadata_file_path, config_fp, out_dir, name_base,
-        sep, suppress_empty_fails=suppress_fails_files)
+        sep, suppress_empty_fails=suppress_fails_files,
+        chunk_size=chunk_size, preserve_input_order=preserve_input_order,
+        n_jobs=n_jobs)
+
+
+@root.command("build-config", context_settings={'show_default': True})
+@click.argument('config_fp', type=click.Path(exists=True))
+#                help='path to the study-specific config yaml file')
+@click.argument('artifact_fp', type=click.Path())
+#                help='path of the config artifact file to write')
+@click.option('--stds_fp', default=None, type=click.Path(exists=True),
+              help='path to the standards yaml file; defaults to the '
+                   'standards packaged with metameq')
+@click.option('--exclude_internals', is_flag=True,
+              help='leave internal host and sample types out of the config')
+def build_config(config_fp, artifact_fp, stds_fp, exclude_internals):
+    """Build the full flat config for a study config and write it as an artifact.
+
+    The artifact can be passed to write-extended-metadata in place of the
+    study config, skipping the config build (and all YAML loading).
+    """
+    header = _build_config_artifact(
+        artifact_fp, extract_config_dict(config_fp), stds_fp=stds_fp,
+        exclude_internals=exclude_internals)
+    click.echo(f"wrote {artifact_fp} (fingerprint {header[FINGERPRINT_KEY]})")
+
+
+@root.group("cache")
+def cache():
+    """Inspect and clear the on-disk cache of built configs."""
+    pass
+
+
+@cache.command("info", context_settings={'show_default': True})
+@click.option('--cache_dir', default=None,
+              help='cache directory; defaults to $METAMEQ_CACHE_DIR or '
+                   '~/.cache/metameq')
+def cache_info(cache_dir):
+    """List the cached configs, most recently used first."""
+    config_cache = ConfigCache(cache_dir)
+    entries = config_cache.list_entries()
+    click.echo(f"cache directory: {config_cache.cache_dir}")
+    click.echo(f"entries: {len(entries)}")
+    click.echo(f"total bytes: {sum(x['size'] for x in entries)} "
+               f"(max {config_cache.max_bytes})")
+    for curr_line in format_cache_entries(entries):
+        click.echo(curr_line)
+
+
+@cache.command("clear", context_settings={'show_default': True})
+@click.option('--cache_dir', default=None,
+              help='cache directory; defaults to $METAMEQ_CACHE_DIR or '
+                   '~/.cache/metameq')
+def cache_clear(cache_dir):
+    """Remove all cached configs."""
+    num_removed = ConfigCache(cache_dir).clear()
+    click.echo(f"removed {num_removed} cache entries")
+
+
+@cache.command("invalidate", context_settings={'show_default': True})
+@click.argument('key', type=str)
+@click.option('--cache_dir', default=None,
+              help='cache directory; defaults to $METAMEQ_CACHE_DIR or '
+                   '~/.cache/metameq')
+def cache_invalidate(key, cache_dir):
+    """Remove the cached config with the given KEY."""
+    if ConfigCache(cache_dir).invalidate(key):
+        click.echo(f"removed cache entry {key}")
+    else:
+        click.echo(f"no cache entry {key}")
 
 
 if __name__ == '__main__':
@@ -0,0 +1,315 @@
+import sys
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Iterable, Optional, Set, Tuple
+from metameq.src.util import DEFAULT_KEY, REQUIRED_KEY, \
+    METADATA_FIELDS_KEY, SAMPLE_TYPE_SPECIFIC_METADATA_KEY, \
+    HOST_TYPE_SPECIFIC_METADATA_KEY, METADATA_TRANSFORMERS_KEY, \
+    PRE_TRANSFORMERS_KEY, POST_TRANSFORMERS_KEY, SOURCES_KEY
+from metameq.src.transformer_plan import get_runnable_targets
+# imported as a module because metadata_validator also uses this module
+import metameq.src.metadata_validator as validator
+
+MAX_CACHED_SAMPLE_TYPE_SCHEMAS = 256
+
+# compiled schemas for interned metadata fields dicts (see
+# metameq.src.frozen_config), keyed by the dicts' fingerprints, so that all
+# host+sample type combinations with the same fields share one schema;
+# least recently used first
+_schemas_by_fingerprint = OrderedDict()
+_schemas_lock = threading.Lock()
+
+
+class FieldSpec:
+    """Compiled definition of a single metadata field.
+
+    Holds the parts of a field definition that the extender and validator
+    consult for every sample type they process, resolved once, so they need
+    not probe the definition dict for them again.
+
+    Attributes
+    ----------
+    name : str
+        The (interned) field name.
+    definition : Dict[str, Any]
+        The field definition the spec was compiled from.
+    has_default : bool
+        Whether the definition has a default value.
+    default : Any
+        The default value, or None if there is none.
+    required : bool
+        Whether the field is required.
+    allowed_types : Optional[Tuple[type, ...]]
+        The python types that values of the field may be cast to, in order
+        of preference, or None if the definition has no type information.
+    """
+
+    __slots__ = ("name", "definition", "has_default", "default", "required",
+                 "allowed_types")
+
+    def __init__(self, name: str, definition: Dict[str, Any]):
+        self.name = sys.intern(name) if isinstance(name, str) else name
+        self.definition = definition
+        self.has_default = DEFAULT_KEY in definition
+        self.default = definition.get(DEFAULT_KEY)
+        self.required = bool(definition.get(REQUIRED_KEY, False))
+
+        try:
+            self.allowed_types = tuple(
+                validator._get_allowed_pandas_types(name, definition))
+        except ValueError:
+            # only an error if the field is actually validated (see
+            # metadata_validator.validate_metadata_df)
+            self.allowed_types = None
+
+    def __repr__(self) -> str:
+        return f"FieldSpec({self.name!r}, {self.definition!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the field definition as an ordinary (mutable) dict."""
+        return dict(self.definition)
+
+
+class SampleTypeSchema:
+    """Compiled metadata fields of a host+sample type combination.
+
+    Attributes
+    ----------
+    fields : Tuple[FieldSpec, ...]
+        The compiled field definitions, in config order.
+    field_names : Tuple[str, ...]
+        The field names, in config order.
+    output_field_names : FrozenSet[str]
+        Names of the fields the extender adds to metadata of this host+sample
+        type: those that have a default or are required.
+    metadata_fields_dict : Dict[str, Any]
+        The metadata fields dictionary the schema was compiled from.
+    cerberus_schema : Dict[str, Any]
+        The cerberus-compatible version of metadata_fields_dict (see
+        metadata_validator._make_cerberus_schema). Shared, so must not be
+        modified.
+    """
+
+    __slots__ = ("fields", "field_names", "output_field_names",
+                 "metadata_fields_dict", "cerberus_schema")
+
+    def __init__(self, metadata_fields_dict: Dict[str, Any]):
+        self.metadata_fields_dict = metadata_fields_dict
+        self.fields = tuple(
+            FieldSpec(field_name, definition)
+            for field_name, definition in metadata_fields_dict.items())
+        self.field_names = tuple(x.name for x in self.fields)
+        self.output_field_names = frozenset(
+            x.name for x in self.fields if x.has_default or x.required)
+        self.cerberus_schema = \
+            validator._make_cerberus_schema(metadata_fields_dict)
+
+    def __len__(self) -> int:
+        return len(self.fields)
+
+    def __repr__(self) -> str:
+        return f"SampleTypeSchema({list(self.field_names)!r})"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the metadata fields as an ordinary dict of field definitions."""
+        return {x.name: x.to_dict() for x in self.fields}
+
+
+def compile_metadata_fields(
+        metadata_fields_dict: Dict[str, Any]) -> SampleTypeSchema:
+    """Compile a metadata fields dictionary into a SampleTypeSchema.
+
+    Schemas compiled from interned metadata fields dictionaries (those with
+    a ``fingerprint`` attribute, such as the resolved sample type fields in
+    a flat config) are cached, least-recently-used first out, so each
+    distinct set of fields is compiled only once.
+
+    Parameters
+    ----------
+    metadata_fields_dict : Dict[str, Any]
+        Dictionary of metadata field name to field definition.
+
+    Returns
+    -------
+    SampleTypeSchema
+        The compiled schema. May be shared with other callers, so must not
+        be modified.
+    """
+    fingerprint = getattr(metadata_fields_dict, "fingerprint", None)
+    if fingerprint is None:
+        return SampleTypeSchema(metadata_fields_dict)
+
+    with _schemas_lock:
+        schema = _schemas_by_fingerprint.get(fingerprint)
+        if schema is not None:
+            _schemas_by_fingerprint.move_to_end(fingerprint)
+            return schema
+
+    schema = SampleTypeSchema(metadata_fields_dict)
+    with _schemas_lock:
+        _schemas_by_fingerprint[fingerprint] = schema
+        while len(_schemas_by_fingerprint) > MAX_CACHED_SAMPLE_TYPE_SCHEMAS:
+            _schemas_by_fingerprint.popitem(last=False)
+    return schema
+
+
+def compile_flat_hosts_dict(
+        flat_hosts_dict: Dict[str, Any]
+) -> Dict[str, Dict[str, SampleTypeSchema]]:
+    """Compile every sample type of every host type in a flat hosts dictionary.
+
+    Parameters
+    ----------
+    flat_hosts_dict : Dict[str, Any]
+        The HOST_TYPE_SPECIFIC_METADATA_KEY section of a full flat config
+        (a dict or a FlatConfig).
+
+    Returns
+    -------
+    Dict[str, Dict[str, SampleTypeSchema]]
+        Dictionary of host type name to dictionary of sample type name to
+        compiled schema. ``{h: {s: x.to_dict() ...}}`` gives back the
+        sample types' metadata fields dictionaries.
+    """
+    result = {}
+    for host_type, host_type_dict in flat_hosts_dict.items():
+        sample_types_dict = \
+            host_type_dict.get(SAMPLE_TYPE_SPECIFIC_METADATA_KEY) or {}
+        result[host_type] = {
+            sample_type: compile_metadata_fields(
+                sample_type_dict.get(METADATA_FIELDS_KEY, {}))
+            for sample_type, sample_type_dict in sample_types_dict.items()}
+    return result
+
+
+class OutputColsIndex:
+    """Index of the columns a full flat config makes the extender output.
+
+    Parameters
+    ----------
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+    host_sample_pairs : Optional[Iterable[Tuple[str, str]]], default=None
+        The only (host type, sample type) pairs to index, or None to index
+        every pair in the config. Pairs not in the config are ignored.
+
+    Attributes
+    ----------
+    output_cols_by_pair : Dict[Tuple[str, str], FrozenSet[str]]
+        (host type, sample type) to the names of the fields the extender
+        adds for samples of that host+sample type.
+    pairs_by_field : Dict[str, Set[Tuple[str, str]]]
+        Field name to the (host type, sample type) pairs for which the
+        extender adds it.
+    pre_transformers : Tuple[Tuple[str, FrozenSet[str]], ...]
+        (target field, source fields) of each pre-transformer, in order.
+    post_transformers : Tuple[Tuple[str, FrozenSet[str]], ...]
+        (target field, source fields) of each post-transformer, in order.
+    config_cols : FrozenSet[str]
+        Names of every column the config refers to: the fields of every
+        indexed host+sample type (whether or not the extender adds them),
+        and the sources and targets of every transformer.
+    """
+
+    __slots__ = ("output_cols_by_pair", "pairs_by_field",
+                 "pre_transformers", "post_transformers", "config_cols")
+
+    def __init__(
+            self, full_flat_config_dict: Dict[str, Any],
+            host_sample_pairs: Optional[Iterable[Tuple[str, str]]] = None):
+        self.output_cols_by_pair = {}
+        self.pairs_by_field = {}
+        config_cols = set()
+        flat_hosts_dict = full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY]
+        if host_sample_pairs is not None:
+            # only the pairs indexed are resolved (see FlatConfig)
+            flat_hosts_dict = _select_host_sample_types(
+                flat_hosts_dict, host_sample_pairs)
+        compiled_hosts_dict = compile_flat_hosts_dict(flat_hosts_dict)
+        for host_type, sample_type_schemas in compiled_hosts_dict.items():
+            for sample_type, schema in sample_type_schemas.items():
+                pair = (host_type, sample_type)
+                self.output_cols_by_pair[pair] = schema.output_field_names
+                config_cols.update(schema.field_names)
+                for field_name in schema.output_field_names:
+                    self.pairs_by_field.setdefault(field_name, set()).add(pair)
+            # next sample type
+        # next host type
+
+        transformers_dict = \
+            full_flat_config_dict.get(METADATA_TRANSFORMERS_KEY) or {}
+        self.pre_transformers = _get_transformer_fields(
+            transformers_dict.get(PRE_TRANSFORMERS_KEY))
+        self.post_transformers = _get_transformer_fields(
+            transformers_dict.get(POST_TRANSFORMERS_KEY))
+        for target_field, source_fields in \
+                self.pre_transformers + self.post_transformers:
+            config_cols.add(target_field)
+            config_cols.update(source_fields)
+        self.config_cols = frozenset(config_cols)
+
+    def get_output_cols(
+            self, input_cols: Iterable[str],
+            host_sample_pairs: Iterable[Tuple[str, str]]) -> Set[str]:
+        """Get the columns the extender would output for the given input.
+
+        Parameters
+        ----------
+        input_cols : Iterable[str]
+            Names of the columns present in the metadata before the
+            pre-transformers run.
+        host_sample_pairs : Iterable[Tuple[str, str]]
+            The (host type, sample type) pairs present in the metadata.
+            Pairs not in the config add no columns.
+
+        Returns
+        -------
+        Set[str]
+            Names of all the columns in the extended metadata.
+        """
+        output_cols = set(input_cols)
+        _add_transformer_targets(output_cols, self.pre_transformers)
+        for pair in host_sample_pairs:
+            output_cols.update(self.output_cols_by_pair.get(pair, ()))
+        _add_transformer_targets(output_cols, self.post_transformers)
+        return output_cols
+
+
+def _select_host_sample_types(
+        flat_hosts_dict: Dict[str, Any],
+        host_sample_pairs: Iterable[Tuple[str, str]]) -> Dict[str, Any]:
+    sample_types_by_host = {}
+    for host_type, sample_type in host_sample_pairs:
+        sample_types_by_host.setdefault(host_type, set()).add(sample_type)
+
+    result = {}
+    # keep the config's order
+    for host_type in flat_hosts_dict:
+        if host_type not in sample_types_by_host:
+            continue
+        sample_types_dict = flat_hosts_dict[host_type].get(
+            SAMPLE_TYPE_SPECIFIC_METADATA_KEY) or {}
+        result[host_type] = {SAMPLE_TYPE_SPECIFIC_METADATA_KEY: {
+            x: sample_types_dict[x] for x in sample_types_dict
+            if x in sample_types_by_host[host_type]}}
+    # next host type
+    return result
+
+
+def _get_transformer_fields(
+        stage_transformers_dict: Dict[str, Any]
+) -> Tuple[Tuple[str, FrozenSet[str]], ...]:
+    return tuple(
+        (target_field, frozenset(transformer_dict[SOURCES_KEY]))
+        for target_field, transformer_dict in
+        (stage_transformers_dict or {}).items())
+
+
+def _add_transformer_targets(
+        output_cols: Set[str],
+        stage_transformers: Tuple[Tuple[str, FrozenSet[str]], ...]) -> None:
+    # as in the extender, a transformer runs (adding its target field) only
+    # if all its source fields are present when its turn comes, after the
+    # transformers it depends on (see metameq.src.transformer_plan)
+    output_cols.update(
+        get_runnable_targets(dict(stage_transformers), output_cols))
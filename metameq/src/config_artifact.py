@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Dict, Optional
+from metameq._version import get_versions
+from metameq.src.config_cache import make_config_cache_key
+from metameq.src.metadata_configurator import build_full_flat_config_dict
+from metameq.src.util import extract_config_dict
+
+CONFIG_ARTIFACT_FORMAT = "metameq-flat-config"
+CONFIG_ARTIFACT_FORMAT_VERSION = 1
+FORMAT_KEY = "format"
+FORMAT_VERSION_KEY = "format_version"
+METAMEQ_VERSION_KEY = "metameq_version"
+FINGERPRINT_KEY = "fingerprint"
+SOURCE_KEY_KEY = "source_key"
+# the header is on the first line, so it can be checked without reading
+# the (much larger) config that follows it
+_MAX_HEADER_BYTES = 4096
+
+# Define a logger for this module
+logger = logging.getLogger(__name__)
+
+
+def build_config_artifact(
+        artifact_fp: str,
+        study_specific_config_dict: Optional[Dict[str, Any]] = None,
+        software_config_dict: Optional[Dict[str, Any]] = None,
+        stds_fp: Optional[str] = None,
+        exclude_internals: bool = False) -> Dict[str, Any]:
+    """Build a full flat config and write it to a config artifact file.
+
+    Parameters
+    ----------
+    artifact_fp : str
+        Path of the artifact file to write.
+    study_specific_config_dict : Optional[Dict[str, Any]], default=None
+        Study-specific configuration dictionary.
+    software_config_dict : Optional[Dict[str, Any]], default=None
+        Software configuration dictionary. If None, the default software
+        config pulled from the config.yml file will be used.
+    stds_fp : Optional[str], default=None
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
+    exclude_internals : bool, default=False
+        If True, leave out internal host and sample types (see
+        ``build_full_flat_config_dict``).
+
+    Returns
+    -------
+    Dict[str, Any]
+        The header written to the artifact.
+    """
+    if software_config_dict is None:
+        software_config_dict = extract_config_dict(None)
+    if study_specific_config_dict is None:
+        study_specific_config_dict = {}
+
+    full_flat_config_dict = build_full_flat_config_dict(
+        study_specific_config_dict, software_config_dict, stds_fp,
+        exclude_internals)
+    source_key = make_config_cache_key(
+        study_specific_config_dict, software_config_dict, stds_fp,
+        exclude_internals)
+    return write_config_artifact(
+        full_flat_config_dict, artifact_fp, source_key)
+
+
+def write_config_artifact(
+        full_flat_config_dict: Dict[str, Any],
+        artifact_fp: str,
+        source_key: Optional[str] = None) -> Dict[str, Any]:
+    """Write a full flat config dictionary to a config artifact file.
+
+    The artifact holds two lines of JSON: a header identifying the format,
+    the metameq version that wrote it, and the fingerprint (sha256 digest)
+    of the config, then the config itself. It loads much faster than the
+    same config written as YAML.
+
+    Parameters
+    ----------
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary, as returned by
+        ``build_full_flat_config_dict``.
+    artifact_fp : str
+        Path of the artifact file to write.
+    source_key : Optional[str], default=None
+        Identifier of the inputs the config was built from (see
+        ``make_config_cache_key``), recorded in the header.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The header written to the artifact.
+
+    Raises
+    ------
+    ValueError
+        If the config contains values that cannot be written as JSON.
+    """
+    try:
+        config_bytes = json.dumps(
+            full_flat_config_dict, separators=(",", ":")).encode("utf-8")
+    except TypeError as e:
+        raise ValueError(f"Config cannot be written as a config "
+                         f"artifact: {e}") from e
+
+    header = {
+        FORMAT_KEY: CONFIG_ARTIFACT_FORMAT,
+        FORMAT_VERSION_KEY: CONFIG_ARTIFACT_FORMAT_VERSION,
+        METAMEQ_VERSION_KEY: get_versions()["version"],
+        FINGERPRINT_KEY: hashlib.sha256(config_bytes).hexdigest(),
+        SOURCE_KEY_KEY: source_key}
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    # write to a temporary file and then move it into place so that
+    # concurrent readers never see a partially written artifact
+    out_dir = os.path.dirname(os.path.abspath(artifact_fp))
+    fd, temp_fp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header_bytes + b"\n" + config_bytes + b"\n")
+        os.replace(temp_fp, artifact_fp)
+    except Exception:
+        if os.path.exists(temp_fp):
+            os.remove(temp_fp)
+        raise
+
+    return header
+
+
+def load_config_artifact(artifact_fp: str) -> Dict[str, Any]:
+    """Load the full flat config dictionary from a config artifact file.
+
+    Parameters
+    ----------
+    artifact_fp : str
+        Path to a config artifact file written by ``write_config_artifact``.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The full flat config dictionary.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a config artifact, is in an unsupported format
+        version, or its config does not match the fingerprint in its header.
+    """
+    with open(artifact_fp, "rb") as f:
+        header = _parse_header(f.readline(_MAX_HEADER_BYTES))
+        config_bytes = f.read().rstrip(b"\n")
+
+    if header is None:
+        raise ValueError(f"'{artifact_fp}' is not a metameq config artifact")
+    if header[FORMAT_VERSION_KEY] != CONFIG_ARTIFACT_FORMAT_VERSION:
+        raise ValueError(
+            f"Config artifact '{artifact_fp}' has format version "
+            f"{header[FORMAT_VERSION_KEY]}, but only version "
+            f"{CONFIG_ARTIFACT_FORMAT_VERSION} is supported; rebuild it")
+    if hashlib.sha256(config_bytes).hexdigest() != header[FINGERPRINT_KEY]:
+        raise ValueError(
+            f"Config artifact '{artifact_fp}' does not match its fingerprint")
+
+    curr_version = get_versions()["version"]
+    if header[METAMEQ_VERSION_KEY] != curr_version:
+        logger.warning(
+            f"Config artifact '{artifact_fp}' was built by metameq "
+            f"{header[METAMEQ_VERSION_KEY]}, not {curr_version}; "
+            f"consider rebuilding it")
+
+    return json.loads(config_bytes)
+
+
+def is_config_artifact(config_fp: str) -> bool:
+    """Check whether a file is a config artifact (rather than, e.g., YAML).
+
+    Parameters
+    ----------
+    config_fp : str
+        Path to a config file.
+
+    Returns
+    -------
+    bool
+        True if the file starts with a config artifact header.
+    """
+    with open(config_fp, "rb") as f:
+        return _parse_header(f.readline(_MAX_HEADER_BYTES)) is not None
+
+
+def _parse_header(header_line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        header = json.loads(header_line)
+    except ValueError:
+        return None
+
+    if not isinstance(header, dict) or \
+            header.get(FORMAT_KEY) != CONFIG_ARTIFACT_FORMAT:
+        return None
+    return header
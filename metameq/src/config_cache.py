@@ -0,0 +1,370 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from importlib.resources import files
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+from metameq._version import get_versions
+from metameq.src.util import CONFIG_MODULE_PATH
+
+CACHE_DIR_ENV_VAR = "METAMEQ_CACHE_DIR"
+CACHE_MAX_BYTES_ENV_VAR = "METAMEQ_CACHE_MAX_BYTES"
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_ENTRY_EXTENSION = ".json"
+_FINGERPRINT_KEY = "fingerprint"
+
+# Define a logger for this module
+logger = logging.getLogger(__name__)
+
+# process-wide cache used by build_full_flat_config_dict; None means disabled
+# unless the CACHE_DIR_ENV_VAR environment variable is set
+_default_config_cache = None
+
+
+class ConfigCache:
+    """On-disk, content-addressed cache of built configs and parsed standards.
+
+    Each entry is a config dictionary stored as JSON in its own file named
+    for its cache key: either a full flat config dictionary (see
+    ``make_config_cache_key``) or the parsed contents of a standards file
+    (see ``make_standards_cache_key``). The JSON follows a header line
+    holding its sha256 digest, as in a config artifact (see
+    ``metameq.src.config_artifact``). Entries are never
+    unpickled or otherwise executed, so a shared cache directory is safe to
+    read, and an entry that doesn't match its digest is a cache miss. Entries
+    are evicted in least-recently-used order once the total size of the
+    cache directory exceeds ``max_bytes``; a file's modification time is
+    refreshed whenever it is read, so it doubles as its last-used time.
+
+    Parameters
+    ----------
+    cache_dir : Optional[str], default=None
+        Directory in which to store cache entries. If None, the directory
+        returned by ``get_default_cache_dir`` is used. Created if necessary.
+    max_bytes : Optional[int], default=None
+        Maximum total size of all entries, in bytes. If None, the value of
+        the CACHE_MAX_BYTES_ENV_VAR environment variable is used if set,
+        otherwise DEFAULT_CACHE_MAX_BYTES.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None,
+                 max_bytes: Optional[int] = None):
+        if cache_dir is None:
+            cache_dir = get_default_cache_dir()
+        if max_bytes is None:
+            max_bytes = int(os.environ.get(
+                CACHE_MAX_BYTES_ENV_VAR, DEFAULT_CACHE_MAX_BYTES))
+
+        self.cache_dir = str(cache_dir)
+        self.max_bytes = max_bytes
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Get the config dict stored under a key, if any.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, as returned by ``make_config_cache_key``.
+
+        Returns
+        -------
+        Optional[Dict[str, Any]]
+            A fresh copy of the cached config dict, or None if there is no
+            (readable) entry for this key.
+        """
+        entry_fp = self._get_entry_fp(key)
+        try:
+            with open(entry_fp, "rb") as f:
+                header = json.loads(f.readline())
+                config_bytes = f.read()
+            if hashlib.sha256(config_bytes).hexdigest() != \
+                    header[_FINGERPRINT_KEY]:
+                raise ValueError("entry does not match its fingerprint")
+            config_dict = json.loads(config_bytes)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            # a corrupt or incompatible entry is just a cache miss
+            logger.warning(f"Discarding unreadable config cache entry "
+                           f"{entry_fp}: {e}")
+            self.invalidate(key)
+            return None
+
+        # mark the entry as most recently used
+        try:
+            os.utime(entry_fp)
+        except OSError:
+            pass
+        return config_dict
+
+    def put(self, key: str, config_dict: Dict[str, Any]) -> None:
+        """Store a config dict under a key, then evict entries if over size.
+
+        Parameters
+        ----------
+        key : str
+            Cache key, as returned by ``make_config_cache_key``.
+        config_dict : Dict[str, Any]
+            The full flat config dictionary to store.
+
+        Raises
+        ------
+        ValueError
+            If the config contains values that cannot be written as JSON, or
+            that would not read back unchanged (e.g. non-string keys).
+        """
+        try:
+            config_bytes = json.dumps(
+                config_dict, separators=(",", ":")).encode("utf-8")
+        except TypeError as e:
+            raise ValueError(f"Config cannot be cached: {e}") from e
+        if json.loads(config_bytes) != config_dict:
+            raise ValueError("Config cannot be cached: it does not read "
+                             "back unchanged from JSON")
+        header_bytes = json.dumps({
+            _FINGERPRINT_KEY: hashlib.sha256(config_bytes).hexdigest()
+        }).encode("utf-8")
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # write to a temporary file and then move it into place so that
+        # concurrent readers never see a partially written entry
+        fd, temp_fp = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(header_bytes + b"\n" + config_bytes)
+            os.replace(temp_fp, self._get_entry_fp(key))
+        except Exception:
+            if os.path.exists(temp_fp):
+                os.remove(temp_fp)
+            raise
+
+        self.evict()
+
+    def invalidate(self, key: str) -> bool:
+        """Remove the entry for a key.
+
+        Parameters
+        ----------
+        key : str
+            Cache key of the entry to remove.
+
+        Returns
+        -------
+        bool
+            True if an entry was removed, False if there was none.
+        """
+        try:
+            os.remove(self._get_entry_fp(key))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def clear(self) -> int:
+        """Remove all entries from the cache.
+
+        Returns
+        -------
+        int
+            The number of entries removed.
+        """
+        entries = self.list_entries()
+        num_removed = 0
+        for curr_entry in entries:
+            if self.invalidate(curr_entry["key"]):
+                num_removed += 1
+        return num_removed
+
+    def list_entries(self) -> List[Dict[str, Any]]:
+        """List the entries in the cache, most recently used first.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            One dict per entry, with keys "key", "size" (in bytes) and
+            "last_used" (a POSIX timestamp).
+        """
+        cache_path = Path(self.cache_dir)
+        if not cache_path.is_dir():
+            return []
+
+        entries = []
+        for curr_fp in cache_path.glob(f"*{CACHE_ENTRY_EXTENSION}"):
+            try:
+                curr_stat = curr_fp.stat()
+            except FileNotFoundError:
+                # removed by another process since the glob
+                continue
+            entries.append({
+                "key": curr_fp.stem,
+                "size": curr_stat.st_size,
+                "last_used": curr_stat.st_mtime})
+        # next entry file
+
+        entries.sort(key=lambda x: x["last_used"], reverse=True)
+        return entries
+
+    def total_bytes(self) -> int:
+        """Get the total size of all entries in the cache, in bytes."""
+        return sum(x["size"] for x in self.list_entries())
+
+    def evict(self) -> int:
+        """Remove least-recently-used entries until the cache fits in max_bytes.
+
+        Returns
+        -------
+        int
+            The number of entries removed.
+        """
+        entries = self.list_entries()
+        total_bytes = sum(x["size"] for x in entries)
+
+        num_removed = 0
+        # entries are sorted most recently used first, so pop from the end
+        while entries and total_bytes > self.max_bytes:
+            curr_entry = entries.pop()
+            if self.invalidate(curr_entry["key"]):
+                num_removed += 1
+            total_bytes -= curr_entry["size"]
+        return num_removed
+
+    def _get_entry_fp(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{CACHE_ENTRY_EXTENSION}")
+
+
+def get_default_cache_dir() -> str:
+    """Get the directory used for the config cache when none is specified.
+
+    Returns
+    -------
+    str
+        The value of the CACHE_DIR_ENV_VAR environment variable if set,
+        otherwise a "metameq" directory under $XDG_CACHE_HOME (or ~/.cache).
+    """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if not cache_dir:
+        cache_home = os.environ.get(
+            "XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache"))
+        cache_dir = os.path.join(cache_home, "metameq")
+    return cache_dir
+
+
+def get_default_config_cache() -> Optional[ConfigCache]:
+    """Get the process-wide config cache, if caching is enabled.
+
+    Caching is enabled either by calling ``set_default_config_cache`` or by
+    setting the CACHE_DIR_ENV_VAR environment variable.
+
+    Returns
+    -------
+    Optional[ConfigCache]
+        The process-wide config cache, or None if caching is not enabled.
+    """
+    if _default_config_cache is not None:
+        return _default_config_cache
+    if os.environ.get(CACHE_DIR_ENV_VAR):
+        return ConfigCache()
+    return None
+
+
+def set_default_config_cache(config_cache: Optional[ConfigCache]) -> None:
+    """Set (or, with None, unset) the process-wide config cache.
+
+    Parameters
+    ----------
+    config_cache : Optional[ConfigCache]
+        The cache to use for all subsequent config builds, or None to fall
+        back to the environment-variable-controlled default.
+    """
+    global _default_config_cache
+    _default_config_cache = config_cache
+
+
+def make_config_cache_key(
+        study_specific_config_dict: Dict[str, Any],
+        software_config_dict: Dict[str, Any],
+        stds_fp: Optional[str] = None,
+        exclude_internals: bool = False) -> str:
+    """Make the content-addressed cache key for a full flat config build.
+
+    Parameters
+    ----------
+    study_specific_config_dict : Dict[str, Any]
+        Study-specific configuration dictionary.
+    software_config_dict : Dict[str, Any]
+        Software configuration dictionary.
+    stds_fp : Optional[str], default=None
+        Path to standards dictionary file. If None, the packaged
+        standards.yml file is used.
+    exclude_internals : bool, default=False
+        Whether the build excludes internal host and sample types.
+
+    Returns
+    -------
+    str
+        Hex digest identifying the standards file contents, both config
+        dicts, the exclude_internals setting, and the metameq version.
+    """
+    key_contents = {
+        "standards": _get_stds_digest(stds_fp),
+        "study_config": study_specific_config_dict,
+        "software_config": software_config_dict,
+        "exclude_internals": exclude_internals,
+        "version": get_versions()["version"]}
+    # default=repr covers values yaml can produce that json can't (e.g. dates)
+    key_json = json.dumps(key_contents, sort_keys=True, default=repr)
+    return hashlib.sha256(key_json.encode("utf-8")).hexdigest()
+
+
+def make_standards_cache_key(stds_fp: Optional[str] = None) -> str:
+    """Make the content-addressed cache key for the parsed contents of a standards file.
+
+    Parameters
+    ----------
+    stds_fp : Optional[str], default=None
+        Path to standards dictionary file. If None, the packaged
+        standards.yml file is used.
+
+    Returns
+    -------
+    str
+        Hex digest identifying the standards file contents and the metameq
+        version; never equal to a key made by ``make_config_cache_key``.
+    """
+    key_contents = {
+        "parsed_standards": _get_stds_digest(stds_fp),
+        "version": get_versions()["version"]}
+    key_json = json.dumps(key_contents, sort_keys=True)
+    return hashlib.sha256(key_json.encode("utf-8")).hexdigest()
+
+
+def _get_stds_digest(stds_fp: Optional[str]) -> str:
+    if not stds_fp:
+        stds_fp = files(CONFIG_MODULE_PATH).joinpath("standards.yml")
+    with open(stds_fp, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def format_cache_entries(entries: List[Dict[str, Any]]) -> List[str]:
+    """Format cache entries as human-readable lines.
+
+    Parameters
+    ----------
+    entries : List[Dict[str, Any]]
+        Entries as returned by ``ConfigCache.list_entries``.
+
+    Returns
+    -------
+    List[str]
+        One line per entry with its key, size, and last-used time.
+    """
+    lines = []
+    for curr_entry in entries:
+        last_used_str = time.strftime(
+            '%Y-%m-%d %H:%M:%S', time.localtime(curr_entry["last_used"]))
+        lines.append(f"{curr_entry['key']}\t{curr_entry['size']}\t"
+                     f"{last_used_str}")
+    return lines
@@ -0,0 +1,228 @@
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Optional
+from dateutil import parser
+import pandas
+
+MAX_CACHED_DATE_PARSES = 100000
+# fewer strings than this are parsed one at a time with dateutil, as faster
+# than building the pandas objects to parse them vectorized
+_MIN_VECTORIZED_DATE_PARSES = 20
+
+# formats whose strings parse vectorized (with pandas.to_datetime) to just
+# what they parse to with dateutil, each with the regex that its strings
+# match: every date part present (dateutil fills missing ones from today's
+# date), four-digit years of at least 1 (pandas reads fewer digits, and
+# year 0, which dateutil doesn't) and no leap seconds (pandas rolls them
+# over, dateutil rejects them); dateutil reads dd/dd/dddd month first
+_FAST_DATE_FORMATS = tuple(
+    (re.compile(x), y) for x, y in [
+        (r"(?!0000)\d{4}-\d{2}-\d{2}", "%Y-%m-%d"),
+        (r"(?!0000)\d{4}-\d{2}-\d{2} \d{2}:\d{2}", "%Y-%m-%d %H:%M"),
+        (r"(?!0000)\d{4}-\d{2}-\d{2} \d{2}:\d{2}:[0-5]\d",
+         "%Y-%m-%d %H:%M:%S"),
+        (r"(?!0000)\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:[0-5]\d",
+         "%Y-%m-%dT%H:%M:%S"),
+        (r"\d{2}/\d{2}/(?!0000)\d{4}", "%m/%d/%Y"),
+        (r"\d{2}/\d{2}/(?!0000)\d{4} \d{2}:\d{2}", "%m/%d/%Y %H:%M")])
+# marks a cache entry that has not (yet) been parsed in that mode
+_NOT_PARSED = object()
+# marks a cache entry that could not be parsed in that mode
+_UNPARSEABLE = object()
+
+# date string to its [strict, fuzzy] parse results; least recently used
+# first. Parsing strings that lack some date parts depends on today's date,
+# so the cache is cleared when that changes.
+_parsed_dates = OrderedDict()
+_parsed_dates_day = None
+_parsed_dates_lock = threading.Lock()
+
+
+def parse_date(date_val: Any, fuzzy: bool = False) -> datetime:
+    """Parse a date string with dateutil, at most once while it is cached.
+
+    The transformers and the validator parse the same date strings (the
+    transformers strictly, the validator fuzzily); both get them from a
+    shared, bounded cache of parsed strings. A string that parses strictly
+    parses to the same date fuzzily, so is parsed only once for both.
+
+    Parameters
+    ----------
+    date_val : Any
+        The date string to parse. Values that are not strings are passed to
+        dateutil as is, and not cached.
+    fuzzy : bool, default=False
+        Whether to ignore unknown tokens in the string, as
+        ``dateutil.parser.parse`` does with fuzzy=True.
+
+    Returns
+    -------
+    datetime
+        The parsed date, as ``dateutil.parser.parse`` returns it (with
+        dayfirst=False).
+
+    Raises
+    ------
+    ValueError
+        If the string cannot be parsed (or any error dateutil raises for a
+        value that is not a string).
+    """
+    if not isinstance(date_val, str):
+        return parser.parse(date_val, fuzzy=fuzzy)
+
+    parsed_date = _NOT_PARSED
+    with _parsed_dates_lock:
+        _clear_if_new_day()
+        curr_entry = _parsed_dates.get(date_val)
+        if curr_entry is not None:
+            _parsed_dates.move_to_end(date_val)
+            parsed_date = _get_entry_result(curr_entry, fuzzy)
+    if parsed_date is _NOT_PARSED:
+        parsed_date = parse_dates([date_val], fuzzy=fuzzy)[date_val]
+    if parsed_date is None or parsed_date is _UNPARSEABLE:
+        raise ValueError(f"Unable to parse date: {date_val}")
+    return parsed_date
+
+
+def parse_dates(date_strs: Iterable[str],
+                fuzzy: bool = False) -> Dict[str, Optional[datetime]]:
+    """Parse date strings, each at most once while it is cached.
+
+    Strings not already in the cache are parsed vectorized where possible:
+    if there are enough of them, the (known) format most of them have is
+    inferred, and those with it are parsed all at once with
+    ``pandas.to_datetime``; only the rest are parsed one at a time with
+    dateutil.
+
+    Parameters
+    ----------
+    date_strs : Iterable[str]
+        The date strings to parse.
+    fuzzy : bool, default=False
+        Whether to ignore unknown tokens in the strings, as
+        ``dateutil.parser.parse`` does with fuzzy=True.
+
+    Returns
+    -------
+    Dict[str, Optional[datetime]]
+        Each distinct date string to its parsed date (as
+        ``dateutil.parser.parse`` returns it), or to None if it cannot be
+        parsed.
+    """
+    result = {}
+    unparsed_strs = []
+    with _parsed_dates_lock:
+        _clear_if_new_day()
+        for curr_str in dict.fromkeys(date_strs):
+            curr_entry = _parsed_dates.get(curr_str)
+            if curr_entry is None:
+                unparsed_strs.append(curr_str)
+                continue
+            _parsed_dates.move_to_end(curr_str)
+            curr_parsed = _get_entry_result(curr_entry, fuzzy)
+            if curr_parsed is _NOT_PARSED:
+                unparsed_strs.append(curr_str)
+            else:
+                result[curr_str] = curr_parsed
+        # next date string
+    # release the lock while parsing
+
+    new_entries = {}
+    if len(unparsed_strs) >= _MIN_VECTORIZED_DATE_PARSES:
+        for curr_str, curr_parsed in \
+                _parse_dates_vectorized(unparsed_strs).items():
+            new_entries[curr_str] = [curr_parsed, _NOT_PARSED]
+    for curr_str in unparsed_strs:
+        if curr_str in new_entries:
+            continue
+        curr_entry = [_NOT_PARSED, _NOT_PARSED]
+        curr_entry[1 if fuzzy else 0] = _parse_date_str(curr_str, fuzzy)
+        new_entries[curr_str] = curr_entry
+    # next date string not parsed vectorized
+
+    with _parsed_dates_lock:
+        for curr_str, curr_entry in new_entries.items():
+            old_entry = _parsed_dates.get(curr_str)
+            if old_entry is not None:
+                # keep whatever another thread parsed in the meantime
+                curr_entry = [y if x is _NOT_PARSED else x
+                              for x, y in zip(curr_entry, old_entry)]
+            _parsed_dates[curr_str] = curr_entry
+            _parsed_dates.move_to_end(curr_str)
+            result[curr_str] = _get_entry_result(curr_entry, fuzzy)
+        # next newly parsed date string
+        while len(_parsed_dates) > MAX_CACHED_DATE_PARSES:
+            _parsed_dates.popitem(last=False)
+
+    return {x: (None if y is _UNPARSEABLE else y) for x, y in result.items()}
+
+
+def clear_date_parse_cache() -> None:
+    """Remove all parsed date strings from the cache."""
+    with _parsed_dates_lock:
+        _parsed_dates.clear()
+
+
+def _clear_if_new_day() -> None:
+    # must be called with _parsed_dates_lock held
+    global _parsed_dates_day
+    today = date.today()
+    if today != _parsed_dates_day:
+        _parsed_dates.clear()
+        _parsed_dates_day = today
+
+
+def _get_entry_result(entry: list, fuzzy: bool) -> Any:
+    """Get a cache entry's parse result for a mode, or _NOT_PARSED."""
+    strict_parsed, fuzzy_parsed = entry
+    if not fuzzy or isinstance(strict_parsed, datetime):
+        # a string that parses strictly parses to the same date fuzzily
+        return strict_parsed
+    return fuzzy_parsed
+
+
+def _parse_date_str(date_str: str, fuzzy: bool) -> Any:
+    """Parse a date string with dateutil, giving _UNPARSEABLE if it can't be."""
+    try:
+        return parser.parse(date_str, fuzzy=fuzzy, dayfirst=False)
+    except Exception:
+        return _UNPARSEABLE
+
+
+def _parse_dates_vectorized(date_strs: Iterable[str]) -> Dict[str, datetime]:
+    """Parse the date strings with the most common known format all at once.
+
+    Parameters
+    ----------
+    date_strs : Iterable[str]
+        Distinct date strings.
+
+    Returns
+    -------
+    Dict[str, datetime]
+        Each date string that has the most common of the known formats
+        (_FAST_DATE_FORMATS) and is a valid date to its parsed date. Empty
+        if none of the strings has a known format.
+    """
+    strs_series = pandas.Series(list(date_strs), dtype=object)
+    best_matches = None
+    best_format = None
+    for curr_regex, curr_format in _FAST_DATE_FORMATS:
+        curr_matches = strs_series.str.fullmatch(curr_regex).fillna(False)
+        if best_matches is None or curr_matches.sum() > best_matches.sum():
+            best_matches = curr_matches
+            best_format = curr_format
+    # next known format
+    if not best_matches.any():
+        return {}
+
+    matching_strs = strs_series[best_matches.astype(bool)]
+    parsed_dates = pandas.to_datetime(
+        matching_strs, format=best_format, errors="coerce")
+    # the strings that aren't valid dates (such as 2020-02-30) are left for
+    # dateutil to find unparseable
+    is_parsed = parsed_dates.notna()
+    return dict(zip(matching_strs[is_parsed],
+                    parsed_dates[is_parsed].dt.to_pydatetime()))
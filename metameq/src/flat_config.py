@@ -0,0 +1,463 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+from importlib.resources import files
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from metameq.src.config_cache import get_default_config_cache, \
+    make_standards_cache_key
+from metameq.src.util import extract_config_dict, extract_stds_config, \
+    extract_yaml_dict, is_yaml_memoized, memoize_yaml_dict, \
+    CONFIG_MODULE_PATH, \
+    HOST_TYPE_SPECIFIC_METADATA_KEY, METADATA_FIELDS_KEY, \
+    SAMPLE_TYPE_SPECIFIC_METADATA_KEY, STUDY_SPECIFIC_METADATA_KEY, \
+    GLOBAL_SETTINGS_KEYS
+from metameq.src.frozen_config import intern_config_value
+# imported as a module because metadata_configurator also uses this module
+import metameq.src.metadata_configurator as configurator
+
+MAX_CACHED_STANDARDS_BASES = 16
+
+# standards-only FlatConfigs shared by all builds from the same standards,
+# global settings and exclude_internals setting; least recently used first
+_standards_bases = OrderedDict()
+_standards_bases_lock = threading.Lock()
+
+# Define a logger for this module
+logger = logging.getLogger(__name__)
+
+
+class _LazyMapping(Mapping):
+    """Read-only mapping whose values are computed on first lookup and memoized.
+
+    Subclasses fill ``_names`` with their keys, in iteration order, and
+    implement ``_resolve`` to compute a key's value. Keys beginning with an
+    underscore are hidden if exclude_internals is True. Lookups are
+    thread-safe, membership checks and iteration never trigger
+    resolution, and instances can be pickled.
+    """
+
+    def __init__(self, exclude_internals: bool = False):
+        self.exclude_internals = exclude_internals
+        # keys in the order they should be iterated
+        self._names = {}
+        self._resolved = {}
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        if name not in self:
+            raise KeyError(name)
+
+        with self._lock:
+            if name not in self._resolved:
+                self._resolved[name] = self._resolve(name)
+            return self._resolved[name]
+
+    def __contains__(self, name: object) -> bool:
+        if name not in self._names:
+            return False
+        return not (self.exclude_internals and name.startswith("_"))
+
+    def __iter__(self) -> Iterator[str]:
+        return (x for x in self._names if x in self)
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @property
+    def resolved_names(self) -> List[str]:
+        """Keys whose values have been resolved so far."""
+        with self._lock:
+            return list(self._resolved)
+
+    def _resolve(self, name: str) -> Dict[str, Any]:
+        raise NotImplementedError()
+
+
+class SampleTypesConfig(_LazyMapping):
+    """Read-only mapping of sample type name to resolved sample type config.
+
+    Behaves like the SAMPLE_TYPE_SPECIFIC_METADATA_KEY dictionary of a host
+    type in the output of ``build_full_flat_config_dict``, but each sample
+    type's aliases and base type are only resolved, and its metadata fields
+    only merged with the host's, the first time it is looked up. Invalid
+    alias or base type definitions therefore raise a ValueError at lookup
+    rather than at build time; use ``check_all`` to resolve everything up
+    front.
+
+    Parameters
+    ----------
+    sample_types_dict : Dict[str, Any]
+        The host type's unresolved sample type definitions.
+    host_metadata_fields_dict : Dict[str, Any]
+        The host type's metadata fields, which each sample type builds on.
+    exclude_internals : bool, default=False
+        If True, sample types whose names begin with an underscore are hidden
+        (although they may still be used as aliases or base types).
+    """
+
+    def __init__(self, sample_types_dict: Dict[str, Any],
+                 host_metadata_fields_dict: Dict[str, Any],
+                 exclude_internals: bool = False):
+        super().__init__(exclude_internals)
+        self._names = dict.fromkeys(sample_types_dict)
+        self._sample_types_dict = sample_types_dict
+        self._host_metadata_fields_dict = host_metadata_fields_dict
+
+    def check_all(self) -> None:
+        """Resolve every (visible) sample type.
+
+        Raises
+        ------
+        ValueError
+            If any sample type has invalid alias or base type definitions.
+        """
+        for sample_type in self:
+            _ = self[sample_type]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Resolve every (visible) sample type and return them as a plain dict."""
+        return {sample_type: dict(self[sample_type]) for sample_type in self}
+
+    def _resolve(self, sample_type: str) -> Dict[str, Any]:
+        metadata_fields_dict = \
+            configurator._construct_sample_type_metadata_fields_dict(
+                sample_type, self._sample_types_dict,
+                self._host_metadata_fields_dict)
+        return {METADATA_FIELDS_KEY: metadata_fields_dict}
+
+
+class FlatConfig(_LazyMapping):
+    """Read-only mapping of host type name to flat host type config, built on demand.
+
+    Behaves like the HOST_TYPE_SPECIFIC_METADATA_KEY dictionary returned by
+    ``build_full_flat_config_dict``, but a host type is only flattened (by
+    walking its own ancestor chain) the first time it is looked up. Results
+    are memoized, as are the unresolved flat dicts of the ancestors walked
+    along the way, so later lookups of related host types reuse them. Each
+    host type's sample types are held in a ``SampleTypesConfig``, so they
+    too are only resolved when used.
+
+    Parameters
+    ----------
+    full_nested_hosts_dict : Dict[str, Any]
+        Combined, nested config dictionary (as returned by
+        ``build_full_nested_config_dict``) whose host type hierarchy is under
+        HOST_TYPE_SPECIFIC_METADATA_KEY.
+    exclude_internals : bool, default=False
+        If True, host types whose names begin with an underscore are hidden,
+        as are sample types whose names begin with an underscore.
+    base : Optional[FlatConfig], default=None
+        A FlatConfig for the same host type hierarchy and settings, but
+        without the study-specific changes named in touched_host_types (see
+        ``get_standards_base``). Host types that neither are nor descend from
+        a touched host type are taken from the base, sharing its memoized
+        results, instead of being flattened again.
+    touched_host_types : Optional[Iterable[str]], default=None
+        Names of the host types whose definitions differ from those in base.
+    """
+
+    def __init__(self, full_nested_hosts_dict: Dict[str, Any],
+                 exclude_internals: bool = False,
+                 base: Optional["FlatConfig"] = None,
+                 touched_host_types: Optional[Iterable[str]] = None):
+        super().__init__(exclude_internals)
+        self._base = base
+        self._touched_host_types = frozenset(touched_host_types or [])
+
+        # host type name -> tuple of host type names from the top of the
+        # hierarchy down to (and including) that host type, in the same
+        # order that flatten_nested_stds_dict emits the host types
+        self._names = {}
+        # host type path -> that host type's nested dict
+        self._nested_host_dicts = {}
+        self._index_host_types(full_nested_hosts_dict, ())
+
+        # host type path -> flat dict whose sample types are not yet resolved
+        self._unresolved_host_dicts = {}
+
+    def check_all(self) -> None:
+        """Resolve every (visible) host type and all of its sample types.
+
+        Intended for standards authors who want every definition checked,
+        as the eager ``build_full_flat_config_dict`` does.
+
+        Raises
+        ------
+        ValueError
+            If any sample type has invalid alias or base type definitions.
+        """
+        for host_type in self:
+            sample_types = self[host_type].get(SAMPLE_TYPE_SPECIFIC_METADATA_KEY)
+            if sample_types is not None:
+                sample_types.check_all()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Resolve every (visible) host type and return them as plain dicts.
+
+        Returns
+        -------
+        Dict[str, Any]
+            Dictionary equal to the HOST_TYPE_SPECIFIC_METADATA_KEY value
+            returned by ``build_full_flat_config_dict`` for the same inputs.
+        """
+        result = {}
+        for host_type in self:
+            # copy the containers that may be shared with other FlatConfigs
+            # (field definitions themselves are immutable)
+            host_type_dict = dict(self[host_type])
+            if METADATA_FIELDS_KEY in host_type_dict:
+                host_type_dict[METADATA_FIELDS_KEY] = \
+                    dict(host_type_dict[METADATA_FIELDS_KEY])
+            if SAMPLE_TYPE_SPECIFIC_METADATA_KEY in host_type_dict:
+                host_type_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY] = \
+                    host_type_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY].to_dict()
+            result[host_type] = host_type_dict
+        return result
+
+    def _index_host_types(
+            self, parent_nested_dict: Dict[str, Any],
+            parent_path: Tuple[str, ...]) -> None:
+        parent_host_types_dict = \
+            parent_nested_dict.get(HOST_TYPE_SPECIFIC_METADATA_KEY, {})
+        for curr_host_type, curr_host_type_nested_dict in \
+                parent_host_types_dict.items():
+            curr_path = parent_path + (curr_host_type,)
+            self._nested_host_dicts[curr_path] = curr_host_type_nested_dict
+
+            # index children first, and let later duplicates of a name win,
+            # to match the output of flatten_nested_stds_dict
+            self._index_host_types(curr_host_type_nested_dict, curr_path)
+            self._names[curr_host_type] = curr_path
+        # next host type
+
+    def _is_from_base(self, host_type_path: Tuple[str, ...]) -> bool:
+        # a host type is unchanged from the base if neither it nor any of
+        # its ancestors was touched
+        return self._base is not None and \
+            self._touched_host_types.isdisjoint(host_type_path)
+
+    def _get_unresolved_host_dict(
+            self, host_type_path: Tuple[str, ...]) -> Dict[str, Any]:
+        if self._is_from_base(host_type_path):
+            with self._base._lock:
+                return self._base._get_unresolved_host_dict(host_type_path)
+
+        unresolved_dict = self._unresolved_host_dicts.get(host_type_path)
+        if unresolved_dict is None:
+            parent_flat_dict = {}
+            if len(host_type_path) > 1:
+                parent_flat_dict = \
+                    self._get_unresolved_host_dict(host_type_path[:-1])
+
+            unresolved_dict = configurator._combine_base_and_added_host_type(
+                parent_flat_dict, self._nested_host_dicts[host_type_path])
+            self._unresolved_host_dicts[host_type_path] = unresolved_dict
+        # endif not already memoized
+
+        return unresolved_dict
+
+    def _resolve(self, host_type: str) -> Dict[str, Any]:
+        if self._is_from_base(self._names[host_type]):
+            return self._base[host_type]
+
+        # copy so that the memoized unresolved dict, which descendants
+        # inherit from, keeps its unresolved sample types
+        host_type_dict = dict(self._get_unresolved_host_dict(
+            self._names[host_type]))
+
+        if SAMPLE_TYPE_SPECIFIC_METADATA_KEY in host_type_dict:
+            host_type_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY] = \
+                SampleTypesConfig(
+                    host_type_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY],
+                    host_type_dict.get(METADATA_FIELDS_KEY, {}),
+                    self.exclude_internals)
+        # endif host type has sample types
+
+        return host_type_dict
+
+
+def build_lazy_flat_config_dict(
+        study_specific_config_dict: Optional[Dict[str, Any]] = None,
+        software_config_dict: Optional[Dict[str, Any]] = None,
+        stds_fp: Optional[str] = None,
+        exclude_internals: bool = False,
+        check_all: bool = False
+) -> Dict[str, Any]:
+    """Build a full flat configuration dictionary whose host types resolve on demand.
+
+    Takes the same arguments as, and returns a dictionary equivalent to, that
+    of ``build_full_flat_config_dict``, except that the value under
+    HOST_TYPE_SPECIFIC_METADATA_KEY is a ``FlatConfig`` rather than a dict, so
+    only the host types actually looked up are ever flattened. Host types
+    that the study-specific config does not change (directly or through an
+    ancestor) are taken from a standards base shared by all builds with the
+    same standards and global settings (see ``get_standards_base``). If the
+    on-disk config cache is enabled (see
+    ``metameq.src.config_cache.get_default_config_cache``), the parsed
+    standards are read from it, or written to it after parsing, so later
+    processes skip parsing the standards file, which is most of the cost
+    of a build.
+
+    Parameters
+    ----------
+    study_specific_config_dict : Optional[Dict[str, Any]], default=None
+        Study-specific configuration dictionary.
+    software_config_dict : Optional[Dict[str, Any]], default=None
+        Software configuration dictionary with default settings. If None,
+        the default software config from config.yml will be used.
+    stds_fp : Optional[str], default=None
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
+    exclude_internals : bool, default=False
+        If True, hide host types whose names begin with an underscore,
+        and from remaining hosts remove sample types whose names begin
+        with an underscore.
+    check_all : bool, default=False
+        If True, resolve every host type and sample type immediately (see
+        ``FlatConfig.check_all``), so that invalid alias or base type
+        definitions anywhere in the standards raise here rather than when
+        first used.
+
+    Returns
+    -------
+    Dict[str, Any]
+        A complete flat configuration dictionary with a ``FlatConfig`` under
+        HOST_TYPE_SPECIFIC_METADATA_KEY.
+
+    Raises
+    ------
+    ValueError
+        If check_all is True and any sample type has invalid alias or base
+        type definitions.
+    """
+    if software_config_dict is None:
+        software_config_dict = extract_config_dict(None)
+
+    if study_specific_config_dict is None:
+        study_specific_config_dict = {}
+
+    _load_cached_standards(stds_fp)
+    full_nested_hosts_dict = configurator.build_full_nested_config_dict(
+        study_specific_config_dict, software_config_dict, stds_fp)
+
+    # only the host types the study changes (and their descendants) need
+    # flattening; everything else comes from the shared standards base
+    study_flat_dict = (software_config_dict | study_specific_config_dict).get(
+        STUDY_SPECIFIC_METADATA_KEY) or {}
+    touched_host_types = \
+        study_flat_dict.get(HOST_TYPE_SPECIFIC_METADATA_KEY) or {}
+    standards_base = get_standards_base(
+        stds_fp, _get_global_settings(full_nested_hosts_dict),
+        exclude_internals)
+
+    full_flat_config_dict = dict(full_nested_hosts_dict)
+    flat_hosts = FlatConfig(
+        full_nested_hosts_dict, exclude_internals, standards_base,
+        touched_host_types)
+    if check_all:
+        flat_hosts.check_all()
+    full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY] = flat_hosts
+    return full_flat_config_dict
+
+
+def get_standards_base(
+        stds_fp: Optional[str],
+        global_settings_dict: Dict[str, Any],
+        exclude_internals: bool = False) -> FlatConfig:
+    """Get the shared, standards-only FlatConfig for a standards file and settings.
+
+    Bases are cached in-process, keyed on the fingerprint of the standards'
+    host type hierarchy, the global settings and exclude_internals, so all
+    studies built against the same standards share one base and the host
+    types it has already flattened and resolved. Across processes, only the
+    parsed standards are shared, through the on-disk config cache if it is
+    enabled; flattening the few host types a study uses is cheap next to
+    parsing the standards file.
+
+    Parameters
+    ----------
+    stds_fp : Optional[str]
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
+    global_settings_dict : Dict[str, Any]
+        The global settings (see GLOBAL_SETTINGS_KEYS) in effect for the
+        build, which are pushed into the top host type.
+    exclude_internals : bool, default=False
+        Whether internal host and sample types are hidden.
+
+    Returns
+    -------
+    FlatConfig
+        FlatConfig for the standards with no study-specific changes.
+    """
+    _load_cached_standards(stds_fp)
+    stds_nested_dict = extract_stds_config(stds_fp, interned=True)
+    stds_hosts_dict = intern_config_value(
+        stds_nested_dict.get(HOST_TYPE_SPECIFIC_METADATA_KEY, {}))
+    base_key = (stds_hosts_dict.fingerprint,
+                repr(sorted(global_settings_dict.items())),
+                exclude_internals)
+
+    with _standards_bases_lock:
+        standards_base = _standards_bases.get(base_key)
+        if standards_base is not None:
+            _standards_bases.move_to_end(base_key)
+            return standards_base
+
+    base_nested_dict = configurator.build_full_nested_config_dict(
+        {}, global_settings_dict, stds_fp)
+    standards_base = FlatConfig(base_nested_dict, exclude_internals)
+
+    with _standards_bases_lock:
+        # another thread may have built the same base in the meantime
+        standards_base = _standards_bases.setdefault(base_key, standards_base)
+        _standards_bases.move_to_end(base_key)
+        while len(_standards_bases) > MAX_CACHED_STANDARDS_BASES:
+            _standards_bases.popitem(last=False)
+    return standards_base
+
+
+def _get_global_settings(config_dict: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: config_dict[k] for k in GLOBAL_SETTINGS_KEYS
+            if k in config_dict}
+
+
+def _load_cached_standards(stds_fp: Optional[str]) -> None:
+    # make the parsed standards available to extract_stds_config through
+    # the on-disk config cache, if it is enabled: memoize them from the
+    # cache entry or, failing that, parse them and write the entry
+    config_cache = get_default_config_cache()
+    if config_cache is None:
+        return
+
+    if not stds_fp:
+        stds_fp = files(CONFIG_MODULE_PATH).joinpath("standards.yml")
+    if is_yaml_memoized(stds_fp):
+        return
+
+    # stat before reading the file for the key, so that if the file changes
+    # in between, the memo won't be served for the changed file
+    stds_stat = os.stat(os.path.realpath(stds_fp))
+    cache_key = make_standards_cache_key(stds_fp)
+    stds_dict = config_cache.get(cache_key)
+    if stds_dict is not None:
+        memoize_yaml_dict(stds_fp, stds_dict, stds_stat)
+        return
+
+    stds_dict = extract_yaml_dict(stds_fp, interned=True)
+    # failing to write to the cache shouldn't fail the build
+    try:
+        config_cache.put(cache_key, stds_dict)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Unable to write config cache entry: {e}")
@@ -0,0 +1,228 @@
+import copy
+import hashlib
+import threading
+import weakref
+from typing import Any, Dict, List
+import yaml
+
+FINGERPRINT_TAG = "#"
+_ITEM_SEPARATOR = "\x1f"
+_KEY_SEPARATOR = "\x1e"
+
+# canonical interned containers, keyed by fingerprint; an entry disappears
+# once nothing outside this table refers to its container any more
+_interned_values = weakref.WeakValueDictionary()
+_interned_values_lock = threading.Lock()
+
+
+def _raise_immutable(self, *args, **kwargs):
+    raise TypeError(f"'{type(self).__name__}' object is immutable")
+
+
+class FrozenDict(dict):
+    """Immutable dict holding an interned config definition.
+
+    Instances are made by ``intern_config_value`` and are the single
+    canonical object for their contents (within this process), so equal
+    definitions are stored once and can be compared and cached by their
+    ``fingerprint``. All mutating methods raise TypeError; copy with
+    ``dict(...)`` to get a shallow, mutable copy, or with
+    ``thaw_config_value`` to get a deep, fully mutable one. (``copy.deepcopy``
+    also gives ordinary containers, but its memo keeps every occurrence of
+    an interned container, and so every equal value, as one shared copy.)
+    """
+
+    __slots__ = ("fingerprint", "__weakref__")
+
+    __setitem__ = _raise_immutable
+    __delitem__ = _raise_immutable
+    __ior__ = _raise_immutable
+    clear = _raise_immutable
+    pop = _raise_immutable
+    popitem = _raise_immutable
+    setdefault = _raise_immutable
+    update = _raise_immutable
+
+    def __reduce__(self):
+        # re-intern on unpickling so the canonical object is shared again
+        return intern_config_value, (dict(self),)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> Dict[str, Any]:
+        # callers deep-copy config in order to modify it, so hand back
+        # ordinary containers
+        return {copy.deepcopy(k, memo): copy.deepcopy(v, memo)
+                for k, v in self.items()}
+
+    def __repr__(self) -> str:
+        return f"FrozenDict({dict.__repr__(self)})"
+
+
+class FrozenList(list):
+    """Immutable list holding an interned config value.
+
+    The list counterpart of ``FrozenDict``; compares equal to an ordinary
+    list with the same contents.
+    """
+
+    __slots__ = ("fingerprint", "__weakref__")
+
+    __setitem__ = _raise_immutable
+    __delitem__ = _raise_immutable
+    __iadd__ = _raise_immutable
+    __imul__ = _raise_immutable
+    append = _raise_immutable
+    extend = _raise_immutable
+    insert = _raise_immutable
+    pop = _raise_immutable
+    remove = _raise_immutable
+    clear = _raise_immutable
+    sort = _raise_immutable
+    reverse = _raise_immutable
+
+    def __reduce__(self):
+        return intern_config_value, (list(self),)
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> List[Any]:
+        return [copy.deepcopy(x, memo) for x in self]
+
+    def __repr__(self) -> str:
+        return f"FrozenList({list.__repr__(self)})"
+
+
+_FROZEN_TYPES = (FrozenDict, FrozenList)
+
+
+def intern_config_value(value: Any) -> Any:
+    """Get the canonical, immutable interned version of a config value.
+
+    Dicts and lists (at any depth) are replaced by FrozenDict and FrozenList
+    objects that are shared by all equal values interned in this process;
+    other values are returned unchanged. Two containers are considered
+    equal if they have the same contents in the same order, with values of
+    the same types.
+
+    Parameters
+    ----------
+    value : Any
+        A config value, such as a metadata field definition or a whole
+        metadata fields dictionary.
+
+    Returns
+    -------
+    Any
+        The canonical version of the value. Containers in the result have a
+        ``fingerprint`` attribute: a hex digest identifying their contents.
+    """
+    if isinstance(value, _FROZEN_TYPES):
+        return value
+
+    if isinstance(value, dict):
+        candidate = FrozenDict(
+            (k, _intern_if_container(v)) for k, v in value.items())
+        tokens = [repr(k) + _KEY_SEPARATOR + _get_token(v)
+                  for k, v in candidate.items()]
+    elif isinstance(value, list):
+        candidate = FrozenList(_intern_if_container(x) for x in value)
+        tokens = [_get_token(x) for x in candidate]
+    else:
+        return value
+    # endif value type
+
+    canonical_str = type(candidate).__name__ + _ITEM_SEPARATOR + \
+        _ITEM_SEPARATOR.join(tokens)
+    fingerprint = hashlib.sha256(canonical_str.encode("utf-8")).hexdigest()
+
+    with _interned_values_lock:
+        canonical = _interned_values.get(fingerprint)
+        if canonical is None:
+            candidate.fingerprint = fingerprint
+            _interned_values[fingerprint] = candidate
+            canonical = candidate
+    return canonical
+
+
+def thaw_config_value(value: Any) -> Any:
+    """Get a deep, ordinary (mutable) copy of a possibly interned config value.
+
+    Unlike ``copy.deepcopy``, every dict and list is copied separately each
+    time it occurs, so no two parts of the result share a container, even
+    where the value shared one interned container for equal definitions.
+
+    Parameters
+    ----------
+    value : Any
+        A config value, interned or not.
+
+    Returns
+    -------
+    Any
+        A copy of the value made of plain dicts and lists; other values are
+        returned unchanged.
+    """
+    if isinstance(value, dict):
+        return {k: thaw_config_value(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw_config_value(x) for x in value]
+    return value
+
+
+def get_fingerprint(value: Any) -> str:
+    """Get the fingerprint of a dict or list config value.
+
+    Parameters
+    ----------
+    value : Any
+        A dict or list, interned or not.
+
+    Returns
+    -------
+    str
+        Hex digest identifying the value's contents; equal values (see
+        ``intern_config_value``) have equal fingerprints.
+
+    Raises
+    ------
+    TypeError
+        If value is not a dict or list.
+    """
+    if not isinstance(value, (dict, list)):
+        raise TypeError(f"Cannot fingerprint value of type "
+                        f"'{type(value).__name__}'")
+    return intern_config_value(value).fingerprint
+
+
+def get_num_interned_values() -> int:
+    """Get the number of distinct interned containers currently alive."""
+    with _interned_values_lock:
+        return len(_interned_values)
+
+
+def _intern_if_container(value: Any) -> Any:
+    if isinstance(value, (dict, list)) and \
+            not isinstance(value, _FROZEN_TYPES):
+        return intern_config_value(value)
+    return value
+
+
+def _get_token(interned_value: Any) -> str:
+    # containers are represented by their (already computed) fingerprint.
+    # The repr of the builtin types yaml produces is stable, tells types
+    # apart (e.g. 1, 1.0, True and '1' all differ), and escapes the control
+    # characters used as separators, so the canonical string is unambiguous
+    if isinstance(interned_value, _FROZEN_TYPES):
+        return FINGERPRINT_TAG + interned_value.fingerprint
+    return repr(interned_value)
+
+
+class FrozenConfigDumper(yaml.SafeDumper):
+    """yaml SafeDumper that also writes interned config like ordinary config.
+
+    Pass as the Dumper to ``yaml.dump`` to write config holding FrozenDict
+    or FrozenList values; yaml.SafeDumper itself is left unchanged.
+    """
+
+
+FrozenConfigDumper.add_representer(
+    FrozenDict, FrozenConfigDumper.represent_dict)
+FrozenConfigDumper.add_representer(
+    FrozenList, FrozenConfigDumper.represent_list)
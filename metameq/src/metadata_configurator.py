@@ -1,12 +1,30 @@
+import logging
+import threading
+from collections import OrderedDict
 from typing import Dict, Optional, Any
 from metameq.src.util import METADATA_TRANSFORMERS_KEY, extract_config_dict, extract_stds_config, \
-    deepcopy_dict, \
     METADATA_FIELDS_KEY, STUDY_SPECIFIC_METADATA_KEY, \
     HOST_TYPE_SPECIFIC_METADATA_KEY, \
     SAMPLE_TYPE_SPECIFIC_METADATA_KEY, ALIAS_KEY, BASE_TYPE_KEY, \
     DEFAULT_KEY, ALLOWED_KEY, ANYOF_KEY, TYPE_KEY, \
     SAMPLE_TYPE_KEY, QIITA_SAMPLE_TYPE, GLOBAL_SETTINGS_KEYS, \
     HOST_OVERRIDES_ANCESTOR_SAMPLE_TYPE_KEY
+from metameq.src.config_cache import get_default_config_cache, \
+    make_config_cache_key
+from metameq.src.frozen_config import FrozenDict, intern_config_value, \
+    thaw_config_value
+# imported as a module because flat_config also uses this module
+import metameq.src.flat_config as flat_config
+
+MAX_COMBINED_FIELD_DEFINITIONS = 8192
+
+# Define a logger for this module
+logger = logging.getLogger(__name__)
+
+# memo of _combine_field_definitions results, keyed on the fingerprints of
+# the (interned) base and added definitions; least recently used first
+_combined_field_definitions = OrderedDict()
+_combined_field_definitions_lock = threading.Lock()
 
 
 def combine_stds_and_study_config(
@@ -41,12 +59,15 @@ def combine_stds_and_study_config(
         - METADATA_TRANSFORMERS_KEY: merged transformer definitions (if any)
         - Other top-level keys from both standards and study configs
     """
-    stds_nested_dict = extract_stds_config(stds_fp)
+    # nothing below modifies the standards, so use the shared, interned
+    # version rather than paying for a private copy
+    stds_nested_dict = extract_stds_config(stds_fp, interned=True)
 
     # pull the study-specific host type specific metadata out of the (local copy of)
     # the study config; we need it for combining host types but specifically don't
-    # want it later when merging the remainder of the study config with the standards config
-    study_config_dict_local = deepcopy_dict(study_config_dict)
+    # want it later when merging the remainder of the study config with the standards config.
+    # (A shallow copy is enough since nothing below modifies the nested values.)
+    study_config_dict_local = dict(study_config_dict)
     study_flat_dict = study_config_dict_local.pop(STUDY_SPECIFIC_METADATA_KEY, {})
 
     combined_host_types_dict = _make_combined_stds_and_study_host_type_dicts(
@@ -89,7 +110,7 @@ def _combine_metadata_transformers_dicts(
     stds_transformers_dict = stds_transformers_dict.get(METADATA_TRANSFORMERS_KEY, {})
     study_transformers_dict = study_transformers_dict.get(METADATA_TRANSFORMERS_KEY, {})
 
-    result = deepcopy_dict(stds_transformers_dict)
+    result = dict(stds_transformers_dict)
     for curr_transformer_type, curr_study_transformers_dict in study_transformers_dict.items():
         curr_stds_transformers_dict = stds_transformers_dict.get(curr_transformer_type, {})
         combined_transformers_dict = curr_stds_transformers_dict | curr_study_transformers_dict
@@ -180,6 +201,15 @@ def update_wip_metadata_dict(
         add_metadata_fields_dict: Dict[str, Any]) -> Dict[str, Any]:
     """Update work-in-progress metadata dictionary *in place* with additional metadata dictionary.
 
+    Only the top level of the wip dictionary is modified in place: each
+    updated field gets a new definition dict, built from its existing
+    definition plus the additions, rather than having its existing
+    definition dict modified. This lets callers start from a shallow copy of
+    an inherited metadata fields dict, sharing the definitions of all the
+    fields they don't override. The new definitions are interned (see
+    ``metameq.src.frozen_config.intern_config_value``), so equal definitions
+    are stored only once.
+
     Parameters
     ----------
     wip_metadata_fields_dict : Dict[str, Any]
@@ -193,32 +223,77 @@ def update_wip_metadata_dict(
         (Pointer to) updated work-in-progress metadata fields dictionary.
     """
     for curr_add_metadata_field, curr_add_metadata_field_dict in add_metadata_fields_dict.items():
-        if curr_add_metadata_field not in wip_metadata_fields_dict:
-            wip_metadata_fields_dict[curr_add_metadata_field] = {}
+        wip_metadata_fields_dict[curr_add_metadata_field] = \
+            _combine_field_definitions(
+                wip_metadata_fields_dict.get(curr_add_metadata_field),
+                curr_add_metadata_field_dict)
+    # next metadata field
 
-        if ALLOWED_KEY in curr_add_metadata_field_dict:
-            # remove the ANYOF_KEY from curr_wip_metadata_fields_dict[curr_metadata_field] if it exists there
-            if ANYOF_KEY in wip_metadata_fields_dict[curr_add_metadata_field]:
-                del wip_metadata_fields_dict[curr_add_metadata_field][ANYOF_KEY]
+    return wip_metadata_fields_dict
 
-        if ANYOF_KEY in curr_add_metadata_field_dict:
-            # remove the ALLOWED_KEY from curr_wip_metadata_fields_dict[curr_metadata_field] if it exists there
-            if ALLOWED_KEY in wip_metadata_fields_dict[curr_add_metadata_field]:
-                del wip_metadata_fields_dict[curr_add_metadata_field][ALLOWED_KEY]
 
-            # remove the TYPE_KEY from curr_wip_metadata_fields_dict[curr_metadata_field] if it exists there
-            if TYPE_KEY in wip_metadata_fields_dict[curr_add_metadata_field]:
-                del wip_metadata_fields_dict[curr_add_metadata_field][TYPE_KEY]
+def _combine_field_definitions(
+        base_field_dict: Optional[Dict[str, Any]],
+        add_field_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Combine a field definition with additions to it, as an interned FrozenDict.
 
-        # TODO: Q: is it possible to have a list of allowed with a default
-        #  at high level, then lower down have a list of allowed WITHOUT
-        #  a default?  If so, how do we handle that?
+    Combinations of two interned definitions are memoized by fingerprint,
+    since the same standards definitions are combined again and again for
+    every host, sample type, and build.
 
-        # update curr_wip_metadata_fields_dict[curr_metadata_field] with curr_add_metadata_field_dict
-        wip_metadata_fields_dict[curr_add_metadata_field].update(curr_add_metadata_field_dict)
-    # next metadata field
+    Parameters
+    ----------
+    base_field_dict : Optional[Dict[str, Any]]
+        Existing definition of the field, or None if there is none.
+    add_field_dict : Dict[str, Any]
+        Additions to (or overrides of) the field's definition.
 
-    return wip_metadata_fields_dict
+    Returns
+    -------
+    Dict[str, Any]
+        The combined definition.
+    """
+    memo_key = None
+    if isinstance(add_field_dict, FrozenDict) and \
+            (base_field_dict is None or isinstance(base_field_dict, FrozenDict)):
+        memo_key = (base_field_dict.fingerprint if base_field_dict else None,
+                    add_field_dict.fingerprint)
+        with _combined_field_definitions_lock:
+            combined_field_dict = _combined_field_definitions.get(memo_key)
+            if combined_field_dict is not None:
+                _combined_field_definitions.move_to_end(memo_key)
+                return combined_field_dict
+    # endif both definitions are interned
+
+    # copy-on-write: the existing definition may be shared with other
+    # hosts or sample types, so build a new one instead of modifying it
+    combined_field_dict = dict(base_field_dict or {})
+
+    if ALLOWED_KEY in add_field_dict:
+        # remove the ANYOF_KEY from combined_field_dict if it exists there
+        combined_field_dict.pop(ANYOF_KEY, None)
+
+    if ANYOF_KEY in add_field_dict:
+        # remove the ALLOWED_KEY and TYPE_KEY from combined_field_dict if they exist there
+        combined_field_dict.pop(ALLOWED_KEY, None)
+        combined_field_dict.pop(TYPE_KEY, None)
+
+    # TODO: Q: is it possible to have a list of allowed with a default
+    #  at high level, then lower down have a list of allowed WITHOUT
+    #  a default?  If so, how do we handle that?
+
+    # update combined_field_dict with add_field_dict, then
+    # keep the canonical immutable version of the result
+    combined_field_dict.update(add_field_dict)
+    combined_field_dict = intern_config_value(combined_field_dict)
+
+    if memo_key is not None:
+        with _combined_field_definitions_lock:
+            _combined_field_definitions[memo_key] = combined_field_dict
+            while len(_combined_field_definitions) > \
+                    MAX_COMBINED_FIELD_DEFINITIONS:
+                _combined_field_definitions.popitem(last=False)
+    return combined_field_dict
 
 
 def _make_combined_stds_and_study_host_type_dicts(
@@ -259,10 +334,9 @@ def _make_combined_stds_and_study_host_type_dicts(
 
     parent_stds_host_types_dict = \
         parent_host_stds_nested_dict.get(HOST_TYPE_SPECIFIC_METADATA_KEY, {})
-    # define the output dictionary as a copy of the parent-level standard.
+    # define the output dictionary as a (shallow) copy of the parent-level standard.
     # This will be augmented if there are any hosts at this level.
-    wip_host_types_dict = \
-        deepcopy_dict(parent_stds_host_types_dict)
+    wip_host_types_dict = dict(parent_stds_host_types_dict)
 
     # loop over the host types at this level in parent_stds_nested_dict;
     # these are what we will be copying to add *TO*
@@ -272,9 +346,8 @@ def _make_combined_stds_and_study_host_type_dicts(
         # only need to do work at this level if curr host type is in study dict
         # since otherwise the wip dict is an unchanged copy of the stds dict
         if curr_host_type not in study_host_types_dict:
-            # make a copy of the stds for the current host type to add info to
-            curr_host_type_wip_nested_dict = \
-                deepcopy_dict(curr_host_type_stds_nested_dict)
+            # make a (shallow) copy of the stds for the current host type to add info to
+            curr_host_type_wip_nested_dict = dict(curr_host_type_stds_nested_dict)
         else:
             curr_host_type_wip_nested_dict = \
                 _combine_base_and_added_host_type(
@@ -325,9 +398,9 @@ def _combine_base_and_added_host_type(
     Dict[str, Any]
         Combined host type configuration dictionary.
     """
-    # make a copy of the base for the current host type to add info to
-    host_type_wip_nested_dict = \
-        deepcopy_dict(host_type_base_dict)
+    # make a (shallow) copy of the base for the current host type to add info to;
+    # every key that differs from the base is replaced below rather than modified
+    host_type_wip_nested_dict = dict(host_type_base_dict)
 
     # look for global settings in the add dict for this host; if
     # any exists, add it to the wip dict (ok to overwrite existing)
@@ -385,8 +458,9 @@ def _combine_base_and_added_metadata_fields(
     Dict[str, Any]
         Combined metadata fields dictionary.
     """
-    # copy the metadata fields from the base to make the wip metadata fields
-    host_type_wip_metadata_fields_dict = deepcopy_dict(
+    # copy the metadata fields from the base to make the wip metadata fields;
+    # the field definitions themselves are shared until overridden
+    host_type_wip_metadata_fields_dict = dict(
         host_type_base_dict.get(METADATA_FIELDS_KEY, {}))
 
     # update the wip with the add metadata fields
@@ -427,20 +501,22 @@ def _apply_host_overrides_to_inherited_sample_types(
         Updated sample types dictionary with host fields layered onto
         sample types that have metadata_fields.
     """
-    output_sample_types_dict = deepcopy_dict(wip_sample_types_dict)
+    output_sample_types_dict = dict(wip_sample_types_dict)
 
-    for curr_base_sample_type_dict in output_sample_types_dict.values():
+    for curr_sample_type, curr_base_sample_type_dict in \
+            wip_sample_types_dict.items():
         # skip alias and base_type-only entries; they will inherit
         # host fields when resolved to their targets
         if METADATA_FIELDS_KEY not in curr_base_sample_type_dict:
             continue
 
-        curr_base_sample_type_metadata_fields_dict = \
-            curr_base_sample_type_dict[METADATA_FIELDS_KEY]
-        curr_base_sample_type_dict[METADATA_FIELDS_KEY] = \
+        curr_output_sample_type_dict = dict(curr_base_sample_type_dict)
+        curr_output_sample_type_dict[METADATA_FIELDS_KEY] = \
             update_wip_metadata_dict(
-                curr_base_sample_type_metadata_fields_dict,
+                dict(curr_base_sample_type_dict[METADATA_FIELDS_KEY]),
                 host_metadata_fields_dict)
+        output_sample_types_dict[curr_sample_type] = \
+            curr_output_sample_type_dict
 
     return output_sample_types_dict
 
@@ -469,7 +545,7 @@ def _combine_base_and_added_sample_type_specific_metadata(
         If sample type has both alias and metadata fields, or both alias and base type.
     """
     # copy the dictionary of sample types from the base to make the wip dict
-    curr_host_wip_sample_types_dict = deepcopy_dict(
+    curr_host_wip_sample_types_dict = dict(
         host_type_base_dict.get(
             SAMPLE_TYPE_SPECIFIC_METADATA_KEY, {}))
 
@@ -488,7 +564,7 @@ def _combine_base_and_added_sample_type_specific_metadata(
     for curr_sample_type, curr_sample_type_add_dict \
             in curr_host_add_sample_types_dict.items():
 
-        curr_sample_type_wip_dict = deepcopy_dict(
+        curr_sample_type_wip_dict = dict(
             curr_host_wip_sample_types_dict.get(curr_sample_type, {}))
 
         curr_sample_type_add_def_type = \
@@ -509,7 +585,7 @@ def _combine_base_and_added_sample_type_specific_metadata(
 
             # first, add all non-metadata fields from the add dict to the wip;
             # this captures, e.g., base_type
-            curr_sample_type_add_dict_wo_metadata = deepcopy_dict(
+            curr_sample_type_add_dict_wo_metadata = dict(
                 curr_sample_type_add_dict)
             del curr_sample_type_add_dict_wo_metadata[METADATA_FIELDS_KEY]
             curr_sample_type_wip_dict.update(
@@ -518,7 +594,7 @@ def _combine_base_and_added_sample_type_specific_metadata(
             curr_sample_type_add_metadata_fields_dict = \
                 curr_sample_type_add_dict[METADATA_FIELDS_KEY]
             curr_sample_type_wip_metadata_fields_dict = \
-                curr_sample_type_wip_dict[METADATA_FIELDS_KEY]
+                dict(curr_sample_type_wip_dict[METADATA_FIELDS_KEY])
             curr_sample_type_wip_metadata_fields_dict = (
                 update_wip_metadata_dict(
                     curr_sample_type_wip_metadata_fields_dict,
@@ -610,7 +686,10 @@ def _construct_sample_type_metadata_fields_dict(
     Returns
     -------
     Dict[str, Any]
-        The constructed metadata fields dictionary for this host-and-sample-type combination.
+        The constructed metadata fields dictionary for this host-and-sample-type combination,
+        as an immutable, interned FrozenDict (see
+        ``metameq.src.frozen_config.intern_config_value``) that is shared
+        with any other combination that resolves to the same fields.
 
     Raises
     ------
@@ -662,16 +741,16 @@ def _construct_sample_type_metadata_fields_dict(
 
         # add this sample type's info on top of the base type's info
         sample_type_specific_dict_metadata = update_wip_metadata_dict(
-            deepcopy_dict(base_sample_dict[METADATA_FIELDS_KEY]),
+            dict(base_sample_dict[METADATA_FIELDS_KEY]),
             sample_type_specific_dict.get(METADATA_FIELDS_KEY, {}))
-        sample_type_specific_dict = deepcopy_dict(sample_type_specific_dict)
+        sample_type_specific_dict = dict(sample_type_specific_dict)
         sample_type_specific_dict[METADATA_FIELDS_KEY] = \
             sample_type_specific_dict_metadata
     # endif sample type has a base type
 
     # add the sample-type-specific info generated above on top of the host info
     sample_type_metadata_dict = update_wip_metadata_dict(
-        deepcopy_dict(a_host_type_metadata_fields_dict),
+        dict(a_host_type_metadata_fields_dict),
         sample_type_specific_dict.get(METADATA_FIELDS_KEY, {}))
 
     # set sample_type, and qiita_sample_type if it is not already set
@@ -687,7 +766,9 @@ def _construct_sample_type_metadata_fields_dict(
             sample_type_metadata_dict, {QIITA_SAMPLE_TYPE: sample_type_definition})
     # end if qiita_sample_type not already set
 
-    return sample_type_metadata_dict
+    # hash-cons the result so that equal field definitions, and equal whole
+    # schemas (e.g. an alias and its target), are stored only once
+    return intern_config_value(sample_type_metadata_dict)
 
 
 def _resolve_sample_type_aliases_and_bases(
@@ -768,6 +849,17 @@ def build_full_flat_config_dict(
         - HOST_TYPE_SPECIFIC_METADATA_KEY: flattened and merged host type configs
         - METADATA_TRANSFORMERS_KEY: merged transformer definitions (if any)
         - Other top-level configuration keys (default, leave_requireds_blank, etc.)
+        It is made of ordinary (mutable) dicts and lists, none of which
+        appears in more than one place, so modifying any part of it leaves
+        every other part unchanged.
+
+    Notes
+    -----
+    If the on-disk config cache is enabled (see
+    ``metameq.src.config_cache.get_default_config_cache``), a previously built
+    result for the same standards file contents, config dicts,
+    exclude_internals setting and metameq version is returned from the cache
+    instead of being rebuilt.
     """
     if software_config_dict is None:
         software_config_dict = extract_config_dict(None)
@@ -775,10 +867,69 @@ def build_full_flat_config_dict(
     if study_specific_config_dict is None:
         study_specific_config_dict = {}
 
+    config_cache = get_default_config_cache()
+    cache_key = None
+    if config_cache is not None:
+        cache_key = make_config_cache_key(
+            study_specific_config_dict, software_config_dict, stds_fp,
+            exclude_internals)
+        cached_config_dict = config_cache.get(cache_key)
+        if cached_config_dict is not None:
+            return cached_config_dict
+    # endif the config cache is enabled
+
+    # resolve every host type of the lazy build, which reuses the host types
+    # the study doesn't change from the shared standards base
+    full_flat_config_dict = flat_config.build_lazy_flat_config_dict(
+        study_specific_config_dict, software_config_dict, stds_fp,
+        exclude_internals)
+    full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY] = \
+        full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY].to_dict()
+    # hand back ordinary, mutable containers rather than the interned
+    # (immutable) ones the build shares, with no container shared between
+    # two places, so that modifying one field never changes another
+    full_flat_config_dict = thaw_config_value(full_flat_config_dict)
+
+    if config_cache is not None:
+        # failing to write to the cache shouldn't fail the build
+        try:
+            config_cache.put(cache_key, full_flat_config_dict)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unable to write config cache entry: {e}")
+
+    return full_flat_config_dict
+
+
+def build_full_nested_config_dict(
+        study_specific_config_dict: Dict[str, Any],
+        software_config_dict: Dict[str, Any],
+        stds_fp: Optional[str] = None) -> Dict[str, Any]:
+    """Build the combined, still-nested configuration dictionary.
+
+    This is the shared first stage of ``build_full_flat_config_dict`` and of
+    the lazy ``metameq.src.flat_config.build_lazy_flat_config_dict``: it
+    merges the software, study-specific, and standards configs and pushes the
+    global settings into the top host, but does not flatten any host types.
+
+    Parameters
+    ----------
+    study_specific_config_dict : Dict[str, Any]
+        Study-specific configuration dictionary.
+    software_config_dict : Dict[str, Any]
+        Software configuration dictionary with default settings.
+    stds_fp : Optional[str], default=None
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The merged top-level settings, with the combined nested host type
+        hierarchy under HOST_TYPE_SPECIFIC_METADATA_KEY.
+    """
     # overwrite default settings in software config with study-specific ones (if any)
-    software_plus_study_flat_config_dict = deepcopy_dict(study_specific_config_dict)
     software_plus_study_flat_config_dict = \
-        software_config_dict | software_plus_study_flat_config_dict
+        software_config_dict | study_specific_config_dict
 
     # extract the host_overrides_ancestor_sample_type setting from the
     # merged config (software defaults + study overrides)
@@ -793,38 +944,7 @@ def build_full_flat_config_dict(
         software_plus_study_flat_config_dict, stds_fp,
         host_overrides_ancestor_sample_type)
 
-    full_nested_hosts_dict = _push_global_settings_into_top_host(
-            full_nested_hosts_dict)
-
-    full_flat_hosts_dict = flatten_nested_stds_dict(
-        full_nested_hosts_dict, None)
-    full_flat_config_dict = deepcopy_dict(full_nested_hosts_dict)
-    full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY] = full_flat_hosts_dict
-
-    if exclude_internals:
-        # identify all host types whose names begin with an underscore
-        internal_host_types = [
-            host_type for host_type in
-            full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY]
-            if host_type.startswith("_")]
-        # now del all those hosts out of the full flat config dict
-        for host_type in internal_host_types:
-            del full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY][host_type]
-
-        # for each, identify and del any sample types whose names begin with an underscore
-        for host_type, host_type_dict in \
-                full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY].items():
-            if SAMPLE_TYPE_SPECIFIC_METADATA_KEY in host_type_dict:
-                internal_sample_types = [
-                    sample_type for sample_type in
-                    host_type_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY].keys()
-                    if sample_type.startswith("_")]
-                for sample_type in internal_sample_types:
-                    del full_flat_config_dict[
-                        HOST_TYPE_SPECIFIC_METADATA_KEY][host_type][
-                            SAMPLE_TYPE_SPECIFIC_METADATA_KEY][sample_type]
-
-    return full_flat_config_dict
+    return _push_global_settings_into_top_host(full_nested_hosts_dict)
 
 
 def _push_global_settings_into_top_host(
@@ -851,7 +971,10 @@ def _push_global_settings_into_top_host(
     ValueError
         If there is not exactly one top-level host in the nested hosts dictionary.
     """
-    result = deepcopy_dict(a_config_dict)
+    # copy only the path down to the top-level host, since that is all that changes
+    result = dict(a_config_dict)
+    result[HOST_TYPE_SPECIFIC_METADATA_KEY] = \
+        dict(result[HOST_TYPE_SPECIFIC_METADATA_KEY])
 
     # get the top level host(s) in the dict
     # (should be only one because it is nested)
@@ -860,11 +983,14 @@ def _push_global_settings_into_top_host(
         raise ValueError(f"Expected exactly one top-level key in "
                          f"full_nested_hosts_dict but found: {top_level_host_keys}")
     top_level_host_key = top_level_host_keys[0]
+    top_level_host_dict = \
+        dict(result[HOST_TYPE_SPECIFIC_METADATA_KEY][top_level_host_key])
+    result[HOST_TYPE_SPECIFIC_METADATA_KEY][top_level_host_key] = \
+        top_level_host_dict
 
     # check for each top-level setting and copy it under the top level host key
     for curr_setting_key in GLOBAL_SETTINGS_KEYS:
         if curr_setting_key in result:
-            result[HOST_TYPE_SPECIFIC_METADATA_KEY][top_level_host_key][curr_setting_key] = \
-                result[curr_setting_key]
+            top_level_host_dict[curr_setting_key] = result[curr_setting_key]
 
     return result
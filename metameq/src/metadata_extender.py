@@ -2,25 +2,40 @@ import logging
 import numpy as np
 import os
 import pandas
+import types
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple, Any
+from typing import List, Dict, Optional, Set, Tuple, Any, Callable
+from metameq._version import get_versions
 from metameq.src.util import extract_config_dict, \
     validate_required_columns_exist, get_extension, \
     load_df_with_best_fit_encoding, update_metadata_df_field, \
+    BEST_FIT_ENCODINGS, \
     HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY, \
     QC_NOTE_KEY, METADATA_FIELDS_KEY, HOST_TYPE_SPECIFIC_METADATA_KEY, \
     SAMPLE_TYPE_SPECIFIC_METADATA_KEY, \
-    DEFAULT_KEY, REQUIRED_KEY, \
+    DEFAULT_KEY, \
     LEAVE_BLANK_VAL, SAMPLE_NAME_KEY, \
     LEAVE_REQUIREDS_BLANK_KEY, OVERWRITE_NON_NANS_KEY, \
     METADATA_TRANSFORMERS_KEY, PRE_TRANSFORMERS_KEY, POST_TRANSFORMERS_KEY, \
-    SOURCES_KEY, FUNCTION_KEY, REQUIRED_RAW_METADATA_FIELDS, \
-    HOSTTYPE_COL_OPTIONS_KEY, SAMPLETYPE_COL_OPTIONS_KEY
-from metameq.src.metadata_configurator import build_full_flat_config_dict
+    FUNCTION_KEY, SOURCES_KEY, REQUIRED_RAW_METADATA_FIELDS, \
+    HOSTTYPE_COL_OPTIONS_KEY, SAMPLETYPE_COL_OPTIONS_KEY, \
+    GROUP_BROADCAST_EXTENSION_KEY, PASSTHROUGH_UNTOUCHED_COLS_KEY, \
+    COMPACT_DEFAULT_COLS_KEY
+from metameq.src.flat_config import build_lazy_flat_config_dict
+from metameq.src.compiled_schema import compile_metadata_fields, \
+    OutputColsIndex
+from metameq.src.config_artifact import is_config_artifact, \
+    load_config_artifact
+from metameq.src.frozen_config import get_fingerprint
+from metameq.src.transformer_plan import TransformerPlan, \
+    build_transformer_plan
 from metameq.src.metadata_validator import validate_metadata_df, \
     format_validation_msgs_as_df, output_validation_msgs
 import metameq.src.metadata_transformers as transformers
+# imported as a module because study_context also uses this module
+import metameq.src.study_context as study_context
 
 
 # columns added to the metadata that are not actually part of it
@@ -28,10 +43,31 @@ INTERNAL_COL_KEYS = [HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY,
                      QC_NOTE_KEY]
 
 REQ_PLACEHOLDER = "_METAMEQ_REQUIRED"
+# temporary column holding each row's position in the input metadata, used to
+# re-attach passthrough columns (see PASSTHROUGH_UNTOUCHED_COLS_KEY)
+_ROW_POSITION_KEY = "___metameq___row_position"
+_PASSTHROUGH_COLS_PER_SLICE = 64
+# temporary column holding each row's position in the input metadata file,
+# used to restore input order when extending metadata in chunks
+_INPUT_ROW_KEY = "___metameq___input_row"
+# host+sample type groups smaller than this are sent to worker processes
+# together (see n_jobs), so that pickling them doesn't outweigh the work;
+# larger ones are split into blocks of rows, but none smaller than this
+_MIN_ROWS_PER_PARALLEL_BATCH = 500
+
+# columns of the manifest of an incremental extension (see
+# extend_metadata_df_incrementally)
+ROW_HASH_KEY = "row_hash"
+SCHEMA_FINGERPRINT_KEY = "schema_fingerprint"
+REUSED_KEY = "reused"
 
 # Define a logger for this module
 logger = logging.getLogger(__name__)
 
+# arguments sent to each worker process once, when it starts, rather than
+# with every task (see _map_in_batches)
+_worker_shared_args = ()
+
 pandas.set_option("future.no_silent_downcasting", True)
 
 # TODO: find a way to inform user that they *are not allowed* to have a 'sample_id' column
@@ -70,33 +106,33 @@ def get_reserved_cols(
     ValueError
         If required columns are missing from the metadata.
     """
-    validate_required_columns_exist(
-        raw_metadata_df, [HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY],
-        "metadata missing required columns")
-
-    # Essentially, mock a minimal metadata valid metadata dataframe and then
-    # use extend_metadata_df to add all the required columns to it (either empty
-    # or with default values but we don't care about the actual values), then
-    # return the list of column names from that extended df.
+    return study_context.get_shared_study_context(
+        study_specific_config_dict, stds_fp).get_reserved_cols(raw_metadata_df)
 
-    # get unique HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY combinations
-    temp_df = raw_metadata_df[
-        [HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY]].copy()
-    temp_df.drop_duplicates(inplace=True)
 
-    # add a bogus SAMPLE_NAME_KEY column to the df that just holds sequential integers
-    temp_df[SAMPLE_NAME_KEY] = range(1, len(temp_df) + 1)
-
-    temp_df = _catch_nan_required_fields(temp_df)
+def _get_output_cols_index(
+        study_specific_config_dict: Optional[Dict[str, Any]],
+        stds_fp: Optional[str]) -> OutputColsIndex:
+    """Get the output column index for a study config and standards, reusing it if possible.
 
-    # extend the metadata_df to get all the required columns for all host+sample type combinations;
-    # we don't really care about the contents of these columns, just their names.
-    # (Likewise, it is not necessary to pass the actual study_specific_transformers_dict so
-    # just use None)
-    metadata_df, _ = extend_metadata_df(
-        temp_df, study_specific_config_dict, None, None, stds_fp)
+    Parameters
+    ----------
+    study_specific_config_dict : Optional[Dict[str, Any]]
+        Study-specific flat-host-type config dictionary.
+    stds_fp : Optional[str]
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
 
-    return sorted(metadata_df.columns.to_list())
+    Returns
+    -------
+    OutputColsIndex
+        Index of the columns the extender outputs for each host+sample type
+        under the full flat config built from the default software config,
+        the study config and the standards. May be shared with other
+        callers, so must not be modified.
+    """
+    return study_context.get_shared_study_context(
+        study_specific_config_dict, stds_fp).output_cols_index
 
 
 def get_default_column_name(
@@ -192,22 +228,9 @@ def find_standard_cols(
     ValueError
         If required columns are missing from the metadata.
     """
-    err_msg = "metadata missing required columns"
-    required_cols = REQUIRED_RAW_METADATA_FIELDS.copy()
-    if suppress_missing_name_err:
-        # remove the sample name from the required columns list
-        required_cols.remove(SAMPLE_NAME_KEY)
-    # endif
-    validate_required_columns_exist(a_df, required_cols, err_msg)
-
-    # get the intersection of the reserved standard columns and
-    # the columns in the input dataframe
-    standard_cols = get_reserved_cols(
-        a_df, study_specific_config_dict, stds_fp)
-
-    standard_cols_set = (set(standard_cols) - set(INTERNAL_COL_KEYS))
-
-    return list(standard_cols_set & set(a_df.columns))
+    return study_context.get_shared_study_context(
+        study_specific_config_dict, stds_fp).find_standard_cols(
+            a_df, suppress_missing_name_err)
 
 
 def find_nonstandard_cols(
@@ -237,14 +260,8 @@ def find_nonstandard_cols(
     ValueError
         If required columns are missing from the metadata.
     """
-    validate_required_columns_exist(a_df, REQUIRED_RAW_METADATA_FIELDS,
-                                    "metadata missing required columns")
-
-    # get the columns in
-    standard_cols = get_reserved_cols(
-        a_df, study_specific_config_dict, stds_fp)
-
-    return list(set(a_df.columns) - set(standard_cols))
+    return study_context.get_shared_study_context(
+        study_specific_config_dict, stds_fp).find_nonstandard_cols(a_df)
 
 
 def extend_metadata_df(
@@ -254,7 +271,9 @@ def extend_metadata_df(
         software_config_dict: Optional[Dict[str, Any]] = None,
         stds_fp: Optional[str] = None,
         hosttype_col_name: Optional[str] = None,
-        sampletype_col_name: Optional[str] = None
+        sampletype_col_name: Optional[str] = None,
+        full_flat_config_dict: Optional[Dict[str, Any]] = None,
+        n_jobs: Optional[int] = None
 ) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
     """Extend a metadata DataFrame based on metadata standards and study-specific configurations.
 
@@ -284,6 +303,19 @@ def extend_metadata_df(
         ``sampletype_shorthand`` column before processing. If None, the
         function checks the config's ``sampletype_col_options`` list for
         a matching column in the DataFrame.
+    full_flat_config_dict : Optional[Dict[str, Any]], default=None
+        An already-built full flat config dictionary, such as one loaded
+        from a config artifact (see ``metameq.src.config_artifact``). If
+        provided, it is used as is, and study_specific_config_dict,
+        software_config_dict and stds_fp are ignored.
+    n_jobs : Optional[int], default=None
+        Number of worker processes in which to transform the metadata and
+        to generate and validate the metadata of the different host+sample
+        type combinations. Combinations with few samples are sent to
+        workers together, and those with many are split into blocks of
+        rows. None or 1 does all the work in this process; -1 uses one
+        worker per CPU. With more than one worker, any functions in
+        study_specific_transformers_dict must be module-level (picklable).
 
     Returns
     -------
@@ -296,18 +328,15 @@ def extend_metadata_df(
     ------
     ValueError
         If required columns are missing from the metadata, if a specified
-        column name is not found in the DataFrame, or if both the internal
-        shorthand column and the specified alternate column exist.
+        column name is not found in the DataFrame, if both the internal
+        shorthand column and the specified alternate column exist, or if
+        n_jobs is not valid.
     """
-    full_flat_config_dict = build_full_flat_config_dict(
-        study_specific_config_dict, software_config_dict, stds_fp)
-
-    metadata_df, validation_msgs_df, _ = _extend_metadata_from_full_flat_config(
-        raw_metadata_df, full_flat_config_dict,
-        study_specific_transformers_dict,
-        hosttype_col_name, sampletype_col_name)
-
-    return metadata_df, validation_msgs_df
+    a_study_context = study_context.StudyContext(
+        study_specific_config_dict, study_specific_transformers_dict,
+        software_config_dict, stds_fp, full_flat_config_dict)
+    return a_study_context.extend_metadata_df(
+        raw_metadata_df, hosttype_col_name, sampletype_col_name, n_jobs)
 
 
 def extend_metadata_df_from_yamls(
@@ -321,7 +350,9 @@ def extend_metadata_df_from_yamls(
     raw_metadata_df : pandas.DataFrame
         The raw metadata DataFrame to extend.
     study_specific_config_fp : Optional[str]
-        Path to the study-specific configuration YAML file.
+        Path to the study-specific configuration YAML file, or to a config
+        artifact holding an already-built full flat config (in which case
+        stds_fp is ignored).
     stds_fp : Optional[str], default=None
         Path to standards dictionary file. If None, the default standards
         config pulled from the standards.yml file will be used.
@@ -333,18 +364,109 @@ def extend_metadata_df_from_yamls(
             - The extended metadata DataFrame
             - A DataFrame containing validation messages
     """
-    # get the study-specific flat-host-type config dictionary from the input yaml file
-    study_specific_config_dict = \
-        _get_study_specific_config(study_specific_config_fp)
+    # get the study-specific flat-host-type config dictionary from the input
+    # yaml file, or the already-built full config from the input artifact
+    study_specific_config_dict, full_flat_config_dict = \
+        _get_study_specific_or_full_config(study_specific_config_fp)
 
     # extend the metadata DataFrame using the study-specific flat-host-type config dictionary
     metadata_df, validation_msgs_df = \
         extend_metadata_df(raw_metadata_df, study_specific_config_dict,
-                           None, None, stds_fp)
+                           None, None, stds_fp,
+                           full_flat_config_dict=full_flat_config_dict)
 
     return metadata_df, validation_msgs_df
 
 
+def extend_metadata_df_incrementally(
+        raw_metadata_df: pandas.DataFrame,
+        study_specific_config_dict: Optional[Dict[str, Any]],
+        previous_metadata_df: Optional[pandas.DataFrame] = None,
+        previous_validation_msgs_df: Optional[pandas.DataFrame] = None,
+        previous_manifest_df: Optional[pandas.DataFrame] = None,
+        study_specific_transformers_dict: Optional[Dict[str, Any]] = None,
+        software_config_dict: Optional[Dict[str, Any]] = None,
+        stds_fp: Optional[str] = None,
+        hosttype_col_name: Optional[str] = None,
+        sampletype_col_name: Optional[str] = None,
+        full_flat_config_dict: Optional[Dict[str, Any]] = None,
+        n_jobs: Optional[int] = None
+) -> Tuple[pandas.DataFrame, pandas.DataFrame, pandas.DataFrame]:
+    """Extend a metadata DataFrame, reusing the unchanged rows of a previous extension.
+
+    Only the rows whose contents, or whose host+sample type's config, have
+    changed since the previous extension are transformed, populated and
+    validated again; the rest are taken as they were from the previous
+    results. The output is what extend_metadata_df would give for the whole
+    of raw_metadata_df. A manifest of the extension, with the hash of each
+    row's contents and the fingerprint of everything else its extension
+    depends on, is returned to pass in (with the other results) next time.
+
+    Custom transformers are identified by their code and default argument
+    values, so editing one extends every row again; editing only a function
+    that a transformer calls is not noticed.
+
+    Parameters
+    ----------
+    raw_metadata_df : pandas.DataFrame
+        The raw metadata DataFrame to extend.
+    study_specific_config_dict : Optional[Dict[str, Any]]
+        Study-specific flat-host-type config dictionary.
+    previous_metadata_df : Optional[pandas.DataFrame], default=None
+        The extended metadata DataFrame returned by the previous extension,
+        or None to extend every row.
+    previous_validation_msgs_df : Optional[pandas.DataFrame], default=None
+        The validation messages DataFrame returned by the previous extension,
+        or None to extend every row.
+    previous_manifest_df : Optional[pandas.DataFrame], default=None
+        The manifest returned by the previous extension, or None to extend
+        every row.
+    study_specific_transformers_dict : Optional[Dict[str, Any]], default=None
+        Dictionary of custom transformers for this study (only).
+    software_config_dict : Optional[Dict[str, Any]], default=None
+        Software configuration dictionary. If None, the default software
+        config pulled from the config.yml file will be used.
+    stds_fp : Optional[str], default=None
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
+    hosttype_col_name : Optional[str], default=None
+        Name of the column in raw_metadata_df that contains host type
+        values (see extend_metadata_df).
+    sampletype_col_name : Optional[str], default=None
+        Name of the column in raw_metadata_df that contains sample type
+        values (see extend_metadata_df).
+    full_flat_config_dict : Optional[Dict[str, Any]], default=None
+        An already-built full flat config dictionary (see
+        extend_metadata_df).
+    n_jobs : Optional[int], default=None
+        Number of worker processes to extend the changed rows in (see
+        extend_metadata_df).
+
+    Returns
+    -------
+    Tuple[pandas.DataFrame, pandas.DataFrame, pandas.DataFrame]
+        A tuple containing:
+            - The extended metadata DataFrame
+            - A DataFrame containing validation messages
+            - The manifest of this extension, with a row for each row of the
+              extended metadata
+
+    Raises
+    ------
+    ValueError
+        If the config's pre-transformers set the host or sample type
+        shorthand columns, if only some of the previous results are given or
+        they do not match each other, or for any of the reasons
+        extend_metadata_df does.
+    """
+    a_study_context = study_context.StudyContext(
+        study_specific_config_dict, study_specific_transformers_dict,
+        software_config_dict, stds_fp, full_flat_config_dict)
+    return a_study_context.extend_metadata_df_incrementally(
+        raw_metadata_df, previous_metadata_df, previous_validation_msgs_df,
+        previous_manifest_df, hosttype_col_name, sampletype_col_name, n_jobs)
+
+
 def get_qc_failures(a_df: pandas.DataFrame) -> pandas.DataFrame:
     """Get rows from the extended metadata DataFrame that have QC failures.
 
@@ -364,6 +486,31 @@ def get_qc_failures(a_df: pandas.DataFrame) -> pandas.DataFrame:
     return qc_fails_df
 
 
+def expand_compact_cols(a_df: pandas.DataFrame) -> pandas.DataFrame:
+    """Expand any compact (categorical) columns into ordinary columns.
+
+    When the config's ``compact_default_columns`` setting is True, the
+    columns that extension adds from the config hold one value per host+
+    sample type and are kept as categoricals, which take a fraction of the
+    memory and are written out exactly as ordinary columns would be. This
+    turns them back into columns of their values, for code that needs those.
+
+    Parameters
+    ----------
+    a_df : pandas.DataFrame
+        The (extended) metadata DataFrame.
+
+    Returns
+    -------
+    pandas.DataFrame
+        A copy of a_df in which no column is categorical.
+    """
+    expanded_dtypes = {
+        x: a_df[x].cat.categories.dtype for x in a_df.columns
+        if isinstance(a_df[x].dtype, pandas.CategoricalDtype)}
+    return a_df.astype(expanded_dtypes)
+
+
 # Map QC note strings to the internal column key they relate to
 _QC_NOTE_TO_INTERNAL_KEY = {
     "invalid host_type": HOSTTYPE_SHORTHAND_KEY,
@@ -427,7 +574,10 @@ def write_extended_metadata_from_df(
         remove_internals: bool = True,
         suppress_empty_fails: bool = False,
         internal_col_names: Optional[List[str]] = None,
-        stds_fp: Optional[str] = None) -> pandas.DataFrame:
+        stds_fp: Optional[str] = None,
+        full_flat_config_dict: Optional[Dict[str, Any]] = None,
+        n_jobs: Optional[int] = None
+) -> pandas.DataFrame:
     """Write extended metadata to files starting from a metadata DataFrame and config dictionary.
 
     Parameters
@@ -453,26 +603,27 @@ def write_extended_metadata_from_df(
     stds_fp : Optional[str], default=None
         Path to standards dictionary file. If None, the default standards
         config pulled from the standards.yml file will be used.
+    full_flat_config_dict : Optional[Dict[str, Any]], default=None
+        An already-built full flat config dictionary (see
+        ``extend_metadata_df``). If provided, study_specific_config_dict and
+        stds_fp are ignored.
+    n_jobs : Optional[int], default=None
+        Number of worker processes to extend the metadata in (see
+        ``extend_metadata_df``).
 
     Returns
     -------
     pandas.DataFrame
         The extended metadata DataFrame.
     """
-    # extend the metadata DataFrame using the study-specific flat-host-type config dictionary
-    metadata_df, validation_msgs_df = extend_metadata_df(
-        raw_metadata_df, study_specific_config_dict,
-        study_specific_transformers_dict, None, stds_fp)
-
-    # write the metadata and validation results to files
-    write_metadata_results(
-        metadata_df, validation_msgs_df, out_dir, out_name_base,
-        sep=sep, remove_internals=remove_internals,
+    a_study_context = study_context.StudyContext(
+        study_specific_config_dict, study_specific_transformers_dict,
+        stds_fp=stds_fp, full_flat_config_dict=full_flat_config_dict)
+    return a_study_context.write_extended_metadata_from_df(
+        raw_metadata_df, out_dir, out_name_base, sep=sep,
+        remove_internals=remove_internals,
         suppress_empty_fails=suppress_empty_fails,
-        internal_col_names=internal_col_names)
-
-    # for good measure, return the extended metadata DataFrame
-    return metadata_df
+        internal_col_names=internal_col_names, n_jobs=n_jobs)
 
 
 def write_extended_metadata(
@@ -483,15 +634,29 @@ def write_extended_metadata(
         sep: str = "\t",
         remove_internals: bool = True,
         suppress_empty_fails: bool = False,
-        stds_fp: Optional[str] = None) -> pandas.DataFrame:
+        stds_fp: Optional[str] = None,
+        chunk_size: Optional[int] = None,
+        preserve_input_order: bool = False,
+        n_jobs: Optional[int] = None) -> Optional[pandas.DataFrame]:
     """Write extended metadata to files starting from input file paths to metadata and config.
 
+    If chunk_size is given, the metadata file is read, extended, validated
+    and written a chunk of rows at a time, against a config built once, so
+    that memory use is bounded by the chunk size rather than the file size.
+    The files written are the same as those written without chunking except
+    for the order of their rows: rows are grouped by host+sample type within
+    each chunk rather than across the whole file (or kept in input order, if
+    preserve_input_order is True), and validation messages are sorted within
+    each chunk.
+
     Parameters
     ----------
     raw_metadata_fp : str
         Path to the raw metadata file (.csv, .tsv, .txt, or .xlsx).
     study_specific_config_fp : str
-        Path to the study-specific configuration YAML file.
+        Path to the study-specific configuration YAML file, or to a config
+        artifact holding an already-built full flat config (in which case
+        stds_fp is ignored).
     out_dir : str
         Directory where output files will be written.
     out_name_base : str
@@ -505,22 +670,46 @@ def write_extended_metadata(
     stds_fp : Optional[str], default=None
         Path to standards dictionary file. If None, the default standards
         config pulled from the standards.yml file will be used.
+    chunk_size : Optional[int], default=None
+        Number of rows of the metadata file to extend at a time. If None,
+        the whole file is extended at once. Only .csv, .tsv and .txt files
+        can be extended in chunks.
+    preserve_input_order : bool, default=False
+        Whether to write the rows in the order they have in the metadata
+        file. Only used if chunk_size is given.
+    n_jobs : Optional[int], default=None
+        Number of worker processes to extend the metadata (or each chunk of
+        it) in (see ``extend_metadata_df``).
 
     Returns
     -------
-    pandas.DataFrame
-        The extended metadata DataFrame.
+    Optional[pandas.DataFrame]
+        The extended metadata DataFrame, or None if chunk_size is given
+        (since the whole extended metadata is then never held in memory).
 
     Raises
     ------
     ValueError
-        If the input file extension is not recognized.
+        If the input file extension is not recognized, or is not one that
+        can be extended in chunks when chunk_size is given.
     """
-    raw_metadata_df = _load_metadata_df(raw_metadata_fp)
+    # get the study-specific flat-host-type config dictionary from the input
+    # yaml file, or the already-built full config from the input artifact
+    study_specific_config_dict, full_flat_config_dict = \
+        _get_study_specific_or_full_config(study_specific_config_fp)
+
+    if chunk_size is not None:
+        if full_flat_config_dict is None:
+            full_flat_config_dict = build_lazy_flat_config_dict(
+                study_specific_config_dict, None, stds_fp)
+        _write_extended_metadata_in_chunks(
+            raw_metadata_fp, full_flat_config_dict, out_dir, out_name_base,
+            chunk_size, sep=sep, remove_internals=remove_internals,
+            suppress_empty_fails=suppress_empty_fails,
+            preserve_input_order=preserve_input_order, n_jobs=n_jobs)
+        return None
 
-    # get the study-specific flat-host-type config dictionary from the input yaml file
-    study_specific_config_dict = \
-        _get_study_specific_config(study_specific_config_fp)
+    raw_metadata_df = _load_metadata_df(raw_metadata_fp)
 
     # write the extended metadata to files
     extended_df = write_extended_metadata_from_df(
@@ -528,12 +717,226 @@ def write_extended_metadata(
         out_dir, out_name_base, sep=sep,
         remove_internals=remove_internals,
         suppress_empty_fails=suppress_empty_fails,
-        stds_fp=stds_fp)
+        stds_fp=stds_fp, full_flat_config_dict=full_flat_config_dict,
+        n_jobs=n_jobs)
 
     # for good measure, return the extended metadata DataFrame
     return extended_df
 
 
+def _write_extended_metadata_in_chunks(
+        raw_metadata_fp: str,
+        full_flat_config_dict: Dict[str, Any],
+        out_dir: str,
+        out_name_base: str,
+        chunk_size: int,
+        sep: str = "\t",
+        remove_internals: bool = True,
+        suppress_empty_fails: bool = False,
+        preserve_input_order: bool = False,
+        n_jobs: Optional[int] = None) -> None:
+    """Extend a metadata file a chunk of rows at a time, appending each chunk to the output files.
+
+    Parameters
+    ----------
+    raw_metadata_fp : str
+        Path to the raw metadata file (.csv, .tsv, or .txt).
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+    out_dir : str
+        Directory where output files will be written.
+    out_name_base : str
+        Base name for output files.
+    chunk_size : int
+        Number of rows of the metadata file to extend at a time.
+    sep : str, default="\t"
+        Separator to use in output files.
+    remove_internals : bool, default=True
+        Whether to remove internal columns (and write QC failures to a
+        separate file).
+    suppress_empty_fails : bool, default=False
+        Whether to suppress empty failure files.
+    preserve_input_order : bool, default=False
+        Whether to write the rows in the order they have in the metadata
+        file, rather than grouped by host+sample type within each chunk.
+    n_jobs : Optional[int], default=None
+        Number of worker processes to extend each chunk in (see
+        ``extend_metadata_df``).
+
+    Raises
+    ------
+    ValueError
+        If chunk_size is not positive, if the input file extension is not
+        one that can be extended in chunks, or if the config's
+        pre-transformers set the host or sample type shorthand columns.
+    """
+    if chunk_size < 1:
+        raise ValueError(f"chunk_size must be positive, not {chunk_size}")
+
+    extension = os.path.splitext(raw_metadata_fp)[1]
+    if extension == ".csv":
+        in_sep = ","
+    elif extension in (".txt", ".tsv"):
+        in_sep = "\t"
+    else:
+        raise ValueError("Unrecognized input file extension for extending "
+                         "in chunks; must be .csv, .tsv, or .txt")
+
+    # Chunks may not hold samples of every host+sample type in the file, so
+    # find the ones that are, to learn every column generation adds for the
+    # whole file; each chunk gets all of these, so that every chunk has the
+    # same columns (and values) it would have had if extended with the rest.
+    for target_field in _get_pre_transformer_targets(full_flat_config_dict):
+        if target_field in (HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY):
+            raise ValueError(
+                f"Metadata cannot be extended in chunks when a "
+                f"pre-transformer sets '{target_field}'")
+    encoding, host_sample_pairs = _scan_metadata_file(
+        raw_metadata_fp, in_sep, chunk_size, full_flat_config_dict)
+    output_cols_index = OutputColsIndex(
+        full_flat_config_dict, host_sample_pairs)
+    generated_col_names = set()
+    for curr_pair in host_sample_pairs:
+        generated_col_names.update(
+            output_cols_index.output_cols_by_pair.get(curr_pair, ()))
+
+    # all output files share one timestamp, since they are written over time
+    timestamp_str = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    out_fp = os.path.join(
+        out_dir, f"{timestamp_str}_{out_name_base}.{get_extension(sep)}")
+    qc_fails_fp = os.path.join(
+        out_dir, f"{timestamp_str}_{out_name_base}_fails.csv")
+    validation_msgs_fp = os.path.join(
+        out_dir, f"{timestamp_str}_{out_name_base}_validation_errors.csv")
+
+    wrote_metadata = wrote_qc_fails = wrote_validation_msgs = False
+    num_rows_read = 0
+    chunk_reader = pandas.read_csv(
+        raw_metadata_fp, sep=in_sep, encoding=encoding, dtype=str,
+        chunksize=chunk_size)
+    for raw_chunk_df in chunk_reader:
+        if preserve_input_order:
+            raw_chunk_df[_INPUT_ROW_KEY] = np.arange(
+                num_rows_read, num_rows_read + len(raw_chunk_df))
+        num_rows_read += len(raw_chunk_df)
+
+        metadata_df, validation_msgs_df, _ = \
+            _extend_metadata_from_full_flat_config(
+                raw_chunk_df, full_flat_config_dict,
+                study_specific_transformers_dict=None,
+                hosttype_col_name=None, sampletype_col_name=None,
+                generated_col_names=generated_col_names, n_jobs=n_jobs)
+        if preserve_input_order:
+            input_rows = metadata_df.pop(_INPUT_ROW_KEY).to_numpy(
+                dtype=np.int64)
+            metadata_df = metadata_df.iloc[
+                np.argsort(input_rows, kind="stable")]
+
+        # as in _output_metadata_df_to_files
+        if remove_internals:
+            qc_fails_df = get_qc_failures(metadata_df)
+            if not qc_fails_df.empty:
+                _append_df_to_file(
+                    qc_fails_df, qc_fails_fp, ",", wrote_qc_fails)
+                wrote_qc_fails = True
+            fails_qc_mask = metadata_df[QC_NOTE_KEY] != ""
+            metadata_df = _remove_internal_cols(
+                metadata_df.loc[~fails_qc_mask, :])
+        _append_df_to_file(metadata_df, out_fp, sep, wrote_metadata)
+        wrote_metadata = True
+
+        # as in output_validation_msgs
+        if not validation_msgs_df.empty:
+            _append_df_to_file(validation_msgs_df, validation_msgs_fp, ",",
+                               wrote_validation_msgs)
+            wrote_validation_msgs = True
+    # next chunk
+
+    # as without chunking, create empty (not even header line) files if
+    # there were no failures, unless told to suppress them
+    if not suppress_empty_fails:
+        if remove_internals and not wrote_qc_fails:
+            Path(qc_fails_fp).touch()
+        if not wrote_validation_msgs:
+            Path(validation_msgs_fp).touch()
+
+
+def _scan_metadata_file(
+        raw_metadata_fp: str,
+        sep: str,
+        chunk_size: int,
+        full_flat_config_dict: Dict[str, Any]
+) -> Tuple[str, Set[Tuple[str, str]]]:
+    """Find a metadata file's encoding and the host+sample type pairs in it.
+
+    Reads only the host and sample type columns, a chunk of rows at a time.
+
+    Parameters
+    ----------
+    raw_metadata_fp : str
+        Path to the raw metadata file.
+    sep : str
+        Separator used in the metadata file.
+    chunk_size : int
+        Number of rows to read at a time.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary, used to find the
+        host and sample type columns (see
+        _extend_metadata_from_full_flat_config).
+
+    Returns
+    -------
+    Tuple[str, Set[Tuple[str, str]]]
+        A tuple containing:
+            - The first encoding in BEST_FIT_ENCODINGS that decodes the file
+            - The (host type, sample type) pairs in the file, with NaNs set
+              to "empty" as _catch_nan_required_fields does
+
+    Raises
+    ------
+    ValueError
+        If the host or sample type column is missing, or if the file cannot
+        be decoded with any of the available encodings.
+    """
+    for encoding in BEST_FIT_ENCODINGS:
+        try:
+            header_df = pandas.read_csv(
+                raw_metadata_fp, sep=sep, encoding=encoding, dtype=str,
+                nrows=0)
+        except UnicodeDecodeError:
+            continue
+
+        type_col_names = []
+        for curr_internal_key, curr_options_key in \
+                [(HOSTTYPE_SHORTHAND_KEY, HOSTTYPE_COL_OPTIONS_KEY),
+                 (SAMPLETYPE_SHORTHAND_KEY, SAMPLETYPE_COL_OPTIONS_KEY)]:
+            specified_name = _find_internal_col_source_name(
+                header_df, full_flat_config_dict, None,
+                curr_internal_key, curr_options_key)
+            type_col_names.append(specified_name or curr_internal_key)
+        validate_required_columns_exist(
+            header_df, type_col_names, "metadata missing required columns")
+
+        host_sample_pairs = set()
+        try:
+            for types_df in pandas.read_csv(
+                    raw_metadata_fp, sep=sep, encoding=encoding, dtype=str,
+                    usecols=list(dict.fromkeys(type_col_names)),
+                    chunksize=chunk_size):
+                types_df = types_df.fillna("empty")
+                host_sample_pairs.update(zip(
+                    types_df[type_col_names[0]], types_df[type_col_names[1]]))
+            # next chunk
+        except UnicodeDecodeError:
+            continue
+
+        return encoding, host_sample_pairs
+    # next encoding
+
+    raise ValueError(f"Unable to decode {raw_metadata_fp} "
+                     f"with any available encoder")
+
+
 def write_validator_metadata(
         raw_metadata_fp: str,
         full_flat_config_dict_fp: str,
@@ -550,8 +953,12 @@ def write_validator_metadata(
     # load the metadata
     raw_metadata_df = _load_metadata_df(raw_metadata_fp)
 
-    # load the full flat config dictionary from the input yaml file
-    full_flat_config_dict = extract_config_dict(full_flat_config_dict_fp)
+    # load the full flat config dictionary from the input config artifact
+    # or yaml file
+    if is_config_artifact(full_flat_config_dict_fp):
+        full_flat_config_dict = load_config_artifact(full_flat_config_dict_fp)
+    else:
+        full_flat_config_dict = extract_config_dict(full_flat_config_dict_fp)
 
     # extend the metadata DataFrame using the study-specific flat-host-type config dictionary
     metadata_df, validation_msgs_df, col_name_mapping = \
@@ -655,10 +1062,39 @@ def _get_study_specific_config(study_specific_config_fp: Optional[str]) -> Optio
     return study_specific_config_dict
 
 
+def _get_study_specific_or_full_config(
+        config_fp: Optional[str]
+) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
+    """Load either a study-specific config YAML file or a config artifact.
+
+    Parameters
+    ----------
+    config_fp : Optional[str]
+        Path to a study-specific configuration YAML file (see
+        ``_get_study_specific_config``) or to a config artifact holding an
+        already-built full flat config (see ``metameq.src.config_artifact``).
+
+    Returns
+    -------
+    Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+        A tuple containing:
+            - The study-specific config dictionary, or None if no file path
+              was provided or the file is a config artifact
+            - The full flat config dictionary if the file is a config
+              artifact, otherwise None
+    """
+    if config_fp and is_config_artifact(config_fp):
+        return None, load_config_artifact(config_fp)
+
+    return _get_study_specific_config(config_fp), None
+
+
 def _populate_metadata_df(
         raw_metadata_df: pandas.DataFrame,
         full_flat_config_dict: Dict[str, Any],
-        transformer_funcs_dict: Optional[Dict[str, Any]]) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+        transformer_funcs_dict: Optional[Dict[str, Any]],
+        generated_col_names: Optional[Set[str]] = None,
+        n_jobs: Optional[int] = None) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
     """Populate columns and fields in a metadata DataFrame.
 
     Parameters
@@ -673,6 +1109,14 @@ def _populate_metadata_df(
         with each value being a dict with keys SOURCES_KEY and FUNCTION_KEY,
         which map to lists of source field names for the transformer to use
         and an existing transformer function name, respectively.
+    generated_col_names : Optional[Set[str]], default=None
+        If the metadata is one chunk of a larger whole, the names of the
+        columns that host- and sample-type-specific generation adds for the
+        whole (see _add_missing_generated_cols).
+    n_jobs : Optional[int], default=None
+        Number of worker processes to transform the metadata and to generate
+        the host- and sample-type-specific metadata in (see
+        extend_metadata_df).
 
     Returns
     -------
@@ -681,6 +1125,14 @@ def _populate_metadata_df(
             - The populated metadata DataFrame
             - A DataFrame containing validation messages
     """
+    passthrough_df = None
+    if full_flat_config_dict.get(PASSTHROUGH_UNTOUCHED_COLS_KEY, False):
+        # Set aside the columns that neither the config nor the transformers
+        # refer to, so they aren't copied through every step below; they are
+        # re-attached (with the same blank-filling) at the end.
+        raw_metadata_df, passthrough_df = _split_off_passthrough_cols(
+            raw_metadata_df, full_flat_config_dict)
+
     metadata_df = raw_metadata_df.copy()
     # Don't try to populate the QC_NOTE_KEY field, since it is an internal field
     update_metadata_df_field(metadata_df, QC_NOTE_KEY, LEAVE_BLANK_VAL)
@@ -692,24 +1144,39 @@ def _populate_metadata_df(
     # specific generation (which also includes validation), so they can transform raw input fields
     # into values that the config validation expects (for example, converting a study's custom sex
     # format like "M"/"F" into standardized values like "male"/"female" before validation occurs.
-    metadata_df = _transform_metadata(
+    num_workers = _get_num_workers(n_jobs)
+    metadata_df = _transform_metadata_in_blocks(
         metadata_df, full_flat_config_dict,
-        PRE_TRANSFORMERS_KEY, transformer_funcs_dict)
+        PRE_TRANSFORMERS_KEY, transformer_funcs_dict, num_workers)
 
     # Add specific metadata based on each host type present in the metadata.
     # This step also validates the metadata against the config requirements.
     metadata_df, validation_msgs = _generate_metadata_for_host_types(
-        metadata_df, full_flat_config_dict)
+        metadata_df, full_flat_config_dict, n_jobs)
+    if passthrough_df is not None:
+        passthrough_df = _fill_passthrough_cols(
+            passthrough_df, metadata_df.pop(_ROW_POSITION_KEY).to_numpy(),
+            metadata_df, full_flat_config_dict)
+    if generated_col_names is not None:
+        # a column the whole's config refers to may be one this chunk's
+        # config doesn't, and so set aside above rather than missing
+        if passthrough_df is not None:
+            generated_col_names = \
+                generated_col_names - set(passthrough_df.columns)
+        metadata_df = _add_missing_generated_cols(
+            metadata_df, generated_col_names, full_flat_config_dict)
 
     # Apply post-transformers to the metadata. Post-transformers run AFTER host- and sample-type
     # specific generation, so they can use fields that only exist or were only filled in
     # after that step, such as passing through a value filled in by the defaults to another field.
-    metadata_df = _transform_metadata(
+    metadata_df = _transform_metadata_in_blocks(
         metadata_df, full_flat_config_dict,
-        POST_TRANSFORMERS_KEY, transformer_funcs_dict)
+        POST_TRANSFORMERS_KEY, transformer_funcs_dict, num_workers)
 
     # Reorder the metadata columns for better readability.
     metadata_df = _reorder_df(metadata_df, INTERNAL_COL_KEYS)
+    if passthrough_df is not None:
+        metadata_df = _reattach_passthrough_cols(metadata_df, passthrough_df)
 
     # Turn the validation messages into a DataFrame of validation messages for easier use downstream.
     validation_msgs_df = format_validation_msgs_as_df(validation_msgs)
@@ -717,6 +1184,213 @@ def _populate_metadata_df(
     return metadata_df, validation_msgs_df
 
 
+def _add_missing_generated_cols(
+        metadata_df: pandas.DataFrame,
+        generated_col_names: Set[str],
+        full_flat_config_dict: Dict[str, Any]) -> pandas.DataFrame:
+    """Add generated columns that a chunk of a larger metadata whole lacks.
+
+    A chunk may not hold samples of every host+sample type in the whole, so
+    generation may not add every column to it that it adds to the whole.
+    Those columns are added here, filled as generation fills them for samples
+    of host+sample types that don't have them: with the general default (if
+    any), with LEAVE_BLANK_VAL then replaced by an empty string.
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The metadata DataFrame, after host- and sample-type-specific
+        generation.
+    generated_col_names : Set[str]
+        Names of the columns generation adds for the whole metadata.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The metadata DataFrame with all of generated_col_names as columns.
+        Unchanged if it already had them all.
+    """
+    missing_col_names = sorted(generated_col_names - set(metadata_df.columns))
+    if not missing_col_names:
+        return metadata_df
+
+    fill_val = full_flat_config_dict.get(DEFAULT_KEY) or np.nan
+    if fill_val == LEAVE_BLANK_VAL:
+        fill_val = ""
+    missing_df = pandas.DataFrame(
+        {x: fill_val for x in missing_col_names},
+        index=metadata_df.index, dtype=object)
+    return pandas.concat([metadata_df, missing_df], axis=1)
+
+
+def _get_pre_transformer_targets(
+        full_flat_config_dict: Dict[str, Any]) -> List[str]:
+    transformers_dict = \
+        full_flat_config_dict.get(METADATA_TRANSFORMERS_KEY) or {}
+    return list(transformers_dict.get(PRE_TRANSFORMERS_KEY) or {})
+
+
+def _split_off_passthrough_cols(
+        raw_metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any]
+) -> Tuple[pandas.DataFrame, Optional[pandas.DataFrame]]:
+    """Split a metadata DataFrame into the columns extension uses and the rest.
+
+    Parameters
+    ----------
+    raw_metadata_df : pandas.DataFrame
+        The raw metadata DataFrame, which must contain at least the columns
+        in REQUIRED_RAW_METADATA_FIELDS.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+
+    Returns
+    -------
+    Tuple[pandas.DataFrame, Optional[pandas.DataFrame]]
+        A tuple containing:
+            - The columns that the config (for any host+sample type in the
+              metadata) or its transformers refer to, plus the required and internal columns
+              and a temporary column of row positions; or raw_metadata_df
+              itself if there are no other columns
+            - The other (passthrough) columns, or None if there are none
+    """
+    # only the host+sample types in the metadata matter, unless a
+    # pre-transformer may change them
+    host_sample_pairs = None
+    if not {HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY}.intersection(
+            _get_pre_transformer_targets(full_flat_config_dict)):
+        # setting NaNs to "empty" as _catch_nan_required_fields does
+        host_sample_pairs = pandas.MultiIndex.from_frame(
+            raw_metadata_df[[HOSTTYPE_SHORTHAND_KEY,
+                             SAMPLETYPE_SHORTHAND_KEY]].fillna("empty")
+        ).unique()
+    used_cols = OutputColsIndex(
+        full_flat_config_dict, host_sample_pairs).config_cols.union(
+            REQUIRED_RAW_METADATA_FIELDS, INTERNAL_COL_KEYS)
+    passthrough_cols = \
+        [x for x in raw_metadata_df.columns if x not in used_cols]
+    if not passthrough_cols:
+        return raw_metadata_df, None
+
+    narrow_df = raw_metadata_df[
+        [x for x in raw_metadata_df.columns if x in used_cols]].copy()
+    narrow_df[_ROW_POSITION_KEY] = np.arange(len(narrow_df))
+    return narrow_df, raw_metadata_df[passthrough_cols]
+
+
+def _fill_passthrough_cols(
+        passthrough_df: pandas.DataFrame,
+        row_positions: np.ndarray,
+        metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any]) -> pandas.DataFrame:
+    """Put passthrough columns in output row order and fill their blanks.
+
+    Blanks in passthrough columns are filled just as
+    _generate_metadata_for_host_types fills blanks in every column: with
+    the host type's default for samples of known host+sample types (after
+    replacing required-field placeholders), then with the global default,
+    after which LEAVE_BLANK_VAL becomes an empty string. Columns with
+    nothing to fill are passed through untouched.
+
+    Parameters
+    ----------
+    passthrough_df : pandas.DataFrame
+        The passthrough columns, in input row order.
+    row_positions : np.ndarray
+        For each row of metadata_df, the position of its row in the input.
+    metadata_df : pandas.DataFrame
+        The output of _generate_metadata_for_host_types.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The filled passthrough columns, in the row order of metadata_df.
+    """
+    output_df = passthrough_df.take(row_positions).reset_index(drop=True)
+
+    hosts_config_dict = full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY]
+    group_codes, group_pairs = pandas.MultiIndex.from_arrays(
+        [metadata_df[HOSTTYPE_SHORTHAND_KEY],
+         metadata_df[SAMPLETYPE_SHORTHAND_KEY]]).factorize()
+    group_plans = [_plan_group_metadata(host_type, sample_type,
+                                        hosts_config_dict, set())
+                   for host_type, sample_type in group_pairs]
+    is_known = np.array([x.schema is not None for x in group_plans],
+                        dtype=bool)[group_codes]
+    reqs_vals = _broadcast([x.reqs_val for x in group_plans], group_codes)
+    reqs_isna = pandas.isna(reqs_vals)
+    host_default_vals = _broadcast(
+        [x.host_default for x in group_plans], group_codes)
+    has_host_default = np.array(
+        [bool(x.host_default) for x in group_plans], dtype=bool)[group_codes]
+    global_default = full_flat_config_dict.get(DEFAULT_KEY)
+
+    # work on the passthrough columns a slice at a time, each as one 2-D
+    # object array, since there may be very many of them
+    for start in range(0, len(output_df.columns), _PASSTHROUGH_COLS_PER_SLICE):
+        slice_cols = \
+            output_df.columns[start:start + _PASSTHROUGH_COLS_PER_SLICE]
+        block = output_df[slice_cols].to_numpy(dtype=object, copy=True)
+        block_isna = pandas.isna(block)
+        is_placeholder = (block == REQ_PLACEHOLDER) & is_known[:, None]
+        block[is_placeholder] = \
+            np.broadcast_to(reqs_vals[:, None], block.shape)[is_placeholder]
+        block_isna[is_placeholder] = \
+            np.broadcast_to(reqs_isna[:, None], block.shape)[is_placeholder]
+        is_changed = is_placeholder
+
+        host_fill_mask = block_isna & (is_known & has_host_default)[:, None]
+        block[host_fill_mask] = np.broadcast_to(
+            host_default_vals[:, None], block.shape)[host_fill_mask]
+        is_changed |= host_fill_mask
+        if global_default:
+            global_fill_mask = block_isna & ~host_fill_mask
+            block[global_fill_mask] = global_default
+            is_changed |= global_fill_mask
+
+        is_blank = block == LEAVE_BLANK_VAL
+        block[is_blank] = ""
+        is_changed |= is_blank
+
+        # columns with nothing filled in are passed through untouched
+        for curr_col_index in np.flatnonzero(is_changed.any(axis=0)):
+            curr_col = slice_cols[curr_col_index]
+            output_df[curr_col] = pandas.Series(
+                block[:, curr_col_index],
+                dtype=_get_filled_dtype(output_df[curr_col]))
+        # next changed passthrough column
+    # next slice of passthrough columns
+
+    return output_df
+
+
+def _reattach_passthrough_cols(
+        metadata_df: pandas.DataFrame,
+        passthrough_df: pandas.DataFrame) -> pandas.DataFrame:
+    """Add filled passthrough columns back to the extended metadata.
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The extended metadata DataFrame.
+    passthrough_df : pandas.DataFrame
+        The passthrough columns, filled and in the row order of metadata_df
+        (see _fill_passthrough_cols).
+
+    Returns
+    -------
+    pandas.DataFrame
+        The extended metadata with all columns, ordered as by _reorder_df.
+    """
+    combined_df = pandas.concat([metadata_df, passthrough_df], axis=1)
+    return combined_df.loc[
+        :, _get_reordered_col_names(combined_df.columns, INTERNAL_COL_KEYS)]
+
+
 def _find_internal_col_source_name(
         raw_metadata_df: pandas.DataFrame, full_flat_config_dict: Dict[str, Any],
         param_key: Optional[str], internal_key: str, options_key: str) -> Optional[str]:
@@ -782,7 +1456,8 @@ def _transform_metadata(
         metadata_df: pandas.DataFrame,
         full_flat_config_dict: Dict[str, Any],
         stage_key: str,
-        transformer_funcs_dict: Optional[Dict[str, Any]]) -> pandas.DataFrame:
+        transformer_funcs_dict: Optional[Dict[str, Any]],
+        num_threads: int = 1) -> pandas.DataFrame:
     """Apply transformations defined in full_flat_config_dict to metadata fields.
 
     Parameters
@@ -799,6 +1474,11 @@ def _transform_metadata(
     transformer_funcs_dict : Optional[Dict[str, Any]]
         Dictionary of transformer functions, keyed by function name.
         If None, only built-in transformers will be available.
+    num_threads : int, default=1
+        Number of threads to run independent transformers concurrently in;
+        if 1, they are run one at a time. Row-wise transformers hold the
+        GIL, so only transformers that release it (mostly vectorized ones)
+        run faster in threads.
 
     Returns
     -------
@@ -808,76 +1488,258 @@ def _transform_metadata(
     Raises
     ------
     ValueError
-        If a specified transformer function cannot be found.
+        If a specified transformer function cannot be found, or if the
+        transformers depend on each other in a cycle.
 
     Notes
     -----
     Each transformer may optionally specify its own OVERWRITE_NON_NANS_KEY
     setting, which takes precedence over the global setting.
 
+    Transformers run in the order given by their plan (see
+    ``metameq.src.transformer_plan.build_transformer_plan``): each after the
+    transformers that fill its source fields, and otherwise in config order.
+
     If a transformer references source fields that are not present in the
-    DataFrame, that transformer is skipped and a warning is logged. This
-    allows optional fields to be used as transformer sources without causing
-    errors when they are absent.
+    DataFrame (or filled by the transformers it runs after), that
+    transformer is skipped and a warning is logged. This allows optional
+    fields to be used as transformer sources without causing errors when
+    they are absent.
     """
     if transformer_funcs_dict is None:
         transformer_funcs_dict = {}
-    # If the necessary keys aren't already in the config, set them to do-nothing defaults
-    overwrite_non_nans = full_flat_config_dict.get(OVERWRITE_NON_NANS_KEY, False)
-    metadata_transformers = full_flat_config_dict.get(METADATA_TRANSFORMERS_KEY, None)
-    if metadata_transformers:
-        stage_transformers = metadata_transformers.get(stage_key, None)
-        # If there are transformers for the stage we're at, apply them
-        if stage_transformers:
-            for curr_target_field, curr_transformer_dict in \
-                    stage_transformers.items():
-                curr_source_fields = curr_transformer_dict[SOURCES_KEY]
-                curr_func_name = curr_transformer_dict[FUNCTION_KEY]
-                curr_overwrite_non_nans = curr_transformer_dict.get(
-                    OVERWRITE_NON_NANS_KEY, overwrite_non_nans)
-
-                # If any of the source fields for this transformer are missing from
-                # the metadata, skip this transformer and log a warning.  This can
-                # happen if, for example, there is a transformer set that uses an
-                # optional field as a source, and that optional field is not present.
-                curr_missing_sources = set(curr_source_fields) - set(metadata_df.columns)
-                if curr_missing_sources:
-                    logging.warning(
-                        f"Transformer '{curr_func_name}' for target field"
-                        f" '{curr_target_field}' skipped due to missing source fields: "
-                        f"{', '.join(sorted(curr_missing_sources))}")
-                    continue
-
-                try:
-                    curr_func = transformer_funcs_dict[curr_func_name]
-                except KeyError:
-                    try:
-                        # if the transformer function isn't in the dictionary
-                        # that was passed in, probably it is a built-in one,
-                        # so look for it in the metameq transformers module
-                        # looking into the metameq transformers module
-                        curr_func = getattr(transformers, curr_func_name)
-                    except AttributeError:
-                        raise ValueError(
-                            f"Unable to find transformer '{curr_func_name}'")
-                    # end try to find in metameq transformers
-                # end try to find in input (study-specific) transformers
-
-                # apply the function named curr_func_name to the column(s) of the
-                # metadata_df named curr_source_fields to fill curr_target_field
-                update_metadata_df_field(metadata_df, curr_target_field,
-                                         curr_func, curr_source_fields,
-                                         overwrite_non_nans=curr_overwrite_non_nans)
-            # next stage transformer
-        # end if there are stage transformers for this stage
-    # end if there are any metadata transformers
+    # Plan the order in which the stage's transformers run, and find those
+    # that must be skipped, before any are run
+    plan = build_transformer_plan(
+        full_flat_config_dict, stage_key, metadata_df.columns)
+    if not plan.steps and not plan.skipped:
+        return metadata_df
+
+    # If any of the source fields for a transformer are missing from the
+    # metadata, skip this transformer and log a warning.  This can happen if,
+    # for example, there is a transformer set that uses an optional field as
+    # a source, and that optional field is not present.
+    stage_transformers = full_flat_config_dict[METADATA_TRANSFORMERS_KEY][
+        stage_key]
+    for curr_target_field, curr_missing_sources in plan.skipped.items():
+        logging.warning(
+            f"Transformer '{stage_transformers[curr_target_field][FUNCTION_KEY]}'"
+            f" for target field '{curr_target_field}' skipped due to missing "
+            f"source fields: {', '.join(curr_missing_sources)}")
+    # next skipped transformer
+
+    funcs_by_target = {
+        curr_target_field: _get_transformer_func(
+            curr_step.function_name, transformer_funcs_dict)
+        for curr_target_field, curr_step in plan.steps.items()}
+
+    if num_threads < 2 or all(len(x) < 2 for x in plan.waves):
+        _run_transformer_task(
+            metadata_df, tuple(plan.steps), plan, funcs_by_target)
+        return metadata_df
+
+    input_cols = list(metadata_df.columns)
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        for curr_wave in plan.waves:
+            # each task runs on its own copy of the metadata, and its target
+            # fields are copied back once all are done; the tasks of a wave
+            # do not use each other's target fields
+            task_dfs = [_copy_metadata_for_task(metadata_df, x)
+                        for x in curr_wave]
+            task_futures = [
+                executor.submit(_run_transformer_task, curr_task_df,
+                                curr_task, plan, funcs_by_target)
+                for curr_task_df, curr_task in zip(task_dfs, curr_wave)]
+            for curr_future in task_futures:
+                # raise the error of the first task to fail, in plan order
+                curr_future.result()
+            for curr_task_df, curr_task in zip(task_dfs, curr_wave):
+                for curr_target_field in curr_task:
+                    metadata_df[curr_target_field] = \
+                        curr_task_df[curr_target_field]
+            # next task
+        # next wave
+
+    # put any added target fields in the order they would have been added
+    # if the transformers were run one at a time
+    added_cols = [x for x in plan.steps if x not in input_cols]
+    return metadata_df[input_cols + added_cols]
+
+
+def _copy_metadata_for_task(
+        metadata_df: pandas.DataFrame,
+        task: Tuple[str, ...]) -> pandas.DataFrame:
+    """Copy the metadata for a task to transform, in a thread, on its own.
 
-    return metadata_df
+    The copy shares the data of every column but the task's target fields,
+    which are copied (where they already exist), so the task never writes
+    into data shared with the metadata or other tasks. (A shallow copy
+    shares the data of all columns unless pandas' copy-on-write is enabled,
+    as it is by default from pandas 3.)
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The metadata DataFrame.
+    task : Tuple[str, ...]
+        Target fields of the task's transformers.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The copy of the metadata.
+    """
+    task_df = metadata_df.copy(deep=False)
+    for curr_target_field in task:
+        if curr_target_field in task_df.columns:
+            # remove and re-add, rather than assign, the column, since
+            # assigning may write into the shared data
+            curr_col = task_df.pop(curr_target_field)
+            task_df[curr_target_field] = curr_col.copy(deep=True)
+    # next target field
+    return task_df
+
+
+def _get_transformer_func(
+        func_name: str,
+        transformer_funcs_dict: Dict[str, Any]) -> Callable:
+    """Find a transformer function by name.
+
+    Parameters
+    ----------
+    func_name : str
+        Name of the transformer function.
+    transformer_funcs_dict : Dict[str, Any]
+        Dictionary of (study-specific) transformer functions, keyed by
+        function name.
+
+    Returns
+    -------
+    Callable
+        The function named func_name in transformer_funcs_dict if it is
+        there, otherwise the built-in transformer of that name.
+
+    Raises
+    ------
+    ValueError
+        If there is no such transformer function.
+    """
+    try:
+        return transformer_funcs_dict[func_name]
+    except KeyError:
+        try:
+            # if the transformer function isn't in the dictionary
+            # that was passed in, probably it is a built-in one,
+            # so look for it in the metameq transformers module
+            return getattr(transformers, func_name)
+        except AttributeError:
+            raise ValueError(f"Unable to find transformer '{func_name}'")
+        # end try to find in metameq transformers
+    # end try to find in input (study-specific) transformers
+
+
+def _run_transformer_task(
+        metadata_df: pandas.DataFrame,
+        task: Tuple[str, ...],
+        plan: TransformerPlan,
+        funcs_by_target: Dict[str, Callable]) -> None:
+    """Run a task's chain of transformers in turn, in place.
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The metadata DataFrame to transform. Modified in place.
+    task : Tuple[str, ...]
+        Target fields of the transformers to run, in order.
+    plan : TransformerPlan
+        The plan of the stage the task is part of.
+    funcs_by_target : Dict[str, Callable]
+        Target field to the transformer function that fills it.
+    """
+    for curr_target_field in task:
+        curr_step = plan.steps[curr_target_field]
+        curr_func = funcs_by_target[curr_target_field]
+        # apply the function to the column(s) of the metadata_df named
+        # by the step's source fields to fill its target field, all rows
+        # at once if it has a vectorized version, or once per distinct
+        # combination of source values if it is pure
+        update_metadata_df_field(
+            metadata_df, curr_target_field, curr_func,
+            list(curr_step.source_fields),
+            overwrite_non_nans=curr_step.overwrite_non_nans,
+            vectorized_func=transformers.get_vectorized_version(curr_func),
+            is_pure=transformers.is_pure_transformer(curr_func),
+            use_row_view=not transformers.needs_row_series(curr_func))
+    # next transformer in the task
+
+
+def _transform_metadata_in_blocks(
+        metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any],
+        stage_key: str,
+        transformer_funcs_dict: Optional[Dict[str, Any]],
+        num_workers: int) -> pandas.DataFrame:
+    """Apply a stage's transformations to blocks of metadata rows in worker processes.
+
+    Transformers work on each row independently, so the metadata is split
+    into contiguous blocks of rows, each transformed by _transform_metadata
+    in a worker, and the blocks are stitched back together in order.
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The metadata DataFrame to transform, which must contain at least
+        the columns in REQUIRED_RAW_METADATA_FIELDS.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+    stage_key : str
+        Key indicating the transformation stage (pre or post).
+    transformer_funcs_dict : Optional[Dict[str, Any]]
+        Dictionary of transformer functions, keyed by function name. With
+        more than one worker, these must be module-level (picklable)
+        functions.
+    num_workers : int
+        Number of worker processes to use; if 1 (or if the stage has no
+        transformers), the metadata is transformed in this process. If
+        there are too few rows to split into blocks, independent
+        transformers are instead run concurrently in up to this many
+        threads in this process.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The transformed metadata DataFrame.
+    """
+    metadata_transformers = \
+        full_flat_config_dict.get(METADATA_TRANSFORMERS_KEY) or {}
+    row_blocks = _get_row_blocks(len(metadata_df), num_workers)
+    if not metadata_transformers.get(stage_key) or len(row_blocks) < 2:
+        return _transform_metadata(metadata_df, full_flat_config_dict,
+                                   stage_key, transformer_funcs_dict,
+                                   num_threads=num_workers)
+
+    # ship only the parts of the config that _transform_metadata uses
+    transformers_config_dict = {
+        METADATA_TRANSFORMERS_KEY: {
+            stage_key: metadata_transformers[stage_key]}}
+    if OVERWRITE_NON_NANS_KEY in full_flat_config_dict:
+        transformers_config_dict[OVERWRITE_NON_NANS_KEY] = \
+            full_flat_config_dict[OVERWRITE_NON_NANS_KEY]
+
+    transformed_blocks = _map_in_batches(
+        _transform_metadata,
+        [(metadata_df.iloc[start:stop],) for start, stop in row_blocks],
+        [stop - start for start, stop in row_blocks], num_workers,
+        shared_args=(transformers_config_dict, stage_key,
+                     transformer_funcs_dict),
+        args_first=False)
+    return pandas.concat(transformed_blocks)
 
 
 def _generate_metadata_for_host_types(
         metadata_df: pandas.DataFrame,
-        full_flat_config_dict: Dict[str, Any]) -> Tuple[pandas.DataFrame, List[str]]:
+        full_flat_config_dict: Dict[str, Any],
+        n_jobs: Optional[int] = None) -> Tuple[pandas.DataFrame, List[str]]:
     """Generate metadata for samples of all host types in the DataFrame.
 
     Parameters
@@ -887,6 +1749,9 @@ def _generate_metadata_for_host_types(
         the columns in REQUIRED_RAW_METADATA_FIELDS.
     full_flat_config_dict : Dict[str, Any]
         Fully combined flat-host-type config dictionary.
+    n_jobs : Optional[int], default=None
+        Number of worker processes to generate (and validate) the metadata
+        of the host+sample type groups in; see extend_metadata_df.
 
     Returns
     -------
@@ -895,38 +1760,659 @@ def _generate_metadata_for_host_types(
             - The processed DataFrame with specific metadata added to each sample of each host type
             - A list of validation messages
     """
+    num_workers = _get_num_workers(n_jobs)
+    if full_flat_config_dict.get(GROUP_BROADCAST_EXTENSION_KEY, False):
+        return _generate_metadata_for_host_types_by_group(
+            metadata_df, full_flat_config_dict, num_workers)
+
+    if num_workers > 1:
+        host_type_dfs, validation_msgs = \
+            _generate_metadata_for_host_types_in_parallel(
+                metadata_df, full_flat_config_dict, num_workers)
+    else:
+        validation_msgs = []
+        host_type_dfs = []
+        # For all the host types present in the metadata, generate the specific metadata
+        host_type_shorthands = pandas.unique(metadata_df[HOSTTYPE_SHORTHAND_KEY])
+        for curr_host_type_shorthand in host_type_shorthands:
+            concatted_dfs, curr_validation_msgs = _generate_metadata_for_a_host_type(
+                    metadata_df, curr_host_type_shorthand, full_flat_config_dict)
+
+            host_type_dfs.append(concatted_dfs)
+            validation_msgs.extend(curr_validation_msgs)
+        # next host type
+    # endif generating in parallel
 
-    validation_msgs = []
-    host_type_dfs = []
-    # For all the host types present in the metadata, generate the specific metadata
+    # Concatenate the processed host-type-specific metadata DataFrames into a single output DataFrame
+    output_df = pandas.concat(host_type_dfs, ignore_index=True)
+
+    # work out which columns the config can have put LEAVE_BLANK_VAL in, so
+    # only those (and the input columns) need be searched for it
+    input_cols = set(metadata_df.columns)
+    hosts_config_dict = full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY]
+    group_plans = [
+        _plan_group_metadata(host_type, sample_type, hosts_config_dict,
+                             input_cols)
+        for host_type, sample_type in pandas.MultiIndex.from_arrays(
+            [metadata_df[HOSTTYPE_SHORTHAND_KEY],
+             metadata_df[SAMPLETYPE_SHORTHAND_KEY]]).unique()]
+    _finalize_metadata_df(
+        output_df, full_flat_config_dict,
+        _get_leave_blank_cols(group_plans, input_cols))
+    if full_flat_config_dict.get(COMPACT_DEFAULT_COLS_KEY, False):
+        # this path builds the added columns in full, so they can only be
+        # compacted once they are done
+        _compact_cols(
+            output_df, [x for x in output_df.columns if x not in input_cols])
+    return output_df, validation_msgs
+
+
+def _generate_metadata_for_host_types_in_parallel(
+        metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any],
+        num_workers: int) -> Tuple[List[pandas.DataFrame], List[str]]:
+    """Generate metadata for each host+sample type group in a pool of worker processes.
+
+    Each known host type's samples are split by sample type as in
+    _generate_metadata_for_a_host_type, and each group's samples (or, for
+    large groups, each contiguous block of them) are processed by
+    _generate_metadata_for_a_sample_type_in_a_host_type in a worker. Only
+    the part of each host type's config that a group needs is sent, and to
+    each worker just once. Samples of unknown host types are noted as such
+    here.
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The metadata DataFrame to process, which must contain at least
+        the columns in REQUIRED_RAW_METADATA_FIELDS.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+    num_workers : int
+        Number of worker processes to use.
+
+    Returns
+    -------
+    Tuple[List[pandas.DataFrame], List[str]]
+        A tuple containing:
+            - The processed DataFrame for each host type, in order of first
+              appearance, as _generate_metadata_for_a_host_type returns them
+            - A list of validation messages, in the same order as
+              _generate_metadata_for_a_host_type returns them
+    """
+    hosts_config_dict = full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY]
+
+    # for each host type, either its processed DataFrame (if it is unknown)
+    # or, for each of its sample type groups, the indices of the group's tasks
+    host_type_results = []
+    group_config_dicts = []
+    group_tasks = []
     host_type_shorthands = pandas.unique(metadata_df[HOSTTYPE_SHORTHAND_KEY])
-    for curr_host_type_shorthand in host_type_shorthands:
-        concatted_dfs, curr_validation_msgs = _generate_metadata_for_a_host_type(
-                metadata_df, curr_host_type_shorthand, full_flat_config_dict)
+    for curr_host_type in host_type_shorthands:
+        host_type_mask = metadata_df[HOSTTYPE_SHORTHAND_KEY] == curr_host_type
+        host_type_df = metadata_df.loc[host_type_mask, :].copy()
+        if curr_host_type not in hosts_config_dict:
+            update_metadata_df_field(
+                host_type_df, QC_NOTE_KEY, "invalid host_type")
+            host_type_results.append(host_type_df)
+            continue
+
+        host_type_config_dict = hosts_config_dict[curr_host_type]
+        sample_types_config_dict = \
+            host_type_config_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY]
+        host_type_task_idxs = []
+        for curr_sample_type in pandas.unique(
+                host_type_df[SAMPLETYPE_SHORTHAND_KEY]):
+            sample_type_mask = \
+                host_type_df[SAMPLETYPE_SHORTHAND_KEY] == curr_sample_type
+            sample_type_df = host_type_df.loc[sample_type_mask, :]
+            # ship only the settings and the one sample type that
+            # _generate_metadata_for_a_sample_type_in_a_host_type uses
+            group_config_dict = {
+                x: host_type_config_dict[x] for x in
+                (DEFAULT_KEY, OVERWRITE_NON_NANS_KEY, LEAVE_REQUIREDS_BLANK_KEY)
+                if x in host_type_config_dict}
+            group_config_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY] = {
+                curr_sample_type: sample_types_config_dict[curr_sample_type]
+            } if curr_sample_type in sample_types_config_dict else {}
+
+            group_idx = len(group_config_dicts)
+            group_config_dicts.append(group_config_dict)
+
+            # each sample's generated metadata depends only on that sample,
+            # so a large group can be processed in blocks of rows
+            group_task_idxs = []
+            for start, stop in _get_row_blocks(
+                    len(sample_type_df), num_workers):
+                group_task_idxs.append(len(group_tasks))
+                group_tasks.append((sample_type_df.iloc[start:stop],
+                                    curr_sample_type, group_idx))
+            # next block of rows
+            host_type_task_idxs.append(group_task_idxs)
+        # next sample type
+        host_type_results.append(host_type_task_idxs)
+    # next host type
 
-        host_type_dfs.append(concatted_dfs)
-        validation_msgs.extend(curr_validation_msgs)
+    task_results = _map_in_batches(
+        _generate_metadata_for_a_group_block, group_tasks,
+        [len(x[0]) for x in group_tasks], num_workers,
+        shared_args=(group_config_dicts,))
+
+    host_type_dfs = []
+    validation_msgs = []
+    for curr_result in host_type_results:
+        if isinstance(curr_result, pandas.DataFrame):
+            host_type_dfs.append(curr_result)
+            continue
+
+        sample_type_dfs = []
+        for curr_group_task_idxs in curr_result:
+            sample_type_dfs.append(pandas.concat(
+                [task_results[x][0] for x in curr_group_task_idxs]))
+            for curr_task_idx in curr_group_task_idxs:
+                validation_msgs.extend(task_results[curr_task_idx][1])
+        # next sample type group
+        host_type_dfs.append(
+            pandas.concat(sample_type_dfs, ignore_index=True))
     # next host type
 
-    # Concatenate the processed host-type-specific metadata DataFrames into a single output DataFrame
-    output_df = pandas.concat(host_type_dfs, ignore_index=True)
+    return host_type_dfs, validation_msgs
+
+
+def _get_num_workers(n_jobs: Optional[int]) -> int:
+    """Get the number of worker processes to use for an n_jobs setting.
+
+    Parameters
+    ----------
+    n_jobs : Optional[int]
+        None or 1 to work in this process, -1 to use one worker process per
+        CPU, or any other positive number of worker processes.
+
+    Returns
+    -------
+    int
+        The number of worker processes; 1 means work in this process.
+
+    Raises
+    ------
+    ValueError
+        If n_jobs is zero or negative but not -1.
+    """
+    if n_jobs is None:
+        return 1
+    if n_jobs == -1:
+        return os.cpu_count() or 1
+    if n_jobs < 1:
+        raise ValueError(f"n_jobs must be a positive number or -1, "
+                         f"not {n_jobs}")
+    return n_jobs
+
+
+def _get_row_blocks(num_rows: int, num_workers: int) -> List[Tuple[int, int]]:
+    """Split a number of rows into contiguous blocks, one per worker process.
+
+    Parameters
+    ----------
+    num_rows : int
+        Number of rows to split.
+    num_workers : int
+        Number of worker processes the blocks are for.
+
+    Returns
+    -------
+    List[Tuple[int, int]]
+        The (start, stop) positions of each block, in order. No block has
+        fewer than _MIN_ROWS_PER_PARALLEL_BATCH rows unless there is only one.
+    """
+    num_blocks = max(1, min(num_workers,
+                            num_rows // _MIN_ROWS_PER_PARALLEL_BATCH))
+    bounds = [num_rows * x // num_blocks for x in range(num_blocks + 1)]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _generate_metadata_for_a_group_block(
+        group_config_dicts: List[Dict[str, Any]],
+        block_df: pandas.DataFrame,
+        a_sample_type: str,
+        group_idx: int) -> Tuple[pandas.DataFrame, List[str]]:
+    return _generate_metadata_for_a_sample_type_in_a_host_type(
+        block_df, a_sample_type, group_config_dicts[group_idx])
+
+
+def _validate_group_block(
+        metadata_fields_dicts: List[Dict[str, Any]],
+        block_df: pandas.DataFrame,
+        group_idx: int) -> List[Dict[str, Any]]:
+    return validate_metadata_df(block_df, metadata_fields_dicts[group_idx])
+
+
+def _map_in_batches(
+        func: Callable[..., Any],
+        tasks: List[Tuple[Any, ...]],
+        task_num_rows: List[int],
+        num_workers: int,
+        shared_args: Tuple[Any, ...] = (),
+        args_first: bool = True) -> List[Any]:
+    """Call a function on each task's arguments, in a pool of worker processes.
+
+    Consecutive tasks are batched together until a batch covers at least
+    _MIN_ROWS_PER_PARALLEL_BATCH rows, and each batch is sent to a worker as
+    a whole. If there is only one batch (or one worker), the tasks are run
+    in this process instead.
+
+    Parameters
+    ----------
+    func : Callable[..., Any]
+        A module-level (so picklable) function.
+    tasks : List[Tuple[Any, ...]]
+        The arguments of each call of func that differ between calls.
+    task_num_rows : List[int]
+        The number of metadata rows each task covers.
+    num_workers : int
+        The maximum number of worker processes to use.
+    shared_args : Tuple[Any, ...], default=()
+        Arguments of every call of func. They are sent to each worker
+        process once, when it starts, rather than with each batch.
+    args_first : bool, default=True
+        Whether shared_args come before (rather than after) each task's
+        arguments in the calls of func.
+
+    Returns
+    -------
+    List[Any]
+        The result of each call of func, in task order.
+    """
+    batches = []
+    batch_num_rows = _MIN_ROWS_PER_PARALLEL_BATCH
+    for curr_task, curr_num_rows in zip(tasks, task_num_rows):
+        if batch_num_rows >= _MIN_ROWS_PER_PARALLEL_BATCH:
+            batches.append([])
+            batch_num_rows = 0
+        batches[-1].append(curr_task)
+        batch_num_rows += curr_num_rows
+    # next task
+
+    if num_workers < 2 or len(batches) < 2:
+        return _call_for_batch(func, tasks, args_first, shared_args)
+
+    results = []
+    with ProcessPoolExecutor(
+            max_workers=min(num_workers, len(batches)),
+            initializer=_set_worker_shared_args,
+            initargs=(shared_args,)) as executor:
+        for curr_batch_results in executor.map(
+                _call_for_batch, [func] * len(batches), batches,
+                [args_first] * len(batches)):
+            results.extend(curr_batch_results)
+    return results
+
+
+def _set_worker_shared_args(shared_args: Tuple[Any, ...]) -> None:
+    global _worker_shared_args
+    _worker_shared_args = shared_args
+
+
+def _call_for_batch(
+        func: Callable[..., Any],
+        batch: List[Tuple[Any, ...]],
+        args_first: bool = True,
+        shared_args: Optional[Tuple[Any, ...]] = None) -> List[Any]:
+    if shared_args is None:
+        # in a worker process (see _map_in_batches)
+        shared_args = _worker_shared_args
+    if args_first:
+        return [func(*shared_args, *x) for x in batch]
+    return [func(*x, *shared_args) for x in batch]
+
+
+def _generate_metadata_for_host_types_by_group(
+        metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any],
+        num_workers: int = 1) -> Tuple[pandas.DataFrame, List[str]]:
+    """Generate metadata for samples of all host types, one column at a time.
+
+    Produces the same output as the host-type-by-host-type, sample-type-by-
+    sample-type path in _generate_metadata_for_host_types, but rather than
+    splitting the metadata into a DataFrame per host+sample type, filling
+    each field of each one and concatenating them back together, it
+    factorizes the (host type, sample type) pairs once, builds a table of
+    what each pair sets in each column, and fills each column with a single
+    take of that table over the rows' pair codes. Used when the config's
+    GROUP_BROADCAST_EXTENSION_KEY setting is True. If the config's
+    COMPACT_DEFAULT_COLS_KEY setting is also True, the columns the config
+    adds are built directly as categoricals, without ever materializing
+    their values row by row.
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The metadata DataFrame to process, which must contain at least
+        the columns in REQUIRED_RAW_METADATA_FIELDS.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+    num_workers : int, default=1
+        Number of worker processes to validate the groups in; 1 means
+        validate them in this process.
 
-    # concatting dfs from different hosts can create large numbers of NAs--
-    # for example, if concatting a host-associated df with a control df, where
-    # the control df doesn't have values for any of the host-related columns.
-    # Fill those NAs with whatever the general default is.
-    # NB: passing in the same dict twice here is not a mistake, just a
-    # convenience since we don't have a more specific dict at this point.
-    output_df = _fill_na_if_default(
-        output_df, full_flat_config_dict)
-
-    # TODO: this is setting a value in the output; should it be centralized
-    #  so it is easy to find?
-    # Replace the LEAVE_BLANK_VAL with an empty string in the output DataFrame
-    output_df.replace(LEAVE_BLANK_VAL, "", inplace=True)
+    Returns
+    -------
+    Tuple[pandas.DataFrame, List[str]]
+        A tuple containing:
+            - The processed DataFrame with specific metadata added to each sample of each host type
+            - A list of validation messages
+    """
+    hosts_config_dict = full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY]
+    input_cols = list(metadata_df.columns)
+    input_cols_set = set(input_cols)
+
+    # Order the rows as the per-host-type path outputs them: grouped by host
+    # type, and within each known host type by sample type, each in order of
+    # first appearance (samples of unknown host types stay in input order).
+    row_order = _get_extension_row_order(
+        metadata_df[HOSTTYPE_SHORTHAND_KEY],
+        metadata_df[SAMPLETYPE_SHORTHAND_KEY], hosts_config_dict)
+    output_df = metadata_df.take(row_order).reset_index(drop=True)
+
+    # Re-factorize on the ordered rows so the group codes follow output order
+    group_codes, group_pairs = pandas.MultiIndex.from_arrays(
+        [output_df[HOSTTYPE_SHORTHAND_KEY],
+         output_df[SAMPLETYPE_SHORTHAND_KEY]]).factorize()
+    num_groups = len(group_pairs)
+
+    # Work out, for each group, what it sets in which columns
+    group_plans = [_plan_group_metadata(host_type, sample_type,
+                                        hosts_config_dict, input_cols_set)
+                   for host_type, sample_type in group_pairs]
+    output_cols = list(input_cols)
+    for curr_plan in group_plans:
+        for curr_field_name in curr_plan.added_cols:
+            if curr_field_name not in output_cols:
+                output_cols.append(curr_field_name)
+    # next group
+
+    # per-group lookup tables, broadcast to the rows by taking on group codes
+    is_known = np.array([x.schema is not None for x in group_plans],
+                        dtype=bool)[group_codes]
+    reqs_vals = _broadcast(
+        [x.reqs_val for x in group_plans], group_codes)
+    reqs_isna = pandas.isna(reqs_vals)
+    host_default_vals = _broadcast(
+        [x.host_default for x in group_plans], group_codes)
+    has_host_default = np.array(
+        [bool(x.host_default) for x in group_plans], dtype=bool)[group_codes]
+
+    compact_added_cols = \
+        full_flat_config_dict.get(COMPACT_DEFAULT_COLS_KEY, False)
+    new_cols = {}
+    for curr_col in output_cols:
+        mode_table = np.zeros(num_groups, dtype=np.int8)
+        val_table = np.full(num_groups, np.nan, dtype=object)
+        for curr_group, curr_plan in enumerate(group_plans):
+            curr_setting = curr_plan.settings.get(curr_col)
+            if curr_setting is not None:
+                mode_table[curr_group], val_table[curr_group] = curr_setting
+        # next group
+
+        if curr_col not in input_cols_set:
+            # samples only get values in the added columns their own config
+            # adds, so those hold one value per group: work it out once per
+            # group and take it (or, if compact, its code) over the rows
+            group_vals = _get_added_col_group_vals(
+                mode_table, val_table, group_plans)
+            if compact_added_cols:
+                group_val_codes, uniques = pandas.factorize(group_vals)
+                new_cols[curr_col] = pandas.Series(
+                    pandas.Categorical.from_codes(
+                        group_val_codes[group_codes],
+                        categories=pandas.Index(uniques)),
+                    name=curr_col)
+            else:
+                new_cols[curr_col] = pandas.Series(
+                    group_vals[group_codes], name=curr_col)
+            continue
+        # endif added column
+
+        # samples of known host+sample types can have any blanks in the
+        # input columns filled, and have placeholders in them replaced
+        modes = mode_table[group_codes]
+        input_col = output_df[curr_col]
+        col_isna = input_col.isna().to_numpy(copy=True)
+        is_placeholder = is_known & \
+            (input_col == REQ_PLACEHOLDER).to_numpy(dtype=bool)
+        if not modes.any() and not is_placeholder.any() and \
+                not (col_isna & is_known & has_host_default).any():
+            continue
+        col_vals = input_col.to_numpy(dtype=object, copy=True)
+
+        # the values set are per group, so whether they are NaN or
+        # placeholders is too; no need to check the column again
+        set_mask = (modes == _SET_ALL) | ((modes == _SET_NANS) & col_isna)
+        if set_mask.any():
+            set_groups = group_codes[set_mask]
+            col_vals[set_mask] = val_table[set_groups]
+            col_isna[set_mask] = pandas.isna(val_table)[set_groups]
+            is_placeholder[set_mask] = \
+                (val_table == REQ_PLACEHOLDER)[set_groups] & is_known[set_mask]
+
+        # replace placeholders for required fields with either an indicator
+        # that they should be blank or NaN (filled with the default below)
+        col_vals[is_placeholder] = reqs_vals[is_placeholder]
+        col_isna[is_placeholder] = reqs_isna[is_placeholder]
+
+        # fill NAs with the host type's default value, if any is set
+        fill_mask = is_known & has_host_default & col_isna
+        col_vals[fill_mask] = host_default_vals[fill_mask]
+
+        # as when setting values in an existing column: string columns stay
+        # string columns, others (e.g. all-NaN float columns) become object
+        # columns
+        new_cols[curr_col] = pandas.Series(
+            col_vals, name=curr_col,
+            dtype=_get_filled_dtype(output_df[curr_col]))
+    # next column
+
+    for curr_col, curr_series in new_cols.items():
+        output_df[curr_col] = curr_series
+    output_df = output_df[output_cols]
+
+    # validate the samples of each known host+sample type against the
+    # requirements for that host+sample type, on the columns they would have
+    # had if processed on their own
+    validation_tasks = []
+    metadata_fields_dicts = []
+    group_rows = np.argsort(group_codes, kind="stable")
+    group_bounds = np.cumsum(
+        np.bincount(group_codes, minlength=num_groups))
+    for curr_group, curr_plan in enumerate(group_plans):
+        if curr_plan.schema is None:
+            continue
+        start = group_bounds[curr_group - 1] if curr_group > 0 else 0
+        curr_rows = group_rows[start:group_bounds[curr_group]]
+        curr_cols = input_cols + curr_plan.added_cols
+        group_idx = len(metadata_fields_dicts)
+        metadata_fields_dicts.append(curr_plan.schema.metadata_fields_dict)
+        # validation is row by row, so a large group can be validated in
+        # blocks of rows
+        for start, stop in _get_row_blocks(len(curr_rows), num_workers):
+            validation_tasks.append(
+                (output_df.iloc[curr_rows[start:stop]][curr_cols],
+                 group_idx))
+        # next block of rows
+    # next group
+
+    validation_msgs = []
+    for curr_validation_msgs in _map_in_batches(
+            _validate_group_block, validation_tasks,
+            [len(x[0]) for x in validation_tasks], num_workers,
+            shared_args=(metadata_fields_dicts,)):
+        validation_msgs.extend(curr_validation_msgs)
+
+    # as in _generate_metadata_for_host_types
+    _finalize_metadata_df(
+        output_df, full_flat_config_dict,
+        _get_leave_blank_cols(group_plans, input_cols_set))
     return output_df, validation_msgs
 
 
+def _get_extension_row_order(
+        host_types: pandas.Series,
+        sample_types: pandas.Series,
+        hosts_config_dict: Dict[str, Any]) -> np.ndarray:
+    # the positions of the rows in the order generation outputs them
+    host_codes, unique_host_types = pandas.factorize(host_types)
+    pair_codes, _ = pandas.MultiIndex.from_arrays(
+        [host_types, sample_types]).factorize()
+    host_is_known = np.array(
+        [x in hosts_config_dict for x in unique_host_types], dtype=bool)
+    sample_order = np.where(host_is_known[host_codes], pair_codes, -1)
+    return np.lexsort((sample_order, host_codes))
+
+
+# how a group's setting for a column is applied (see _plan_group_metadata)
+_NOT_SET = 0
+_SET_ALL = 1
+_SET_NANS = 2
+
+
+class _GroupPlan:
+    """What extension does to the samples of one (host type, sample type).
+
+    Attributes
+    ----------
+    schema : Optional[SampleTypeSchema]
+        The compiled metadata fields of the host+sample type, or None if the
+        host type or sample type is not in the config.
+    settings : Dict[str, Tuple[int, Any]]
+        Column name to (how the value is applied, value).
+    added_cols : List[str]
+        Names of the columns, not already in the metadata, that are set,
+        in order.
+    reqs_val : Any
+        What placeholders for required fields are replaced with.
+    host_default : Any
+        The host type's default value for blank fields, if any.
+    """
+
+    __slots__ = ("schema", "settings", "added_cols", "reqs_val",
+                 "host_default")
+
+    def __init__(self):
+        self.schema = None
+        self.settings = {}
+        self.added_cols = []
+        self.reqs_val = np.nan
+        self.host_default = None
+
+
+def _plan_group_metadata(
+        host_type: str, sample_type: str,
+        hosts_config_dict: Dict[str, Any],
+        input_cols: Set[str]) -> _GroupPlan:
+    plan = _GroupPlan()
+    if host_type not in hosts_config_dict:
+        plan.settings[QC_NOTE_KEY] = (_SET_ALL, "invalid host_type")
+    else:
+        host_type_config_dict = hosts_config_dict[host_type]
+        host_sample_types_config_dict = \
+            host_type_config_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY]
+        if sample_type not in host_sample_types_config_dict:
+            plan.settings[QC_NOTE_KEY] = (_SET_ALL, "invalid sample_type")
+        else:
+            plan.schema = compile_metadata_fields(
+                host_sample_types_config_dict[sample_type].get(
+                    METADATA_FIELDS_KEY, {}))
+            set_existing = _SET_ALL \
+                if host_type_config_dict[OVERWRITE_NON_NANS_KEY] else _SET_NANS
+            # as in _update_metadata_from_metadata_fields_dict
+            for curr_field_spec in plan.schema.fields:
+                curr_field_name = curr_field_spec.name
+                is_input_col = curr_field_name in input_cols
+                if curr_field_spec.has_default:
+                    curr_val = curr_field_spec.default
+                    curr_val = str(curr_val) if pandas.notna(curr_val) \
+                        else curr_val
+                    plan.settings[curr_field_name] = \
+                        (set_existing if is_input_col else _SET_ALL, curr_val)
+                elif curr_field_spec.required and not is_input_col:
+                    plan.settings[curr_field_name] = \
+                        (_SET_ALL, REQ_PLACEHOLDER)
+            # next field
+
+            if host_type_config_dict[LEAVE_REQUIREDS_BLANK_KEY]:
+                plan.reqs_val = LEAVE_BLANK_VAL
+            plan.host_default = host_type_config_dict.get(DEFAULT_KEY)
+        # endif sample type is valid
+    # endif host type is valid
+
+    plan.added_cols = [x for x in plan.settings if x not in input_cols]
+    return plan
+
+
+def _get_filled_dtype(col: pandas.Series) -> Any:
+    # filling blanks in a column with strings leaves string columns as they
+    # are but turns any others into object columns
+    return col.dtype if isinstance(col.dtype, pandas.StringDtype) else object
+
+
+def _broadcast(group_vals: List[Any], group_codes: np.ndarray) -> np.ndarray:
+    group_vals_arr = np.empty(len(group_vals), dtype=object)
+    group_vals_arr[:] = group_vals
+    return group_vals_arr[group_codes]
+
+
+def _get_added_col_group_vals(
+        mode_table: np.ndarray,
+        val_table: np.ndarray,
+        group_plans: List[_GroupPlan]) -> np.ndarray:
+    # the per-group equivalent of filling an input column in
+    # _generate_metadata_for_host_types_by_group: an added column starts
+    # out NaN, so a group that sets it sets it everywhere
+    group_vals = val_table.copy()
+    for curr_group, curr_plan in enumerate(group_plans):
+        if mode_table[curr_group] == _NOT_SET:
+            continue
+        curr_val = group_vals[curr_group]
+        if curr_plan.schema is not None and \
+                not pandas.isna(curr_val) and curr_val == REQ_PLACEHOLDER:
+            curr_val = curr_plan.reqs_val
+        if pandas.isna(curr_val) and curr_plan.host_default:
+            curr_val = curr_plan.host_default
+        group_vals[curr_group] = curr_val
+    # next group
+    return group_vals
+
+
+def _compact_cols(
+        metadata_df: pandas.DataFrame, col_names: List[str]) -> None:
+    # turn columns into categoricals (see COMPACT_DEFAULT_COLS_KEY), with
+    # the categories in order of first appearance
+    for curr_col in col_names:
+        val_codes, uniques = pandas.factorize(metadata_df[curr_col])
+        metadata_df[curr_col] = pandas.Categorical.from_codes(
+            val_codes, categories=uniques)
+    # next column
+
+
+def _get_leave_blank_cols(
+        group_plans: List[_GroupPlan],
+        input_cols: Set[str]) -> Optional[Set[str]]:
+    # after generation, LEAVE_BLANK_VAL may be in any input column and in
+    # any added column a group sets to it, directly or by leaving a required
+    # field blank; a host type default of LEAVE_BLANK_VAL may put it anywhere
+    leave_blank_cols = set(input_cols)
+    for curr_plan in group_plans:
+        if curr_plan.host_default == LEAVE_BLANK_VAL:
+            return None
+        for curr_col, (_, curr_val) in curr_plan.settings.items():
+            if curr_val == REQ_PLACEHOLDER:
+                curr_val = curr_plan.reqs_val
+            if curr_val == LEAVE_BLANK_VAL:
+                leave_blank_cols.add(curr_col)
+        # next column the group sets
+    # next group
+    return leave_blank_cols
+
+
 def _generate_metadata_for_a_host_type(
         metadata_df: pandas.DataFrame,
         a_host_type: str,
@@ -1044,15 +2530,21 @@ def _generate_metadata_for_a_sample_type_in_a_host_type(
 
         # for fields that are required but not yet filled, replace the placeholder with
         # either an indicator that it should be blank or else
-        # fill with NA (replaced with default just below), based on config setting
+        # with the default value (as for NAs), based on config setting
+        host_default = a_host_type_config_dict.get(DEFAULT_KEY) or None
         leave_reqs_blank = a_host_type_config_dict[LEAVE_REQUIREDS_BLANK_KEY]
-        reqs_val = LEAVE_BLANK_VAL if leave_reqs_blank else np.nan
-        sample_type_df.replace(
-            to_replace=REQ_PLACEHOLDER, value=reqs_val, inplace=True)
+        reqs_val = LEAVE_BLANK_VAL if leave_reqs_blank \
+            else (host_default or np.nan)
+
+        # placeholders can only be in the columns just added for required
+        # fields (or, in principle, in the input columns)
+        schema = compile_metadata_fields(full_sample_type_metadata_fields_dict)
+        placeholder_cols = set(host_type_metadata_df.columns).union(
+            x.name for x in schema.fields if x.required and not x.has_default)
 
         # fill NAs with appropriate default value if any is set
-        sample_type_df = _fill_na_if_default(
-            sample_type_df, a_host_type_config_dict)
+        _replace_sentinels(sample_type_df, host_default,
+                           {REQ_PLACEHOLDER: reqs_val}, placeholder_cols)
 
         # validate the metadata df based on the specific requirements
         # for this host+sample type
@@ -1121,7 +2613,9 @@ def _update_metadata_from_metadata_fields_dict(
     output_df = metadata_df.copy()
 
     # loop through each metadata field in the metadata fields dict
-    for curr_field_name, curr_field_vals_dict in metadata_fields_dict.items():
+    schema = compile_metadata_fields(metadata_fields_dict)
+    for curr_field_spec in schema.fields:
+        curr_field_name = curr_field_spec.name
         # if the field has a default value (regardless of whether it is
         # required), update the metadata df with it (this includes adding the
         # field if it does not already exist). For existing fields, what exactly
@@ -1130,16 +2624,14 @@ def _update_metadata_from_metadata_fields_dict(
         # if overwrite_non_nans is False, then only NA values will be updated
         # if the field already exists in the metadata; otherwise, the field
         # will be added to the metadata with the default value throughout.
-        if DEFAULT_KEY in curr_field_vals_dict:
-            curr_default_val = curr_field_vals_dict[DEFAULT_KEY]
+        if curr_field_spec.has_default:
             update_metadata_df_field(
-                output_df, curr_field_name, curr_default_val,
+                output_df, curr_field_name, curr_field_spec.default,
                 overwrite_non_nans=overwrite_non_nans)
         # if the field is required BUT has no default value, then if the field does not
         # already exist in the metadata, add the field to the metadata with a placeholder value.
-        elif REQUIRED_KEY in curr_field_vals_dict:
-            curr_required_val = curr_field_vals_dict[REQUIRED_KEY]
-            if curr_required_val and curr_field_name not in output_df:
+        elif curr_field_spec.required:
+            if curr_field_name not in output_df:
                 update_metadata_df_field(
                     output_df, curr_field_name, REQ_PLACEHOLDER,
                     overwrite_non_nans=overwrite_non_nans)
@@ -1149,32 +2641,157 @@ def _update_metadata_from_metadata_fields_dict(
     return output_df
 
 
-# fill NAs with default value if any is set
-def _fill_na_if_default(
+def _replace_sentinels(
         metadata_df: pandas.DataFrame,
-        settings_dict: Dict[str, Any]) -> pandas.DataFrame:
-    """Fill NaN values in metadata df with default values if available.
+        fill_val: Any,
+        replacements: Dict[str, Any],
+        sentinel_cols: Optional[Set[str]] = None) -> None:
+    """Fill NaNs and replace sentinel values in a single pass over the columns.
+
+    Each column is checked once for NaNs and, if it can hold strings, for
+    each sentinel value, and only columns with something to change are
+    rewritten. Filled string columns stay string columns; other filled
+    columns become object columns. Compact (categorical) columns are
+    changed in their categories and stay categorical.
 
     Parameters
     ----------
     metadata_df : pandas.DataFrame
-        The metadata DataFrame to process.
-    settings_dict : Dict[str, Any]
-        Dictionary containing settings.
+        The metadata DataFrame to process. Modified in place.
+    fill_val : Any
+        Value to fill NaNs with, or None to leave them as they are.
+    replacements : Dict[str, Any]
+        Dictionary of sentinel value to the value that replaces it.
+    sentinel_cols : Optional[Set[str]], default=None
+        Names of the only columns that may hold sentinel values, or None if
+        any column may.
+    """
+    for curr_col in metadata_df.columns:
+        col = metadata_df[curr_col]
+        if isinstance(col.dtype, pandas.CategoricalDtype):
+            may_hold_sentinels = \
+                sentinel_cols is None or curr_col in sentinel_cols
+            new_col = _replace_sentinels_in_categories(
+                col, fill_val, replacements if may_hold_sentinels else {})
+            if new_col is not None:
+                metadata_df[curr_col] = new_col
+            continue
+        # endif compact column
+
+        masks_and_vals = []
+        if fill_val is not None:
+            # TODO: this is setting a value in the output; should it be
+            #  centralized so it is easy to find?
+            col_isna = col.isna().to_numpy()
+            if col_isna.any():
+                masks_and_vals.append((col_isna, fill_val))
+
+        if (sentinel_cols is None or curr_col in sentinel_cols) and \
+                (col.dtype == object or
+                 isinstance(col.dtype, pandas.StringDtype)):
+            for sentinel, new_val in replacements.items():
+                is_sentinel = (col == sentinel).to_numpy(dtype=bool)
+                if is_sentinel.any():
+                    masks_and_vals.append((is_sentinel, new_val))
+            # next sentinel
+        # endif column may hold sentinels
+
+        if not masks_and_vals:
+            continue
+        col_vals = col.to_numpy(dtype=object, copy=True)
+        for curr_mask, curr_val in masks_and_vals:
+            col_vals[curr_mask] = curr_val
+        metadata_df[curr_col] = pandas.Series(
+            col_vals, index=col.index, dtype=_get_filled_dtype(col))
+    # next column
+
+
+def _replace_sentinels_in_categories(
+        col: pandas.Series,
+        fill_val: Any,
+        replacements: Dict[str, Any]) -> Optional[pandas.Series]:
+    # as _replace_sentinels, but on a categorical column's distinct values;
+    # returns None if nothing changes
+    cat_vals = col.cat.categories.to_numpy(dtype=object, copy=True)
+    codes = col.cat.codes.to_numpy()
+    is_changed = False
+    for sentinel, new_val in replacements.items():
+        is_sentinel = cat_vals == sentinel
+        if is_sentinel.any():
+            cat_vals[is_sentinel] = new_val
+            is_changed = True
+    # next sentinel
+
+    if fill_val is not None:
+        col_isna = codes < 0
+        if col_isna.any():
+            codes = np.where(col_isna, len(cat_vals), codes)
+            cat_vals = np.append(cat_vals, np.array([fill_val], dtype=object))
+            is_changed = True
+    # endif filling NaNs
+
+    if not is_changed:
+        return None
+    # replacing can make categories equal to each other (or NaN), so
+    # re-factorize them and remap the codes
+    cat_codes, uniques = pandas.factorize(cat_vals)
+    codes = np.where(codes < 0, -1, cat_codes[codes])
+    return pandas.Series(
+        pandas.Categorical.from_codes(
+            codes, categories=pandas.Index(uniques)),
+        index=col.index, name=col.name)
+
+
+def _finalize_metadata_df(
+        metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any],
+        leave_blank_cols: Optional[Set[str]]) -> None:
+    """Fill NaNs with the general default and turn LEAVE_BLANK_VAL into blanks.
 
-    Returns
-    -------
-    pandas.DataFrame
-        The updated DataFrame with NaN values filled. Unchanged if no default values are set.
+    Concatenating the metadata of different host+sample types can create
+    large numbers of NaNs--for example, where a control sample has no values
+    for any of the host-related columns. Those are filled with whatever the
+    general default is, after which LEAVE_BLANK_VAL (including as the
+    default) is replaced with an empty string, all in one pass.
+
+    Parameters
+    ----------
+    metadata_df : pandas.DataFrame
+        The generated metadata DataFrame. Modified in place.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+    leave_blank_cols : Optional[Set[str]]
+        Names of the only columns that may hold LEAVE_BLANK_VAL, or None if
+        any column may (see _get_leave_blank_cols).
     """
-    default_val = settings_dict.get(DEFAULT_KEY)
-    if default_val:
-        # TODO: this is setting a value in the output; should it be
-        #  centralized so it is easy to find?
-        metadata_df = \
-            metadata_df.fillna(default_val)
+    default_val = full_flat_config_dict.get(DEFAULT_KEY) or None
+    if default_val == LEAVE_BLANK_VAL:
+        default_val = ""
+    _replace_sentinels(
+        metadata_df, default_val, {LEAVE_BLANK_VAL: ""}, leave_blank_cols)
 
-    return metadata_df
+
+def _append_df_to_file(
+        a_df: pandas.DataFrame,
+        out_fp: str,
+        sep: str,
+        file_started: bool) -> None:
+    """Write a DataFrame to a new file, or append it (without header) to one already started.
+
+    Parameters
+    ----------
+    a_df : pandas.DataFrame
+        The DataFrame to write.
+    out_fp : str
+        Path of the output file.
+    sep : str
+        Separator to use in the output file.
+    file_started : bool
+        Whether out_fp has already been written to (by this function, with a
+        DataFrame with the same columns).
+    """
+    a_df.to_csv(out_fp, sep=sep, index=False, header=not file_started,
+                mode="a" if file_started else "w")
 
 
 def _write_df_to_file(
@@ -1304,11 +2921,33 @@ def _reorder_df(a_df: pandas.DataFrame, internal_col_names: List[str]) -> pandas
             - remaining columns except for internal columns in alphabetical order
             - internal columns at the end in the order they were provided
     """
+    col_names = _get_reordered_col_names(a_df.columns, internal_col_names)
+    output_df = a_df.loc[:, col_names].copy()
+    return output_df
+
+
+def _get_reordered_col_names(
+        col_names: List[str], internal_col_names: List[str]) -> List[str]:
+    """Get column names in the order _reorder_df puts them in.
+
+    Parameters
+    ----------
+    col_names : List[str]
+        The column names to order.
+    internal_col_names : List[str]
+        List of internal column names that will be moved to the end.
+
+    Returns
+    -------
+    List[str]
+        sample_name, then the remaining column names except for internal
+        ones in alphabetical order, then the internal column names in the
+        order they were provided.
+    """
     # sort columns alphabetically
-    working_df = a_df.copy().reindex(sorted(a_df.columns), axis=1)
+    col_names = sorted(col_names)
 
     # move the internal columns to the end of the list of cols to output
-    col_names = list(working_df)
     for curr_internal_col_name in internal_col_names:
         # TODO: throw an error if the internal col name is not present
         col_names.pop(col_names.index(curr_internal_col_name))
@@ -1316,8 +2955,7 @@ def _reorder_df(a_df: pandas.DataFrame, internal_col_names: List[str]) -> pandas
 
     # move sample name to the first column
     col_names.insert(0, col_names.pop(col_names.index(SAMPLE_NAME_KEY)))
-    output_df = working_df.loc[:, col_names].copy()
-    return output_df
+    return col_names
 
 
 def _load_metadata_df(raw_metadata_fp: str) -> pandas.DataFrame:
@@ -1358,7 +2996,9 @@ def _extend_metadata_from_full_flat_config(
         full_flat_config_dict: Dict[str, Any],
         study_specific_transformers_dict: Optional[Dict[str, Any]],
         hosttype_col_name: Optional[str],
-        sampletype_col_name: Optional[str]) -> Tuple[pandas.DataFrame, pandas.DataFrame, Dict[str, str]]:
+        sampletype_col_name: Optional[str],
+        generated_col_names: Optional[Set[str]] = None,
+        n_jobs: Optional[int] = None) -> Tuple[pandas.DataFrame, pandas.DataFrame, Dict[str, str]]:
     """Resolve shorthand columns and populate a metadata DataFrame using a full flat config.
 
     The metadata df must have metameq-specific host- and sample-type-shorthand columns,
@@ -1387,6 +3027,13 @@ def _extend_metadata_from_full_flat_config(
         ``sampletype_shorthand`` column before processing. If None, the
         function checks the config's ``sampletype_col_options`` list for
         a matching column in the DataFrame.
+    generated_col_names : Optional[Set[str]], default=None
+        If raw_metadata_df is one chunk of a larger whole, the names of the
+        columns that host- and sample-type-specific generation adds for the
+        whole (see _populate_metadata_df).
+    n_jobs : Optional[int], default=None
+        Number of worker processes to extend the metadata in (see
+        extend_metadata_df).
 
     Returns
     -------
@@ -1423,6 +3070,397 @@ def _extend_metadata_from_full_flat_config(
 
     metadata_df, validation_msgs_df = _populate_metadata_df(
         raw_metadata_df, full_flat_config_dict,
-        study_specific_transformers_dict)
+        study_specific_transformers_dict, generated_col_names, n_jobs)
 
     return metadata_df, validation_msgs_df, col_name_mapping
+
+
+def _extend_metadata_incrementally(
+        raw_metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any],
+        study_specific_transformers_dict: Optional[Dict[str, Any]],
+        previous_metadata_df: Optional[pandas.DataFrame],
+        previous_validation_msgs_df: Optional[pandas.DataFrame],
+        previous_manifest_df: Optional[pandas.DataFrame],
+        hosttype_col_name: Optional[str],
+        sampletype_col_name: Optional[str],
+        n_jobs: Optional[int] = None
+) -> Tuple[pandas.DataFrame, pandas.DataFrame, pandas.DataFrame]:
+    """Extend a metadata DataFrame, reusing unchanged rows of a previous extension.
+
+    See extend_metadata_df_incrementally. The rows to extend again are
+    extended as one chunk of the whole (see _write_extended_metadata_in_chunks),
+    so they get the columns and values they would have had if extended with
+    the rest; the rest are taken from the previous extended metadata.
+
+    Parameters
+    ----------
+    raw_metadata_df : pandas.DataFrame
+        The raw metadata DataFrame to extend.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+    study_specific_transformers_dict : Optional[Dict[str, Any]]
+        Dictionary of custom transformers for this study (only).
+    previous_metadata_df : Optional[pandas.DataFrame]
+        The extended metadata DataFrame of the previous extension, or None.
+    previous_validation_msgs_df : Optional[pandas.DataFrame]
+        The validation messages DataFrame of the previous extension, or None.
+    previous_manifest_df : Optional[pandas.DataFrame]
+        The manifest of the previous extension, or None.
+    hosttype_col_name : Optional[str]
+        Name of the column that contains host type values (see
+        _extend_metadata_from_full_flat_config).
+    sampletype_col_name : Optional[str]
+        Name of the column that contains sample type values (see
+        _extend_metadata_from_full_flat_config).
+    n_jobs : Optional[int], default=None
+        Number of worker processes to extend the changed rows in (see
+        extend_metadata_df).
+
+    Returns
+    -------
+    Tuple[pandas.DataFrame, pandas.DataFrame, pandas.DataFrame]
+        A tuple containing:
+            - The extended metadata DataFrame
+            - A DataFrame containing validation messages
+            - The manifest of this extension
+
+    Raises
+    ------
+    ValueError
+        If the config's pre-transformers set the host or sample type
+        shorthand columns, if the previous results do not match each
+        other, or for any of the reasons extend_metadata_df does.
+    """
+    # the rows' host+sample types must be known before any of them are
+    # extended, as for extending in chunks
+    for target_field in _get_pre_transformer_targets(full_flat_config_dict):
+        if target_field in (HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY):
+            raise ValueError(
+                f"Metadata cannot be extended incrementally when a "
+                f"pre-transformer sets '{target_field}'")
+    type_cols = []
+    for curr_internal_key, curr_param_key, curr_options_key in \
+            [(HOSTTYPE_SHORTHAND_KEY, hosttype_col_name,
+              HOSTTYPE_COL_OPTIONS_KEY),
+             (SAMPLETYPE_SHORTHAND_KEY, sampletype_col_name,
+              SAMPLETYPE_COL_OPTIONS_KEY)]:
+        specified_name = _find_internal_col_source_name(
+            raw_metadata_df, full_flat_config_dict,
+            curr_param_key, curr_internal_key, curr_options_key)
+        type_cols.append(specified_name or curr_internal_key)
+    validate_required_columns_exist(
+        raw_metadata_df, REQUIRED_RAW_METADATA_FIELDS[:1] + type_cols,
+        "metadata missing required columns")
+    # as _catch_nan_required_fields sets them
+    host_types = raw_metadata_df[type_cols[0]].fillna("empty")
+    sample_types = raw_metadata_df[type_cols[1]].fillna("empty")
+    row_pairs = list(zip(host_types, sample_types))
+    host_sample_pairs = set(row_pairs)
+
+    output_cols_index = OutputColsIndex(
+        full_flat_config_dict, host_sample_pairs)
+    generated_col_names = set()
+    for curr_pair in host_sample_pairs:
+        generated_col_names.update(
+            output_cols_index.output_cols_by_pair.get(curr_pair, ()))
+
+    # a row can be reused if its contents and everything that determines how
+    # it is extended are as they were
+    row_hashes = pandas.util.hash_pandas_object(
+        raw_metadata_df, index=False).to_numpy()
+    whole_fingerprint = _get_whole_fingerprint(
+        raw_metadata_df, full_flat_config_dict,
+        study_specific_transformers_dict, generated_col_names)
+    transformers_dict = \
+        full_flat_config_dict.get(METADATA_TRANSFORMERS_KEY) or {}
+    hosts_config_dict = full_flat_config_dict[HOST_TYPE_SPECIFIC_METADATA_KEY]
+    schema_fingerprints_by_pair = {
+        x: _get_schema_fingerprint(whole_fingerprint, x, hosts_config_dict)
+        for x in host_sample_pairs}
+    row_schema_fingerprints = np.array(
+        [schema_fingerprints_by_pair[x] for x in row_pairs], dtype=object)
+
+    num_rows = len(raw_metadata_df)
+    previous_rows = _match_previous_rows(
+        raw_metadata_df, row_hashes, row_schema_fingerprints,
+        previous_metadata_df, previous_validation_msgs_df,
+        previous_manifest_df)
+    is_reused = previous_rows >= 0
+    reused_rows = np.flatnonzero(is_reused)
+    recomputed_rows = np.flatnonzero(~is_reused)
+    logger.info(f"Reused {len(reused_rows)} and recomputed "
+                f"{len(recomputed_rows)} of {num_rows} rows")
+
+    part_dfs = []
+    validation_msgs_dfs = []
+    # generated columns the reused rows didn't have before
+    new_col_names = set()
+    if len(reused_rows) > 0:
+        new_col_names = \
+            generated_col_names - set(previous_metadata_df.columns)
+        reused_df = _reindex_reused_rows(
+            previous_metadata_df.iloc[previous_rows[reused_rows]],
+            raw_metadata_df.columns, generated_col_names,
+            transformers_dict, full_flat_config_dict)
+        part_dfs.append(reused_df.assign(**{_INPUT_ROW_KEY: reused_rows}))
+        reused_names = raw_metadata_df[SAMPLE_NAME_KEY].iloc[reused_rows]
+        validation_msgs_dfs.append(previous_validation_msgs_df[
+            previous_validation_msgs_df[SAMPLE_NAME_KEY].isin(reused_names)])
+    if len(recomputed_rows) > 0:
+        recomputed_df = raw_metadata_df.iloc[recomputed_rows].copy()
+        recomputed_df[_INPUT_ROW_KEY] = recomputed_rows
+        extended_df, recomputed_msgs_df, _ = \
+            _extend_metadata_from_full_flat_config(
+                recomputed_df, full_flat_config_dict,
+                study_specific_transformers_dict,
+                hosttype_col_name, sampletype_col_name,
+                generated_col_names=generated_col_names, n_jobs=n_jobs)
+        part_dfs.append(extended_df)
+        validation_msgs_dfs.append(recomputed_msgs_df)
+    # endif any rows to recompute
+
+    if len(part_dfs) > 1 and \
+            set(part_dfs[0].columns) != set(part_dfs[1].columns):
+        raise ValueError("The previous extended metadata does not have the "
+                         "columns its manifest says it should")
+    # compact columns (see COMPACT_DEFAULT_COLS_KEY) with different
+    # categories would be concatenated as object columns, so expand them
+    # first and compact them again once the rows are in order
+    compact_cols = [
+        x for x in part_dfs[-1].columns if x != _INPUT_ROW_KEY and
+        any(isinstance(y[x].dtype, pandas.CategoricalDtype)
+            for y in part_dfs)]
+    if compact_cols:
+        part_dfs = [expand_compact_cols(x) for x in part_dfs]
+    metadata_df = pandas.concat(
+        [x[part_dfs[-1].columns] for x in part_dfs], ignore_index=True)
+    # a column the parts hold in different dtypes (say, str in one and
+    # object in another, for having fewer rows) is concatenated as object;
+    # unless the previous extension (of most of the rows) held it as object
+    # too, infer the dtype the whole column would have had
+    mixed_dtype_cols = [
+        x for x in metadata_df.columns
+        if len({y[x].dtype for y in part_dfs}) > 1 and
+        (part_dfs[0][x].dtype != object or x in new_col_names)]
+    if mixed_dtype_cols:
+        metadata_df[mixed_dtype_cols] = \
+            metadata_df[mixed_dtype_cols].infer_objects()
+
+    # put the rows in the order extending all of them at once would
+    input_rows = metadata_df.pop(_INPUT_ROW_KEY).to_numpy(dtype=np.int64)
+    output_rows = _get_extension_row_order(
+        host_types, sample_types, hosts_config_dict)
+    metadata_df = metadata_df.iloc[
+        np.argsort(input_rows)[output_rows]].reset_index(drop=True)
+    _compact_cols(metadata_df, compact_cols)
+
+    validation_msgs_df = pandas.concat(validation_msgs_dfs, ignore_index=True)
+    # as format_validation_msgs_as_df sorts them
+    validation_msgs_df.sort_values(
+        by=[SAMPLE_NAME_KEY, "field_name", "error_message"], inplace=True)
+    validation_msgs_df.reset_index(drop=True, inplace=True)
+
+    manifest_df = pandas.DataFrame({
+        ROW_HASH_KEY: row_hashes[output_rows],
+        SCHEMA_FINGERPRINT_KEY: row_schema_fingerprints[output_rows],
+        REUSED_KEY: is_reused[output_rows]})
+    return metadata_df, validation_msgs_df, manifest_df
+
+
+def _reindex_reused_rows(
+        reused_df: pandas.DataFrame,
+        raw_col_names: pandas.Index,
+        generated_col_names: Set[str],
+        transformers_dict: Dict[str, Any],
+        full_flat_config_dict: Dict[str, Any]) -> pandas.DataFrame:
+    """Give reused rows of a previous extension the columns of this one.
+
+    Generation adds a column to every row if it adds it for any host+sample
+    type in the metadata, so adding or removing the last row of a host+sample
+    type can change the columns of rows that are otherwise unchanged. Their
+    values in such columns don't depend on anything else (see
+    _add_missing_generated_cols), so reused rows are given the columns that
+    the whole now generates and lose those it no longer does, rather than
+    being extended again.
+
+    Parameters
+    ----------
+    reused_df : pandas.DataFrame
+        The reused rows of the previous extended metadata.
+    raw_col_names : pandas.Index
+        Names of the columns of the raw metadata being extended.
+    generated_col_names : Set[str]
+        Names of the columns generation adds for the raw metadata being
+        extended.
+    transformers_dict : Dict[str, Any]
+        The config's METADATA_TRANSFORMERS_KEY dictionary.
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary.
+
+    Returns
+    -------
+    pandas.DataFrame
+        The reused rows, with their columns ordered as by _reorder_df.
+    """
+    # the only columns an extension can add besides generated ones
+    kept_col_names = set(raw_col_names) | set(INTERNAL_COL_KEYS)
+    for curr_stage_dict in transformers_dict.values():
+        kept_col_names.update(curr_stage_dict or {})
+    dropped_col_names = [x for x in reused_df.columns
+                         if x not in kept_col_names and
+                         x not in generated_col_names]
+    if dropped_col_names:
+        reused_df = reused_df.drop(columns=dropped_col_names)
+    reused_df = _add_missing_generated_cols(
+        reused_df, generated_col_names, full_flat_config_dict)
+    return reused_df.loc[
+        :, _get_reordered_col_names(reused_df.columns, INTERNAL_COL_KEYS)]
+
+
+def _get_whole_fingerprint(
+        raw_metadata_df: pandas.DataFrame,
+        full_flat_config_dict: Dict[str, Any],
+        study_specific_transformers_dict: Optional[Dict[str, Any]],
+        generated_col_names: Set[str]) -> str:
+    # everything outside a row's own contents and host+sample type config
+    # that its extension depends on: the input columns, the generated
+    # columns that post-transformers read (since a transformer whose source
+    # fields are all missing is skipped), the top-level settings and
+    # transformers, and the metameq version. The rest of the generated
+    # columns are not included; see _reindex_reused_rows
+    transformers_dict = \
+        full_flat_config_dict.get(METADATA_TRANSFORMERS_KEY) or {}
+    post_source_col_names = set()
+    for curr_def in (transformers_dict.get(POST_TRANSFORMERS_KEY)
+                     or {}).values():
+        post_source_col_names.update(curr_def.get(SOURCES_KEY) or [])
+    transformer_funcs = {
+        k: _get_transformer_token(v)
+        for k, v in (study_specific_transformers_dict or {}).items()}
+    return get_fingerprint([
+        [str(x) for x in raw_metadata_df.columns],
+        [str(x) for x in raw_metadata_df.dtypes],
+        sorted(generated_col_names & post_source_col_names),
+        {k: v for k, v in full_flat_config_dict.items()
+         if k != HOST_TYPE_SPECIFIC_METADATA_KEY},
+        transformer_funcs,
+        get_versions()["version"]])
+
+
+def _get_transformer_token(func: Callable) -> List[Any]:
+    # identify a custom transformer by its code, so that editing it changes
+    # the fingerprint, rather than only by its name. A callable without code
+    # of its own (e.g. a functools.partial) is identified by its repr, which
+    # usually holds an address, and so is rarely matched and rows using it
+    # are extended again
+    token = [f"{getattr(func, '__module__', None)}."
+             f"{getattr(func, '__qualname__', None)}"]
+    curr_funcs = [func]
+    vectorized_func = transformers.get_vectorized_version(func)
+    if vectorized_func is not None and vectorized_func is not func:
+        curr_funcs.append(vectorized_func)
+    for curr_func in curr_funcs:
+        code = getattr(curr_func, "__code__", None)
+        if code is None:
+            token.append(repr(curr_func))
+            continue
+        closure_vals = []
+        for curr_cell in getattr(curr_func, "__closure__", None) or ():
+            try:
+                closure_vals.append(repr(curr_cell.cell_contents))
+            except ValueError:
+                # the cell is empty
+                closure_vals.append(None)
+        # next closure cell
+        token.append([_get_code_token(code),
+                      repr(getattr(curr_func, "__defaults__", None)),
+                      repr(getattr(curr_func, "__kwdefaults__", None)),
+                      closure_vals])
+    # next function
+    return token
+
+
+def _get_code_token(code: types.CodeType) -> List[Any]:
+    consts = []
+    for curr_const in code.co_consts:
+        if isinstance(curr_const, types.CodeType):
+            # e.g. a nested function or comprehension, whose repr holds an
+            # address
+            consts.append(_get_code_token(curr_const))
+        elif isinstance(curr_const, frozenset):
+            # set literals are compiled to frozensets, whose repr order
+            # varies between processes
+            consts.append(sorted(repr(x) for x in curr_const))
+        else:
+            consts.append(repr(curr_const))
+    # next constant
+    return [code.co_code.hex(), consts, list(code.co_names)]
+
+
+def _get_schema_fingerprint(
+        whole_fingerprint: str,
+        host_sample_pair: Tuple[str, str],
+        hosts_config_dict: Dict[str, Any]) -> str:
+    host_type, sample_type = host_sample_pair
+    host_settings_dict = None
+    metadata_fields_dict = None
+    host_type_config_dict = hosts_config_dict.get(host_type)
+    if host_type_config_dict is not None:
+        host_settings_dict = {
+            k: v for k, v in host_type_config_dict.items()
+            if k not in (SAMPLE_TYPE_SPECIFIC_METADATA_KEY,
+                         METADATA_FIELDS_KEY)}
+        sample_types_config_dict = \
+            host_type_config_dict[SAMPLE_TYPE_SPECIFIC_METADATA_KEY]
+        if sample_type in sample_types_config_dict:
+            metadata_fields_dict = \
+                sample_types_config_dict[sample_type].get(
+                    METADATA_FIELDS_KEY, {})
+    # endif host type is known
+    return get_fingerprint(
+        [whole_fingerprint, host_settings_dict, metadata_fields_dict])
+
+
+def _match_previous_rows(
+        raw_metadata_df: pandas.DataFrame,
+        row_hashes: np.ndarray,
+        row_schema_fingerprints: np.ndarray,
+        previous_metadata_df: Optional[pandas.DataFrame],
+        previous_validation_msgs_df: Optional[pandas.DataFrame],
+        previous_manifest_df: Optional[pandas.DataFrame]) -> np.ndarray:
+    # the position in the previous extended metadata of the row that each
+    # row can reuse, or -1 if it must be extended again
+    previous_rows = np.full(len(raw_metadata_df), -1, dtype=np.int64)
+    previous_results = [previous_metadata_df, previous_validation_msgs_df,
+                        previous_manifest_df]
+    if all(x is None for x in previous_results):
+        return previous_rows
+    if any(x is None for x in previous_results):
+        raise ValueError("The previous extended metadata, validation "
+                         "messages and manifest must all be given, or none")
+    if len(previous_manifest_df) != len(previous_metadata_df):
+        raise ValueError("The previous manifest does not have a row for "
+                         "each row of the previous extended metadata")
+
+    previous_rows_by_key = {}
+    for previous_row, curr_key in enumerate(zip(
+            previous_manifest_df[ROW_HASH_KEY].to_numpy(dtype=np.uint64),
+            previous_manifest_df[SCHEMA_FINGERPRINT_KEY])):
+        previous_rows_by_key.setdefault(curr_key, []).append(previous_row)
+    # next previous row
+
+    # validation messages are only identified by sample name, so samples
+    # whose names are not unique are always extended again
+    sample_names = raw_metadata_df[SAMPLE_NAME_KEY]
+    is_name_unique = ~sample_names.duplicated(keep=False).to_numpy()
+    previous_names = previous_metadata_df[SAMPLE_NAME_KEY]
+    ambiguous_names = set(previous_names[previous_names.duplicated()])
+    for curr_row, curr_key in enumerate(
+            zip(row_hashes, row_schema_fingerprints)):
+        curr_previous_rows = previous_rows_by_key.get(curr_key)
+        if curr_previous_rows and is_name_unique[curr_row] and \
+                sample_names.iat[curr_row] not in ambiguous_names:
+            previous_rows[curr_row] = curr_previous_rows.pop(0)
+    # next row
+    return previous_rows
@@ -1,11 +1,218 @@
+import numpy as np
 import pandas
-from dateutil import parser
-from typing import Any, Dict, List, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 from datetime import datetime
 from metameq.src.util import cast_field_to_type
+from metameq.src.date_parse_cache import parse_date, parse_dates
+
+# attribute of a transformer function that holds its vectorized version, if
+# it has one (see vectorized_transformer)
+VECTORIZED_VERSION_ATTR = "vectorized_version"
+# attribute of a transformer function that is True if it is pure (see
+# pure_transformer)
+PURE_ATTR = "is_pure"
+# attribute of a transformer function that is True if it needs each row as a
+# full pandas.Series (see row_series_transformer)
+NEEDS_ROW_SERIES_ATTR = "needs_row_series"
+
+
+# transformer registration functions
+def vectorized_transformer(func: Callable) -> Callable:
+    """Register a transformer function as vectorized (column-at-a-time).
+
+    A vectorized transformer takes a DataFrame of the rows to transform,
+    rather than one row at a time, and returns their values as a Series (or
+    array-like) with one value per row, in the same order. It is otherwise
+    called as row-wise transformers are: with the source field names as its
+    second argument, only for the rows to be set, and only if there are any.
+    Use it as a decorator:
+
+        @vectorized_transformer
+        def transform_my_field(rows_df, source_fields):
+            return rows_df[source_fields[0]].str.upper()
+
+    Parameters
+    ----------
+    func : Callable
+        The vectorized transformer function.
+
+    Returns
+    -------
+    Callable
+        func, registered as vectorized.
+    """
+    setattr(func, VECTORIZED_VERSION_ATTR, func)
+    return func
+
+
+def get_vectorized_version(func: Callable) -> Optional[Callable]:
+    """Get the vectorized version of a transformer function, if it has one.
+
+    Parameters
+    ----------
+    func : Callable
+        A transformer function.
+
+    Returns
+    -------
+    Optional[Callable]
+        func itself if it is registered as vectorized (see
+        vectorized_transformer), the vectorized version of func if it is a
+        row-wise transformer that has one (as the built-in ones do), or None.
+    """
+    return getattr(func, VECTORIZED_VERSION_ATTR, None)
+
+
+def pure_transformer(func: Callable) -> Callable:
+    """Declare a row-wise transformer function pure.
+
+    A pure transformer's value for a row depends only on the row's values in
+    its source fields, and calling it has no side effects, so it need only
+    be called once for each distinct combination of source values (nulls
+    included); the result is used for every row that has that combination.
+    If it raises, it does so for the first offending row, as it would if
+    called on every row. Use it as a decorator:
+
+        @pure_transformer
+        def transform_my_field(row, source_fields):
+            return row[source_fields[0]].upper()
+
+    Parameters
+    ----------
+    func : Callable
+        The row-wise transformer function.
+
+    Returns
+    -------
+    Callable
+        func, declared pure.
+    """
+    setattr(func, PURE_ATTR, True)
+    return func
+
+
+def is_pure_transformer(func: Callable) -> bool:
+    """Check whether a transformer function is declared pure.
+
+    Parameters
+    ----------
+    func : Callable
+        A transformer function.
+
+    Returns
+    -------
+    bool
+        True if func is declared pure (see pure_transformer).
+    """
+    return getattr(func, PURE_ATTR, False)
+
+
+def row_series_transformer(func: Callable) -> Callable:
+    """Declare that a row-wise transformer function needs full row Series.
+
+    By default, a row-wise transformer is passed each row as a lightweight
+    read-only mapping of just the row's source field values (and with the
+    row's index label as its ``name``), which is much cheaper to make than
+    a pandas.Series of the whole row. A transformer that uses other fields
+    of the row, or Series methods, can opt out and be passed each row as a
+    full pandas.Series instead. Use it as a decorator:
+
+        @row_series_transformer
+        def transform_my_field(row, source_fields):
+            return row[source_fields].str.cat(sep="_")
+
+    Parameters
+    ----------
+    func : Callable
+        The row-wise transformer function.
+
+    Returns
+    -------
+    Callable
+        func, declared as needing full row Series.
+    """
+    setattr(func, NEEDS_ROW_SERIES_ATTR, True)
+    return func
+
+
+def needs_row_series(func: Callable) -> bool:
+    """Check whether a transformer function needs full row Series.
+
+    Parameters
+    ----------
+    func : Callable
+        A transformer function.
+
+    Returns
+    -------
+    bool
+        True if func is declared as needing each row as a full pandas.Series
+        (see row_series_transformer).
+    """
+    return getattr(func, NEEDS_ROW_SERIES_ATTR, False)
+
+
+def _with_vectorized_version(vectorized_func: Callable) -> Callable:
+    # decorator giving a row-wise transformer a vectorized version; the
+    # row-wise function itself is unchanged
+    def add_vectorized_version(func: Callable) -> Callable:
+        setattr(func, VECTORIZED_VERSION_ATTR, vectorized_func)
+        return func
+    return add_vectorized_version
+
+
+# vectorized versions of the individual transformer functions; each gives
+# the same values, and raises the same errors, as its row-wise version does
+# for the same rows
+def _pass_through_vectorized(
+        rows_df: pandas.DataFrame, source_fields: List[str]) -> pandas.Series:
+    return _get_one_source_col(rows_df, source_fields, "pass_through")
+
+
+def _transform_input_sex_to_std_sex_vectorized(
+        rows_df: pandas.DataFrame, source_fields: List[str]) -> pandas.Series:
+    source_col = _get_one_source_col(
+        rows_df, source_fields, "standardize_input_sex")
+    return _map_source_vals(source_col, standardize_input_sex)
+
+
+def _transform_age_to_life_stage_vectorized(
+        rows_df: pandas.DataFrame, source_fields: List[str]) -> pandas.Series:
+    source_col = _get_one_source_col(
+        rows_df, source_fields, "transform_age_to_life_stage")
+    return _map_source_vals(
+        source_col, lambda x: set_life_stage_from_age_yrs(x, source_fields[0]))
+
+
+def _transform_date_to_formatted_date_vectorized(
+        rows_df: pandas.DataFrame, source_fields: List[str]) -> pandas.Series:
+    source_col = _get_one_source_col(
+        rows_df, source_fields, "transform_date_to_formatted_date")
+    # parse the distinct date strings together (mostly vectorized) into the
+    # date parse cache, from which format_a_datetime then gets them
+    parse_dates(x for x in source_col.unique() if isinstance(x, str))
+    return _map_source_vals(
+        source_col, lambda x: format_a_datetime(x, source_fields[0]))
+
+
+def _transform_format_field_as_int_vectorized(
+        rows_df: pandas.DataFrame, source_fields: List[str]) -> pandas.Series:
+    source_col = _get_one_source_col(
+        rows_df, source_fields, "format_field_val")
+    return _map_source_vals(
+        source_col, lambda x: _format_val(x, int, '{0:d}'))
+
+
+def _transform_format_field_as_location_vectorized(
+        rows_df: pandas.DataFrame, source_fields: List[str]) -> pandas.Series:
+    source_col = _get_one_source_col(
+        rows_df, source_fields, "format_field_val")
+    return _map_source_vals(source_col, _format_location_val)
 
 
 # individual transformer functions
+@_with_vectorized_version(_pass_through_vectorized)
+@pure_transformer
 def pass_through(row: pandas.Series, source_fields: List[str]) -> Any:
     """Pass through a value from a source field without transformation.
 
@@ -29,6 +236,8 @@ def pass_through(row: pandas.Series, source_fields: List[str]) -> Any:
     return _get_one_source_field(row, source_fields, "pass_through")
 
 
+@_with_vectorized_version(_transform_input_sex_to_std_sex_vectorized)
+@pure_transformer
 def transform_input_sex_to_std_sex(row: pandas.Series, source_fields: List[str]) -> str:
     """Transform input sex value to standardized sex value.
 
@@ -56,6 +265,8 @@ def transform_input_sex_to_std_sex(row: pandas.Series, source_fields: List[str])
     return standardize_input_sex(x)
 
 
+@_with_vectorized_version(_transform_age_to_life_stage_vectorized)
+@pure_transformer
 def transform_age_to_life_stage(row: pandas.Series, source_fields: List[str]) -> str:
     """Transform age in years to life stage category.
 
@@ -86,6 +297,8 @@ def transform_age_to_life_stage(row: pandas.Series, source_fields: List[str]) ->
     return set_life_stage_from_age_yrs(x, source_fields[0])
 
 
+@_with_vectorized_version(_transform_date_to_formatted_date_vectorized)
+@pure_transformer
 def transform_date_to_formatted_date(row: pandas.Series, source_fields: List[str]) -> str:
     """Transform date to standardized format (YYYY-MM-DD HH:MM).
 
@@ -112,6 +325,8 @@ def transform_date_to_formatted_date(row: pandas.Series, source_fields: List[str
     return format_a_datetime(x, source_fields[0])
 
 
+@_with_vectorized_version(_transform_format_field_as_int_vectorized)
+@pure_transformer
 def transform_format_field_as_int(
         row: pandas.Series, source_fields: List[str]) -> str:
     """Transform a field to an integer format.
@@ -136,6 +351,8 @@ def transform_format_field_as_int(
     return _format_field_val(row, source_fields, int, '{0:d}')
 
 
+@_with_vectorized_version(_transform_format_field_as_location_vectorized)
+@pure_transformer
 def transform_format_field_as_location(row: pandas.Series, source_fields: List[str]) -> str:
     """Transform a field to a float format for a location (latitude, longitude, elevation).
 
@@ -157,12 +374,8 @@ def transform_format_field_as_location(row: pandas.Series, source_fields: List[s
         If source_fields does not contain exactly one field name.
     """
 
-    result = _format_field_val(row, source_fields, float, None)
-    # if the result is a string
-    if isinstance(result, str):
-        # Strip any trailing zeros and any subsequently unnecessary decimal point
-        result = result.rstrip('0').rstrip('.')
-    return result
+    x = _get_one_source_field(row, source_fields, "format_field_val")
+    return _format_location_val(x)
 
 
 def help_transform_mapping(
@@ -303,7 +516,7 @@ def format_a_datetime(x: Union[str, datetime, None], source_name: str = "input")
         strftimeable_x = x
     else:
         try:
-            strftimeable_x = parser.parse(x)
+            strftimeable_x = parse_date(x)
         except:  # noqa: E722
             raise ValueError(f"{source_name} cannot be parsed to a date")
 
@@ -406,7 +619,28 @@ def _format_field_val(row, source_fields, field_type, format_string=None):
         If source_fields does not contain exactly one field name.
     """
     x = _get_one_source_field(row, source_fields, "format_field_val")
+    return _format_val(x, field_type, format_string)
+
+
+def _format_val(x, field_type, format_string=None):
+    """Format a value by casting to a type and optionally applying a format string.
 
+    Parameters
+    ----------
+    x : Any
+        The value to format.
+    field_type : type
+        Type to cast the value to (e.g., int, float, bool).
+    format_string : str, optional
+        Format string to apply (e.g., '{0:d}', '{0:.2f}', '{0:.6g}').
+        Defaults to None.
+
+    Returns
+    -------
+    str
+        The formatted value as a string (see _format_field_val), or x itself
+        if it is null.
+    """
     if pandas.isnull(x):
         return x
 
@@ -431,3 +665,98 @@ def _format_field_val(row, source_fields, field_type, format_string=None):
             pass
 
     return str(result)
+
+
+def _format_location_val(x: Any) -> Any:
+    """Format a value as a location (latitude, longitude, elevation).
+
+    Parameters
+    ----------
+    x : Any
+        The value to format.
+
+    Returns
+    -------
+    Any
+        The value cast to float and formatted as a string without trailing
+        zeros (see transform_format_field_as_location), or x itself if it is
+        null.
+    """
+    result = _format_val(x, float, None)
+    # if the result is a string
+    if isinstance(result, str):
+        # Strip any trailing zeros and any subsequently unnecessary decimal point
+        result = result.rstrip('0').rstrip('.')
+    return result
+
+
+def _get_one_source_col(
+        rows_df: pandas.DataFrame,
+        source_fields: List[str],
+        func_name: str) -> pandas.Series:
+    """Get a single source field column from a DataFrame of rows.
+
+    The vectorized equivalent of _get_one_source_field.
+
+    Parameters
+    ----------
+    rows_df : pandas.DataFrame
+        Rows of data containing the source field.
+    source_fields : List[str]
+        List of source field names.
+    func_name : str
+        Name of the calling function, used in error messages.
+
+    Returns
+    -------
+    pandas.Series
+        The source field column.
+
+    Raises
+    ------
+    ValueError
+        If source_fields does not contain exactly one field name.
+    """
+    if len(source_fields) != 1:
+        raise ValueError(f"{func_name} requires exactly one source field")
+    return rows_df[source_fields[0]]
+
+
+def _map_source_vals(
+        source_col: pandas.Series,
+        val_func: Callable[[Any], Any]) -> pandas.Series:
+    """Apply a function to each non-null value of a source column.
+
+    Null values are kept as they are, as the transformer helper functions
+    return them. If the other values are all strings (as in metadata read
+    from a file), the function is called only once per distinct value, in
+    order of first appearance, so it raises for the same value it would
+    have raised for if called on each row in turn.
+
+    Parameters
+    ----------
+    source_col : pandas.Series
+        The source field column.
+    val_func : Callable[[Any], Any]
+        Function that takes one value and returns its transformed value.
+
+    Returns
+    -------
+    pandas.Series
+        The transformed values, with the same index as source_col.
+    """
+    vals = source_col.to_numpy(dtype=object)
+    result_vals = vals.copy()
+    is_set = ~pandas.isna(vals)
+    set_vals = vals[is_set]
+    if pandas.api.types.infer_dtype(set_vals, skipna=False) == "string":
+        val_codes, unique_vals = pandas.factorize(set_vals)
+        unique_results = np.empty(len(unique_vals), dtype=object)
+        unique_results[:] = [val_func(x) for x in unique_vals]
+        result_vals[is_set] = unique_results[val_codes]
+    else:
+        set_results = np.empty(len(set_vals), dtype=object)
+        set_results[:] = [val_func(x) for x in set_vals]
+        result_vals[is_set] = set_results
+    # endif the values are all strings
+    return pandas.Series(result_vals, index=source_col.index)
@@ -1,15 +1,21 @@
 import cerberus
 import copy
 from datetime import datetime
-from dateutil import parser
 import logging
+import numpy as np
 import os
 import pandas
 from pathlib import Path
 from metameq.src.util import SAMPLE_NAME_KEY, get_extension, cast_field_to_type
+from metameq.src.date_parse_cache import parse_date, parse_dates
+# imported as a module because compiled_schema also uses this module
+import metameq.src.compiled_schema as compiled_schema
 
 _TYPE_KEY = "type"
 _ANYOF_KEY = "anyof"
+# cerberus rules that relate a field to other fields, so can't be checked
+# against the field's values alone
+_CROSS_FIELD_RULES = ("dependencies", "excludes")
 
 # Define a logger for this module
 logger = logging.getLogger(__name__)
@@ -50,7 +56,7 @@ class MetameqValidator(cerberus.Validator):
         """
         # convert the field string to a date
         try:
-            putative_date = parser.parse(value, fuzzy=True, dayfirst=False)
+            putative_date = parse_date(value, fuzzy=True)
         except Exception:  # noqa: E722
             self._error(field, "Must be a valid date")
             return
@@ -65,7 +71,9 @@ def validate_metadata_df(metadata_df, sample_type_full_metadata_fields_dict):
     Converts the metadata fields dictionary into a cerberus schema, casts
     each field in the DataFrame to its expected type, and validates all rows
     against the schema. Fields defined in the schema but missing from the
-    DataFrame are logged and skipped.
+    DataFrame are logged and skipped. Fields held in categorical columns
+    (such as the compact default columns of extended metadata) have each
+    of their distinct values cast and validated just once.
 
     Parameters
     ----------
@@ -87,26 +95,52 @@ def validate_metadata_df(metadata_df, sample_type_full_metadata_fields_dict):
         "error_message" keys.  Returns an empty list if all rows pass
         validation.
     """
-    config = _make_cerberus_schema(sample_type_full_metadata_fields_dict)
+    schema = compiled_schema.compile_metadata_fields(
+        sample_type_full_metadata_fields_dict)
+    config = schema.cerberus_schema
 
     # NB: typed_metadata_df (the type-cast version of metadata_df) is only
     # used for generating validation messages, after which it is discarded.
     typed_metadata_df = metadata_df.copy()
-    for curr_field, curr_definition in \
-            sample_type_full_metadata_fields_dict.items():
-
+    field_value_checks = {}
+    for curr_field_spec in schema.fields:
+        curr_field = curr_field_spec.name
         if curr_field not in typed_metadata_df.columns:
             logging.info(
                 f"Standard field {curr_field} not in metadata file")
             continue
 
-        curr_allowed_types = _get_allowed_pandas_types(
-            curr_field, curr_definition)
+        curr_allowed_types = curr_field_spec.allowed_types
+        if curr_allowed_types is None:
+            # raises the appropriate error
+            curr_allowed_types = _get_allowed_pandas_types(
+                curr_field, curr_field_spec.definition)
+
+        if _checks_date_not_in_future(config[curr_field]):
+            # parse the distinct date strings together (mostly vectorized)
+            # into the date parse cache, from which the check gets them
+            parse_dates((x for x in typed_metadata_df[curr_field].unique()
+                         if isinstance(x, str)), fuzzy=True)
+
+        if isinstance(typed_metadata_df[curr_field].dtype,
+                      pandas.CategoricalDtype) and \
+                not _has_cross_field_rules(config[curr_field]):
+            # check each distinct value once, rather than once per row
+            field_value_checks[curr_field] = _check_field_values(
+                typed_metadata_df.pop(curr_field), curr_field,
+                curr_allowed_types, config[curr_field])
+            continue
+
         typed_metadata_df[curr_field] = typed_metadata_df[curr_field].apply(
             lambda x: cast_field_to_type(x, curr_allowed_types))
     # next field in config
 
-    validation_msgs = _generate_validation_msg(typed_metadata_df, config)
+    if field_value_checks:
+        # the fields checked by value are not checked again row by row
+        config = {k: v for k, v in config.items()
+                  if k not in field_value_checks}
+    validation_msgs = _generate_validation_msg(
+        typed_metadata_df, config, field_value_checks)
     return validation_msgs
 
 
@@ -381,7 +415,8 @@ def _get_allowed_pandas_types(field_name, field_definition):
     return allowed_pandas_types
 
 
-def _generate_validation_msg(typed_metadata_df, config):
+def _generate_validation_msg(typed_metadata_df, config,
+                             field_value_checks=None):
     """Generate validation error messages for a metadata DataFrame.
 
     Validates each row of the metadata DataFrame against the provided cerberus
@@ -396,6 +431,12 @@ def _generate_validation_msg(typed_metadata_df, config):
     config : dict
         A cerberus-compatible validation schema dictionary defining the
         validation rules for each metadata field.
+    field_value_checks : dict, optional
+        Dictionary of the name of a field that has already been checked
+        value by value (and is not in typed_metadata_df or config) to the
+        results of the check, as returned by ``_check_field_values``. Its
+        errors are reported for each row with the failing value, in with
+        the row's other errors.
 
     Returns
     -------
@@ -408,15 +449,25 @@ def _generate_validation_msg(typed_metadata_df, config):
         - "error_message": The validation error message(s) from cerberus as a list of strings
         Returns an empty list if all rows pass validation.
     """
-    v = MetameqValidator()
-    v.allow_unknown = True
-
     validation_msgs = []
     raw_metadata_dict = typed_metadata_df.to_dict(orient="records")
-    for _, curr_row in enumerate(raw_metadata_dict):
-        if not v.validate(curr_row, config):
+    if not raw_metadata_dict:
+        return validation_msgs
+
+    # give the schema to the validator once, rather than with every row,
+    # so cerberus only checks and normalizes it once
+    v = MetameqValidator(config)
+    v.allow_unknown = True
+
+    for curr_row_index, curr_row in enumerate(raw_metadata_dict):
+        curr_errors = {} if v.validate(curr_row) else v.errors
+        if field_value_checks:
+            curr_errors = _add_field_value_errors(
+                curr_errors, curr_row, curr_row_index, field_value_checks)
+
+        if curr_errors:
             curr_sample_name = curr_row[SAMPLE_NAME_KEY]
-            for curr_field_name, curr_err_msg in v.errors.items():
+            for curr_field_name, curr_err_msg in curr_errors.items():
                 validation_msgs.append({
                     SAMPLE_NAME_KEY: curr_sample_name,
                     "field_name": curr_field_name,
@@ -427,3 +478,137 @@ def _generate_validation_msg(typed_metadata_df, config):
     # next row
 
     return validation_msgs
+
+
+def _check_field_values(field_col, field_name, allowed_pandas_types,
+                        field_schema):
+    """Cast and validate each distinct value of a categorical field once.
+
+    Parameters
+    ----------
+    field_col : pandas.Series
+        The field's (categorical) column.
+    field_name : str
+        The name of the field.
+    allowed_pandas_types : list
+        The Python types that values of the field may be cast to, in order
+        of preference (see ``cast_field_to_type``).
+    field_schema : dict
+        The cerberus schema for the field alone. Must not relate the field
+        to other fields.
+
+    Returns
+    -------
+    tuple
+        A tuple containing:
+        - A numpy array of each row's category code (-1 for NaN)
+        - A dictionary of code to the value cast to its expected type
+        - A dictionary of code to the cerberus error messages for the
+          value, for values that fail validation
+
+    Raises
+    ------
+    ValueError
+        If a value cannot be cast to any of the allowed types.
+    """
+    codes = field_col.cat.codes.to_numpy()
+    categories = field_col.cat.categories
+    v = MetameqValidator({field_name: field_schema})
+    v.allow_unknown = True
+
+    typed_vals = {}
+    errors = {}
+    # in order of first appearance, so any value that can't be cast is the
+    # same one that would be found row by row
+    for curr_code in pandas.unique(codes):
+        curr_val = categories[curr_code] if curr_code >= 0 else np.nan
+        typed_vals[curr_code] = cast_field_to_type(
+            curr_val, allowed_pandas_types)
+        if not v.validate({field_name: typed_vals[curr_code]}):
+            errors[curr_code] = v.errors[field_name]
+    # next distinct value
+
+    return codes, typed_vals, errors
+
+
+def _add_field_value_errors(row_errors, row, row_index, field_value_checks):
+    """Combine a row's errors with those of its values of fields checked by value.
+
+    Parameters
+    ----------
+    row_errors : dict
+        The cerberus errors for the row (without the fields checked by
+        value), by field name.
+    row : dict
+        The row. The typed values of the fields checked by value are added
+        to it.
+    row_index : int
+        The position of the row in the metadata.
+    field_value_checks : dict
+        Field name to the results of ``_check_field_values``.
+
+    Returns
+    -------
+    dict
+        All the row's errors, by field name, in the order cerberus gives
+        them (sorted by field name).
+    """
+    all_errors = dict(row_errors)
+    for curr_field, (codes, typed_vals, errors) in \
+            field_value_checks.items():
+        curr_code = codes[row_index]
+        row[curr_field] = typed_vals[curr_code]
+        if curr_code in errors:
+            all_errors[curr_field] = errors[curr_code]
+    # next field checked by value
+
+    if len(all_errors) == len(row_errors):
+        return row_errors
+    return {k: all_errors[k] for k in sorted(all_errors)}
+
+
+def _checks_date_not_in_future(field_schema):
+    """Check whether a field's cerberus schema checks it is not a future date.
+
+    Parameters
+    ----------
+    field_schema : dict
+        The cerberus schema for a single field.
+
+    Returns
+    -------
+    bool
+        True if the schema, or any schema nested in it, has
+        ``check_with: date_not_in_future``.
+    """
+    if isinstance(field_schema, dict):
+        return any(
+            (k == "check_with" and v == "date_not_in_future") or
+            _checks_date_not_in_future(v)
+            for k, v in field_schema.items())
+    if isinstance(field_schema, list):
+        return any(_checks_date_not_in_future(x) for x in field_schema)
+    return False
+
+
+def _has_cross_field_rules(field_schema):
+    """Check whether a field's cerberus schema relates it to other fields.
+
+    Parameters
+    ----------
+    field_schema : dict
+        The cerberus schema for a single field.
+
+    Returns
+    -------
+    bool
+        True if the schema, or any schema nested in it, uses a rule (such
+        as ``dependencies``) whose outcome depends on other fields.
+    """
+    if isinstance(field_schema, dict):
+        return any(
+            k in _CROSS_FIELD_RULES or _has_cross_field_rules(v)
+            for k, v in field_schema.items())
+    if isinstance(field_schema, list):
+        return any(_has_cross_field_rules(x) for x in field_schema)
+    return False
@@ -0,0 +1,454 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import pandas
+from metameq.src.util import extract_config_dict, extract_stds_config, \
+    validate_required_columns_exist, HOSTTYPE_SHORTHAND_KEY, \
+    SAMPLETYPE_SHORTHAND_KEY, SAMPLE_NAME_KEY, QC_NOTE_KEY, \
+    REQUIRED_RAW_METADATA_FIELDS
+from metameq.src.flat_config import build_lazy_flat_config_dict
+from metameq.src.compiled_schema import OutputColsIndex
+from metameq.src.frozen_config import get_fingerprint
+from metameq.src.transformer_plan import TransformerPlan, \
+    build_transformer_plan
+# imported as a module because metadata_extender also uses this module
+import metameq.src.metadata_extender as extender
+
+MAX_CACHED_STUDY_CONTEXTS = 16
+
+# contexts shared by the module-level column finders (see
+# get_shared_study_context), keyed by the fingerprints of the configs they
+# were built from; least recently used first
+_shared_study_contexts = OrderedDict()
+_shared_study_contexts_lock = threading.Lock()
+
+
+class StudyContext:
+    """A study's full flat config, built once, and the operations that use it.
+
+    The module-level functions (``get_reserved_cols``,
+    ``find_standard_cols``, ``extend_metadata_df`` and so on) each build the
+    config from the study config and standards they are given. A context
+    builds it once, along with the index of the columns it outputs (on first
+    use), and runs any number of those operations against it. Nothing the
+    operations do changes the context, so one can be shared across threads.
+
+    Parameters
+    ----------
+    study_specific_config_dict : Optional[Dict[str, Any]], default=None
+        Study-specific flat-host-type config dictionary.
+    study_specific_transformers_dict : Optional[Dict[str, Any]], default=None
+        Dictionary of custom transformers for this study (only).
+    software_config_dict : Optional[Dict[str, Any]], default=None
+        Software configuration dictionary. If None, the default software
+        config pulled from the config.yml file will be used.
+    stds_fp : Optional[str], default=None
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
+    full_flat_config_dict : Optional[Dict[str, Any]], default=None
+        An already-built full flat config dictionary, such as one loaded
+        from a config artifact (see ``metameq.src.config_artifact``). If
+        provided, it is used as is, and study_specific_config_dict,
+        software_config_dict and stds_fp are ignored.
+
+    Attributes
+    ----------
+    full_flat_config_dict : Dict[str, Any]
+        The full flat config dictionary. Must not be modified.
+    study_specific_transformers_dict : Optional[Dict[str, Any]]
+        Dictionary of custom transformers for this study (only).
+    """
+
+    __slots__ = ("full_flat_config_dict", "study_specific_transformers_dict",
+                 "_output_cols_index", "_lock")
+
+    def __init__(
+            self,
+            study_specific_config_dict: Optional[Dict[str, Any]] = None,
+            study_specific_transformers_dict: Optional[Dict[str, Any]] = None,
+            software_config_dict: Optional[Dict[str, Any]] = None,
+            stds_fp: Optional[str] = None,
+            full_flat_config_dict: Optional[Dict[str, Any]] = None):
+        if full_flat_config_dict is None:
+            # host types are flattened on demand, so only those actually
+            # present in the metadata are ever resolved
+            full_flat_config_dict = build_lazy_flat_config_dict(
+                study_specific_config_dict, software_config_dict, stds_fp)
+        self.full_flat_config_dict = full_flat_config_dict
+        self.study_specific_transformers_dict = \
+            study_specific_transformers_dict
+        self._output_cols_index = None
+        self._lock = threading.Lock()
+
+    @property
+    def output_cols_index(self) -> OutputColsIndex:
+        """Index of the columns the config makes the extender output.
+
+        Built the first time it is needed, since that resolves every host
+        and sample type in the config.
+        """
+        with self._lock:
+            if self._output_cols_index is None:
+                self._output_cols_index = \
+                    OutputColsIndex(self.full_flat_config_dict)
+            return self._output_cols_index
+
+    def get_reserved_cols(
+            self, raw_metadata_df: pandas.DataFrame) -> List[str]:
+        """Get a list of all reserved column names for all host+sample type combinations in the metadata.
+
+        See ``metameq.src.metadata_extender.get_reserved_cols``.
+
+        Parameters
+        ----------
+        raw_metadata_df : pandas.DataFrame
+            The input metadata DataFrame.
+
+        Returns
+        -------
+        List[str]
+            Sorted list of all reserved column names.
+            Empty if there are no reserved columns.
+
+        Raises
+        ------
+        ValueError
+            If required columns are missing from the metadata.
+        """
+        validate_required_columns_exist(
+            raw_metadata_df,
+            [HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY],
+            "metadata missing required columns")
+
+        # get unique HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY
+        # combinations, setting NaNs to "empty" as
+        # _catch_nan_required_fields does
+        host_sample_pairs = set()
+        for curr_pair in set(zip(raw_metadata_df[HOSTTYPE_SHORTHAND_KEY],
+                                 raw_metadata_df[SAMPLETYPE_SHORTHAND_KEY])):
+            host_sample_pairs.add(
+                tuple("empty" if pandas.isna(x) else x for x in curr_pair))
+        # next unique combination
+
+        # look up the columns that extending metadata with these host+sample
+        # type combinations would produce, rather than actually extending
+        # it. The extender adds the qc note column before anything else.
+        reserved_cols = self.output_cols_index.get_output_cols(
+            [HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY,
+             SAMPLE_NAME_KEY, QC_NOTE_KEY], host_sample_pairs)
+
+        return sorted(reserved_cols)
+
+    def find_standard_cols(
+            self, a_df: pandas.DataFrame,
+            suppress_missing_name_err: bool = False) -> List[str]:
+        """Find all the standard columns in the metadata DataFrame.
+
+        Parameters
+        ----------
+        a_df : pandas.DataFrame
+            The metadata DataFrame to analyze.
+        suppress_missing_name_err : bool, default=False
+            Whether to suppress errors about missing sample name.
+
+        Returns
+        -------
+        List[str]
+            List of standard column names found in the DataFrame.
+            Empty if there are no standard columns.
+
+        Raises
+        ------
+        ValueError
+            If required columns are missing from the metadata.
+        """
+        err_msg = "metadata missing required columns"
+        required_cols = REQUIRED_RAW_METADATA_FIELDS.copy()
+        if suppress_missing_name_err:
+            # remove the sample name from the required columns list
+            required_cols.remove(SAMPLE_NAME_KEY)
+        # endif
+        validate_required_columns_exist(a_df, required_cols, err_msg)
+
+        # get the intersection of the reserved standard columns and
+        # the columns in the input dataframe
+        standard_cols = self.get_reserved_cols(a_df)
+
+        standard_cols_set = \
+            (set(standard_cols) - set(extender.INTERNAL_COL_KEYS))
+
+        return list(standard_cols_set & set(a_df.columns))
+
+    def find_nonstandard_cols(self, a_df: pandas.DataFrame) -> List[str]:
+        """Find any non-standard columns in the metadata DataFrame.
+
+        Parameters
+        ----------
+        a_df : pandas.DataFrame
+            The metadata DataFrame to analyze.
+
+        Returns
+        -------
+        List[str]
+            List of non-standard column names found in the DataFrame.
+            Empty if there are no non-standard columns.
+
+        Raises
+        ------
+        ValueError
+            If required columns are missing from the metadata.
+        """
+        validate_required_columns_exist(a_df, REQUIRED_RAW_METADATA_FIELDS,
+                                        "metadata missing required columns")
+
+        standard_cols = self.get_reserved_cols(a_df)
+
+        return list(set(a_df.columns) - set(standard_cols))
+
+    def extend_metadata_df(
+            self, raw_metadata_df: pandas.DataFrame,
+            hosttype_col_name: Optional[str] = None,
+            sampletype_col_name: Optional[str] = None,
+            n_jobs: Optional[int] = None
+    ) -> Tuple[pandas.DataFrame, pandas.DataFrame]:
+        """Extend a metadata DataFrame based on the context's config.
+
+        See ``metameq.src.metadata_extender.extend_metadata_df`` for the
+        details of the parameters.
+
+        Parameters
+        ----------
+        raw_metadata_df : pandas.DataFrame
+            The raw metadata DataFrame to extend.
+        hosttype_col_name : Optional[str], default=None
+            Name of the column in raw_metadata_df that contains host type
+            values, if not the internal ``hosttype_shorthand`` column.
+        sampletype_col_name : Optional[str], default=None
+            Name of the column in raw_metadata_df that contains sample type
+            values, if not the internal ``sampletype_shorthand`` column.
+        n_jobs : Optional[int], default=None
+            Number of worker processes to extend the metadata in.
+
+        Returns
+        -------
+        Tuple[pandas.DataFrame, pandas.DataFrame]
+            A tuple containing:
+                - The extended metadata DataFrame
+                - A DataFrame containing validation messages
+
+        Raises
+        ------
+        ValueError
+            If required columns are missing from the metadata, if a
+            specified column name is not found in the DataFrame, if both the
+            internal shorthand column and the specified alternate column
+            exist, or if n_jobs is not valid.
+        """
+        metadata_df, validation_msgs_df, _ = \
+            extender._extend_metadata_from_full_flat_config(
+                raw_metadata_df, self.full_flat_config_dict,
+                self.study_specific_transformers_dict,
+                hosttype_col_name, sampletype_col_name, n_jobs=n_jobs)
+
+        return metadata_df, validation_msgs_df
+
+    def extend_metadata_df_incrementally(
+            self, raw_metadata_df: pandas.DataFrame,
+            previous_metadata_df: Optional[pandas.DataFrame] = None,
+            previous_validation_msgs_df: Optional[pandas.DataFrame] = None,
+            previous_manifest_df: Optional[pandas.DataFrame] = None,
+            hosttype_col_name: Optional[str] = None,
+            sampletype_col_name: Optional[str] = None,
+            n_jobs: Optional[int] = None
+    ) -> Tuple[pandas.DataFrame, pandas.DataFrame, pandas.DataFrame]:
+        """Extend a metadata DataFrame, reusing unchanged rows of a previous extension.
+
+        See ``metameq.src.metadata_extender.extend_metadata_df_incrementally``
+        for the details of the parameters.
+
+        Parameters
+        ----------
+        raw_metadata_df : pandas.DataFrame
+            The raw metadata DataFrame to extend.
+        previous_metadata_df : Optional[pandas.DataFrame], default=None
+            The extended metadata DataFrame of the previous extension.
+        previous_validation_msgs_df : Optional[pandas.DataFrame], default=None
+            The validation messages DataFrame of the previous extension.
+        previous_manifest_df : Optional[pandas.DataFrame], default=None
+            The manifest of the previous extension.
+        hosttype_col_name : Optional[str], default=None
+            Name of the column in raw_metadata_df that contains host type
+            values, if not the internal ``hosttype_shorthand`` column.
+        sampletype_col_name : Optional[str], default=None
+            Name of the column in raw_metadata_df that contains sample type
+            values, if not the internal ``sampletype_shorthand`` column.
+        n_jobs : Optional[int], default=None
+            Number of worker processes to extend the changed rows in.
+
+        Returns
+        -------
+        Tuple[pandas.DataFrame, pandas.DataFrame, pandas.DataFrame]
+            A tuple containing:
+                - The extended metadata DataFrame
+                - A DataFrame containing validation messages
+                - The manifest of this extension
+
+        Raises
+        ------
+        ValueError
+            If the config's pre-transformers set the host or sample type
+            shorthand columns, if only some of the previous results are
+            given or they do not match each other, or for any of the
+            reasons extend_metadata_df does.
+        """
+        return extender._extend_metadata_incrementally(
+            raw_metadata_df, self.full_flat_config_dict,
+            self.study_specific_transformers_dict, previous_metadata_df,
+            previous_validation_msgs_df, previous_manifest_df,
+            hosttype_col_name, sampletype_col_name, n_jobs)
+
+    def write_extended_metadata_from_df(
+            self, raw_metadata_df: pandas.DataFrame,
+            out_dir: str,
+            out_name_base: str,
+            sep: str = "\t",
+            remove_internals: bool = True,
+            suppress_empty_fails: bool = False,
+            internal_col_names: Optional[List[str]] = None,
+            n_jobs: Optional[int] = None) -> pandas.DataFrame:
+        """Extend a metadata DataFrame and write the results to files.
+
+        Parameters
+        ----------
+        raw_metadata_df : pandas.DataFrame
+            The raw metadata DataFrame to extend.
+        out_dir : str
+            Directory where output files will be written.
+        out_name_base : str
+            Base name for output files.
+        sep : str, default="\t"
+            Separator to use in output files.
+        remove_internals : bool, default=True
+            Whether to remove internal columns.
+        suppress_empty_fails : bool, default=False
+            Whether to suppress empty failure files.
+        internal_col_names : Optional[List[str]], default=None
+            List of internal column names.
+        n_jobs : Optional[int], default=None
+            Number of worker processes to extend the metadata in.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The extended metadata DataFrame.
+        """
+        metadata_df, validation_msgs_df = self.extend_metadata_df(
+            raw_metadata_df, n_jobs=n_jobs)
+
+        self.write_metadata_results(
+            metadata_df, validation_msgs_df, out_dir, out_name_base,
+            sep=sep, remove_internals=remove_internals,
+            suppress_empty_fails=suppress_empty_fails,
+            internal_col_names=internal_col_names)
+
+        return metadata_df
+
+    def write_metadata_results(
+            self, metadata_df: pandas.DataFrame,
+            validation_msgs_df: pandas.DataFrame,
+            out_dir: str,
+            out_name_base: str,
+            sep: str = "\t",
+            remove_internals: bool = True,
+            suppress_empty_fails: bool = False,
+            internal_col_names: Optional[List[str]] = None) -> None:
+        """Write metadata and validation results to files.
+
+        See ``metameq.src.metadata_extender.write_metadata_results``, which
+        needs no config; this is here so a context can be used throughout.
+        """
+        extender.write_metadata_results(
+            metadata_df, validation_msgs_df, out_dir, out_name_base,
+            sep=sep, remove_internals=remove_internals,
+            suppress_empty_fails=suppress_empty_fails,
+            internal_col_names=internal_col_names)
+
+    def get_transformer_plan(
+            self, stage_key: str,
+            input_cols: Iterable[str]) -> TransformerPlan:
+        """Plan the order in which a stage's transformers run.
+
+        See ``metameq.src.transformer_plan.build_transformer_plan``.
+
+        Parameters
+        ----------
+        stage_key : str
+            Key indicating the transformation stage (PRE_TRANSFORMERS_KEY
+            or POST_TRANSFORMERS_KEY).
+        input_cols : Iterable[str]
+            Names of the columns present in the metadata before the stage's
+            transformers run.
+
+        Returns
+        -------
+        TransformerPlan
+            The plan, including the order the transformers run in, which
+            will be skipped, and the critical path.
+
+        Raises
+        ------
+        ValueError
+            If the stage's transformers depend on each other in a cycle.
+        """
+        return build_transformer_plan(
+            self.full_flat_config_dict, stage_key, input_cols)
+
+
+def get_shared_study_context(
+        study_specific_config_dict: Optional[Dict[str, Any]],
+        stds_fp: Optional[str]) -> StudyContext:
+    """Get a context for a study config and standards, reusing one if possible.
+
+    Contexts are cached in-process, keyed on the fingerprints of the study
+    config, the default software config and the standards, so repeated calls
+    to the module-level column finders with the same configs share one
+    config and output column index.
+
+    Parameters
+    ----------
+    study_specific_config_dict : Optional[Dict[str, Any]]
+        Study-specific flat-host-type config dictionary.
+    stds_fp : Optional[str]
+        Path to standards dictionary file. If None, the default standards
+        config pulled from the standards.yml file will be used.
+
+    Returns
+    -------
+    StudyContext
+        Context with no study-specific transformers, built from the default
+        software config, the study config and the standards. May be shared
+        with other callers.
+    """
+    # the standards and software config are memoized per file contents, so
+    # fingerprinting them is cheap
+    context_key = (
+        get_fingerprint(study_specific_config_dict or {}),
+        get_fingerprint(extract_config_dict(None, interned=True)),
+        get_fingerprint(extract_stds_config(stds_fp, interned=True)))
+
+    with _shared_study_contexts_lock:
+        study_context = _shared_study_contexts.get(context_key)
+        if study_context is not None:
+            _shared_study_contexts.move_to_end(context_key)
+            return study_context
+
+    study_context = StudyContext(study_specific_config_dict, stds_fp=stds_fp)
+
+    with _shared_study_contexts_lock:
+        # another thread may have built the same context in the meantime
+        study_context = _shared_study_contexts.setdefault(
+            context_key, study_context)
+        _shared_study_contexts.move_to_end(context_key)
+        while len(_shared_study_contexts) > MAX_CACHED_STUDY_CONTEXTS:
+            _shared_study_contexts.popitem(last=False)
+    return study_context
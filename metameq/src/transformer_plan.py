@@ -0,0 +1,440 @@
+import heapq
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+from metameq.src.util import METADATA_TRANSFORMERS_KEY, SOURCES_KEY, \
+    FUNCTION_KEY, OVERWRITE_NON_NANS_KEY
+
+
+class TransformerStep:
+    """One transformer of a stage: the field it fills, and from what.
+
+    Attributes
+    ----------
+    target_field : str
+        The field the transformer fills.
+    source_fields : Tuple[str, ...]
+        The fields the transformer is passed, in the order it is passed them.
+    function_name : str
+        Name of the transformer function.
+    overwrite_non_nans : bool
+        Whether the transformer fills every row of the target field, rather
+        than only the rows where it is NaN.
+    upstream_fields : Tuple[str, ...]
+        The source fields that other transformers of the stage fill, and so
+        must run before this one. A transformer whose target is also one of
+        its sources sees that field's values from before it runs.
+    """
+
+    __slots__ = ("target_field", "source_fields", "function_name",
+                 "overwrite_non_nans", "upstream_fields")
+
+    def __init__(self, target_field: str, source_fields: Sequence[str],
+                 function_name: str, overwrite_non_nans: bool,
+                 upstream_fields: Sequence[str]):
+        self.target_field = target_field
+        self.source_fields = tuple(source_fields)
+        self.function_name = function_name
+        self.overwrite_non_nans = overwrite_non_nans
+        self.upstream_fields = tuple(upstream_fields)
+
+    def __repr__(self) -> str:
+        return (f"TransformerStep({self.target_field!r} <- "
+                f"{self.function_name}{self.source_fields!r})")
+
+
+class TransformerPlan:
+    """The order in which a stage's transformers run, from their dependencies.
+
+    A transformer depends on the transformers that fill its source fields,
+    whatever their order in the config, and runs after them; otherwise,
+    transformers run in config order. To run them concurrently, they are
+    grouped into waves: every transformer in a wave depends only on
+    transformers in earlier waves, so those in the same wave are independent
+    of each other. Within a wave, a chain of transformers in which each is
+    the only one depending on the one before (and depends only on it) is
+    fused into a single task that runs the whole chain in turn.
+
+    Made by ``build_transformer_plan``.
+
+    Attributes
+    ----------
+    stage_key : str
+        The stage the plan is for (PRE_TRANSFORMERS_KEY or
+        POST_TRANSFORMERS_KEY).
+    steps : Dict[str, TransformerStep]
+        Target field to the step filling it, for each transformer that will
+        run, in the order they run one at a time.
+    skipped : Dict[str, Tuple[str, ...]]
+        Target field to the missing source fields (neither in the metadata
+        nor filled by a transformer that will run) of each transformer that
+        will be skipped, in config order.
+    waves : Tuple[Tuple[Tuple[str, ...], ...], ...]
+        The target fields of the transformers that will run, as the waves
+        they run in when run concurrently, in order; each wave is a tuple of
+        its tasks, each of which is a tuple of the target fields of the
+        chain of transformers it runs, in order.
+    critical_path : Tuple[str, ...]
+        Target fields of the longest chain of transformers that each depend
+        on the one before, in execution order; none of these can run
+        concurrently with the others.
+    """
+
+    __slots__ = ("stage_key", "steps", "skipped", "waves", "critical_path")
+
+    def __init__(self, stage_key: str, steps: Dict[str, TransformerStep],
+                 skipped: Dict[str, Tuple[str, ...]],
+                 waves: Tuple[Tuple[Tuple[str, ...], ...], ...],
+                 critical_path: Tuple[str, ...]):
+        self.stage_key = stage_key
+        self.steps = steps
+        self.skipped = skipped
+        self.waves = waves
+        self.critical_path = critical_path
+
+    @property
+    def execution_order(self) -> List[str]:
+        """Target fields of the transformers that will run, in the order they run one at a time."""
+        return list(self.steps)
+
+    def __str__(self) -> str:
+        lines = [f"{self.stage_key}:"]
+        for wave_num, wave in enumerate(self.waves, start=1):
+            lines.append(f"  wave {wave_num}:")
+            for task in wave:
+                lines.append("    " + " -> ".join(
+                    f"{x} <- {self.steps[x].function_name}"
+                    f"({', '.join(self.steps[x].source_fields)})"
+                    for x in task))
+        # next wave
+        for target_field, missing_sources in self.skipped.items():
+            lines.append(f"  skipped {target_field}: missing "
+                         f"{', '.join(missing_sources)}")
+        if self.critical_path:
+            lines.append(
+                f"  critical path: {' -> '.join(self.critical_path)}")
+        return "\n".join(lines)
+
+
+def build_transformer_plan(
+        full_flat_config_dict: Dict[str, Any],
+        stage_key: str,
+        input_cols: Iterable[str]) -> TransformerPlan:
+    """Plan the order in which a stage's transformers run.
+
+    Parameters
+    ----------
+    full_flat_config_dict : Dict[str, Any]
+        Fully combined flat-host-type config dictionary. May contain
+        OVERWRITE_NON_NANS_KEY as a global setting, which can be overridden
+        by individual transformers.
+    stage_key : str
+        Key indicating the transformation stage (pre or post).
+    input_cols : Iterable[str]
+        Names of the columns present in the metadata before the stage's
+        transformers run.
+
+    Returns
+    -------
+    TransformerPlan
+        The plan; it has no steps if the config has no transformers for the
+        stage.
+
+    Raises
+    ------
+    ValueError
+        If the stage's transformers depend on each other in a cycle.
+    """
+    overwrite_non_nans = full_flat_config_dict.get(
+        OVERWRITE_NON_NANS_KEY, False)
+    metadata_transformers = \
+        full_flat_config_dict.get(METADATA_TRANSFORMERS_KEY) or {}
+    stage_transformers = metadata_transformers.get(stage_key) or {}
+
+    sources_by_target = {
+        target_field: transformer_dict[SOURCES_KEY]
+        for target_field, transformer_dict in stage_transformers.items()}
+    run_order, upstreams_by_target, skipped = _order_transformers(
+        sources_by_target, stage_key, input_cols)
+
+    steps = {}
+    for target_field in run_order:
+        transformer_dict = stage_transformers[target_field]
+        steps[target_field] = TransformerStep(
+            target_field, transformer_dict[SOURCES_KEY],
+            transformer_dict[FUNCTION_KEY],
+            transformer_dict.get(OVERWRITE_NON_NANS_KEY, overwrite_non_nans),
+            upstreams_by_target[target_field])
+    # next target field
+
+    return TransformerPlan(
+        stage_key, steps, skipped,
+        _group_into_waves(run_order, upstreams_by_target),
+        _get_critical_path(run_order, upstreams_by_target))
+
+
+def get_runnable_targets(
+        sources_by_target: Dict[str, Iterable[str]],
+        input_cols: Iterable[str],
+        stage_key: str = "transformers") -> List[str]:
+    """Get the target fields of a stage's transformers that will run.
+
+    Parameters
+    ----------
+    sources_by_target : Dict[str, Iterable[str]]
+        Target field to source fields of each of the stage's transformers,
+        in config order.
+    input_cols : Iterable[str]
+        Names of the columns present in the metadata before the stage's
+        transformers run.
+    stage_key : str, default="transformers"
+        Name of the stage, for error messages.
+
+    Returns
+    -------
+    List[str]
+        Target fields of the transformers whose source fields will all be
+        present when their turn comes, in the order they run.
+
+    Raises
+    ------
+    ValueError
+        If the stage's transformers depend on each other in a cycle.
+    """
+    return _order_transformers(sources_by_target, stage_key, input_cols)[0]
+
+
+def _order_transformers(
+        sources_by_target: Dict[str, Iterable[str]],
+        stage_key: str,
+        input_cols: Iterable[str]
+) -> Tuple[List[str], Dict[str, Tuple[str, ...]],
+           Dict[str, Tuple[str, ...]]]:
+    """Order a stage's transformers by their dependencies.
+
+    Parameters
+    ----------
+    sources_by_target : Dict[str, Iterable[str]]
+        Target field to source fields of each of the stage's transformers,
+        in config order.
+    stage_key : str
+        Name of the stage, for error messages.
+    input_cols : Iterable[str]
+        Names of the columns present in the metadata before the stage's
+        transformers run.
+
+    Returns
+    -------
+    Tuple[List[str], Dict[str, Tuple[str, ...]], Dict[str, Tuple[str, ...]]]
+        A tuple containing:
+            - The target fields of the transformers that will run, each
+              after all those it depends on and otherwise in config order
+            - Target field to the target fields of the transformers (that
+              will run) that each transformer that will run depends on
+            - Target field to the missing source fields of each transformer
+              that will be skipped, in config order
+
+    Raises
+    ------
+    ValueError
+        If the stage's transformers depend on each other in a cycle.
+    """
+    config_positions = {x: i for i, x in enumerate(sources_by_target)}
+    # a transformer depends on the others that fill its sources; one whose
+    # target is also a source uses that field's values from before it runs
+    upstreams_by_target = {
+        target_field: tuple(dict.fromkeys(
+            x for x in source_fields
+            if x in config_positions and x != target_field))
+        for target_field, source_fields in sources_by_target.items()}
+    _check_for_cycle(upstreams_by_target, stage_key)
+
+    # topological sort that, of the transformers that are ready, runs the
+    # first in config order, so independent transformers keep config order
+    downstreams_by_target = {x: [] for x in upstreams_by_target}
+    num_upstreams_left = {}
+    for target_field, upstream_fields in upstreams_by_target.items():
+        num_upstreams_left[target_field] = len(upstream_fields)
+        for upstream_field in upstream_fields:
+            downstreams_by_target[upstream_field].append(target_field)
+    # next target field
+    ready_positions = [config_positions[x] for x, y in
+                       num_upstreams_left.items() if y == 0]
+    heapq.heapify(ready_positions)
+    targets_by_position = list(sources_by_target)
+    sorted_targets = []
+    while ready_positions:
+        curr_target = targets_by_position[heapq.heappop(ready_positions)]
+        sorted_targets.append(curr_target)
+        for downstream_field in downstreams_by_target[curr_target]:
+            num_upstreams_left[downstream_field] -= 1
+            if num_upstreams_left[downstream_field] == 0:
+                heapq.heappush(
+                    ready_positions, config_positions[downstream_field])
+        # next downstream transformer
+    # next ready transformer
+
+    # a transformer runs only if all its sources are present when its turn
+    # comes: either in the metadata already or filled by a transformer that
+    # ran before it
+    available_cols = set(input_cols)
+    run_order = []
+    skipped_by_target = {}
+    for curr_target in sorted_targets:
+        missing_sources = [x for x in sources_by_target[curr_target]
+                           if x not in available_cols]
+        if missing_sources:
+            skipped_by_target[curr_target] = tuple(sorted(set(missing_sources)))
+            continue
+        run_order.append(curr_target)
+        available_cols.add(curr_target)
+    # next transformer
+
+    run_targets = set(run_order)
+    run_upstreams_by_target = {
+        x: tuple(y for y in upstreams_by_target[x] if y in run_targets)
+        for x in run_order}
+    skipped = {x: skipped_by_target[x] for x in sources_by_target
+               if x in skipped_by_target}
+    return run_order, run_upstreams_by_target, skipped
+
+
+def _check_for_cycle(
+        upstreams_by_target: Dict[str, Tuple[str, ...]],
+        stage_key: str) -> None:
+    """Raise a ValueError if transformers depend on each other in a cycle."""
+    # depth-first search, iterative so long chains can't hit the recursion
+    # limit; a transformer met again while still on the path is a cycle
+    done = set()
+    for start_target in upstreams_by_target:
+        if start_target in done:
+            continue
+        path = [start_target]
+        on_path = {start_target}
+        iters = [iter(upstreams_by_target[start_target])]
+        while iters:
+            next_target = next(iters[-1], None)
+            if next_target is None:
+                finished_target = path.pop()
+                on_path.discard(finished_target)
+                done.add(finished_target)
+                iters.pop()
+                continue
+            if next_target in on_path:
+                cycle = path[path.index(next_target):] + [next_target]
+                # report the cycle in the direction the data flows
+                raise ValueError(
+                    f"{stage_key} depend on each other in a cycle: "
+                    f"{' -> '.join(reversed(cycle))}")
+            if next_target not in done:
+                path.append(next_target)
+                on_path.add(next_target)
+                iters.append(iter(upstreams_by_target[next_target]))
+        # next step of the search
+    # next starting transformer
+
+
+def _group_into_waves(
+        run_order: List[str],
+        upstreams_by_target: Dict[str, Tuple[str, ...]]
+) -> Tuple[Tuple[Tuple[str, ...], ...], ...]:
+    """Group transformers into waves of tasks of fused chains.
+
+    Parameters
+    ----------
+    run_order : List[str]
+        Target fields of the transformers that will run, each after all
+        those it depends on.
+    upstreams_by_target : Dict[str, Tuple[str, ...]]
+        Target field to the target fields of the transformers that each
+        transformer depends on.
+
+    Returns
+    -------
+    Tuple[Tuple[Tuple[str, ...], ...], ...]
+        The waves; see TransformerPlan.waves.
+    """
+    num_downstreams = dict.fromkeys(run_order, 0)
+    for upstream_fields in upstreams_by_target.values():
+        for upstream_field in upstream_fields:
+            num_downstreams[upstream_field] += 1
+    # next target field
+
+    # fuse a transformer into the task of the one before it in a chain:
+    # the only one it depends on, which only it depends on
+    tasks = []
+    task_nums_by_target = {}
+    for curr_target in run_order:
+        upstream_fields = upstreams_by_target[curr_target]
+        if len(upstream_fields) == 1 and \
+                num_downstreams[upstream_fields[0]] == 1:
+            task_num = task_nums_by_target[upstream_fields[0]]
+            tasks[task_num].append(curr_target)
+        else:
+            task_num = len(tasks)
+            tasks.append([curr_target])
+        task_nums_by_target[curr_target] = task_num
+    # next transformer
+
+    # a task's wave is the one after the latest of those of the tasks it
+    # depends on
+    waves = []
+    wave_nums = []
+    for task_num, task in enumerate(tasks):
+        wave_num = 0
+        for curr_target in task:
+            for upstream_field in upstreams_by_target[curr_target]:
+                upstream_task_num = task_nums_by_target[upstream_field]
+                if upstream_task_num != task_num:
+                    wave_num = max(wave_num, wave_nums[upstream_task_num] + 1)
+        # next transformer in the task
+        wave_nums.append(wave_num)
+        if len(waves) == wave_num:
+            waves.append([])
+        waves[wave_num].append(tuple(task))
+    # next task
+
+    return tuple(tuple(x) for x in waves)
+
+
+def _get_critical_path(
+        run_order: List[str],
+        upstreams_by_target: Dict[str, Tuple[str, ...]]) -> Tuple[str, ...]:
+    """Get the longest chain of transformers that each depend on the one before.
+
+    Parameters
+    ----------
+    run_order : List[str]
+        Target fields of the transformers that will run, each after all
+        those it depends on.
+    upstreams_by_target : Dict[str, Tuple[str, ...]]
+        Target field to the target fields of the transformers that each
+        transformer depends on.
+
+    Returns
+    -------
+    Tuple[str, ...]
+        The target fields of the chain, in execution order; the first such
+        chain in run order if there are several of the same length. Empty if
+        no transformers will run.
+    """
+    path_lengths = {}
+    path_prevs = {}
+    for curr_target in run_order:
+        prev_target: Optional[str] = None
+        for upstream_field in upstreams_by_target[curr_target]:
+            if prev_target is None or \
+                    path_lengths[upstream_field] > path_lengths[prev_target]:
+                prev_target = upstream_field
+        # next upstream transformer
+        path_prevs[curr_target] = prev_target
+        path_lengths[curr_target] = \
+            1 if prev_target is None else path_lengths[prev_target] + 1
+    # next transformer
+
+    if not path_lengths:
+        return ()
+    last_target = max(run_order, key=lambda x: path_lengths[x])
+    critical_path = []
+    while last_target is not None:
+        critical_path.append(last_target)
+        last_target = path_prevs[last_target]
+    return tuple(reversed(critical_path))
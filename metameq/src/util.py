@@ -1,8 +1,20 @@
 import copy
+from collections.abc import Mapping
 from importlib.resources import files
+import numpy as np
+import os
 import pandas
-from typing import List, Optional, Union, Callable, Any
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Union, Callable, Any
 import yaml
+from metameq.src.frozen_config import intern_config_value
+
+# use the much faster libyaml-backed loader when pyyaml was built with it
+try:
+    from yaml import CSafeLoader as _YamlSafeLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader as _YamlSafeLoader
 
 CONFIG_MODULE_PATH = "metameq.config"
 
@@ -30,6 +42,9 @@ OVERWRITE_NON_NANS_KEY = "overwrite_non_nans"
 HOST_OVERRIDES_ANCESTOR_SAMPLE_TYPE_KEY = "host_overrides_ancestor_sample_type"
 HOSTTYPE_COL_OPTIONS_KEY = "hosttype_column_options"
 SAMPLETYPE_COL_OPTIONS_KEY = "sampletype_column_options"
+GROUP_BROADCAST_EXTENSION_KEY = "group_broadcast_extension"
+PASSTHROUGH_UNTOUCHED_COLS_KEY = "passthrough_untouched_columns"
+COMPACT_DEFAULT_COLS_KEY = "compact_default_columns"
 REUSABLE_DEFINITIONS_KEY = "_reusable_definitions"
 
 # internal code keys
@@ -52,6 +67,10 @@ REQUIRED_RAW_METADATA_FIELDS = [SAMPLE_NAME_KEY,
                                 HOSTTYPE_SHORTHAND_KEY,
                                 SAMPLETYPE_SHORTHAND_KEY]
 
+# encodings to try, in order, when reading a metadata file
+# from https://stackoverflow.com/a/76366653
+BEST_FIT_ENCODINGS = ["utf-8", "utf-8-sig", "iso-8859-1", "latin1", "cp1252"]
+
 
 GLOBAL_SETTINGS_KEYS = [
     DEFAULT_KEY,
@@ -59,10 +78,20 @@ GLOBAL_SETTINGS_KEYS = [
     OVERWRITE_NON_NANS_KEY
 ]
 
+# process-wide memo of parsed yaml files, keyed on
+# (resolved path, modification time in ns, size in bytes)
+_yaml_cache = {}
+# interned (immutable, shared) versions of the same, made on first request
+_interned_yaml_cache = {}
+_yaml_cache_lock = threading.Lock()
+# parse durations in seconds, keyed on resolved path, for every cache miss
+_yaml_parse_timings = {}
+
 
 def extract_config_dict(
         config_fp: Union[str, None],
-        keys_to_remove: Optional[List[str]] = None) -> dict:
+        keys_to_remove: Optional[List[str]] = None,
+        interned: bool = False) -> dict:
     """Extract configuration dictionary from a YAML file.
 
     If no config file path is provided, looks for config.yml in the grandparent
@@ -76,6 +105,10 @@ def extract_config_dict(
     keys_to_remove : Optional[List[str]]
         Top-level keys to remove from the loaded dictionary. Keys that
         do not exist in the dictionary are silently ignored.
+    interned : bool, default=False
+        If True, the values in the returned dictionary are the shared,
+        immutable interned versions (see ``extract_yaml_dict``); only the
+        top-level dictionary itself is a private, modifiable copy.
 
     Returns
     -------
@@ -94,20 +127,33 @@ def extract_config_dict(
         config_fp = config_dir.joinpath("config.yml")
 
     # read in config file
-    config_dict = extract_yaml_dict(config_fp)
+    config_dict = extract_yaml_dict(config_fp, interned=interned)
+    if interned:
+        config_dict = dict(config_dict)
     if keys_to_remove:
         for key in keys_to_remove:
             config_dict.pop(key, None)
     return config_dict
 
 
-def extract_yaml_dict(yaml_fp: str) -> dict:
+def extract_yaml_dict(yaml_fp: str, interned: bool = False) -> dict:
     """Extract dictionary from a YAML file.
 
+    Parsed files are memoized for the life of the process, keyed on the
+    file's resolved path, modification time and size, so a file is only
+    re-parsed when it changes. By default each call returns a private deep
+    copy of the memoized contents, so callers may freely modify what they
+    get back.
+
     Parameters
     ----------
     yaml_fp : str
         Path to the YAML file.
+    interned : bool, default=False
+        If True, instead return the interned version of the memoized
+        contents (see ``metameq.src.frozen_config.intern_config_value``),
+        which is shared by all callers and cannot be modified, but costs
+        nothing to hand out.
 
     Returns
     -------
@@ -121,12 +167,126 @@ def extract_yaml_dict(yaml_fp: str) -> dict:
     yaml.YAMLError
         If the YAML file is invalid.
     """
-    with open(yaml_fp, "r") as f:
-        yaml_dict = yaml.safe_load(f)
-    return yaml_dict
+    cache_key = _get_yaml_cache_key(yaml_fp)
+
+    with _yaml_cache_lock:
+        yaml_dict = _yaml_cache.get(cache_key)
+
+    if yaml_dict is None:
+        resolved_fp = cache_key[0]
+        start_time = time.perf_counter()
+        with open(resolved_fp, "r") as f:
+            yaml_dict = yaml.load(f, Loader=_YamlSafeLoader)
+        parse_secs = time.perf_counter() - start_time
+
+        with _yaml_cache_lock:
+            _store_yaml_dict(cache_key, yaml_dict)
+            _yaml_parse_timings.setdefault(resolved_fp, []).append(parse_secs)
+    # endif the file wasn't already parsed
+
+    if interned:
+        with _yaml_cache_lock:
+            interned_dict = _interned_yaml_cache.get(cache_key)
+        if interned_dict is None:
+            interned_dict = intern_config_value(yaml_dict)
+            with _yaml_cache_lock:
+                if cache_key in _yaml_cache:
+                    _interned_yaml_cache[cache_key] = interned_dict
+        return interned_dict
+    # endif interned version requested
+
+    # hand out a copy so callers can't corrupt the memoized version
+    return copy.deepcopy(yaml_dict)
+
+
+def is_yaml_memoized(yaml_fp: str) -> bool:
+    """Check whether the current version of a YAML file is already memoized.
+
+    Parameters
+    ----------
+    yaml_fp : str
+        Path to the YAML file.
+
+    Returns
+    -------
+    bool
+        True if ``extract_yaml_dict`` would serve the file from its memo
+        rather than parsing it.
+    """
+    cache_key = _get_yaml_cache_key(yaml_fp)
+    with _yaml_cache_lock:
+        return cache_key in _yaml_cache
+
+
+def memoize_yaml_dict(
+        yaml_fp: str, yaml_dict: dict,
+        yaml_stat: Optional[os.stat_result] = None) -> None:
+    """Memoize the contents of a YAML file that were obtained without parsing it.
+
+    Later ``extract_yaml_dict`` calls for the file are served the given
+    contents, as if the file had just been parsed, until the file changes.
+    The memo does not record a parse, so nothing is added to
+    ``get_yaml_parse_timings``.
+
+    Parameters
+    ----------
+    yaml_fp : str
+        Path to the YAML file.
+    yaml_dict : dict
+        The contents of the YAML file, such as a copy of an earlier parse
+        read back from the config cache. Must not be modified afterwards.
+    yaml_stat : Optional[os.stat_result], default=None
+        Result of ``os.stat`` for the file, taken before reading whatever
+        yaml_dict was checked against. If the file changed since, the memo
+        is never served. If None, the file is stat-ed now.
+    """
+    cache_key = _get_yaml_cache_key(yaml_fp, yaml_stat)
+    with _yaml_cache_lock:
+        _store_yaml_dict(cache_key, yaml_dict)
+
+
+def get_yaml_parse_timings() -> Dict[str, List[float]]:
+    """Get the durations of all YAML parses done by extract_yaml_dict.
+
+    Returns
+    -------
+    Dict[str, List[float]]
+        Dictionary keyed by resolved file path, with each value being a list
+        of the durations (in seconds) of every parse of that file, in order.
+        Memoized (cache-hit) loads are not parses and so are not included.
+    """
+    with _yaml_cache_lock:
+        return {k: list(v) for k, v in _yaml_parse_timings.items()}
+
+
+def clear_yaml_cache() -> None:
+    """Forget all memoized YAML files and recorded parse timings."""
+    with _yaml_cache_lock:
+        _yaml_cache.clear()
+        _interned_yaml_cache.clear()
+        _yaml_parse_timings.clear()
+
+
+def _get_yaml_cache_key(
+        yaml_fp: str, yaml_stat: Optional[os.stat_result] = None) -> tuple:
+    resolved_fp = os.path.realpath(yaml_fp)
+    if yaml_stat is None:
+        yaml_stat = os.stat(resolved_fp)
+    return resolved_fp, yaml_stat.st_mtime_ns, yaml_stat.st_size
 
 
-def extract_stds_config(stds_fp: Union[str, None]) -> dict:
+def _store_yaml_dict(cache_key: tuple, yaml_dict: dict) -> None:
+    # callers must hold _yaml_cache_lock.
+    # drop any stale entries for previous versions of this file
+    stale_keys = [x for x in _yaml_cache if x[0] == cache_key[0]]
+    for curr_key in stale_keys:
+        del _yaml_cache[curr_key]
+        _interned_yaml_cache.pop(curr_key, None)
+    _yaml_cache[cache_key] = yaml_dict
+
+
+def extract_stds_config(
+        stds_fp: Union[str, None], interned: bool = False) -> dict:
     """Extract standards dictionary from a YAML file.
 
     If no standards file path is provided, looks for standards.yml in the
@@ -137,6 +297,9 @@ def extract_stds_config(stds_fp: Union[str, None]) -> dict:
     stds_fp : Union[str, None]
         Path to the standards YAML file. If None, will look for
         standards.yml in the "config" module.
+    interned : bool, default=False
+        If True, the values in the returned dictionary are shared and
+        immutable (see ``extract_config_dict``).
 
     Returns
     -------
@@ -154,7 +317,7 @@ def extract_stds_config(stds_fp: Union[str, None]) -> dict:
         config_dir = files(CONFIG_MODULE_PATH)
         stds_fp = config_dir.joinpath("standards.yml")
     return extract_config_dict(
-        stds_fp, keys_to_remove=[REUSABLE_DEFINITIONS_KEY])
+        stds_fp, keys_to_remove=[REUSABLE_DEFINITIONS_KEY], interned=interned)
 
 
 def deepcopy_dict(input_dict: dict) -> dict:
@@ -208,9 +371,7 @@ def load_df_with_best_fit_encoding(
     """
     result = None
 
-    # from https://stackoverflow.com/a/76366653
-    encodings = ["utf-8", "utf-8-sig", "iso-8859-1", "latin1", "cp1252"]
-    for encoding in encodings:
+    for encoding in BEST_FIT_ENCODINGS:
         # noinspection PyBroadException
         try:
             result = pandas.read_csv(
@@ -273,7 +434,11 @@ def update_metadata_df_field(
         field_val_or_func: Union[
             str, Callable[[pandas.Series, List[str]], str]],
         source_fields: Optional[List[str]] = None,
-        overwrite_non_nans: bool = True) -> None:
+        overwrite_non_nans: bool = True,
+        vectorized_func: Optional[Callable[
+            [pandas.DataFrame, List[str]], Any]] = None,
+        is_pure: bool = False,
+        use_row_view: bool = False) -> None:
     """Update or add a field in an existing metadata DataFrame.
 
     Can update an existing field or add a new one, using either a constant
@@ -295,63 +460,270 @@ def update_metadata_df_field(
     overwrite_non_nans : bool
         If True, overwrites all values in the field. If False, only updates
         NaN values.
+    vectorized_func : Optional[Callable]
+        Vectorized version of the function field_val_or_func, which takes a
+        DataFrame of the rows to update (rather than one row) and source
+        fields as input and returns a Series of values, one per row (see
+        ``metameq.src.metadata_transformers.vectorized_transformer``). If
+        provided, it is used instead of field_val_or_func whenever there
+        are rows to update.
+    is_pure : bool
+        If True, the function field_val_or_func is pure: its value for a row
+        depends only on the row's values in source_fields (see
+        ``metameq.src.metadata_transformers.pure_transformer``), so it is
+        called only once for each distinct combination of them, on the
+        first row that has it.
+    use_row_view : bool
+        If True, the function field_val_or_func is passed each row as a
+        lightweight read-only mapping of just the row's values in
+        source_fields (with the row's index label as its ``name``) rather
+        than as a pandas.Series of the whole row (see
+        ``metameq.src.metadata_transformers.row_series_transformer``).
     """
     # Note: function doesn't return anything.  Work is done in-place on the
     #  metadata_df passed in.
 
-    TEMP_COL_SUFFIX = "___metameq___temp"
-
-    # pandas has hard-to-predict behavior when setting values in a DataFrame
-    # (such as turning a int input value into a float column even when setting
-    # for all values in df so there are no NaNs).  To avoid this, we convert
-    # all non-NaN values to strings before setting them.  The validator code
-    # casts values to the expected type before validating them so this won't
-    # impede validation. We leave NaNs as-is so they can be caught by the
-    # downstream default-filling logic.
-    def turn_non_nans_to_str(val: Any) -> Any:
-        """Convert non-NaN values to strings."""
-        return str(val) if pandas.notna(val) else val
-
-    # if the field already exists in the metadata, make a temporary copy of it
-    # with a different name; we will set values on this rather than on the
-    # original in case the original uses itself as a source field
-    field_to_set = field_name
-    if field_name in metadata_df.columns:
-        field_to_set = f"{field_name}{TEMP_COL_SUFFIX}"
-        metadata_df[field_to_set] = metadata_df[field_name]
+    # If the field does not already exist in the metadata OR if we have
+    # been told to overwrite existing (i.e., non-NaN) values, we will set its
+    # value in all rows; otherwise, will only set it where it is currently NaN
+    field_exists = field_name in metadata_df.columns
+    row_mask = None
+    if field_exists and not overwrite_non_nans:
+        row_mask = metadata_df[field_name].isna()
+        if not row_mask.any():
+            return
+    # endif only some rows are set
+
+    # If source fields were passed in, the field_val_or_func must be a function
+    if source_fields:
+        # Apply only to masked rows to avoid overhead of running func
+        # on rows that won't be updated.  All the values are computed before
+        # any are set, so a function that uses the field itself as a source
+        # sees only the original values.
+        rows_df = metadata_df if row_mask is None else metadata_df.loc[row_mask]
+        row_codes = None
+        if is_pure and vectorized_func is None and len(rows_df) > 0:
+            row_codes = _factorize_source_rows(rows_df[source_fields])
+        if vectorized_func is not None and len(rows_df) > 0:
+            # as apply does, convert the values and let pandas infer the
+            # dtype of the whole
+            vals = pandas.Series(
+                vectorized_func(rows_df, source_fields)).to_numpy(
+                    dtype=object, copy=True)
+            is_set = pandas.notna(vals)
+            vals[is_set] = [str(x) for x in vals[is_set]]
+            field_vals = pandas.Series(vals, index=rows_df.index)
+        elif row_codes is not None:
+            # call the function on the first row with each combination of
+            # source values, in row order, so that if it raises, it does so
+            # for the same row (the first offending one) as apply would
+            first_rows = np.unique(row_codes, return_index=True)[1]
+            unique_vals = _apply_to_rows(
+                rows_df.iloc[first_rows], field_val_or_func, source_fields,
+                use_row_view).to_numpy(dtype=object)
+            field_vals = pandas.Series(
+                unique_vals[row_codes], index=rows_df.index)
+        else:
+            field_vals = _apply_to_rows(
+                rows_df, field_val_or_func, source_fields, use_row_view)
+        # endif calling the function on all the rows at once/once per
+        # distinct combination of source values/on each row
+        # if the function returned only NaNs, pandas makes them a float
+        # column, which can't be set into a string column
+        if len(field_vals) > 0 and field_vals.isna().all():
+            field_vals = field_vals.astype(object)
+    else:
+        # Otherwise, it is a constant value
+        field_vals = _turn_non_nans_to_str(field_val_or_func)
+    # endif using a function/a constant value
+
+    if not field_exists:
+        metadata_df.loc[metadata_df.index, field_name] = field_vals
+        return
+
+    # set the values on a detached copy of the column and only put it in the
+    # df once they are all set, so an error part way through (e.g., a value
+    # that can't be held by the column's dtype) leaves the df unchanged
+    new_col = metadata_df[field_name].copy()
+    if isinstance(new_col.dtype, pandas.CategoricalDtype):
+        # a compact column (see COMPACT_DEFAULT_COLS_KEY) can only hold the
+        # values it already has, so expand it before setting new ones
+        new_col = new_col.astype(new_col.cat.categories.dtype)
+    if row_mask is None:
+        new_col.loc[:] = field_vals
+    else:
+        new_col.loc[row_mask] = field_vals
+    metadata_df[field_name] = new_col
+
+
+# pandas has hard-to-predict behavior when setting values in a DataFrame
+# (such as turning a int input value into a float column even when setting
+# for all values in df so there are no NaNs).  To avoid this, we convert
+# all non-NaN values to strings before setting them.  The validator code
+# casts values to the expected type before validating them so this won't
+# impede validation. We leave NaNs as-is so they can be caught by the
+# downstream default-filling logic.
+def _turn_non_nans_to_str(val: Any) -> Any:
+    """Convert non-NaN values to strings."""
+    return str(val) if pandas.notna(val) else val
+
+
+class _SourceRowView(Mapping):
+    """Read-only mapping of one row's values in its source fields.
+
+    Passed to a row-wise function in place of a pandas.Series of the whole
+    row, which is far more expensive to make than the function's lookups of
+    its source field values. The row's index label is its ``name``, as for
+    a row Series.
+    """
 
-    try:
-        # If the field does not already exist in the metadata OR if we have
-        # been told to overwrite existing (i.e., non-NaN) values, we will set its
-        # value in all rows; otherwise, will only set it where it is currently NaN
-        set_all = overwrite_non_nans or (field_name not in metadata_df.columns)
-        row_mask = \
-            metadata_df.index if set_all else metadata_df[field_name].isnull()
-
-        # If source fields were passed in, the field_val_or_func must be a function
-        if source_fields:
-            # Apply only to masked rows to avoid overhead of running func
-            # on rows that won't be updated; pandas aligns the result back
-            # to the correct rows by matching on the index
-            metadata_df.loc[row_mask, field_to_set] = \
-                metadata_df.loc[row_mask].apply(
-                    lambda row: turn_non_nans_to_str(
-                        field_val_or_func(row, source_fields)),
-                    axis=1)
+    __slots__ = ("name", "_position", "_source_cols")
+
+    def __init__(self, name: Any, position: int,
+                 source_cols: Dict[str, np.ndarray]):
+        self.name = name
+        self._position = position
+        self._source_cols = source_cols
+
+    def __getitem__(self, field_name: str) -> Any:
+        try:
+            return self._source_cols[field_name][self._position]
+        except KeyError:
+            raise KeyError(
+                f"'{field_name}' is not a source field of this row; a "
+                f"transformer that uses other fields of the row must be "
+                f"declared with row_series_transformer") from None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._source_cols)
+
+    def __len__(self) -> int:
+        return len(self._source_cols)
+
+    def __repr__(self) -> str:
+        return f"_SourceRowView(name={self.name!r}, {dict(self)!r})"
+
+
+def _apply_to_rows(
+        rows_df: pandas.DataFrame,
+        row_func: Callable[[Any, List[str]], Any],
+        source_fields: List[str],
+        use_row_view: bool) -> pandas.Series:
+    """Call a row-wise function on each row of a DataFrame, in order.
+
+    Parameters
+    ----------
+    rows_df : pandas.DataFrame
+        The rows to call the function on.
+    row_func : Callable
+        Function that takes a row and source fields as input and returns a
+        value.
+    source_fields : List[str]
+        List of field names to pass to the function.
+    use_row_view : bool
+        If True, pass the function each row as a _SourceRowView of its
+        source field values rather than as a pandas.Series, where that
+        gives it the same values (see _row_view_matches_row_series).
+
+    Returns
+    -------
+    pandas.Series
+        The function's value for each row, with non-NaN values converted to
+        strings.
+    """
+    if use_row_view and _row_view_matches_row_series(rows_df, source_fields):
+        # a missing source field is left to raise a KeyError if the
+        # function looks it up, as it would in a row Series
+        source_cols = {x: rows_df[x].to_numpy(dtype=object)
+                       for x in source_fields if x in rows_df.columns}
+        field_vals = np.empty(len(rows_df), dtype=object)
+        for curr_position, curr_name in enumerate(rows_df.index):
+            curr_row = _SourceRowView(curr_name, curr_position, source_cols)
+            field_vals[curr_position] = _turn_non_nans_to_str(
+                row_func(curr_row, source_fields))
+        # next row
+        return pandas.Series(field_vals, index=rows_df.index)
+
+    return rows_df.apply(
+        lambda row: _turn_non_nans_to_str(row_func(row, source_fields)),
+        axis=1)
+
+
+def _row_view_matches_row_series(
+        rows_df: pandas.DataFrame, source_fields: List[str]) -> bool:
+    """Check whether row views give the same source values as row Series.
+
+    Parameters
+    ----------
+    rows_df : pandas.DataFrame
+        The rows to call a row-wise function on.
+    source_fields : List[str]
+        List of field names to pass to the function.
+
+    Returns
+    -------
+    bool
+        True if a pandas.Series of each row would hold the row's source
+        field values as is: that is, if the Series' dtype is object (as when
+        the DataFrame's columns have mixed types) or the same string dtype
+        as every source column.
+    """
+    if len(rows_df) == 0 or not rows_df.columns.is_unique:
+        return False
+
+    # a row Series has the same dtype for every row, so check the first
+    row_dtype = rows_df.iloc[:1].apply(lambda row: row.dtype, axis=1).iloc[0]
+    if row_dtype == object:
+        return True
+    return isinstance(row_dtype, pandas.StringDtype) and all(
+        rows_df[x].dtype == row_dtype
+        for x in source_fields if x in rows_df.columns)
+
+
+def _factorize_source_rows(source_df: pandas.DataFrame) -> Optional[np.ndarray]:
+    """Number each row by its combination of values in a DataFrame.
+
+    Parameters
+    ----------
+    source_df : pandas.DataFrame
+        The source field columns of the rows.
+
+    Returns
+    -------
+    Optional[np.ndarray]
+        For each row, the number of its combination of values (nulls
+        included), with the combinations numbered in order of first
+        appearance; or None if a column holds a mix of types of values,
+        which factorizing could treat as equal when they are not (such as
+        1, 1.0 and True).
+    """
+    key_cols = []
+    for _, col in source_df.items():
+        if not isinstance(col.dtype, np.dtype):
+            # extension dtypes (str, categorical, nullable) hold one type
+            key_cols.append(pandas.factorize(col, use_na_sentinel=False)[0])
+        elif col.dtype.kind == "f":
+            # -0.0 and 0.0 are equal, but not the same value
+            float_vals = col.to_numpy()
+            key_cols.append(
+                float_vals.view(f"i{float_vals.dtype.itemsize}"))
+        elif col.dtype == object:
+            object_vals = col.to_numpy()
+            object_type = pandas.api.types.infer_dtype(
+                object_vals, skipna=True)
+            if object_type not in ("string", "empty"):
+                return None
+            key_cols.append(
+                pandas.factorize(object_vals, use_na_sentinel=False)[0])
+            # None and NaN are both null, but not the same value
+            key_cols.append(np.equal(object_vals, None))
         else:
-            # Otherwise, it is a constant value
-            metadata_df.loc[row_mask, field_to_set] = \
-                turn_non_nans_to_str(field_val_or_func)
-        # endif using a function/a constant value
-
-        # if field already existed and we set values in a temporary column,
-        # copy the set values back to the original column and drop the temp column
-        if field_to_set != field_name:
-            metadata_df[field_name] = metadata_df[field_to_set]
-    finally:
-        # if we created a temporary column, drop it, even if an error was raised during setting
-        if field_to_set != field_name:
-            metadata_df.drop(columns=[field_to_set], inplace=True)
+            key_cols.append(pandas.factorize(col)[0])
+    # next column
+
+    if len(key_cols) == 1:
+        return pandas.factorize(key_cols[0])[0]
+    return pandas.MultiIndex.from_arrays(key_cols).factorize()[0]
 
 
 def _try_cast_to_int(raw_field_val):
@@ -0,0 +1,189 @@
+import copy
+from unittest import TestCase
+from metameq.src.util import HOST_TYPE_SPECIFIC_METADATA_KEY, \
+    SAMPLE_TYPE_SPECIFIC_METADATA_KEY, METADATA_FIELDS_KEY, \
+    METADATA_TRANSFORMERS_KEY, POST_TRANSFORMERS_KEY, SOURCES_KEY, \
+    FUNCTION_KEY
+from metameq.src.frozen_config import intern_config_value
+from metameq.src.metadata_configurator import build_full_flat_config_dict
+from metameq.src.compiled_schema import FieldSpec, SampleTypeSchema, \
+    OutputColsIndex, compile_metadata_fields, compile_flat_hosts_dict
+
+
+class TestCompiledSchema(TestCase):
+    METADATA_FIELDS_DICT = {
+        "sample_name": {
+            "type": "string", "required": True, "unique": True
+        },
+        "body_site": {
+            "type": "string", "allowed": ["gut", "skin"],
+            "default": "gut", "is_phi": False
+        },
+        "age": {
+            "anyof": [{"type": "integer"}, {"type": "string"}],
+            "required": False
+        },
+        "barcode": {
+            "type": "string", "regex": "^[ACGT]+$"
+        },
+        "notes": {
+            "field_desc": "no type"
+        }
+    }
+
+    def test_field_spec(self):
+        """Test that field definitions are resolved into their parts."""
+        obs = compile_metadata_fields(self.METADATA_FIELDS_DICT)
+        specs = {x.name: x for x in obs.fields}
+
+        self.assertIsInstance(specs["body_site"], FieldSpec)
+        self.assertTrue(specs["body_site"].has_default)
+        self.assertEqual("gut", specs["body_site"].default)
+        self.assertFalse(specs["body_site"].required)
+        self.assertEqual((str,), specs["body_site"].allowed_types)
+
+        self.assertFalse(specs["sample_name"].has_default)
+        self.assertTrue(specs["sample_name"].required)
+
+        self.assertFalse(specs["age"].required)
+        self.assertEqual((int, str), specs["age"].allowed_types)
+
+        # missing type info is only an error when the field is validated
+        self.assertIsNone(specs["notes"].allowed_types)
+
+    def test_sample_type_schema(self):
+        """Test the schema's field order, cerberus schema and round trip."""
+        obs = compile_metadata_fields(self.METADATA_FIELDS_DICT)
+
+        self.assertIsInstance(obs, SampleTypeSchema)
+        self.assertEqual(list(self.METADATA_FIELDS_DICT), list(obs.field_names))
+        self.assertEqual(5, len(obs))
+        self.assertDictEqual(
+            {"type": "string", "allowed": ["gut", "skin"], "default": "gut"},
+            obs.cerberus_schema["body_site"])
+        self.assertDictEqual(self.METADATA_FIELDS_DICT, obs.to_dict())
+        self.assertEqual(frozenset(["sample_name", "body_site"]),
+                         obs.output_field_names)
+
+    def test_compile_metadata_fields_cached_by_fingerprint(self):
+        """Test that equal interned dicts share one compiled schema."""
+        interned = intern_config_value(self.METADATA_FIELDS_DICT)
+
+        obs1 = compile_metadata_fields(interned)
+        obs2 = compile_metadata_fields(
+            intern_config_value(copy.deepcopy(self.METADATA_FIELDS_DICT)))
+
+        self.assertIs(obs1, obs2)
+        # uninterned dicts are compiled each time
+        self.assertIsNot(
+            compile_metadata_fields(self.METADATA_FIELDS_DICT),
+            compile_metadata_fields(self.METADATA_FIELDS_DICT))
+
+    def test_compile_flat_hosts_dict(self):
+        """Test that compiling a full flat config round-trips its metadata fields."""
+        flat_hosts_dict = \
+            build_full_flat_config_dict()[HOST_TYPE_SPECIFIC_METADATA_KEY]
+
+        obs = compile_flat_hosts_dict(flat_hosts_dict)
+
+        self.assertEqual(list(flat_hosts_dict), list(obs))
+        for host_type, host_type_dict in flat_hosts_dict.items():
+            sample_types_dict = \
+                host_type_dict.get(SAMPLE_TYPE_SPECIFIC_METADATA_KEY, {})
+            self.assertEqual(list(sample_types_dict), list(obs[host_type]))
+            for sample_type, sample_type_dict in sample_types_dict.items():
+                self.assertDictEqual(
+                    sample_type_dict[METADATA_FIELDS_KEY],
+                    obs[host_type][sample_type].to_dict())
+
+
+class TestOutputColsIndex(TestCase):
+    FULL_FLAT_CONFIG_DICT = {
+        HOST_TYPE_SPECIFIC_METADATA_KEY: {
+            "human": {
+                SAMPLE_TYPE_SPECIFIC_METADATA_KEY: {
+                    "stool": {
+                        METADATA_FIELDS_KEY: {
+                            "body_site": {"type": "string", "default": "gut"},
+                            "optional": {"type": "string"}
+                        }
+                    },
+                    "blood": {
+                        METADATA_FIELDS_KEY: {
+                            "body_site": {"type": "string",
+                                          "default": "blood"},
+                            "blood_type": {"type": "string",
+                                           "required": True}
+                        }
+                    }
+                }
+            },
+            "control": {}
+        },
+        METADATA_TRANSFORMERS_KEY: {
+            POST_TRANSFORMERS_KEY: {
+                "site_copy": {SOURCES_KEY: ["body_site"],
+                              FUNCTION_KEY: "pass_through"},
+                "type_copy": {SOURCES_KEY: ["blood_type"],
+                              FUNCTION_KEY: "pass_through"}
+            }
+        }
+    }
+
+    def test_output_cols_index(self):
+        """Test the index's per-pair columns and inverted field lookup."""
+        obs = OutputColsIndex(self.FULL_FLAT_CONFIG_DICT)
+
+        self.assertEqual(
+            {("human", "stool"): frozenset(["body_site"]),
+             ("human", "blood"): frozenset(["body_site", "blood_type"])},
+            obs.output_cols_by_pair)
+        self.assertEqual(
+            {"body_site": {("human", "stool"), ("human", "blood")},
+             "blood_type": {("human", "blood")}},
+            obs.pairs_by_field)
+        self.assertEqual(
+            frozenset(["body_site", "optional", "blood_type", "site_copy",
+                       "type_copy"]),
+            obs.config_cols)
+
+    def test_get_output_cols(self):
+        """Test that only transformers whose sources are present add columns."""
+        obs = OutputColsIndex(self.FULL_FLAT_CONFIG_DICT)
+
+        self.assertEqual(
+            {"sample_name", "body_site", "site_copy"},
+            obs.get_output_cols(["sample_name"], [("human", "stool")]))
+        self.assertEqual(
+            {"sample_name"},
+            obs.get_output_cols(
+                ["sample_name"], [("control", "blank"), ("unicorn", "x")]))
+
+    def test_get_output_cols_transformer_dependencies(self):
+        """Test that a transformer whose source is filled by a later-listed transformer adds its column."""
+        config_dict = copy.deepcopy(self.FULL_FLAT_CONFIG_DICT)
+        config_dict[METADATA_TRANSFORMERS_KEY][POST_TRANSFORMERS_KEY] = {
+            "copy_of_copy": {SOURCES_KEY: ["site_copy"],
+                             FUNCTION_KEY: "pass_through"},
+            "site_copy": {SOURCES_KEY: ["body_site"],
+                          FUNCTION_KEY: "pass_through"}
+        }
+        obs = OutputColsIndex(config_dict)
+
+        self.assertEqual(
+            {"sample_name", "body_site", "site_copy", "copy_of_copy"},
+            obs.get_output_cols(["sample_name"], [("human", "stool")]))
+
+    def test_output_cols_index_host_sample_pairs(self):
+        """Test that only the given host+sample type pairs are indexed."""
+        obs = OutputColsIndex(
+            self.FULL_FLAT_CONFIG_DICT,
+            [("human", "stool"), ("control", "blank"), ("unicorn", "x")])
+
+        self.assertEqual(
+            {("human", "stool"): frozenset(["body_site"])},
+            obs.output_cols_by_pair)
+        self.assertEqual(
+            frozenset(["body_site", "optional", "site_copy", "type_copy",
+                       "blood_type"]),
+            obs.config_cols)
@@ -0,0 +1,91 @@
+import json
+import os.path as path
+import tempfile
+from unittest import TestCase
+import pandas
+from click.testing import CliRunner
+from metameq.src.__main__ import root
+from metameq.src.config_artifact import build_config_artifact, \
+    write_config_artifact, load_config_artifact, is_config_artifact, \
+    CONFIG_ARTIFACT_FORMAT_VERSION, FINGERPRINT_KEY, FORMAT_VERSION_KEY, \
+    SOURCE_KEY_KEY
+from metameq.src.config_cache import make_config_cache_key
+from metameq.src.metadata_configurator import build_full_flat_config_dict
+from metameq.src.metadata_extender import extend_metadata_df_from_yamls
+from metameq.src.util import extract_config_dict
+
+
+class TestConfigArtifact(TestCase):
+    TEST_DIR = path.dirname(__file__)
+    TEST_STDS_FP = path.join(TEST_DIR, "data/test_standards.yml")
+    TEST_STUDY_CONFIG_FP = path.join(TEST_DIR, "data/test_study_config.yml")
+    TEST_METADATA_FP = path.join(TEST_DIR, "data/test_metadata.csv")
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.artifact_fp = path.join(self._temp_dir.name, "config.jsonl")
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def test_build_config_artifact_round_trip(self):
+        """Test that a built artifact loads back as the built config."""
+        study_config = extract_config_dict(self.TEST_STUDY_CONFIG_FP)
+
+        header = build_config_artifact(
+            self.artifact_fp, study_config, stds_fp=self.TEST_STDS_FP)
+
+        expected = build_full_flat_config_dict(
+            study_config, None, self.TEST_STDS_FP)
+        self.assertTrue(is_config_artifact(self.artifact_fp))
+        self.assertEqual(CONFIG_ARTIFACT_FORMAT_VERSION,
+                         header[FORMAT_VERSION_KEY])
+        self.assertEqual(
+            make_config_cache_key(study_config, extract_config_dict(None),
+                                  self.TEST_STDS_FP),
+            header[SOURCE_KEY_KEY])
+        self.assertDictEqual(expected, load_config_artifact(self.artifact_fp))
+
+    def test_load_config_artifact_errors(self):
+        """Test that non-artifacts, other format versions and altered configs are rejected."""
+        self.assertFalse(is_config_artifact(self.TEST_STUDY_CONFIG_FP))
+        with self.assertRaisesRegex(ValueError, "not a metameq config artifact"):
+            load_config_artifact(self.TEST_STUDY_CONFIG_FP)
+
+        header = write_config_artifact({"a": 1}, self.artifact_fp)
+        with open(self.artifact_fp, "w") as f:
+            f.write(json.dumps(header) + "\n" + '{"a":2}\n')
+        with self.assertRaisesRegex(ValueError, "does not match"):
+            load_config_artifact(self.artifact_fp)
+
+        header[FORMAT_VERSION_KEY] = CONFIG_ARTIFACT_FORMAT_VERSION + 1
+        with open(self.artifact_fp, "w") as f:
+            f.write(json.dumps(header) + "\n" + '{"a":1}\n')
+        with self.assertRaisesRegex(ValueError, "format version"):
+            load_config_artifact(self.artifact_fp)
+
+    def test_write_config_artifact_unserializable_value(self):
+        """Test that configs JSON can't represent raise a ValueError."""
+        with self.assertRaisesRegex(ValueError, "cannot be written"):
+            write_config_artifact({"a": {1, 2}}, self.artifact_fp)
+        self.assertFalse(path.exists(self.artifact_fp))
+
+    def test_build_config_cli_artifact_used_in_place_of_study_config(self):
+        """Test that extending with a CLI-built artifact matches extending with the study config."""
+        runner = CliRunner()
+        result = runner.invoke(
+            root, ["build-config", self.TEST_STUDY_CONFIG_FP,
+                   self.artifact_fp, "--stds_fp", self.TEST_STDS_FP])
+        self.assertEqual(0, result.exit_code, result.output)
+        with open(self.artifact_fp) as f:
+            header = json.loads(f.readline())
+        self.assertIn(header[FINGERPRINT_KEY], result.output)
+
+        raw_df = pandas.read_csv(self.TEST_METADATA_FP, dtype=str)
+        expected_df, expected_msgs_df = extend_metadata_df_from_yamls(
+            raw_df.copy(), self.TEST_STUDY_CONFIG_FP, self.TEST_STDS_FP)
+        obs_df, obs_msgs_df = extend_metadata_df_from_yamls(
+            raw_df.copy(), self.artifact_fp)
+
+        pandas.testing.assert_frame_equal(expected_df, obs_df)
+        pandas.testing.assert_frame_equal(expected_msgs_df, obs_msgs_df)
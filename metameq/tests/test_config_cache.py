@@ -0,0 +1,273 @@
+import os
+import os.path as path
+import tempfile
+import time
+from unittest import TestCase
+from click.testing import CliRunner
+from metameq.src.__main__ import root
+from metameq.src.config_cache import ConfigCache, make_config_cache_key, \
+    make_standards_cache_key, set_default_config_cache
+from metameq.src.flat_config import build_lazy_flat_config_dict
+from metameq.src.metadata_configurator import build_full_flat_config_dict
+from metameq.src.util import HOST_TYPE_SPECIFIC_METADATA_KEY, \
+    clear_yaml_cache, extract_config_dict, get_yaml_parse_timings
+
+
+class ConfigCacheTestBase(TestCase):
+    TEST_DIR = path.dirname(__file__)
+    TEST_STDS_FP = path.join(TEST_DIR, "data/test_standards.yml")
+    TEST_STDS_W_INTERNALS_FP = path.join(
+        TEST_DIR, "data/test_standards_w_internals.yml")
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self._temp_dir.name
+
+    def tearDown(self):
+        set_default_config_cache(None)
+        self._temp_dir.cleanup()
+
+
+class TestMakeConfigCacheKey(ConfigCacheTestBase):
+    def test_make_config_cache_key_stable(self):
+        """Test that equal inputs give equal keys regardless of dict order."""
+        key1 = make_config_cache_key(
+            {"a": 1, "b": 2}, {"default": "x"}, self.TEST_STDS_FP)
+        key2 = make_config_cache_key(
+            {"b": 2, "a": 1}, {"default": "x"}, self.TEST_STDS_FP)
+        self.assertEqual(key1, key2)
+
+    def test_make_config_cache_key_sensitive_to_inputs(self):
+        """Test that changing any input changes the key."""
+        base_key = make_config_cache_key(
+            {"a": 1}, {"default": "x"}, self.TEST_STDS_FP)
+
+        self.assertNotEqual(base_key, make_config_cache_key(
+            {"a": 2}, {"default": "x"}, self.TEST_STDS_FP))
+        self.assertNotEqual(base_key, make_config_cache_key(
+            {"a": 1}, {"default": "y"}, self.TEST_STDS_FP))
+        self.assertNotEqual(base_key, make_config_cache_key(
+            {"a": 1}, {"default": "x"}, self.TEST_STDS_W_INTERNALS_FP))
+        self.assertNotEqual(base_key, make_config_cache_key(
+            {"a": 1}, {"default": "x"}, self.TEST_STDS_FP,
+            exclude_internals=True))
+
+
+class TestMakeStandardsCacheKey(ConfigCacheTestBase):
+    def test_make_standards_cache_key(self):
+        """Test that the key depends on the standards file and differs from config keys."""
+        key = make_standards_cache_key(self.TEST_STDS_FP)
+
+        self.assertEqual(key, make_standards_cache_key(self.TEST_STDS_FP))
+        self.assertNotEqual(
+            key, make_standards_cache_key(self.TEST_STDS_W_INTERNALS_FP))
+        self.assertNotEqual(
+            key, make_config_cache_key({}, {}, self.TEST_STDS_FP))
+
+
+class TestConfigCache(ConfigCacheTestBase):
+    def test_put_and_get(self):
+        """Test that a stored entry is returned as an equal, fresh copy."""
+        cache = ConfigCache(self.cache_dir)
+        config_dict = {"default": "not provided", "nested": {"a": [1, 2]}}
+
+        cache.put("abc", config_dict)
+        obs1 = cache.get("abc")
+        obs2 = cache.get("abc")
+
+        self.assertDictEqual(config_dict, obs1)
+        self.assertIsNot(obs1, obs2)
+
+    def test_get_missing(self):
+        """Test that a missing entry is a cache miss."""
+        cache = ConfigCache(self.cache_dir)
+        self.assertIsNone(cache.get("abc"))
+
+    def test_get_corrupt_entry(self):
+        """Test that an unreadable entry is a cache miss and is removed."""
+        cache = ConfigCache(self.cache_dir)
+        corrupt_fp = path.join(self.cache_dir, "abc.json")
+        with open(corrupt_fp, "w") as f:
+            f.write("not json")
+
+        self.assertIsNone(cache.get("abc"))
+        self.assertFalse(path.exists(corrupt_fp))
+
+    def test_get_tampered_entry(self):
+        """Test that an entry that doesn't match its fingerprint is a cache miss and is removed."""
+        cache = ConfigCache(self.cache_dir)
+        cache.put("abc", {"a": 1})
+        entry_fp = path.join(self.cache_dir, "abc.json")
+        with open(entry_fp, "rb") as f:
+            header_line = f.readline()
+        with open(entry_fp, "wb") as f:
+            f.write(header_line + b'{"a":2}')
+
+        self.assertIsNone(cache.get("abc"))
+        self.assertFalse(path.exists(entry_fp))
+
+    def test_put_err_not_json(self):
+        """Test that a config that can't be written as JSON raises a ValueError and isn't stored."""
+        cache = ConfigCache(self.cache_dir)
+
+        with self.assertRaisesRegex(ValueError, "Config cannot be cached"):
+            cache.put("abc", {"a": object()})
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_put_err_not_round_trip(self):
+        """Test that a config that JSON would change raises a ValueError and isn't stored."""
+        cache = ConfigCache(self.cache_dir)
+
+        with self.assertRaisesRegex(ValueError, "Config cannot be cached"):
+            cache.put("abc", {"a": {1: "one"}})
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_invalidate_and_clear(self):
+        """Test removing single entries and all entries."""
+        cache = ConfigCache(self.cache_dir)
+        cache.put("abc", {"a": 1})
+        cache.put("def", {"b": 2})
+        cache.put("ghi", {"c": 3})
+
+        self.assertTrue(cache.invalidate("abc"))
+        self.assertFalse(cache.invalidate("abc"))
+        self.assertIsNone(cache.get("abc"))
+
+        self.assertEqual(2, cache.clear())
+        self.assertEqual([], cache.list_entries())
+
+    def test_evict_least_recently_used(self):
+        """Test that eviction removes the least recently used entries."""
+        cache = ConfigCache(self.cache_dir)
+        cache.put("old", {"a": "x" * 100})
+        cache.put("new", {"a": "y" * 100})
+        entry_size = cache.total_bytes() // 2
+
+        # make "old" the least recently used, then read "new" to refresh it
+        past = time.time() - 100
+        os.utime(path.join(self.cache_dir, "old.json"), (past, past))
+        os.utime(path.join(self.cache_dir, "new.json"), (past, past))
+        cache.get("new")
+
+        cache.max_bytes = entry_size * 2
+        cache.put("newest", {"a": "z" * 100})
+
+        obs_keys = [x["key"] for x in cache.list_entries()]
+        self.assertEqual(2, len(obs_keys))
+        self.assertNotIn("old", obs_keys)
+        self.assertIn("new", obs_keys)
+        self.assertIn("newest", obs_keys)
+
+
+class TestBuildFullFlatConfigDictWithCache(ConfigCacheTestBase):
+    def test_build_full_flat_config_dict_uses_cache(self):
+        """Test that builds are stored in and then served from the cache."""
+        cache = ConfigCache(self.cache_dir)
+        set_default_config_cache(cache)
+        study_config = {"default": "not provided"}
+
+        first = build_full_flat_config_dict(
+            study_config, None, self.TEST_STDS_FP)
+        key = make_config_cache_key(
+            study_config, extract_config_dict(None), self.TEST_STDS_FP)
+        self.assertIn(key, [x["key"] for x in cache.list_entries()])
+
+        # tamper with the cached entry to prove the next build reads it
+        tampered = cache.get(key)
+        tampered["cache_marker"] = True
+        cache.put(key, tampered)
+
+        second = build_full_flat_config_dict(
+            study_config, None, self.TEST_STDS_FP)
+        self.assertTrue(second.pop("cache_marker"))
+        self.assertDictEqual(first, second)
+
+    def test_build_full_flat_config_dict_cache_matches_uncached(self):
+        """Test that cached builds equal uncached ones, with and without internals."""
+        for exclude_internals in [False, True]:
+            expected = build_full_flat_config_dict(
+                None, None, self.TEST_STDS_W_INTERNALS_FP, exclude_internals)
+
+            set_default_config_cache(ConfigCache(self.cache_dir))
+            build_full_flat_config_dict(
+                None, None, self.TEST_STDS_W_INTERNALS_FP, exclude_internals)
+            obs = build_full_flat_config_dict(
+                None, None, self.TEST_STDS_W_INTERNALS_FP, exclude_internals)
+            set_default_config_cache(None)
+
+            self.assertDictEqual(expected, obs)
+            self.assertEqual(
+                exclude_internals,
+                all(not x.startswith("_") for x in
+                    obs[HOST_TYPE_SPECIFIC_METADATA_KEY]))
+
+
+class TestBuildLazyFlatConfigDictWithCache(ConfigCacheTestBase):
+    def test_build_lazy_flat_config_dict_caches_standards(self):
+        """Test that the parsed standards are stored in and then served from the cache."""
+        resolved_stds_fp = os.path.realpath(self.TEST_STDS_FP)
+        expected = build_lazy_flat_config_dict(
+            None, None, self.TEST_STDS_FP)[HOST_TYPE_SPECIFIC_METADATA_KEY]
+
+        cache = ConfigCache(self.cache_dir)
+        set_default_config_cache(cache)
+        clear_yaml_cache()
+        build_lazy_flat_config_dict(None, None, self.TEST_STDS_FP)
+        self.assertEqual(
+            [make_standards_cache_key(self.TEST_STDS_FP)],
+            [x["key"] for x in cache.list_entries()])
+        self.assertEqual(1, len(get_yaml_parse_timings()[resolved_stds_fp]))
+
+        # a fresh process has no memoized parse; it should read the cache
+        clear_yaml_cache()
+        obs = build_lazy_flat_config_dict(
+            None, None, self.TEST_STDS_FP)[HOST_TYPE_SPECIFIC_METADATA_KEY]
+
+        self.assertNotIn(resolved_stds_fp, get_yaml_parse_timings())
+        self.assertDictEqual(expected.to_dict(), obs.to_dict())
+
+    def test_build_lazy_flat_config_dict_reparses_changed_standards(self):
+        """Test that a changed standards file is parsed rather than served from the cache."""
+        set_default_config_cache(ConfigCache(self.cache_dir))
+        stds_fp = path.join(self.cache_dir, "stds.yml")
+        with open(self.TEST_STDS_FP) as f:
+            stds_yaml = f.read()
+        with open(stds_fp, "w") as f:
+            f.write(stds_yaml)
+        build_lazy_flat_config_dict(None, None, stds_fp)
+
+        with open(stds_fp, "w") as f:
+            f.write(stds_yaml.replace("not provided", "changed"))
+        clear_yaml_cache()
+        obs = build_lazy_flat_config_dict(None, None, stds_fp)
+
+        self.assertEqual(
+            1, len(get_yaml_parse_timings()[os.path.realpath(stds_fp)]))
+        self.assertIn("changed", repr(obs[HOST_TYPE_SPECIFIC_METADATA_KEY]
+                                      .to_dict()))
+
+
+class TestCacheCli(ConfigCacheTestBase):
+    def test_cache_cli_info_invalidate_and_clear(self):
+        """Test the cache CLI group against a populated cache."""
+        cache = ConfigCache(self.cache_dir)
+        cache.put("abc", {"a": 1})
+        cache.put("def", {"b": 2})
+        runner = CliRunner()
+
+        result = runner.invoke(
+            root, ["cache", "info", "--cache_dir", self.cache_dir])
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("entries: 2", result.output)
+        self.assertIn("abc", result.output)
+
+        result = runner.invoke(
+            root, ["cache", "invalidate", "abc", "--cache_dir", self.cache_dir])
+        self.assertEqual(0, result.exit_code)
+        self.assertIsNone(cache.get("abc"))
+
+        result = runner.invoke(
+            root, ["cache", "clear", "--cache_dir", self.cache_dir])
+        self.assertEqual(0, result.exit_code)
+        self.assertIn("removed 1 cache entries", result.output)
+        self.assertEqual([], cache.list_entries())
@@ -0,0 +1,129 @@
+from datetime import date, datetime
+from unittest import TestCase
+from unittest.mock import patch
+from dateutil import parser
+import metameq.src.date_parse_cache as date_parse_cache
+from metameq.src.date_parse_cache import clear_date_parse_cache, \
+    parse_date, parse_dates
+
+
+class TestParseDate(TestCase):
+    def setUp(self):
+        clear_date_parse_cache()
+
+    def tearDown(self):
+        clear_date_parse_cache()
+
+    def test_parse_date(self):
+        """Test that a date string parses as with dateutil."""
+        for date_str in ["2023-01-02", "01/02/2023", "Jan 2 2023 10:15",
+                         "2023-01-02T10:15:30"]:
+            with self.subTest(date_str=date_str):
+                self.assertEqual(
+                    parser.parse(date_str), parse_date(date_str))
+
+    def test_parse_date_fuzzy(self):
+        """Test that a fuzzy parse ignores unknown tokens, as with dateutil."""
+        self.assertEqual(datetime(2023, 1, 2),
+                         parse_date("sampled on 2023-01-02", fuzzy=True))
+
+    def test_parse_date_err_unparseable(self):
+        """Test that an unparseable string raises a ValueError, and again when cached."""
+        for _ in range(2):
+            with self.assertRaisesRegex(
+                    ValueError, "Unable to parse date: sampled on 2023-01-02"):
+                parse_date("sampled on 2023-01-02")
+
+    def test_parse_date_not_str(self):
+        """Test that a value that is not a string is passed to dateutil."""
+        with self.assertRaises(TypeError):
+            parse_date(20230102)
+
+    def test_parse_date_cached(self):
+        """Test that a string is parsed once, for a strict and then a fuzzy parse."""
+        with patch.object(date_parse_cache.parser, "parse",
+                          wraps=parser.parse) as mock_parse:
+            for _ in range(2):
+                self.assertEqual(datetime(2023, 1, 2, 10, 15),
+                                 parse_date("Jan 2 2023 10:15"))
+                self.assertEqual(datetime(2023, 1, 2, 10, 15),
+                                 parse_date("Jan 2 2023 10:15", fuzzy=True))
+
+        self.assertEqual(1, mock_parse.call_count)
+
+    def test_parse_date_fuzzy_after_failed_strict(self):
+        """Test that a string that fails a strict parse is parsed again fuzzily."""
+        with self.assertRaises(ValueError):
+            parse_date("sampled on 2023-01-02")
+        self.assertEqual(datetime(2023, 1, 2),
+                         parse_date("sampled on 2023-01-02", fuzzy=True))
+        with self.assertRaises(ValueError):
+            parse_date("sampled on 2023-01-02")
+
+    def test_parse_date_cleared_on_new_day(self):
+        """Test that the cache is cleared when the date changes."""
+        parse_date("2023-01-02")
+        with patch.object(date_parse_cache, "date") as mock_date:
+            mock_date.today.return_value = date(2100, 1, 1)
+            parse_dates([])
+
+        self.assertEqual({}, dict(date_parse_cache._parsed_dates))
+
+
+class TestParseDates(TestCase):
+    def setUp(self):
+        clear_date_parse_cache()
+
+    def tearDown(self):
+        clear_date_parse_cache()
+
+    def test_parse_dates(self):
+        """Test that each distinct string parses as with dateutil, or to None."""
+        date_strs = ["2023-01-02", "2023-02-30", "0000-01-01", "2023-01-02",
+                     "01/02/2023 10:15", "2023-01-02 10:15:60", "bad",
+                     "Jan 2 2023"]
+
+        obs = parse_dates(date_strs)
+
+        self.assertEqual(list(dict.fromkeys(date_strs)), list(obs))
+        for curr_str, curr_obs in obs.items():
+            try:
+                exp = parser.parse(curr_str)
+            except Exception:
+                exp = None
+            with self.subTest(date_str=curr_str):
+                self.assertEqual(exp, curr_obs)
+
+    def test_parse_dates_fuzzy(self):
+        """Test that fuzzy parses give None only for strings with no date."""
+        obs = parse_dates(["2023-01-02", "on 2023-01-02", "bad"], fuzzy=True)
+
+        self.assertEqual({"2023-01-02": datetime(2023, 1, 2),
+                          "on 2023-01-02": datetime(2023, 1, 2),
+                          "bad": None}, obs)
+
+    def test_parse_dates_vectorized(self):
+        """Test that only strings without the dominant format are parsed with dateutil."""
+        date_strs = [f"2023-01-{x:02d}" for x in range(1, 29)] + \
+            ["01/02/2023", "2023-02-30"]
+
+        with patch.object(date_parse_cache.parser, "parse",
+                          wraps=parser.parse) as mock_parse:
+            obs = parse_dates(date_strs)
+
+        self.assertEqual(datetime(2023, 1, 28), obs["2023-01-28"])
+        self.assertEqual(datetime(2023, 1, 2), obs["01/02/2023"])
+        self.assertIsNone(obs["2023-02-30"])
+        self.assertEqual(
+            ["01/02/2023", "2023-02-30"],
+            [x.args[0] for x in mock_parse.call_args_list])
+
+    def test_parse_dates_bounded(self):
+        """Test that the least recently used strings are dropped from a full cache."""
+        with patch.object(date_parse_cache, "MAX_CACHED_DATE_PARSES", 2):
+            parse_dates(["2023-01-01", "2023-01-02"])
+            parse_date("2023-01-01")
+            parse_dates(["2023-01-03"])
+
+        self.assertEqual(["2023-01-01", "2023-01-03"],
+                         list(date_parse_cache._parsed_dates))
@@ -0,0 +1,216 @@
+import os.path as path
+import pickle
+from unittest import TestCase
+from metameq.src.util import HOST_TYPE_SPECIFIC_METADATA_KEY, \
+    SAMPLE_TYPE_SPECIFIC_METADATA_KEY, HOST_OVERRIDES_ANCESTOR_SAMPLE_TYPE_KEY, \
+    METADATA_FIELDS_KEY, ALIAS_KEY, BASE_TYPE_KEY, DEFAULT_KEY, TYPE_KEY, \
+    STUDY_SPECIFIC_METADATA_KEY, extract_config_dict
+from metameq.src.metadata_configurator import build_full_flat_config_dict, \
+    build_full_nested_config_dict
+from metameq.src.flat_config import FlatConfig, SampleTypesConfig, \
+    build_lazy_flat_config_dict, get_standards_base, _get_global_settings
+
+
+class TestFlatConfig(TestCase):
+    TEST_DIR = path.dirname(__file__)
+    TEST_STDS_FP = path.join(TEST_DIR, "data/test_standards.yml")
+    TEST_STDS_W_INTERNALS_FP = path.join(
+        TEST_DIR, "data/test_standards_w_internals.yml")
+
+    def test_build_lazy_flat_config_dict_matches_eager(self):
+        """Test that lazy builds equal eager ones for all option combinations."""
+        for stds_fp in [self.TEST_STDS_FP, self.TEST_STDS_W_INTERNALS_FP, None]:
+            for exclude_internals in [False, True]:
+                for host_overrides in [False, True]:
+                    study_config = {
+                        HOST_OVERRIDES_ANCESTOR_SAMPLE_TYPE_KEY: host_overrides}
+                    expected = build_full_flat_config_dict(
+                        study_config, None, stds_fp, exclude_internals)
+                    obs = build_lazy_flat_config_dict(
+                        study_config, None, stds_fp, exclude_internals)
+
+                    obs_hosts = obs.pop(HOST_TYPE_SPECIFIC_METADATA_KEY)
+                    expected_hosts = expected.pop(
+                        HOST_TYPE_SPECIFIC_METADATA_KEY)
+                    self.assertIsInstance(obs_hosts, FlatConfig)
+                    self.assertDictEqual(expected, obs)
+                    self.assertDictEqual(expected_hosts, obs_hosts.to_dict())
+                    self.assertEqual(list(expected_hosts), list(obs_hosts))
+
+    def test_flat_config_resolves_only_requested_host_types(self):
+        """Test that looking up a host type resolves only that host type."""
+        config = build_lazy_flat_config_dict(None, None, self.TEST_STDS_FP)
+        hosts = config[HOST_TYPE_SPECIFIC_METADATA_KEY]
+
+        self.assertIn("human", hosts)
+        self.assertNotIn("unicorn", hosts)
+        self.assertEqual([], hosts.resolved_names)
+
+        human_dict = hosts["human"]
+        self.assertEqual(["human"], hosts.resolved_names)
+        # memoized
+        self.assertIs(human_dict, hosts["human"])
+
+        with self.assertRaises(KeyError):
+            _ = hosts["unicorn"]
+
+    def test_flat_config_exclude_internals(self):
+        """Test that internal host and sample types are hidden."""
+        config = build_lazy_flat_config_dict(
+            None, None, self.TEST_STDS_W_INTERNALS_FP, exclude_internals=True)
+        hosts = config[HOST_TYPE_SPECIFIC_METADATA_KEY]
+
+        self.assertNotIn("_internal", hosts)
+        self.assertEqual(
+            ["human", "mouse", "host_associated", "base"], list(hosts))
+        self.assertEqual(
+            ["stool", "blood"],
+            list(hosts["human"][SAMPLE_TYPE_SPECIFIC_METADATA_KEY]))
+
+        with self.assertRaises(KeyError):
+            _ = hosts["_internal"]
+
+    def test_flat_config_pickles(self):
+        """Test that a partially resolved FlatConfig survives pickling."""
+        config = build_lazy_flat_config_dict(None, None, self.TEST_STDS_FP)
+        hosts = config[HOST_TYPE_SPECIFIC_METADATA_KEY]
+        _ = hosts["human"]
+
+        obs = pickle.loads(pickle.dumps(hosts))
+        self.assertEqual(["human"], obs.resolved_names)
+        self.assertDictEqual(hosts.to_dict(), obs.to_dict())
+
+    def test_study_overlay_matches_fresh_build(self):
+        """Test that overlaying a study on the standards base equals flattening from scratch."""
+        software_config = extract_config_dict(None)
+        for host_overrides in [False, True]:
+            study_config = {
+                HOST_OVERRIDES_ANCESTOR_SAMPLE_TYPE_KEY: host_overrides,
+                STUDY_SPECIFIC_METADATA_KEY: {
+                    HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                        "host_associated": {
+                            METADATA_FIELDS_KEY: {
+                                "study_field": {
+                                    DEFAULT_KEY: "x", TYPE_KEY: "string"}
+                            }
+                        }
+                    }
+                }
+            }
+            obs = build_lazy_flat_config_dict(
+                study_config, software_config, self.TEST_STDS_FP)
+            obs_hosts = obs[HOST_TYPE_SPECIFIC_METADATA_KEY]
+            fresh_hosts = FlatConfig(build_full_nested_config_dict(
+                study_config, software_config, self.TEST_STDS_FP))
+
+            # human descends from the touched host type
+            self.assertIn("study_field",
+                          obs_hosts["human"][METADATA_FIELDS_KEY])
+            self.assertDictEqual(fresh_hosts.to_dict(), obs_hosts.to_dict())
+
+    def test_standards_base_shared_across_studies(self):
+        """Test that studies share the standards base's untouched host types."""
+        study_config = {
+            STUDY_SPECIFIC_METADATA_KEY: {
+                HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                    "mouse": {METADATA_FIELDS_KEY: {}}
+                }
+            }
+        }
+        hosts1 = build_lazy_flat_config_dict(
+            None, None, self.TEST_STDS_FP)[HOST_TYPE_SPECIFIC_METADATA_KEY]
+        hosts2 = build_lazy_flat_config_dict(
+            study_config, None,
+            self.TEST_STDS_FP)[HOST_TYPE_SPECIFIC_METADATA_KEY]
+        base = get_standards_base(
+            self.TEST_STDS_FP, _get_global_settings(extract_config_dict(None)))
+
+        self.assertIs(base["human"], hosts1["human"])
+        self.assertIs(base["human"], hosts2["human"])
+        self.assertIsNot(hosts1["mouse"], hosts2["mouse"])
+
+        # different global settings need a different base
+        other_hosts = build_lazy_flat_config_dict(
+            {DEFAULT_KEY: "missing"}, None,
+            self.TEST_STDS_FP)[HOST_TYPE_SPECIFIC_METADATA_KEY]
+        self.assertIsNot(base["human"], other_hosts["human"])
+        self.assertEqual(
+            "missing", other_hosts["base"][DEFAULT_KEY])
+
+    def test_to_dict_does_not_modify_base(self):
+        """Test that modifying a to_dict result leaves the shared base intact."""
+        hosts = build_lazy_flat_config_dict(
+            None, None, self.TEST_STDS_FP)[HOST_TYPE_SPECIFIC_METADATA_KEY]
+        expected = hosts.to_dict()
+
+        obs = hosts.to_dict()
+        obs["human"][METADATA_FIELDS_KEY].clear()
+        obs["human"][SAMPLE_TYPE_SPECIFIC_METADATA_KEY]["stool"].clear()
+
+        self.assertDictEqual(expected, hosts.to_dict())
+
+
+class TestSampleTypesConfig(TestCase):
+    NESTED_HOSTS_DICT = {
+        HOST_TYPE_SPECIFIC_METADATA_KEY: {
+            "human": {
+                METADATA_FIELDS_KEY: {
+                    "host_field": {DEFAULT_KEY: "h", TYPE_KEY: "string"}
+                },
+                SAMPLE_TYPE_SPECIFIC_METADATA_KEY: {
+                    "stool": {
+                        METADATA_FIELDS_KEY: {
+                            "stool_field": {
+                                DEFAULT_KEY: "s", TYPE_KEY: "string"}
+                        }
+                    },
+                    "feces": {ALIAS_KEY: "stool"},
+                    "poop": {ALIAS_KEY: "feces"},
+                    "blood": {
+                        BASE_TYPE_KEY: "blood",
+                        METADATA_FIELDS_KEY: {}
+                    }
+                }
+            }
+        }
+    }
+
+    def test_sample_types_resolved_on_demand(self):
+        """Test that only looked-up sample types are resolved."""
+        hosts = FlatConfig(self.NESTED_HOSTS_DICT)
+        sample_types = hosts["human"][SAMPLE_TYPE_SPECIFIC_METADATA_KEY]
+
+        self.assertIsInstance(sample_types, SampleTypesConfig)
+        self.assertEqual(["stool", "feces", "poop", "blood"],
+                         list(sample_types))
+        self.assertEqual([], sample_types.resolved_names)
+
+        feces_dict = sample_types["feces"]
+        self.assertEqual(["feces"], sample_types.resolved_names)
+        self.assertEqual(
+            {"host_field", "stool_field", "sample_type", "qiita_sample_type"},
+            set(feces_dict[METADATA_FIELDS_KEY]))
+        self.assertIs(feces_dict, sample_types["feces"])
+
+    def test_sample_type_errors_raised_at_lookup(self):
+        """Test that invalid aliases and base types raise only when used."""
+        hosts = FlatConfig(self.NESTED_HOSTS_DICT)
+        sample_types = hosts["human"][SAMPLE_TYPE_SPECIFIC_METADATA_KEY]
+
+        with self.assertRaisesRegex(ValueError, "May not chain aliases"):
+            _ = sample_types["poop"]
+        with self.assertRaisesRegex(ValueError, "has itself as its base type"):
+            _ = sample_types["blood"]
+        # valid sample types are unaffected
+        self.assertIn(METADATA_FIELDS_KEY, sample_types["stool"])
+
+    def test_check_all(self):
+        """Test that check_all raises for any invalid sample type."""
+        with self.assertRaisesRegex(ValueError, "May not chain aliases"):
+            FlatConfig(self.NESTED_HOSTS_DICT).check_all()
+
+        # the test standards are valid, so checking them raises nothing
+        config = build_lazy_flat_config_dict(
+            None, None, TestFlatConfig.TEST_STDS_FP, check_all=True)
+        hosts = config[HOST_TYPE_SPECIFIC_METADATA_KEY]
+        self.assertEqual(list(hosts), hosts.resolved_names)
@@ -0,0 +1,147 @@
+import copy
+import pickle
+from unittest import TestCase
+import yaml
+from metameq.src.frozen_config import FrozenDict, FrozenList, \
+    FrozenConfigDumper, intern_config_value, get_fingerprint, \
+    thaw_config_value
+from metameq.src.flat_config import build_lazy_flat_config_dict
+from metameq.src.metadata_configurator import build_full_flat_config_dict
+from metameq.src.compiled_schema import compile_metadata_fields
+from metameq.src.util import HOST_TYPE_SPECIFIC_METADATA_KEY, \
+    SAMPLE_TYPE_SPECIFIC_METADATA_KEY, METADATA_FIELDS_KEY, DEFAULT_KEY
+
+
+class TestInternConfigValue(TestCase):
+    def test_intern_config_value_shares_equal_values(self):
+        """Test that equal definitions map to one canonical object."""
+        def1 = {"type": "string", "allowed": ["a", "b"], "default": "a"}
+        def2 = {"type": "string", "allowed": ["a", "b"], "default": "a"}
+
+        obs1 = intern_config_value(def1)
+        obs2 = intern_config_value(def2)
+
+        self.assertIs(obs1, obs2)
+        self.assertIsInstance(obs1, FrozenDict)
+        self.assertIsInstance(obs1["allowed"], FrozenList)
+        self.assertEqual(def1, obs1)
+        self.assertEqual(get_fingerprint(def1), obs1.fingerprint)
+        # already-interned values are returned as is
+        self.assertIs(obs1, intern_config_value(obs1))
+
+    def test_intern_config_value_distinguishes_types_and_order(self):
+        """Test that values equal in python but of different types, or in a different order, stay distinct."""
+        fingerprints = {get_fingerprint({"a": x}) for x in [1, 1.0, True, "1"]}
+        self.assertEqual(4, len(fingerprints))
+        self.assertNotEqual(get_fingerprint({"a": 1, "b": 2}),
+                            get_fingerprint({"b": 2, "a": 1}))
+        self.assertNotEqual(get_fingerprint([]), get_fingerprint({}))
+
+    def test_intern_config_value_scalars_unchanged(self):
+        """Test that non-container values are returned unchanged."""
+        self.assertEqual("abc", intern_config_value("abc"))
+        self.assertIsNone(intern_config_value(None))
+        with self.assertRaises(TypeError):
+            get_fingerprint("abc")
+
+    def test_frozen_values_are_immutable(self):
+        """Test that interned containers can't be modified."""
+        obs = intern_config_value({"allowed": ["a"]})
+
+        with self.assertRaises(TypeError):
+            obs["default"] = "a"
+        with self.assertRaises(TypeError):
+            obs.update({"default": "a"})
+        with self.assertRaises(TypeError):
+            obs.pop("allowed")
+        with self.assertRaises(TypeError):
+            obs["allowed"].append("b")
+
+    def test_frozen_values_copy_pickle_and_dump(self):
+        """Test deep copying, pickling and yaml dumping of interned containers."""
+        obs = intern_config_value({"allowed": ["a"], "nested": {"x": 1}})
+
+        deep_copy = copy.deepcopy(obs)
+        self.assertIs(type(deep_copy), dict)
+        self.assertIs(type(deep_copy["allowed"]), list)
+        deep_copy["allowed"].append("b")
+        self.assertEqual(["a"], obs["allowed"])
+
+        self.assertIs(obs, pickle.loads(pickle.dumps(obs)))
+        self.assertEqual(
+            {"allowed": ["a"], "nested": {"x": 1}},
+            yaml.safe_load(yaml.dump(obs, Dumper=FrozenConfigDumper)))
+        # the representers are not added to yaml's own SafeDumper
+        with self.assertRaises(yaml.representer.RepresenterError):
+            yaml.safe_dump(obs)
+
+    def test_thaw_config_value(self):
+        """Test that thawing copies every occurrence of a shared interned value separately."""
+        field_def = {"type": "string", "allowed": ["a", "b"]}
+        interned = intern_config_value(
+            {"field_a": field_def, "field_b": dict(field_def)})
+        self.assertIs(interned["field_a"], interned["field_b"])
+
+        obs = thaw_config_value(interned)
+
+        self.assertEqual({"field_a": field_def, "field_b": field_def}, obs)
+        self.assertIs(type(obs), dict)
+        self.assertIs(type(obs["field_a"]), dict)
+        self.assertIs(type(obs["field_a"]["allowed"]), list)
+        self.assertIsNot(obs["field_a"], obs["field_b"])
+        self.assertIsNot(obs["field_a"]["allowed"], obs["field_b"]["allowed"])
+
+
+class TestInternedConfig(TestCase):
+    def test_build_lazy_flat_config_dict_shares_schemas(self):
+        """Test that an alias's resolved schema is its target's schema object."""
+        config = build_lazy_flat_config_dict()
+        human_sample_types = config[HOST_TYPE_SPECIFIC_METADATA_KEY][
+            "human"][SAMPLE_TYPE_SPECIFIC_METADATA_KEY]
+
+        # "csf" is an alias of "cerebrospinal fluid" in the bundled standards
+        self.assertIs(
+            human_sample_types["cerebrospinal fluid"][METADATA_FIELDS_KEY],
+            human_sample_types["csf"][METADATA_FIELDS_KEY])
+
+    def test_build_full_flat_config_dict_mutable(self):
+        """Test that the built config is made of ordinary, mutable containers."""
+        config = build_full_flat_config_dict()
+        saliva_fields = config[HOST_TYPE_SPECIFIC_METADATA_KEY]["human"][
+            SAMPLE_TYPE_SPECIFIC_METADATA_KEY]["saliva"][METADATA_FIELDS_KEY]
+
+        self.assertIs(type(saliva_fields), dict)
+        saliva_fields["new_field"] = {"type": "string"}
+        self.assertEqual({"type": "string"}, saliva_fields["new_field"])
+        self.assertEqual(config, yaml.safe_load(yaml.safe_dump(config)))
+
+    def test_build_full_flat_config_dict_fields_independent(self):
+        """Test that modifying one pair's field leaves every other pair unchanged."""
+        config = build_full_flat_config_dict()
+        expected = copy.deepcopy(config)
+
+        def get_field(a_config):
+            return a_config[HOST_TYPE_SPECIFIC_METADATA_KEY]["human"][
+                SAMPLE_TYPE_SPECIFIC_METADATA_KEY]["_intestinal content"][
+                METADATA_FIELDS_KEY]["collection_device"]
+
+        get_field(config)[DEFAULT_KEY] = "changed"
+        get_field(expected)[DEFAULT_KEY] = "changed"
+
+        self.maxDiff = None
+        self.assertEqual(expected, config)
+
+    def test_cerberus_schema_shared_by_fingerprint(self):
+        """Test that equal interned schemas share one cerberus schema."""
+        fields = {"field_a": {"type": "string", "is_phi": False}}
+        interned = intern_config_value(fields)
+
+        obs1 = compile_metadata_fields(interned).cerberus_schema
+        obs2 = compile_metadata_fields(
+            intern_config_value(copy.deepcopy(fields))).cerberus_schema
+
+        self.assertIs(obs1, obs2)
+        self.assertEqual({"field_a": {"type": "string"}}, obs1)
+        # uninterned dicts still get their own schema
+        self.assertIsNot(
+            obs1, compile_metadata_fields(fields).cerberus_schema)
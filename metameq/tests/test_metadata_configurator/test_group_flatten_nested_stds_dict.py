@@ -1,3 +1,4 @@
+import copy
 from metameq.src.util import \
     HOST_TYPE_SPECIFIC_METADATA_KEY, \
     METADATA_FIELDS_KEY, \
@@ -27,6 +28,17 @@ class TestMakeCombinedStdsAndStudyHostTypeDicts(ConfiguratorTestBase):
             self.NESTED_STDS_W_STUDY_DICT[HOST_TYPE_SPECIFIC_METADATA_KEY],
             out_nested_dict)
 
+    def test__make_combined_stds_and_study_host_type_dicts_inputs_unchanged(self):
+        """Test that combining does not modify the input dictionaries."""
+        study_dict = copy.deepcopy(self.FLAT_STUDY_DICT)
+        stds_dict = copy.deepcopy(self.NESTED_STDS_DICT)
+
+        _make_combined_stds_and_study_host_type_dicts(study_dict, stds_dict)
+
+        self.maxDiff = None
+        self.assertDictEqual(self.FLAT_STUDY_DICT, study_dict)
+        self.assertDictEqual(self.NESTED_STDS_DICT, stds_dict)
+
 
 class TestFlattenNestedStdsDict(ConfiguratorTestBase):
     def test_flatten_nested_stds_dict(self):
@@ -1536,3 +1548,48 @@ class TestFlattenNestedStdsDict(ConfiguratorTestBase):
         result = flatten_nested_stds_dict(input_dict, None)
 
         self.assertDictEqual(expected, result)
+
+    def test_flatten_nested_stds_dict_input_unchanged(self):
+        """Test that flattening does not modify the input dictionary."""
+        stds_dict = copy.deepcopy(self.NESTED_STDS_W_STUDY_DICT)
+
+        flatten_nested_stds_dict(stds_dict, None)
+
+        self.maxDiff = None
+        self.assertDictEqual(self.NESTED_STDS_W_STUDY_DICT, stds_dict)
+
+    def test_flatten_nested_stds_dict_shares_inherited_definitions(self):
+        """Test that child hosts share, not copy, inherited field definitions."""
+        parent_field_def = {TYPE_KEY: "string", DEFAULT_KEY: "parent"}
+        overridden_field_def = {TYPE_KEY: "string", DEFAULT_KEY: "parent"}
+        input_dict = {
+            HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                "parent_host": {
+                    METADATA_FIELDS_KEY: {
+                        "inherited_field": parent_field_def,
+                        "overridden_field": overridden_field_def
+                    },
+                    HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                        "child_host": {
+                            METADATA_FIELDS_KEY: {
+                                "overridden_field": {DEFAULT_KEY: "child"}
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+        result = flatten_nested_stds_dict(input_dict, None)
+
+        parent_fields = result["parent_host"][METADATA_FIELDS_KEY]
+        child_fields = result["child_host"][METADATA_FIELDS_KEY]
+        self.assertEqual(parent_field_def, child_fields["inherited_field"])
+        self.assertIs(parent_fields["inherited_field"],
+                      child_fields["inherited_field"])
+        self.assertEqual("child",
+                         child_fields["overridden_field"][DEFAULT_KEY])
+        # overriding a field in the child leaves the parent's definition alone
+        self.assertEqual("parent",
+                         parent_fields["overridden_field"][DEFAULT_KEY])
+        self.assertEqual("parent", overridden_field_def[DEFAULT_KEY])
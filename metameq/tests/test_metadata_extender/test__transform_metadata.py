@@ -1,5 +1,6 @@
 import numpy as np
 import pandas
+from unittest.mock import patch
 from pandas.testing import assert_frame_equal
 from metameq.src.util import \
     SAMPLE_NAME_KEY, \
@@ -11,7 +12,11 @@ from metameq.src.util import \
     FUNCTION_KEY, \
     PRE_TRANSFORMERS_KEY
 from metameq.src.metadata_extender import \
-    _transform_metadata
+    _transform_metadata, \
+    _transform_metadata_in_blocks
+from metameq.src.metadata_transformers import vectorized_transformer, \
+    pure_transformer, row_series_transformer, help_transform_mapping
+import metameq.src.metadata_extender as metadata_extender
 from metameq.tests.test_metadata_extender.conftest import \
     ExtenderTestBase
 
@@ -171,6 +176,209 @@ class TestTransformMetadata(ExtenderTestBase):
         })
         assert_frame_equal(expected_df, result_df)
 
+    def test__transform_metadata_vectorized_custom_transformer(self):
+        """Test using a custom transformer registered as vectorized."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+            "source_field": ["hello", "world", np.nan],
+            "target_field": [np.nan, "keep", np.nan]
+        })
+        full_flat_config_dict = {
+            OVERWRITE_NON_NANS_KEY: False,
+            METADATA_TRANSFORMERS_KEY: {
+                "pre": {
+                    "target_field": {
+                        SOURCES_KEY: ["source_field"],
+                        FUNCTION_KEY: "custom_upper"
+                    }
+                }
+            }
+        }
+        received_row_counts = []
+
+        @vectorized_transformer
+        def custom_upper(rows_df, source_fields):
+            received_row_counts.append(len(rows_df))
+            return rows_df[source_fields[0]].str.upper()
+
+        result_df = _transform_metadata(
+            input_df, full_flat_config_dict, "pre",
+            {"custom_upper": custom_upper})
+
+        expected_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+            "source_field": ["hello", "world", np.nan],
+            "target_field": ["HELLO", "keep", np.nan]
+        })
+        assert_frame_equal(expected_df, result_df)
+        # called once, on only the rows to be set
+        self.assertEqual([2], received_row_counts)
+
+    def test__transform_metadata_pure_custom_transformer(self):
+        """Test that a custom transformer declared pure is called once per distinct source value."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+            "source_field": ["hello", "world", "hello"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                "pre": {
+                    "target_field": {
+                        SOURCES_KEY: ["source_field"],
+                        FUNCTION_KEY: "custom_upper"
+                    }
+                }
+            }
+        }
+        called_for = []
+
+        @pure_transformer
+        def custom_upper(row, source_fields):
+            called_for.append(row[source_fields[0]])
+            return row[source_fields[0]].upper()
+
+        result_df = _transform_metadata(
+            input_df, full_flat_config_dict, "pre",
+            {"custom_upper": custom_upper})
+
+        expected_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+            "source_field": ["hello", "world", "hello"],
+            "target_field": ["HELLO", "WORLD", "HELLO"]
+        })
+        assert_frame_equal(expected_df, result_df)
+        self.assertEqual(["hello", "world"], called_for)
+
+    def test__transform_metadata_custom_transformer_row_view(self):
+        """Test that a custom transformer is passed each row as a view of its source field values."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "source_field": ["y", "n"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                "pre": {
+                    "target_field": {
+                        SOURCES_KEY: ["source_field"],
+                        FUNCTION_KEY: "custom_yes_no"
+                    }
+                }
+            }
+        }
+        rows = []
+
+        def custom_yes_no(row, source_fields):
+            rows.append(row)
+            return help_transform_mapping(
+                row, source_fields, {"y": "yes", "n": "no"})
+
+        result_df = _transform_metadata(
+            input_df, full_flat_config_dict, "pre",
+            {"custom_yes_no": custom_yes_no})
+
+        expected_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "source_field": ["y", "n"],
+            "target_field": ["yes", "no"]
+        })
+        assert_frame_equal(expected_df, result_df)
+        self.assertNotIsInstance(rows[0], pandas.Series)
+        self.assertEqual(["source_field"], list(rows[0]))
+
+    def test__transform_metadata_row_series_custom_transformer(self):
+        """Test that a custom transformer declared as needing row Series is passed each whole row."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "source_field": ["a", "b"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                "pre": {
+                    "target_field": {
+                        SOURCES_KEY: ["source_field"],
+                        FUNCTION_KEY: "custom_with_name"
+                    }
+                }
+            }
+        }
+
+        @row_series_transformer
+        def custom_with_name(row, source_fields):
+            return f"{row[SAMPLE_NAME_KEY]}_{row[source_fields[0]]}"
+
+        result_df = _transform_metadata(
+            input_df, full_flat_config_dict, "pre",
+            {"custom_with_name": custom_with_name})
+
+        expected_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "source_field": ["a", "b"],
+            "target_field": ["sample1_a", "sample2_b"]
+        })
+        assert_frame_equal(expected_df, result_df)
+
+    def test__transform_metadata_builtins_match_row_wise(self):
+        """Test that the built-in transformers give the same results all rows at once as row by row."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3", "sample4"],
+            "sex": ["M", "female", np.nan, "m"],
+            "age": ["5", "40", "17", np.nan],
+            "date": ["2021-01-01", np.nan, "1/2/2020 10:30", "2021-01-01"],
+            "lat": ["32.8800", "unknown", np.nan, "100"],
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                "pre": {
+                    "std_sex": {SOURCES_KEY: ["sex"],
+                                FUNCTION_KEY: "transform_input_sex_to_std_sex"},
+                    "life_stage": {SOURCES_KEY: ["age"],
+                                   FUNCTION_KEY: "transform_age_to_life_stage"},
+                    "std_date": {
+                        SOURCES_KEY: ["date"],
+                        FUNCTION_KEY: "transform_date_to_formatted_date"},
+                    "latitude": {
+                        SOURCES_KEY: ["lat"],
+                        FUNCTION_KEY: "transform_format_field_as_location"},
+                    "age_int": {SOURCES_KEY: ["age"],
+                                FUNCTION_KEY: "transform_format_field_as_int"},
+                    "sex_copy": {SOURCES_KEY: ["sex"],
+                                 FUNCTION_KEY: "pass_through"}
+                }
+            }
+        }
+
+        result_df = _transform_metadata(
+            input_df.copy(), full_flat_config_dict, "pre", None)
+        with patch.object(metadata_extender.transformers,
+                          "get_vectorized_version", return_value=None):
+            expected_df = _transform_metadata(
+                input_df.copy(), full_flat_config_dict, "pre", None)
+
+        assert_frame_equal(expected_df, result_df)
+        self.assertEqual(["male", "female"],
+                         result_df["std_sex"].tolist()[:2])
+        self.assertEqual(["32.88", "unknown"],
+                         result_df["latitude"].tolist()[:2])
+
+    def test__transform_metadata_builtin_error_matches_row_wise(self):
+        """Test that a built-in transformer raises the same error all rows at once as row by row."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+            "sex": ["M", "unknown1", "unknown2"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                "pre": {
+                    "std_sex": {SOURCES_KEY: ["sex"],
+                                FUNCTION_KEY: "transform_input_sex_to_std_sex"}
+                }
+            }
+        }
+
+        with self.assertRaisesRegex(ValueError, "Unrecognized sex: unknown1"):
+            _transform_metadata(
+                input_df, full_flat_config_dict, "pre", None)
+
     def test__transform_metadata_unknown_transformer_raises(self):
         """Test that unknown transformer function raises ValueError."""
         input_df = pandas.DataFrame({
@@ -466,3 +674,215 @@ class TestTransformMetadata(ExtenderTestBase):
         self.assertEqual(1, len(log_context.output))
         self.assertIn("field_b", log_context.output[0])
         self.assertNotIn("field_a", log_context.output[0])
+
+    def test__transform_metadata_runs_after_source_transformers(self):
+        """Test that a transformer runs after the transformers filling its sources, whatever the config order."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "input_sex": ["F", "M"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "sex_copy": {
+                        SOURCES_KEY: ["sex"],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "sex": {
+                        SOURCES_KEY: ["input_sex"],
+                        FUNCTION_KEY: "transform_input_sex_to_std_sex"
+                    }
+                }
+            }
+        }
+
+        result_df = _transform_metadata(
+            input_df, full_flat_config_dict, PRE_TRANSFORMERS_KEY, None)
+
+        expected_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "input_sex": ["F", "M"],
+            "sex": ["female", "male"],
+            "sex_copy": ["female", "male"]
+        })
+        assert_frame_equal(expected_df, result_df)
+
+    def test__transform_metadata_cycle_raises(self):
+        """Test that transformers depending on each other in a cycle raise an error before any run."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "field_a": ["a1", "a2"],
+            "field_b": ["b1", "b2"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "other_field": {
+                        SOURCES_KEY: ["field_a"],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "field_a": {
+                        SOURCES_KEY: ["field_b"],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "field_b": {
+                        SOURCES_KEY: ["field_a"],
+                        FUNCTION_KEY: "pass_through"
+                    }
+                }
+            }
+        }
+        expected_df = input_df.copy()
+
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            _transform_metadata(
+                input_df, full_flat_config_dict, PRE_TRANSFORMERS_KEY, None)
+        assert_frame_equal(expected_df, input_df)
+
+    def test__transform_metadata_unknown_transformer_raises_before_any_run(self):
+        """Test that an unknown transformer raises an error before any transformer runs."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "source_field": ["a", "b"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "target_field": {
+                        SOURCES_KEY: ["source_field"],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "other_field": {
+                        SOURCES_KEY: ["source_field"],
+                        FUNCTION_KEY: "nonexistent_function"
+                    }
+                }
+            }
+        }
+        expected_df = input_df.copy()
+
+        with self.assertRaisesRegex(
+                ValueError,
+                "Unable to find transformer 'nonexistent_function'"):
+            _transform_metadata(
+                input_df, full_flat_config_dict, PRE_TRANSFORMERS_KEY, None)
+        assert_frame_equal(expected_df, input_df)
+
+    def test__transform_metadata_in_threads(self):
+        """Test that running independent transformers in threads matches running them one at a time."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+            "input_sex": ["F", "M", None],
+            "age": ["4", "40", None],
+            "existing_field": ["e1", None, "e3"]
+        })
+        full_flat_config_dict = {
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "sex_copy": {
+                        SOURCES_KEY: ["sex"],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "sex": {
+                        SOURCES_KEY: ["input_sex"],
+                        FUNCTION_KEY: "transform_input_sex_to_std_sex"
+                    },
+                    "life_stage": {
+                        SOURCES_KEY: ["age"],
+                        FUNCTION_KEY: "transform_age_to_life_stage"
+                    },
+                    "existing_field": {
+                        SOURCES_KEY: [SAMPLE_NAME_KEY],
+                        FUNCTION_KEY: "pass_through"
+                    }
+                }
+            }
+        }
+        expected_df = _transform_metadata(
+            input_df.copy(), full_flat_config_dict, PRE_TRANSFORMERS_KEY,
+            None)
+
+        result_df = _transform_metadata(
+            input_df.copy(), full_flat_config_dict, PRE_TRANSFORMERS_KEY,
+            None, num_threads=3)
+
+        assert_frame_equal(expected_df, result_df)
+        self.assertEqual(
+            [SAMPLE_NAME_KEY, "input_sex", "age", "existing_field", "sex",
+             "sex_copy", "life_stage"],
+            list(result_df.columns))
+
+    def test__transform_metadata_in_threads_leaves_input_data(self):
+        """Test that transformers run in threads don't write into the input's data."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            "existing_field": ["e1", "e2"],
+            "other_field": ["o1", "o2"]
+        })
+        full_flat_config_dict = {
+            OVERWRITE_NON_NANS_KEY: True,
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "existing_field": {
+                        SOURCES_KEY: [SAMPLE_NAME_KEY],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "other_field": {
+                        SOURCES_KEY: [SAMPLE_NAME_KEY],
+                        FUNCTION_KEY: "pass_through"
+                    }
+                }
+            }
+        }
+        shallow_input_df = input_df.copy(deep=False)
+
+        result_df = _transform_metadata(
+            shallow_input_df, full_flat_config_dict, PRE_TRANSFORMERS_KEY,
+            None, num_threads=2)
+
+        self.assertEqual(["sample1", "sample2"],
+                         result_df["existing_field"].tolist())
+        self.assertEqual(["sample1", "sample2"],
+                         result_df["other_field"].tolist())
+        self.assertEqual(["e1", "e2"], input_df["existing_field"].tolist())
+        self.assertEqual(["o1", "o2"], input_df["other_field"].tolist())
+
+
+class TestTransformMetadataInBlocks(ExtenderTestBase):
+    def test__transform_metadata_in_blocks(self):
+        """Test that transforming blocks of rows in worker processes matches transforming in this process."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: [f"sample{i}" for i in range(9)],
+            HOSTTYPE_SHORTHAND_KEY: ["human"] * 9,
+            SAMPLETYPE_SHORTHAND_KEY: ["stool"] * 9,
+            "input_sex": ["F", "M", "female", None, "Male", "f", "m",
+                          None, "FEMALE"],
+            "sex": [None, "male", None, None, None, None, None, None, None]
+        })
+        full_flat_config_dict = {
+            OVERWRITE_NON_NANS_KEY: False,
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "sex": {
+                        SOURCES_KEY: ["input_sex"],
+                        FUNCTION_KEY: "transform_input_sex_to_std_sex"
+                    },
+                    "sex_copy": {
+                        SOURCES_KEY: ["sex"],
+                        FUNCTION_KEY: "pass_through"
+                    }
+                }
+            }
+        }
+        expected_df = _transform_metadata(
+            input_df.copy(), full_flat_config_dict, PRE_TRANSFORMERS_KEY,
+            None)
+
+        # blocks of 3 rows, in 3 workers
+        with patch.object(metadata_extender,
+                          "_MIN_ROWS_PER_PARALLEL_BATCH", 3):
+            result_df = _transform_metadata_in_blocks(
+                input_df.copy(), full_flat_config_dict,
+                PRE_TRANSFORMERS_KEY, None, 3)
+
+        assert_frame_equal(expected_df, result_df)
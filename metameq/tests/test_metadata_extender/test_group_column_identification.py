@@ -16,10 +16,17 @@ from metameq.src.util import \
     HOST_TYPE_SPECIFIC_METADATA_KEY, \
     STUDY_SPECIFIC_METADATA_KEY, \
     HOSTTYPE_COL_OPTIONS_KEY, \
-    SAMPLETYPE_COL_OPTIONS_KEY
+    SAMPLETYPE_COL_OPTIONS_KEY, \
+    METADATA_TRANSFORMERS_KEY, \
+    PRE_TRANSFORMERS_KEY, \
+    POST_TRANSFORMERS_KEY, \
+    SOURCES_KEY, \
+    FUNCTION_KEY
 from metameq.src.metadata_extender import \
     id_missing_cols, \
     get_reserved_cols, \
+    extend_metadata_df, \
+    _get_output_cols_index, \
     find_standard_cols, \
     find_nonstandard_cols, \
     get_default_column_name, \
@@ -261,6 +268,59 @@ class TestGetReservedCols(ExtenderTestBase):
         ]
         self.assertEqual(expected, result)
 
+    def test_get_reserved_cols_matches_extended_columns(self):
+        """Test returns the columns extension would add, including transformer targets and invalid types."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3", "sample4"],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "human", "unicorn", None],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "nonsense", "stool", "stool"]
+        })
+        study_config = {
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "pre_target": {
+                        SOURCES_KEY: [SAMPLE_NAME_KEY],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "skipped_pre_target": {
+                        SOURCES_KEY: ["body_site"],
+                        FUNCTION_KEY: "pass_through"
+                    }
+                },
+                POST_TRANSFORMERS_KEY: {
+                    "post_target": {
+                        SOURCES_KEY: ["body_site"],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "chained_post_target": {
+                        SOURCES_KEY: ["post_target"],
+                        FUNCTION_KEY: "pass_through"
+                    }
+                }
+            }
+        }
+
+        result = get_reserved_cols(input_df, study_config, self.TEST_STDS_FP)
+
+        extended_df, _ = extend_metadata_df(
+            input_df, study_config, None, None, self.TEST_STDS_FP)
+        self.assertEqual(sorted(extended_df.columns), result)
+        self.assertIn("chained_post_target", result)
+        self.assertNotIn("skipped_pre_target", result)
+
+    def test_get_reserved_cols_reuses_index(self):
+        """Test that the output column index is built once per distinct config."""
+        study_config = {DEFAULT_KEY: "not provided"}
+
+        index1 = _get_output_cols_index(study_config, self.TEST_STDS_FP)
+        index2 = _get_output_cols_index(
+            {DEFAULT_KEY: "not provided"}, self.TEST_STDS_FP)
+        other_index = _get_output_cols_index(
+            {DEFAULT_KEY: "missing"}, self.TEST_STDS_FP)
+
+        self.assertIs(index1, index2)
+        self.assertIsNot(index1, other_index)
+
 
 class TestFindStandardCols(ExtenderTestBase):
     def test_find_standard_cols_returns_standard_cols_in_df(self):
@@ -6,12 +6,16 @@ from metameq.src.util import \
     HOSTTYPE_SHORTHAND_KEY, \
     SAMPLETYPE_SHORTHAND_KEY, \
     QC_NOTE_KEY, \
-    DEFAULT_KEY
+    DEFAULT_KEY, \
+    LEAVE_BLANK_VAL
 from metameq.src.metadata_extender import \
     _reorder_df, \
     _catch_nan_required_fields, \
-    _fill_na_if_default, \
-    INTERNAL_COL_KEYS
+    _replace_sentinels, \
+    _finalize_metadata_df, \
+    expand_compact_cols, \
+    INTERNAL_COL_KEYS, \
+    REQ_PLACEHOLDER
 from metameq.tests.test_metadata_extender.conftest import \
     ExtenderTestBase
 
@@ -123,35 +127,142 @@ class TestCatchNanRequiredFields(ExtenderTestBase):
         assert_frame_equal(expected, result)
 
 
-class TestFillNaIfDefault(ExtenderTestBase):
-    def test__fill_na_if_default_has_default_in_settings(self):
-        """Test that specific_dict default takes precedence over settings_dict."""
+class TestReplaceSentinels(ExtenderTestBase):
+    def test__replace_sentinels_fills_nans(self):
+        """Test that NaNs are filled with the fill value."""
         input_df = pandas.DataFrame({
             "field1": ["value1", np.nan, "value3"],
             "field2": [np.nan, "value2", np.nan]
         })
-        settings_dict = {DEFAULT_KEY: "filled"}
 
-        result = _fill_na_if_default(input_df, settings_dict)
+        _replace_sentinels(input_df, "filled", {})
 
         expected = pandas.DataFrame({
             "field1": ["value1", "filled", "value3"],
             "field2": ["filled", "value2", "filled"]
         })
-        assert_frame_equal(expected, result)
+        assert_frame_equal(expected, input_df)
 
-    def test__fill_na_if_default_no_default_in_settings(self):
-        """Test that NaN values are unchanged when no default is in settings."""
+    def test__replace_sentinels_no_fill_val(self):
+        """Test that NaN values are unchanged when there is no fill value."""
         input_df = pandas.DataFrame({
             "field1": ["value1", np.nan, "value3"],
             "field2": [np.nan, "value2", np.nan]
         })
-        settings_dict = {}
 
-        result = _fill_na_if_default(input_df, settings_dict)
+        _replace_sentinels(input_df, None, {})
 
         expected = pandas.DataFrame({
             "field1": ["value1", np.nan, "value3"],
             "field2": [np.nan, "value2", np.nan]
         })
+        assert_frame_equal(expected, input_df)
+
+    def test__replace_sentinels_fills_and_replaces_in_one_pass(self):
+        """Test that sentinels are replaced, but not by the NaN fill value."""
+        input_df = pandas.DataFrame({
+            "field1": [REQ_PLACEHOLDER, np.nan, "value3"],
+            "field2": pandas.Series(
+                [np.nan, REQ_PLACEHOLDER, "value2"], dtype="str"),
+            "floats": [1.5, np.nan, 2.5],
+            "ints": [1, 2, 3]
+        })
+
+        _replace_sentinels(input_df, "filled", {REQ_PLACEHOLDER: np.nan})
+
+        expected = pandas.DataFrame({
+            "field1": [np.nan, "filled", "value3"],
+            "field2": pandas.Series(
+                ["filled", np.nan, "value2"], dtype="str"),
+            "floats": pandas.Series([1.5, "filled", 2.5], dtype=object),
+            "ints": [1, 2, 3]
+        })
+        assert_frame_equal(expected, input_df)
+
+    def test__replace_sentinels_only_in_sentinel_cols(self):
+        """Test that sentinels are only looked for in the given columns."""
+        input_df = pandas.DataFrame({
+            "field1": [REQ_PLACEHOLDER, np.nan],
+            "field2": [REQ_PLACEHOLDER, np.nan]
+        })
+
+        _replace_sentinels(
+            input_df, "filled", {REQ_PLACEHOLDER: "replaced"}, {"field1"})
+
+        expected = pandas.DataFrame({
+            "field1": ["replaced", "filled"],
+            "field2": [REQ_PLACEHOLDER, "filled"]
+        })
+        assert_frame_equal(expected, input_df)
+
+    def test__replace_sentinels_categorical(self):
+        """Test that compact columns are changed in their categories and stay compact."""
+        input_df = pandas.DataFrame({
+            "field1": pandas.Categorical(
+                ["value1", REQ_PLACEHOLDER, np.nan, "value1"]),
+            "field2": pandas.Categorical(["value2"] * 4)
+        })
+
+        _replace_sentinels(input_df, "filled", {REQ_PLACEHOLDER: "filled"})
+
+        expected = pandas.DataFrame({
+            "field1": pandas.Categorical(
+                ["value1", "filled", "filled", "value1"],
+                categories=["filled", "value1"]),
+            "field2": pandas.Categorical(["value2"] * 4)
+        })
+        assert_frame_equal(expected, input_df)
+
+
+class TestFinalizeMetadataDf(ExtenderTestBase):
+    def test__finalize_metadata_df(self):
+        """Test that NaNs get the default and LEAVE_BLANK_VAL becomes blank."""
+        input_df = pandas.DataFrame({
+            "field1": [LEAVE_BLANK_VAL, np.nan, "value3"],
+            "field2": [np.nan, "value2", LEAVE_BLANK_VAL]
+        })
+
+        _finalize_metadata_df(
+            input_df, {DEFAULT_KEY: "not provided"}, None)
+
+        expected = pandas.DataFrame({
+            "field1": ["", "not provided", "value3"],
+            "field2": ["not provided", "value2", ""]
+        })
+        assert_frame_equal(expected, input_df)
+
+    def test__finalize_metadata_df_leave_blank_default(self):
+        """Test that a default of LEAVE_BLANK_VAL fills NaNs with blanks."""
+        input_df = pandas.DataFrame({
+            "field1": ["value1", np.nan],
+            "field2": [np.nan, np.nan]
+        })
+
+        _finalize_metadata_df(
+            input_df, {DEFAULT_KEY: LEAVE_BLANK_VAL}, {"field1"})
+
+        expected = pandas.DataFrame({
+            "field1": ["value1", ""],
+            "field2": pandas.Series(["", ""], dtype=object)
+        })
+        assert_frame_equal(expected, input_df)
+
+
+class TestExpandCompactCols(ExtenderTestBase):
+    def test_expand_compact_cols(self):
+        """Test that categorical columns become columns of their values."""
+        input_df = pandas.DataFrame({
+            "field1": pandas.Categorical(["value1", np.nan, "value1"]),
+            "field2": ["a", "b", "c"]
+        })
+
+        result = expand_compact_cols(input_df)
+
+        expected = pandas.DataFrame({
+            "field1": ["value1", np.nan, "value1"],
+            "field2": ["a", "b", "c"]
+        })
         assert_frame_equal(expected, result)
+        # the input is left as it is
+        self.assertIsInstance(
+            input_df["field1"].dtype, pandas.CategoricalDtype)
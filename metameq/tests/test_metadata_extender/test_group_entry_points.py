@@ -3,6 +3,7 @@ import os
 import os.path as path
 import pandas
 import tempfile
+from click.testing import CliRunner
 from pandas.testing import assert_frame_equal
 from metameq.src.util import \
     SAMPLE_NAME_KEY, \
@@ -25,6 +26,7 @@ from metameq.src.metadata_extender import \
     write_extended_metadata_from_df, \
     write_extended_metadata, \
     _get_study_specific_config
+from metameq.src.__main__ import root
 from metameq.tests.test_metadata_extender.conftest import \
     ExtenderTestBase
 
@@ -929,3 +931,106 @@ study_specific_metadata:
                 os.path.join(tmpdir, "*_test_output_validation_errors.csv"))
             self.assertEqual(1, len(validation_files))
             self.assertEqual(0, os.path.getsize(validation_files[0]))
+
+
+class TestWriteExtendedMetadataInChunks(ExtenderTestBase):
+    @staticmethod
+    def _read_output_lines(out_dir, suffix):
+        output_fps = glob.glob(os.path.join(out_dir, f"*_test_output{suffix}"))
+        assert len(output_fps) == 1
+        with open(output_fps[0], 'r') as output_file:
+            return output_file.read().splitlines()
+
+    def test_write_extended_metadata_chunked_project1(self):
+        """Test that chunked extension writes the same rows as the in-memory path."""
+        # the first 24 rows have an invalid host type, so the early chunks
+        # get none of the generated columns of their own
+        for chunk_size in [1, 5, 1000]:
+            with tempfile.TemporaryDirectory() as tmpdir:
+                result = write_extended_metadata(
+                    self.TEST_PROJECT1_METADATA_FP,
+                    self.TEST_PROJECT1_CONFIG_FP, tmpdir, "test_output",
+                    chunk_size=chunk_size)
+                self.assertIsNone(result)
+
+                for suffix, expected_fp in [
+                        (".txt", self.TEST_PROJECT1_EXPECTED_OUTPUT_FP),
+                        ("_fails.csv", self.TEST_PROJECT1_EXPECTED_FAILS_FP)]:
+                    with open(expected_fp, 'r') as expected_file:
+                        expected_lines = expected_file.read().splitlines()
+                    obs_lines = self._read_output_lines(tmpdir, suffix)
+                    self.assertEqual(expected_lines[0], obs_lines[0])
+                    self.assertEqual(
+                        sorted(expected_lines[1:]), sorted(obs_lines[1:]))
+
+                self.assertEqual([], self._read_output_lines(
+                    tmpdir, "_validation_errors.csv"))
+
+    def test_write_extended_metadata_chunked_preserve_input_order(self):
+        """Test that chunked extension can write rows in their input order."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_extended_metadata(
+                self.TEST_PROJECT1_METADATA_FP, self.TEST_PROJECT1_CONFIG_FP,
+                tmpdir, "test_output", chunk_size=10,
+                preserve_input_order=True)
+
+            output_df = pandas.read_csv(
+                glob.glob(os.path.join(tmpdir, "*_test_output.txt"))[0],
+                sep="\t", dtype=str, keep_default_na=False)
+            input_df = pandas.read_csv(
+                self.TEST_PROJECT1_METADATA_FP, dtype=str)
+            expected_sample_names = [
+                x for x in input_df[SAMPLE_NAME_KEY]
+                if x in set(output_df[SAMPLE_NAME_KEY])]
+            self.assertEqual(
+                expected_sample_names, output_df[SAMPLE_NAME_KEY].tolist())
+
+    def test_write_extended_metadata_chunked_validation_errors(self):
+        """Test that chunked extension appends each chunk's validation errors."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_extended_metadata(
+                self.TEST_METADATA_WITH_ERRORS_FP,
+                self.TEST_STUDY_CONFIG_WITH_VALIDATION_FP, tmpdir,
+                "test_output", stds_fp=self.TEST_STDS_FP)
+            expected_lines = self._read_output_lines(
+                tmpdir, "_validation_errors.csv")
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            write_extended_metadata(
+                self.TEST_METADATA_WITH_ERRORS_FP,
+                self.TEST_STUDY_CONFIG_WITH_VALIDATION_FP, tmpdir,
+                "test_output", stds_fp=self.TEST_STDS_FP, chunk_size=1,
+                suppress_empty_fails=True)
+            obs_lines = self._read_output_lines(
+                tmpdir, "_validation_errors.csv")
+            # no qc failures, so no (empty) fails file
+            self.assertEqual([], glob.glob(
+                os.path.join(tmpdir, "*_test_output_fails.csv")))
+
+        self.assertGreater(len(expected_lines), 1)
+        self.assertEqual(expected_lines[0], obs_lines[0])
+        self.assertEqual(sorted(expected_lines[1:]), sorted(obs_lines[1:]))
+
+    def test_write_extended_metadata_chunked_xlsx_raises(self):
+        """Test that chunked extension rejects excel files."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            with self.assertRaisesRegex(ValueError, "extending in chunks"):
+                write_extended_metadata(
+                    self.TEST_METADATA_XLSX_FP, self.TEST_STUDY_CONFIG_FP,
+                    tmpdir, "test_output", stds_fp=self.TEST_STDS_FP,
+                    chunk_size=10)
+
+    def test_write_extended_metadata_cli_chunk_size(self):
+        """Test the write-extended-metadata command's --chunk_size option."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result = CliRunner().invoke(root, [
+                "write-extended-metadata", self.TEST_PROJECT1_METADATA_FP,
+                self.TEST_PROJECT1_CONFIG_FP, "test_output",
+                "--out_dir", tmpdir, "--chunk_size", "20",
+                "--preserve_input_order"])
+            self.assertEqual(0, result.exit_code, result.output)
+
+            with open(self.TEST_PROJECT1_EXPECTED_OUTPUT_FP, 'r') as f:
+                expected_lines = f.read().splitlines()
+            obs_lines = self._read_output_lines(tmpdir, ".txt")
+            self.assertEqual(sorted(expected_lines), sorted(obs_lines))
@@ -1,4 +1,5 @@
 import pandas
+from unittest.mock import patch
 from pandas.testing import assert_frame_equal
 from metameq.src.util import \
     SAMPLE_NAME_KEY, \
@@ -16,11 +17,20 @@ from metameq.src.util import \
     OVERWRITE_NON_NANS_KEY, \
     LEAVE_REQUIREDS_BLANK_KEY, \
     LEAVE_BLANK_VAL, \
-    HOST_TYPE_SPECIFIC_METADATA_KEY
+    HOST_TYPE_SPECIFIC_METADATA_KEY, \
+    GROUP_BROADCAST_EXTENSION_KEY, \
+    COMPACT_DEFAULT_COLS_KEY
+from metameq.src.flat_config import build_lazy_flat_config_dict
 from metameq.src.metadata_extender import \
     _generate_metadata_for_a_sample_type_in_a_host_type, \
     _generate_metadata_for_a_host_type, \
-    _generate_metadata_for_host_types
+    _generate_metadata_for_host_types, \
+    _generate_metadata_for_host_types_by_group, \
+    _get_num_workers, \
+    _get_row_blocks, \
+    _map_in_batches, \
+    expand_compact_cols
+import metameq.src.metadata_extender as metadata_extender
 from metameq.tests.test_metadata_extender.conftest import \
     ExtenderTestBase
 
@@ -978,3 +988,398 @@ class TestGenerateMetadataForHostTypes(ExtenderTestBase):
             QIITA_SAMPLE_TYPE: ["stool"]
         })
         assert_frame_equal(expected_df, result_df)
+
+
+class TestGenerateMetadataForHostTypesByGroup(ExtenderTestBase):
+    def _assert_matches_per_type_path(self, input_df, full_flat_config_dict):
+        expected_df, expected_msgs = _generate_metadata_for_host_types(
+            input_df, full_flat_config_dict)
+
+        by_group_config_dict = dict(full_flat_config_dict)
+        by_group_config_dict[GROUP_BROADCAST_EXTENSION_KEY] = True
+        result_df, result_msgs = _generate_metadata_for_host_types(
+            input_df, by_group_config_dict)
+
+        assert_frame_equal(expected_df, result_df)
+        self.assertEqual(expected_msgs, result_msgs)
+        return result_df
+
+    def test__generate_metadata_for_host_types_by_group_multiple_host_types(self):
+        """Test group-broadcast generation orders rows by host type, then sample type, and fills NAs."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3", "sample4"],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human", "human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood", "stool"],
+            QC_NOTE_KEY: ["", "", "", ""]
+        })
+        full_flat_config_dict = {
+            DEFAULT_KEY: "global_default",
+            LEAVE_REQUIREDS_BLANK_KEY: False,
+            OVERWRITE_NON_NANS_KEY: False,
+            HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                "human": {
+                    DEFAULT_KEY: "human_default",
+                    LEAVE_REQUIREDS_BLANK_KEY: False,
+                    OVERWRITE_NON_NANS_KEY: False,
+                    SAMPLE_TYPE_SPECIFIC_METADATA_KEY: {
+                        "stool": {
+                            METADATA_FIELDS_KEY: {
+                                "human_field": {
+                                    DEFAULT_KEY: "human_value",
+                                    TYPE_KEY: "string"
+                                },
+                                "required_field": {
+                                    REQUIRED_KEY: True,
+                                    TYPE_KEY: "string"
+                                }
+                            }
+                        },
+                        "blood": {
+                            METADATA_FIELDS_KEY: {
+                                "human_field": {
+                                    DEFAULT_KEY: "human_value",
+                                    TYPE_KEY: "string"
+                                }
+                            }
+                        }
+                    }
+                },
+                "mouse": {
+                    DEFAULT_KEY: "global_default",
+                    LEAVE_REQUIREDS_BLANK_KEY: True,
+                    OVERWRITE_NON_NANS_KEY: False,
+                    SAMPLE_TYPE_SPECIFIC_METADATA_KEY: {
+                        "stool": {
+                            METADATA_FIELDS_KEY: {
+                                "mouse_field": {
+                                    DEFAULT_KEY: "mouse_value",
+                                    TYPE_KEY: "string"
+                                },
+                                "required_field": {
+                                    REQUIRED_KEY: True,
+                                    TYPE_KEY: "string"
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+        result_df = self._assert_matches_per_type_path(
+            input_df, full_flat_config_dict)
+
+        expected_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample4", "sample3", "sample2"],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "human", "human", "mouse"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood", "stool"],
+            QC_NOTE_KEY: ["", "", "", ""],
+            "human_field": ["human_value", "human_value", "human_value",
+                            "global_default"],
+            # human has no leave_requireds_blank, so the missing required
+            # field gets the human default; it is not a blood field, so
+            # blood samples get the global default after the fact
+            "required_field": ["human_default", "human_default",
+                               "global_default", ""],
+            "mouse_field": ["global_default", "global_default",
+                            "global_default", "mouse_value"]
+        })
+        assert_frame_equal(expected_df, result_df)
+
+    def test__generate_metadata_for_host_types_by_group_existing_values(self):
+        """Test group-broadcast generation honors overwrite_non_nans per host type."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3", "sample4"],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human", "mouse"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "stool", "stool"],
+            QC_NOTE_KEY: ["", "", "", ""],
+            "shared_field": ["input1", "input2", None, None]
+        })
+        sample_types_dict = {
+            "stool": {
+                METADATA_FIELDS_KEY: {
+                    "shared_field": {
+                        DEFAULT_KEY: "default_value",
+                        TYPE_KEY: "string"
+                    }
+                }
+            }
+        }
+        full_flat_config_dict = {
+            DEFAULT_KEY: "global_default",
+            LEAVE_REQUIREDS_BLANK_KEY: False,
+            OVERWRITE_NON_NANS_KEY: False,
+            HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                "human": {
+                    LEAVE_REQUIREDS_BLANK_KEY: False,
+                    OVERWRITE_NON_NANS_KEY: False,
+                    SAMPLE_TYPE_SPECIFIC_METADATA_KEY: sample_types_dict
+                },
+                "mouse": {
+                    LEAVE_REQUIREDS_BLANK_KEY: False,
+                    OVERWRITE_NON_NANS_KEY: True,
+                    SAMPLE_TYPE_SPECIFIC_METADATA_KEY: sample_types_dict
+                }
+            }
+        }
+
+        result_df = self._assert_matches_per_type_path(
+            input_df, full_flat_config_dict)
+
+        self.assertEqual(
+            ["input1", "default_value", "default_value", "default_value"],
+            result_df["shared_field"].tolist())
+
+    def test__generate_metadata_for_host_types_by_group_unknown_types(self):
+        """Test group-broadcast generation adds QC notes for unknown host and sample types."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3", "sample4"],
+            HOSTTYPE_SHORTHAND_KEY: ["unknown_host", "human", "unknown_host",
+                                     "human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "unknown_sample", "blood",
+                                       "stool"],
+            QC_NOTE_KEY: ["", "", "", ""]
+        })
+        full_flat_config_dict = {
+            DEFAULT_KEY: "global_default",
+            LEAVE_REQUIREDS_BLANK_KEY: False,
+            OVERWRITE_NON_NANS_KEY: False,
+            HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                "human": {
+                    LEAVE_REQUIREDS_BLANK_KEY: False,
+                    OVERWRITE_NON_NANS_KEY: False,
+                    SAMPLE_TYPE_SPECIFIC_METADATA_KEY: {
+                        "stool": {
+                            METADATA_FIELDS_KEY: {
+                                "stool_field": {
+                                    DEFAULT_KEY: "stool_value",
+                                    TYPE_KEY: "string"
+                                }
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+        result_df = self._assert_matches_per_type_path(
+            input_df, full_flat_config_dict)
+
+        expected_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample3", "sample2", "sample4"],
+            HOSTTYPE_SHORTHAND_KEY: ["unknown_host", "unknown_host", "human",
+                                     "human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "blood", "unknown_sample",
+                                       "stool"],
+            QC_NOTE_KEY: ["invalid host_type", "invalid host_type",
+                          "invalid sample_type", ""],
+            "stool_field": ["global_default", "global_default",
+                            "global_default", "stool_value"]
+        })
+        assert_frame_equal(expected_df, result_df)
+
+    def test__generate_metadata_for_host_types_by_group_test_standards(self):
+        """Test group-broadcast generation matches the per-type path on the test standards."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: [f"sample{i}" for i in range(8)],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human", "control",
+                                     "human", "mouse", "unknown", "human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood", "stool",
+                                       "stool", "unknown", "stool", "blood"],
+            QC_NOTE_KEY: [""] * 8,
+            "description": ["a", None, None, "b", None, "c", None, None],
+            "host_age": [1.5, None, 30, None, 2, None, None, 4],
+            "notes": [float("nan")] * 8
+        })
+        for curr_setting in [False, True]:
+            full_flat_config_dict = dict(build_lazy_flat_config_dict(
+                {OVERWRITE_NON_NANS_KEY: curr_setting,
+                 LEAVE_REQUIREDS_BLANK_KEY: curr_setting},
+                None, self.TEST_STDS_FP))
+
+            with self.subTest(setting=curr_setting):
+                self._assert_matches_per_type_path(
+                    input_df, full_flat_config_dict)
+
+    def test__generate_metadata_for_host_types_by_group_direct(self):
+        """Test calling the group-broadcast engine directly gives the same result as via the setting."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1"],
+            HOSTTYPE_SHORTHAND_KEY: ["human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool"],
+            QC_NOTE_KEY: [""]
+        })
+        full_flat_config_dict = build_lazy_flat_config_dict(
+            None, None, self.TEST_STDS_FP)
+
+        expected_df, expected_msgs = _generate_metadata_for_host_types(
+            input_df, full_flat_config_dict)
+        result_df, result_msgs = _generate_metadata_for_host_types_by_group(
+            input_df, full_flat_config_dict)
+
+        assert_frame_equal(expected_df, result_df)
+        self.assertEqual(expected_msgs, result_msgs)
+
+
+class TestGenerateMetadataForHostTypesCompact(ExtenderTestBase):
+    INPUT_DF = pandas.DataFrame({
+        SAMPLE_NAME_KEY: [f"sample{i}" for i in range(8)],
+        HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human", "control",
+                                 "human", "mouse", "unknown", "human"],
+        SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood", "stool",
+                                   "stool", "unknown", "stool", "blood"],
+        QC_NOTE_KEY: [""] * 8,
+        "description": ["a", None, None, "b", None, "c", None, None],
+        "host_age": [1.5, None, 30, None, 2, None, None, 4]
+    })
+
+    def test__generate_metadata_for_host_types_compact_default_cols(self):
+        """Test that compact added columns are categoricals of the same values, for both engines."""
+        input_cols = set(self.INPUT_DF.columns)
+        for use_group_broadcast, curr_setting in \
+                [(False, False), (False, True), (True, False), (True, True)]:
+            full_flat_config_dict = dict(build_lazy_flat_config_dict(
+                {LEAVE_REQUIREDS_BLANK_KEY: curr_setting},
+                None, self.TEST_STDS_FP))
+            full_flat_config_dict[GROUP_BROADCAST_EXTENSION_KEY] = \
+                use_group_broadcast
+            expected_df, expected_msgs = _generate_metadata_for_host_types(
+                self.INPUT_DF, full_flat_config_dict)
+
+            full_flat_config_dict[COMPACT_DEFAULT_COLS_KEY] = True
+            with self.subTest(group_broadcast=use_group_broadcast,
+                              leave_requireds_blank=curr_setting):
+                result_df, result_msgs = _generate_metadata_for_host_types(
+                    self.INPUT_DF, full_flat_config_dict)
+
+                for curr_col in result_df.columns:
+                    self.assertEqual(
+                        curr_col not in input_cols,
+                        isinstance(result_df[curr_col].dtype,
+                                   pandas.CategoricalDtype))
+                assert_frame_equal(
+                    expected_df, expand_compact_cols(result_df))
+                self.assertEqual(expected_msgs, result_msgs)
+                self.assertEqual(
+                    expected_df.to_csv(), result_df.to_csv())
+
+    def test__generate_metadata_for_host_types_compact_engines_agree(self):
+        """Test that both engines build the same compact columns."""
+        full_flat_config_dict = dict(build_lazy_flat_config_dict(
+            None, None, self.TEST_STDS_FP))
+        full_flat_config_dict[COMPACT_DEFAULT_COLS_KEY] = True
+        expected_df, _ = _generate_metadata_for_host_types(
+            self.INPUT_DF, full_flat_config_dict)
+
+        full_flat_config_dict[GROUP_BROADCAST_EXTENSION_KEY] = True
+        result_df, _ = _generate_metadata_for_host_types(
+            self.INPUT_DF, full_flat_config_dict)
+
+        assert_frame_equal(expected_df, result_df)
+
+
+class TestGenerateMetadataForHostTypesInParallel(ExtenderTestBase):
+    INPUT_DF = pandas.DataFrame({
+        SAMPLE_NAME_KEY: [f"sample{i}" for i in range(8)],
+        HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human", "control",
+                                 "human", "mouse", "unknown", "human"],
+        SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood", "stool",
+                                   "stool", "unknown", "stool", "blood"],
+        QC_NOTE_KEY: [""] * 8,
+        "description": ["a", None, None, "b", None, "c", None, None],
+        "host_age": [1.5, None, 30, None, 2, None, None, 4]
+    })
+
+    def test__generate_metadata_for_host_types_n_jobs(self):
+        """Test generating in worker processes matches generating in this process, for both engines."""
+        for use_group_broadcast in [False, True]:
+            full_flat_config_dict = dict(build_lazy_flat_config_dict(
+                None, None, self.TEST_STDS_FP))
+            full_flat_config_dict[GROUP_BROADCAST_EXTENSION_KEY] = \
+                use_group_broadcast
+            expected_df, expected_msgs = _generate_metadata_for_host_types(
+                self.INPUT_DF, full_flat_config_dict)
+
+            # batch every group separately, so they go to different workers
+            with self.subTest(group_broadcast=use_group_broadcast), \
+                    patch.object(metadata_extender,
+                                 "_MIN_ROWS_PER_PARALLEL_BATCH", 1):
+                result_df, result_msgs = _generate_metadata_for_host_types(
+                    self.INPUT_DF, full_flat_config_dict, n_jobs=2)
+                assert_frame_equal(expected_df, result_df)
+                self.assertEqual(expected_msgs, result_msgs)
+
+    def test__generate_metadata_for_host_types_n_jobs_row_blocks(self):
+        """Test generating a single large group in blocks of rows matches generating it whole."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: [f"sample{i}" for i in range(10)],
+            HOSTTYPE_SHORTHAND_KEY: ["human"] * 10,
+            SAMPLETYPE_SHORTHAND_KEY: ["stool"] * 10,
+            QC_NOTE_KEY: [""] * 10,
+            "description": ["a", None, None, None, None, "c", None, None,
+                            "d", None],
+            "host_age": [1.5, None, 30, None, 2, None, None, 4, 5, None]
+        })
+        for use_group_broadcast in [False, True]:
+            full_flat_config_dict = dict(build_lazy_flat_config_dict(
+                None, None, self.TEST_STDS_FP))
+            full_flat_config_dict[GROUP_BROADCAST_EXTENSION_KEY] = \
+                use_group_broadcast
+            expected_df, expected_msgs = _generate_metadata_for_host_types(
+                input_df, full_flat_config_dict)
+
+            # blocks of 3 or 4 rows, in 3 workers
+            with self.subTest(group_broadcast=use_group_broadcast), \
+                    patch.object(metadata_extender,
+                                 "_MIN_ROWS_PER_PARALLEL_BATCH", 3):
+                result_df, result_msgs = _generate_metadata_for_host_types(
+                    input_df, full_flat_config_dict, n_jobs=3)
+                assert_frame_equal(expected_df, result_df)
+                self.assertEqual(expected_msgs, result_msgs)
+
+    def test__get_row_blocks(self):
+        """Test splitting rows into one contiguous block per worker, with a minimum block size."""
+        with patch.object(metadata_extender,
+                          "_MIN_ROWS_PER_PARALLEL_BATCH", 3):
+            self.assertEqual([(0, 3), (3, 6), (6, 10)],
+                             _get_row_blocks(10, 3))
+            # blocks would be smaller than the minimum
+            self.assertEqual([(0, 3), (3, 7)], _get_row_blocks(7, 4))
+            self.assertEqual([(0, 2)], _get_row_blocks(2, 4))
+            self.assertEqual([(0, 10)], _get_row_blocks(10, 1))
+
+    def test__map_in_batches(self):
+        """Test that small tasks are batched together and results come back in task order."""
+        tasks = [(7, 2), (9, 4), (5, 5), (8, 3)]
+        expected = [divmod(*x) for x in tasks]
+
+        with patch.object(metadata_extender,
+                          "_MIN_ROWS_PER_PARALLEL_BATCH", 2):
+            # two batches of two tasks, in two workers
+            self.assertEqual(
+                expected, _map_in_batches(divmod, tasks, [1, 1, 1, 1], 2))
+            # one batch, so run in this process
+            self.assertEqual(
+                expected, _map_in_batches(divmod, tasks, [1, 0, 0, 1], 2))
+
+    def test__get_num_workers(self):
+        """Test translating n_jobs settings into numbers of worker processes."""
+        self.assertEqual(1, _get_num_workers(None))
+        self.assertEqual(3, _get_num_workers(3))
+        self.assertGreaterEqual(_get_num_workers(-1), 1)
+        for curr_n_jobs in [0, -2]:
+            with self.assertRaisesRegex(ValueError, "n_jobs"):
+                _get_num_workers(curr_n_jobs)
+
+    def test__map_in_batches_shared_args(self):
+        """Test that shared args are passed to every call, before or after each task's args."""
+        with patch.object(metadata_extender,
+                          "_MIN_ROWS_PER_PARALLEL_BATCH", 1):
+            self.assertEqual(
+                [divmod(20, 3), divmod(20, 6)],
+                _map_in_batches(divmod, [(3,), (6,)], [1, 1], 2,
+                                shared_args=(20,)))
+            self.assertEqual(
+                [divmod(3, 2), divmod(6, 2)],
+                _map_in_batches(divmod, [(3,), (6,)], [1, 1], 2,
+                                shared_args=(2,), args_first=False))
@@ -2,6 +2,7 @@ import numpy as np
 import pandas
 from pandas.testing import assert_frame_equal
 from metameq.src.util import \
+    extract_config_dict, \
     SAMPLE_NAME_KEY, \
     HOSTTYPE_SHORTHAND_KEY, \
     SAMPLETYPE_SHORTHAND_KEY, \
@@ -23,10 +24,19 @@ from metameq.src.util import \
     POST_TRANSFORMERS_KEY, \
     STUDY_SPECIFIC_METADATA_KEY, \
     HOSTTYPE_COL_OPTIONS_KEY, \
-    SAMPLETYPE_COL_OPTIONS_KEY
+    SAMPLETYPE_COL_OPTIONS_KEY, \
+    LEAVE_BLANK_VAL, \
+    GROUP_BROADCAST_EXTENSION_KEY, \
+    PASSTHROUGH_UNTOUCHED_COLS_KEY, \
+    COMPACT_DEFAULT_COLS_KEY
 from metameq.src.metadata_extender import \
     _populate_metadata_df, \
-    extend_metadata_df
+    _split_off_passthrough_cols, \
+    extend_metadata_df, \
+    extend_metadata_df_incrementally, \
+    expand_compact_cols, \
+    REQ_PLACEHOLDER, \
+    REUSED_KEY
 from metameq.tests.test_metadata_extender.conftest import \
     ExtenderTestBase
 
@@ -396,6 +406,161 @@ class TestPopulateMetadataDf(ExtenderTestBase):
             _populate_metadata_df(input_df, full_flat_config_dict, None)
 
 
+class TestPassthroughUntouchedCols(ExtenderTestBase):
+    FULL_FLAT_CONFIG_DICT = {
+        DEFAULT_KEY: "not provided",
+        LEAVE_REQUIREDS_BLANK_KEY: False,
+        OVERWRITE_NON_NANS_KEY: False,
+        METADATA_TRANSFORMERS_KEY: {
+            POST_TRANSFORMERS_KEY: {
+                "copied_field": {
+                    SOURCES_KEY: ["source_field"],
+                    FUNCTION_KEY: "pass_through"
+                }
+            }
+        },
+        HOST_TYPE_SPECIFIC_METADATA_KEY: {
+            "human": {
+                DEFAULT_KEY: "human default",
+                LEAVE_REQUIREDS_BLANK_KEY: False,
+                OVERWRITE_NON_NANS_KEY: False,
+                SAMPLE_TYPE_SPECIFIC_METADATA_KEY: {
+                    "stool": {
+                        METADATA_FIELDS_KEY: {
+                            "source_field": {
+                                DEFAULT_KEY: "stool value",
+                                TYPE_KEY: "string"
+                            },
+                            "optional_field": {
+                                TYPE_KEY: "string"
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
+
+    def test__split_off_passthrough_cols(self):
+        """Test that only columns the config doesn't refer to are passed through."""
+        input_df = pandas.DataFrame({
+            "free_text": ["a", "b"],
+            SAMPLE_NAME_KEY: ["sample1", "sample2"],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool"],
+            "optional_field": ["x", "y"],
+            "copied_field": ["z", "w"],
+            "more_free_text": ["c", "d"]
+        })
+
+        narrow_df, passthrough_df = _split_off_passthrough_cols(
+            input_df, self.FULL_FLAT_CONFIG_DICT)
+
+        self.assertEqual(
+            [SAMPLE_NAME_KEY, HOSTTYPE_SHORTHAND_KEY, SAMPLETYPE_SHORTHAND_KEY,
+             "optional_field", "copied_field", "___metameq___row_position"],
+            list(narrow_df.columns))
+        assert_frame_equal(
+            input_df[["free_text", "more_free_text"]], passthrough_df)
+
+    def test__split_off_passthrough_cols_none(self):
+        """Test that the input is used as is if there is nothing to pass through."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1"],
+            HOSTTYPE_SHORTHAND_KEY: ["human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool"]
+        })
+
+        narrow_df, passthrough_df = _split_off_passthrough_cols(
+            input_df, self.FULL_FLAT_CONFIG_DICT)
+
+        self.assertIs(input_df, narrow_df)
+        self.assertIsNone(passthrough_df)
+
+    def test__populate_metadata_df_passthrough_matches_default(self):
+        """Test that passing columns through gives the same output as extending them."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3", "sample4"],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "unknown", "human", "human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "unknown", "stool"],
+            "free_text": pandas.Series(
+                ["a", None, None, LEAVE_BLANK_VAL], dtype="str"),
+            "placeholder_text": pandas.Series(
+                [REQ_PLACEHOLDER, "b", REQ_PLACEHOLDER, None], dtype="str"),
+            "all_nan": [np.nan] * 4,
+            "some_nan": [1.5, np.nan, 2.5, np.nan],
+            "no_nan": [1.5, 2.5, 3.5, 4.5],
+            "ints": [1, 2, 3, 4]
+        })
+        for curr_group_broadcast in [False, True]:
+            full_flat_config_dict = dict(self.FULL_FLAT_CONFIG_DICT)
+            full_flat_config_dict[GROUP_BROADCAST_EXTENSION_KEY] = \
+                curr_group_broadcast
+            expected_df, expected_msgs_df = _populate_metadata_df(
+                input_df, full_flat_config_dict, None)
+
+            full_flat_config_dict[PASSTHROUGH_UNTOUCHED_COLS_KEY] = True
+            result_df, result_msgs_df = _populate_metadata_df(
+                input_df, full_flat_config_dict, None)
+
+            with self.subTest(group_broadcast=curr_group_broadcast):
+                assert_frame_equal(expected_df, result_df)
+                assert_frame_equal(expected_msgs_df, result_msgs_df)
+                # rows are ordered by host type, then sample type
+                self.assertEqual(
+                    ["sample1", "sample4", "sample3", "sample2"],
+                    result_df[SAMPLE_NAME_KEY].tolist())
+                self.assertEqual(
+                    ["a", "", "not provided", "not provided"],
+                    result_df["free_text"].tolist())
+                self.assertEqual(
+                    ["human default", "human default", "not provided",
+                     "not provided"],
+                    result_df["all_nan"].tolist())
+
+    def test_extend_metadata_df_passthrough_matches_default(self):
+        """Test that passthrough mode gives the same output with the test standards."""
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: [f"sample{i}" for i in range(6)],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human", "unknown",
+                                     "mouse", "human"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood", "stool",
+                                       "unknown", "stool"],
+            "free_text": ["a", None, "b", None, "c", None],
+            "description": [None, "d", None, "e", None, None]
+        })
+
+        expected_df, expected_msgs_df = extend_metadata_df(
+            input_df, {}, stds_fp=self.TEST_STDS_FP)
+        result_df, result_msgs_df = extend_metadata_df(
+            input_df, {PASSTHROUGH_UNTOUCHED_COLS_KEY: True},
+            stds_fp=self.TEST_STDS_FP)
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+
+    def test_extend_metadata_df_passthrough_resolves_only_present_types(self):
+        """Test that passthrough mode only needs the config of the types in the metadata."""
+        # the test standards have a human sample type based on one that
+        # doesn't exist, so resolving every human sample type fails
+        input_df = pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+            HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", np.nan],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood"],
+            "free_text": ["a", None, "b"]
+        })
+        study_config = extract_config_dict(self.TEST_PROJECT1_CONFIG_FP)
+
+        expected_df, expected_msgs_df = extend_metadata_df(
+            input_df, study_config, stds_fp=self.TEST_STDS_FP)
+        study_config[PASSTHROUGH_UNTOUCHED_COLS_KEY] = True
+        result_df, result_msgs_df = extend_metadata_df(
+            input_df, study_config, stds_fp=self.TEST_STDS_FP)
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+
+
 class TestExtendMetadataDf(ExtenderTestBase):
     def test_extend_metadata_df_basic(self):
         """Test basic metadata extension with study config."""
@@ -1022,3 +1187,239 @@ class TestExtendMetadataDf(ExtenderTestBase):
                 hosttype_col_name="host_type")
 
         self.assertTrue(any("contains both" in msg for msg in cm.output))
+
+
+class TestExtendMetadataDfIncrementally(ExtenderTestBase):
+    INPUT_DF = pandas.DataFrame({
+        SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3", "sample4"],
+        HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human", "mouse"],
+        SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood", "stool"],
+        "my_notes": ["a", "b", "c", "d"]
+    })
+
+    @staticmethod
+    def _make_study_config(human_description):
+        return {
+            DEFAULT_KEY: "not provided",
+            STUDY_SPECIFIC_METADATA_KEY: {
+                HOST_TYPE_SPECIFIC_METADATA_KEY: {
+                    "human": {
+                        METADATA_FIELDS_KEY: {
+                            "description": {
+                                DEFAULT_KEY: human_description,
+                                TYPE_KEY: "string"
+                            }
+                        }
+                    }
+                }
+            }
+        }
+
+    def test_extend_metadata_df_incrementally_no_previous(self):
+        """Test that without previous results every row is extended, as by extend_metadata_df."""
+        study_config = self._make_study_config("human sample")
+
+        expected_df, expected_msgs_df = extend_metadata_df(
+            self.INPUT_DF.copy(), study_config, None, None, self.TEST_STDS_FP)
+        result_df, result_msgs_df, manifest_df = \
+            extend_metadata_df_incrementally(
+                self.INPUT_DF.copy(), study_config, stds_fp=self.TEST_STDS_FP)
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+        self.assertEqual(len(result_df), len(manifest_df))
+        self.assertFalse(manifest_df[REUSED_KEY].any())
+
+    def test_extend_metadata_df_incrementally_changed_rows(self):
+        """Test that only changed and new rows are extended again."""
+        study_config = self._make_study_config("human sample")
+        prev_results = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), study_config, stds_fp=self.TEST_STDS_FP)
+
+        # change one row, drop one, and add one
+        input_df = self.INPUT_DF.copy()
+        input_df.loc[0, "my_notes"] = "changed"
+        input_df = input_df.drop(index=[3])
+        input_df = pandas.concat([input_df, pandas.DataFrame({
+            SAMPLE_NAME_KEY: ["sample5"],
+            HOSTTYPE_SHORTHAND_KEY: ["mouse"],
+            SAMPLETYPE_SHORTHAND_KEY: ["stool"],
+            "my_notes": ["e"]
+        })], ignore_index=True)
+
+        expected_df, expected_msgs_df = extend_metadata_df(
+            input_df.copy(), study_config, None, None, self.TEST_STDS_FP)
+        with self.assertLogs(
+                "metameq.src.metadata_extender", level="INFO") as cm:
+            result_df, result_msgs_df, manifest_df = \
+                extend_metadata_df_incrementally(
+                    input_df.copy(), study_config, *prev_results,
+                    stds_fp=self.TEST_STDS_FP)
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+        reused_names = \
+            result_df.loc[manifest_df[REUSED_KEY], SAMPLE_NAME_KEY].tolist()
+        self.assertEqual(["sample3", "sample2"], reused_names)
+        self.assertTrue(any(
+            "Reused 2 and recomputed 2 of 4 rows" in msg
+            for msg in cm.output))
+
+    def test_extend_metadata_df_incrementally_changed_config(self):
+        """Test that only rows of host+sample types whose config changed are extended again."""
+        prev_results = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), self._make_study_config("human sample"),
+            stds_fp=self.TEST_STDS_FP)
+        study_config = self._make_study_config("changed human sample")
+
+        expected_df, expected_msgs_df = extend_metadata_df(
+            self.INPUT_DF.copy(), study_config, None, None, self.TEST_STDS_FP)
+        result_df, result_msgs_df, manifest_df = \
+            extend_metadata_df_incrementally(
+                self.INPUT_DF.copy(), study_config, *prev_results,
+                stds_fp=self.TEST_STDS_FP)
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+        reused_hosts = result_df.loc[
+            manifest_df[REUSED_KEY], HOSTTYPE_SHORTHAND_KEY].tolist()
+        self.assertEqual(["mouse", "mouse"], reused_hosts)
+
+    def test_extend_metadata_df_incrementally_compact(self):
+        """Test that compact columns stay compact when rows are reused."""
+        study_config = self._make_study_config("human sample")
+        study_config[COMPACT_DEFAULT_COLS_KEY] = True
+        prev_results = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), study_config, stds_fp=self.TEST_STDS_FP)
+        input_df = self.INPUT_DF.copy()
+        input_df.loc[1, "my_notes"] = "changed"
+
+        expected_df, _ = extend_metadata_df(
+            input_df.copy(), study_config, None, None, self.TEST_STDS_FP)
+        result_df, _, manifest_df = extend_metadata_df_incrementally(
+            input_df.copy(), study_config, *prev_results,
+            stds_fp=self.TEST_STDS_FP)
+
+        self.assertEqual(3, manifest_df[REUSED_KEY].sum())
+        self.assertIsInstance(
+            result_df["description"].dtype, pandas.CategoricalDtype)
+        assert_frame_equal(
+            expand_compact_cols(expected_df), expand_compact_cols(result_df))
+
+    def test_extend_metadata_df_incrementally_partial_previous_raises(self):
+        """Test that giving only some of the previous results raises ValueError."""
+        study_config = self._make_study_config("human sample")
+        prev_df, _, prev_manifest_df = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), study_config, stds_fp=self.TEST_STDS_FP)
+
+        with self.assertRaisesRegex(ValueError, "must all be given"):
+            extend_metadata_df_incrementally(
+                self.INPUT_DF.copy(), study_config, prev_df, None,
+                prev_manifest_df, stds_fp=self.TEST_STDS_FP)
+
+    def test_extend_metadata_df_incrementally_type_pre_transformer_raises(self):
+        """Test that a pre-transformer setting a type shorthand column raises ValueError."""
+        study_config = {
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    HOSTTYPE_SHORTHAND_KEY: {
+                        SOURCES_KEY: ["my_notes"],
+                        FUNCTION_KEY: "pass_through"
+                    }
+                }
+            }
+        }
+
+        with self.assertRaisesRegex(ValueError, "cannot be extended"):
+            extend_metadata_df_incrementally(
+                self.INPUT_DF.copy(), study_config,
+                stds_fp=self.TEST_STDS_FP)
+
+    def test_extend_metadata_df_incrementally_edited_transformer(self):
+        """Test that editing a custom transformer extends every row again."""
+        def make_transformer(suffix):
+            # a fresh function of the same name, as after editing its source
+            namespace = {}
+            exec(f"def my_transformer(row, source_fields):\n"
+                 f"    return row[source_fields[0]] + '{suffix}'\n",
+                 namespace)
+            return namespace["my_transformer"]
+
+        study_config = self._make_study_config("human sample")
+        study_config[METADATA_TRANSFORMERS_KEY] = {
+            POST_TRANSFORMERS_KEY: {
+                "my_output": {
+                    SOURCES_KEY: ["my_notes"],
+                    FUNCTION_KEY: "my_transformer"
+                }
+            }
+        }
+        prev_results = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), study_config, stds_fp=self.TEST_STDS_FP,
+            study_specific_transformers_dict={
+                "my_transformer": make_transformer("_v1")})
+
+        # recreating the unchanged transformer reuses every row
+        _, _, manifest_df = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), study_config, *prev_results,
+            stds_fp=self.TEST_STDS_FP,
+            study_specific_transformers_dict={
+                "my_transformer": make_transformer("_v1")})
+        self.assertTrue(manifest_df[REUSED_KEY].all())
+
+        edited_transformers = {"my_transformer": make_transformer("_v2")}
+        expected_df, _ = extend_metadata_df(
+            self.INPUT_DF.copy(), study_config, edited_transformers, None,
+            self.TEST_STDS_FP)
+        result_df, _, manifest_df = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), study_config, *prev_results,
+            stds_fp=self.TEST_STDS_FP,
+            study_specific_transformers_dict=edited_transformers)
+
+        self.assertFalse(manifest_df[REUSED_KEY].any())
+        assert_frame_equal(expected_df, result_df)
+        self.assertEqual(["a_v2", "b_v2", "c_v2", "d_v2"],
+                         sorted(result_df["my_output"]))
+
+    def test_extend_metadata_df_incrementally_new_and_removed_type(self):
+        """Test that adding or removing a host+sample type's rows doesn't extend other rows again."""
+        study_config = self._make_study_config("human sample")
+        study_config[STUDY_SPECIFIC_METADATA_KEY][
+            HOST_TYPE_SPECIFIC_METADATA_KEY]["mouse"] = {
+                METADATA_FIELDS_KEY: {
+                    "cage_type": {DEFAULT_KEY: "standard", TYPE_KEY: "string"}
+                }
+            }
+        human_df = self.INPUT_DF[
+            self.INPUT_DF[HOSTTYPE_SHORTHAND_KEY] == "human"].reset_index(
+                drop=True)
+        human_results = extend_metadata_df_incrementally(
+            human_df.copy(), study_config, stds_fp=self.TEST_STDS_FP)
+        self.assertNotIn("cage_type", human_results[0].columns)
+
+        # adding mouse rows adds a column to the (reused) human rows
+        expected_df, expected_msgs_df = extend_metadata_df(
+            self.INPUT_DF.copy(), study_config, None, None, self.TEST_STDS_FP)
+        all_results = extend_metadata_df_incrementally(
+            self.INPUT_DF.copy(), study_config, *human_results,
+            stds_fp=self.TEST_STDS_FP)
+        result_df, result_msgs_df, manifest_df = all_results
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+        self.assertEqual(
+            ["human", "human"],
+            result_df.loc[manifest_df[REUSED_KEY],
+                          HOSTTYPE_SHORTHAND_KEY].tolist())
+
+        # removing them again takes the column away, with every row reused
+        expected_df, expected_msgs_df = extend_metadata_df(
+            human_df.copy(), study_config, None, None, self.TEST_STDS_FP)
+        result_df, result_msgs_df, manifest_df = \
+            extend_metadata_df_incrementally(
+                human_df.copy(), study_config, *all_results,
+                stds_fp=self.TEST_STDS_FP)
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+        self.assertTrue(manifest_df[REUSED_KEY].all())
@@ -18,6 +18,7 @@ from metameq.src.util import \
     LEAVE_REQUIREDS_BLANK_KEY, \
     HOST_TYPE_SPECIFIC_METADATA_KEY
 from metameq.src.metadata_extender import write_validator_metadata
+from metameq.src.config_artifact import write_config_artifact
 from metameq.tests.test_metadata_extender.conftest import \
     ExtenderTestBase
 
@@ -147,6 +148,31 @@ class TestWriteValidatorMetadata(ExtenderTestBase):
                 os.path.join(tmpdir, "*_test_output_validation_errors.csv"))
             self.assertEqual(0, len(validation_files))
 
+    def test_write_validator_metadata_from_config_artifact(self):
+        """Test that a config artifact can be used in place of a YAML full flat config."""
+        metadata_csv = (
+            f"{SAMPLE_NAME_KEY},{HOSTTYPE_SHORTHAND_KEY},{SAMPLETYPE_SHORTHAND_KEY}\n"
+            "sample1,human,stool\n"
+            "sample2,human,stool\n"
+            "sample3,mouse,cecum\n"
+        )
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            _, metadata_fp = self._write_config_and_metadata(
+                tmpdir, self.BASIC_FLAT_CONFIG, metadata_csv)
+            artifact_fp = path.join(tmpdir, "test_config.jsonl")
+            write_config_artifact(self.BASIC_FLAT_CONFIG, artifact_fp)
+
+            write_validator_metadata(
+                metadata_fp, artifact_fp, tmpdir, "test_output",
+                suppress_empty_fails=True)
+
+            output_files = glob.glob(
+                os.path.join(tmpdir, "*_test_output.txt"))
+            self.assertEqual(1, len(output_files))
+            self._assert_file_matches_expected(
+                output_files[0], "test_validator_valid_output.txt")
+
     def test_write_validator_metadata_valid_creates_empty_errors(self):
         """Test valid input without suppress creates empty validation file."""
         metadata_csv = (
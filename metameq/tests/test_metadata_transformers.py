@@ -2,6 +2,10 @@ from datetime import datetime
 import pandas
 import numpy as np
 from unittest import TestCase
+from unittest.mock import patch
+from dateutil import parser
+import metameq.src.date_parse_cache as date_parse_cache
+from metameq.src.date_parse_cache import clear_date_parse_cache
 from metameq.src.metadata_transformers import (
     pass_through,
     transform_input_sex_to_std_sex,
@@ -10,12 +14,19 @@ from metameq.src.metadata_transformers import (
     transform_format_field_as_int,
     transform_format_field_as_location,
     help_transform_mapping,
+    vectorized_transformer,
+    get_vectorized_version,
+    pure_transformer,
+    is_pure_transformer,
+    row_series_transformer,
+    needs_row_series,
     standardize_input_sex,
     set_life_stage_from_age_yrs,
     format_a_datetime,
     _get_one_source_field,
     _help_transform_mapping,
-    _format_field_val
+    _format_field_val,
+    _map_source_vals
 )
 
 
@@ -610,3 +621,141 @@ class TestTransformFormatFieldAsLocation(TestCase):
         result = transform_format_field_as_location(row, ['elevation'])
         self.assertEqual(result, '12345.6789')
         self.assertIsInstance(result, str)
+
+
+class TestVectorizedVersions(TestCase):
+    ROWS_DF = pandas.DataFrame({
+        'sample_name': ['s1', 's2', 's3', 's4'],
+        'patient_sex': ['M', np.nan, 'female', 'M'],
+        'patient_age': ['25', '3', np.nan, '25'],
+        'start_date': ['2023-01-01', np.nan, '2023-01-02 10:15', '2023-01-01'],
+        'latitude': ['32.8800', 'unknown', np.nan, '5']
+    })
+
+    def _assert_matches_row_wise(self, func, source_fields):
+        expected = [func(row, source_fields)
+                    for _, row in self.ROWS_DF.iterrows()]
+        result = get_vectorized_version(func)(self.ROWS_DF, source_fields)
+        self.assertEqual(len(expected), len(result))
+        for curr_expected, curr_result in zip(expected, result):
+            if pandas.isna(curr_expected):
+                self.assertTrue(pandas.isna(curr_result))
+            else:
+                self.assertEqual(curr_expected, curr_result)
+
+    def test_builtin_vectorized_versions_match_row_wise(self):
+        """Test that each built-in transformer's vectorized version gives its row-wise values."""
+        for func, source_field in [
+                (pass_through, 'patient_sex'),
+                (transform_input_sex_to_std_sex, 'patient_sex'),
+                (transform_age_to_life_stage, 'patient_age'),
+                (transform_date_to_formatted_date, 'start_date'),
+                (transform_format_field_as_int, 'patient_age'),
+                (transform_format_field_as_location, 'latitude')]:
+            with self.subTest(func=func.__name__):
+                self._assert_matches_row_wise(func, [source_field])
+
+    def test_builtin_vectorized_versions_err_multiple_source_fields(self):
+        """Test that vectorized versions raise the row-wise error for multiple source fields."""
+        with self.assertRaisesRegex(
+                ValueError,
+                "transform_age_to_life_stage requires exactly one source field"):
+            get_vectorized_version(transform_age_to_life_stage)(
+                self.ROWS_DF, ['patient_age', 'patient_sex'])
+
+    def test_builtin_vectorized_version_err_first_bad_value(self):
+        """Test that a vectorized version raises for the first bad value, as row by row."""
+        rows_df = pandas.DataFrame({'patient_age': ['25', 'old', 'older']})
+        with self.assertRaisesRegex(
+                ValueError, "patient_age must be an integer"):
+            get_vectorized_version(transform_age_to_life_stage)(
+                rows_df, ['patient_age'])
+
+    def test_vectorized_transformer(self):
+        """Test that vectorized_transformer registers a function as its own vectorized version."""
+        @vectorized_transformer
+        def transform_upper(rows_df, source_fields):
+            return rows_df[source_fields[0]].str.upper()
+
+        self.assertIs(transform_upper, get_vectorized_version(transform_upper))
+
+    def test_get_vectorized_version_none(self):
+        """Test that a row-wise function without a vectorized version has none."""
+        def transform_upper(row, source_fields):
+            return row[source_fields[0]].upper()
+
+        self.assertIsNone(get_vectorized_version(transform_upper))
+
+    def test__map_source_vals_mixed_types(self):
+        """Test that values that are not all strings are each transformed."""
+        source_col = pandas.Series([1, '1', np.nan, 2.5], index=[5, 6, 7, 8])
+        result = _map_source_vals(source_col, lambda x: f"<{x!r}>")
+
+        self.assertEqual([5, 6, 7, 8], result.index.tolist())
+        self.assertEqual(["<1>", "<'1'>"], result.tolist()[:2])
+        self.assertTrue(pandas.isna(result[7]))
+        self.assertEqual("<2.5>", result[8])
+
+    def test_transform_date_to_formatted_date_vectorized_parses_once(self):
+        """Test that only distinct dates without the dominant format are parsed with dateutil."""
+        clear_date_parse_cache()
+        date_strs = [f'2023-01-{x:02d}' for x in range(1, 29)]
+        rows_df = pandas.DataFrame({'start_date': (
+            date_strs + ['Jan 3 2023', np.nan, 'Jan 3 2023'] + date_strs)})
+
+        with patch.object(date_parse_cache.parser, "parse",
+                          wraps=parser.parse) as mock_parse:
+            result = get_vectorized_version(transform_date_to_formatted_date)(
+                rows_df, ['start_date'])
+
+        self.assertEqual('2023-01-01 00:00', result[0])
+        self.assertEqual('2023-01-03 00:00', result[28])
+        self.assertTrue(pandas.isna(result[29]))
+        self.assertEqual('2023-01-28 00:00', result[58])
+        self.assertEqual(['Jan 3 2023'],
+                         [x.args[0] for x in mock_parse.call_args_list])
+        clear_date_parse_cache()
+
+
+class TestPureTransformer(TestCase):
+    def test_pure_transformer(self):
+        """Test that pure_transformer declares a function pure."""
+        @pure_transformer
+        def transform_upper(row, source_fields):
+            return row[source_fields[0]].upper()
+
+        self.assertTrue(is_pure_transformer(transform_upper))
+
+    def test_is_pure_transformer_undeclared(self):
+        """Test that a function not declared pure is not."""
+        def transform_upper(row, source_fields):
+            return row[source_fields[0]].upper()
+
+        self.assertFalse(is_pure_transformer(transform_upper))
+
+    def test_builtin_transformers_are_pure(self):
+        """Test that the built-in transformers are declared pure."""
+        for func in [pass_through, transform_input_sex_to_std_sex,
+                     transform_age_to_life_stage,
+                     transform_date_to_formatted_date,
+                     transform_format_field_as_int,
+                     transform_format_field_as_location]:
+            with self.subTest(func=func.__name__):
+                self.assertTrue(is_pure_transformer(func))
+
+
+class TestRowSeriesTransformer(TestCase):
+    def test_row_series_transformer(self):
+        """Test that row_series_transformer declares a function as needing row Series."""
+        @row_series_transformer
+        def transform_upper(row, source_fields):
+            return row[source_fields[0]].upper()
+
+        self.assertTrue(needs_row_series(transform_upper))
+
+    def test_needs_row_series_undeclared(self):
+        """Test that a function not declared as needing row Series does not."""
+        def transform_upper(row, source_fields):
+            return row[source_fields[0]].upper()
+
+        self.assertFalse(needs_row_series(transform_upper))
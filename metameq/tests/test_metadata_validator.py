@@ -3,8 +3,12 @@ import os
 import pandas as pd
 import tempfile
 from unittest import TestCase
+from unittest.mock import patch
 from datetime import datetime
 from datetime import timedelta
+from dateutil import parser as dateutil_parser
+import metameq.src.date_parse_cache as date_parse_cache
+from metameq.src.date_parse_cache import clear_date_parse_cache
 from metameq.src.metadata_validator import (
     _flatten_error_message,
     _generate_validation_msg,
@@ -1177,6 +1181,91 @@ class TestValidateMetadataDf(TestCase):
         })
         pd.testing.assert_frame_equal(expected_df, result_df)
 
+    def test_validate_metadata_df_categorical_matches_object(self):
+        """Test that a categorical column gives the same messages as an object one."""
+        metadata_df = pd.DataFrame({
+            "sample_name": ["sample1", "sample2", "sample3", "sample4"],
+            "status": ["bad", "active", None, "bad"],
+            "count": ["1", "x2", "3", "x2"]
+        })
+        fields_dict = {
+            "sample_name": {"type": "string"},
+            "status": {"type": "string", "allowed": ["active"],
+                       "required": True, "nullable": False},
+            "count": {"type": "string", "regex": "^[0-9]+$"}
+        }
+        categorical_df = metadata_df.astype(
+            {"status": "category", "count": "category"})
+
+        expected = validate_metadata_df(metadata_df, fields_dict)
+        result = validate_metadata_df(categorical_df, fields_dict)
+
+        self.assertEqual(5, len(expected))
+        self.assertEqual(expected, result)
+
+    def test_validate_metadata_df_categorical_uncastable_raises_error(self):
+        """Test that an uncastable value in a categorical column raises ValueError."""
+        metadata_df = pd.DataFrame({
+            "sample_name": ["sample1", "sample2"],
+            "age": pd.Categorical(["25", "not_an_integer"])
+        })
+        fields_dict = {
+            "sample_name": {"type": "string"},
+            "age": {"type": "integer"}
+        }
+
+        self.assertRaisesRegex(
+            ValueError,
+            "Unable to cast 'not_an_integer' to any of the allowed types",
+            validate_metadata_df,
+            metadata_df,
+            fields_dict)
+
+    def test_validate_metadata_df_categorical_with_dependencies(self):
+        """Test that categorical fields with cross-field rules are checked per row."""
+        metadata_df = pd.DataFrame({
+            "sample_name": ["sample1", "sample2"],
+            "units": pd.Categorical(["cm", "cm"]),
+            "height": ["tall", "5"]
+        })
+        fields_dict = {
+            "sample_name": {"type": "string"},
+            "units": {"type": "string", "dependencies": {"height": ["5"]}},
+            "height": {"type": "string"}
+        }
+
+        result = validate_metadata_df(metadata_df, fields_dict)
+
+        self.assertEqual(
+            validate_metadata_df(
+                metadata_df.astype({"units": object}), fields_dict),
+            result)
+        self.assertEqual(["sample1"], [x["sample_name"] for x in result])
+
+    def test_validate_metadata_df_date_not_in_future_parsed_once(self):
+        """Test that each distinct date string is parsed once, even under anyof."""
+        clear_date_parse_cache()
+        metadata_df = pd.DataFrame({
+            "sample_name": ["sample1", "sample2", "sample3", "sample4"],
+            "collection_date": ["2023-01-02", "on 2023-01-03", "2023-01-02",
+                                "on 2023-01-03"]
+        })
+        fields_dict = {
+            "sample_name": {"type": "string"},
+            "collection_date": {"anyof": [
+                {"type": "string", "check_with": "date_not_in_future"},
+                {"type": "string", "allowed": ["not collected"]}]}
+        }
+
+        with patch.object(date_parse_cache.parser, "parse",
+                          wraps=dateutil_parser.parse) as mock_parse:
+            result = validate_metadata_df(metadata_df, fields_dict)
+
+        self.assertEqual([], result)
+        self.assertEqual(["2023-01-02", "on 2023-01-03"],
+                         [x.args[0] for x in mock_parse.call_args_list])
+        clear_date_parse_cache()
+
 
 class TestFlattenErrorMessage(TestCase):
     """Tests for _flatten_error_message function."""
@@ -26,6 +26,7 @@ from metameq.src.util import (
     METADATA_FIELDS_KEY,
     SAMPLE_TYPE_KEY,
     DEFAULT_KEY,
+    GROUP_BROADCAST_EXTENSION_KEY,
 )
 
 GOLDEN_DIR = os.path.join(
@@ -111,6 +112,30 @@ def test_extend_type_pair(host_type, sample_type, update_golden):
     assert_frame_equal(result_df, expected_df)
 
 
+@pytest.mark.parametrize(
+    "host_type,sample_type",
+    _ALL_PAIRS,
+    ids=[f"{h}-{s}" for h, s in _ALL_PAIRS],
+)
+def test_extend_type_pair_by_group(host_type, sample_type):
+    """Check the group-broadcast extension engine against the same golden
+    files as the default per-type engine."""
+    raw_df = _build_dummy_df(host_type, sample_type)
+
+    result_df, _ = extend_metadata_df(
+        raw_df, {GROUP_BROADCAST_EXTENSION_KEY: True})
+    result_df = result_df.drop(columns=INTERNAL_COL_KEYS)
+
+    golden_fp = _golden_path(host_type, sample_type)
+    assert os.path.exists(golden_fp), (
+        f"Golden file not found: {golden_fp}\n"
+        f"Run with --update-golden to generate it.")
+
+    expected_df = pandas.read_csv(golden_fp, dtype=str, keep_default_na=False)
+
+    assert_frame_equal(result_df, expected_df)
+
+
 def test_no_stale_golden_files():
     """Fail if the golden directory contains CSVs that don't correspond to any
     current (host_type, sample_type) pair.  This catches leftovers from
@@ -0,0 +1,178 @@
+import glob
+import os.path as path
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import patch
+import pandas
+from pandas.testing import assert_frame_equal
+from metameq.src.util import SAMPLE_NAME_KEY, HOSTTYPE_SHORTHAND_KEY, \
+    SAMPLETYPE_SHORTHAND_KEY, DEFAULT_KEY, METADATA_TRANSFORMERS_KEY, \
+    PRE_TRANSFORMERS_KEY, SOURCES_KEY, FUNCTION_KEY
+from metameq.src.flat_config import build_lazy_flat_config_dict
+from metameq.src.metadata_extender import get_reserved_cols, \
+    find_standard_cols, find_nonstandard_cols, extend_metadata_df
+import metameq.src.study_context as study_context
+from metameq.src.study_context import StudyContext, \
+    get_shared_study_context
+
+
+class TestStudyContext(TestCase):
+    TEST_DIR = path.dirname(__file__)
+    TEST_STDS_FP = path.join(TEST_DIR, "data/test_standards.yml")
+    STUDY_CONFIG = {DEFAULT_KEY: "not provided"}
+    INPUT_DF = pandas.DataFrame({
+        SAMPLE_NAME_KEY: ["sample1", "sample2", "sample3"],
+        HOSTTYPE_SHORTHAND_KEY: ["human", "mouse", "human"],
+        SAMPLETYPE_SHORTHAND_KEY: ["stool", "stool", "blood"],
+        "body_site": ["gut", "gut", "blood"],
+        "my_notes": ["a", "b", "c"]
+    })
+
+    def test_study_context_matches_module_functions(self):
+        """Test that the context's methods give the same results as the module-level functions."""
+        a_context = StudyContext(self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP)
+
+        self.assertEqual(
+            get_reserved_cols(
+                self.INPUT_DF, self.STUDY_CONFIG, self.TEST_STDS_FP),
+            a_context.get_reserved_cols(self.INPUT_DF))
+        self.assertEqual(
+            sorted(find_standard_cols(
+                self.INPUT_DF, self.STUDY_CONFIG, self.TEST_STDS_FP)),
+            sorted(a_context.find_standard_cols(self.INPUT_DF)))
+        self.assertEqual(
+            sorted(find_nonstandard_cols(
+                self.INPUT_DF, self.STUDY_CONFIG, self.TEST_STDS_FP)),
+            sorted(a_context.find_nonstandard_cols(self.INPUT_DF)))
+        self.assertEqual(["my_notes"],
+                         a_context.find_nonstandard_cols(self.INPUT_DF))
+
+        expected_df, expected_msgs_df = extend_metadata_df(
+            self.INPUT_DF, self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP)
+        result_df, result_msgs_df = \
+            a_context.extend_metadata_df(self.INPUT_DF)
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+
+    def test_study_context_builds_config_once(self):
+        """Test that a context builds its config and output column index only once."""
+        with patch.object(study_context, "build_lazy_flat_config_dict",
+                          wraps=build_lazy_flat_config_dict) as mock_build, \
+                patch.object(study_context, "OutputColsIndex",
+                             wraps=study_context.OutputColsIndex) as mock_index:
+            a_context = StudyContext(
+                self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP)
+            a_context.get_reserved_cols(self.INPUT_DF)
+            a_context.find_standard_cols(self.INPUT_DF)
+            a_context.find_nonstandard_cols(self.INPUT_DF)
+            a_context.extend_metadata_df(self.INPUT_DF)
+
+        self.assertEqual(1, mock_build.call_count)
+        self.assertEqual(1, mock_index.call_count)
+
+    def test_study_context_full_flat_config_dict(self):
+        """Test that an already-built config is used as is."""
+        full_flat_config_dict = build_lazy_flat_config_dict(
+            self.STUDY_CONFIG, None, self.TEST_STDS_FP)
+
+        a_context = StudyContext(full_flat_config_dict=full_flat_config_dict)
+
+        self.assertIs(full_flat_config_dict, a_context.full_flat_config_dict)
+
+    def test_study_context_shared_across_threads(self):
+        """Test that one context gives the same results when used from several threads."""
+        a_context = StudyContext(self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP)
+        expected_df, _ = StudyContext(
+            self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP).extend_metadata_df(
+                self.INPUT_DF)
+        expected_cols = StudyContext(
+            self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP).get_reserved_cols(
+                self.INPUT_DF)
+
+        def use_context(_):
+            result_df, _ = a_context.extend_metadata_df(self.INPUT_DF)
+            return result_df, a_context.get_reserved_cols(self.INPUT_DF)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(use_context, range(8)))
+
+        for result_df, result_cols in results:
+            assert_frame_equal(expected_df, result_df)
+            self.assertEqual(expected_cols, result_cols)
+
+    def test_study_context_extend_metadata_df_incrementally(self):
+        """Test that the context reuses the rows of its previous extension."""
+        a_context = StudyContext(self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP)
+        prev_results = a_context.extend_metadata_df_incrementally(
+            self.INPUT_DF)
+        input_df = self.INPUT_DF.copy()
+        input_df.loc[2, "my_notes"] = "changed"
+
+        expected_df, expected_msgs_df = a_context.extend_metadata_df(
+            input_df.copy())
+        result_df, result_msgs_df, manifest_df = \
+            a_context.extend_metadata_df_incrementally(
+                input_df, *prev_results)
+
+        assert_frame_equal(expected_df, result_df)
+        assert_frame_equal(expected_msgs_df, result_msgs_df)
+        self.assertEqual(2, manifest_df["reused"].sum())
+
+    def test_study_context_get_transformer_plan(self):
+        """Test that the context plans a stage's transformers from its config."""
+        study_config = {
+            DEFAULT_KEY: "not provided",
+            METADATA_TRANSFORMERS_KEY: {
+                PRE_TRANSFORMERS_KEY: {
+                    "sex_copy": {
+                        SOURCES_KEY: ["sex"],
+                        FUNCTION_KEY: "pass_through"
+                    },
+                    "sex": {
+                        SOURCES_KEY: ["input_sex"],
+                        FUNCTION_KEY: "transform_input_sex_to_std_sex"
+                    }
+                }
+            }
+        }
+        a_context = StudyContext(study_config, stds_fp=self.TEST_STDS_FP)
+
+        obs = a_context.get_transformer_plan(
+            PRE_TRANSFORMERS_KEY, list(self.INPUT_DF.columns) + ["input_sex"])
+
+        self.assertEqual(["sex", "sex_copy"], obs.execution_order)
+        self.assertEqual(("sex", "sex_copy"), obs.critical_path)
+        # the standards' transformer's source is not in the metadata
+        self.assertEqual(
+            {"collection_date": ("collection_timestamp",)}, obs.skipped)
+
+    def test_study_context_write_extended_metadata_from_df(self):
+        """Test that the context writes the extended metadata and validation files."""
+        a_context = StudyContext(self.STUDY_CONFIG, stds_fp=self.TEST_STDS_FP)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            result_df = a_context.write_extended_metadata_from_df(
+                self.INPUT_DF, tmpdir, "test_output")
+
+            expected_df, _ = a_context.extend_metadata_df(self.INPUT_DF)
+            assert_frame_equal(expected_df, result_df)
+            self.assertEqual(
+                1, len(glob.glob(f"{tmpdir}/*_test_output.txt")))
+            self.assertEqual(
+                1, len(glob.glob(f"{tmpdir}/*_test_output_fails.csv")))
+            self.assertEqual(
+                1, len(glob.glob(
+                    f"{tmpdir}/*_test_output_validation_errors.csv")))
+
+    def test_get_shared_study_context(self):
+        """Test that a context is shared by equal configs, but not by different ones."""
+        context1 = get_shared_study_context(
+            self.STUDY_CONFIG, self.TEST_STDS_FP)
+        context2 = get_shared_study_context(
+            {DEFAULT_KEY: "not provided"}, self.TEST_STDS_FP)
+        other_context = get_shared_study_context(
+            {DEFAULT_KEY: "missing"}, self.TEST_STDS_FP)
+
+        self.assertIs(context1, context2)
+        self.assertIsNot(context1, other_context)
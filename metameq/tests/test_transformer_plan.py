@@ -0,0 +1,145 @@
+from unittest import TestCase
+from metameq.src.util import METADATA_TRANSFORMERS_KEY, \
+    PRE_TRANSFORMERS_KEY, SOURCES_KEY, FUNCTION_KEY, OVERWRITE_NON_NANS_KEY
+from metameq.src.transformer_plan import TransformerPlan, TransformerStep, \
+    build_transformer_plan, get_runnable_targets
+
+
+def _make_config_dict(sources_by_target):
+    return {
+        METADATA_TRANSFORMERS_KEY: {
+            PRE_TRANSFORMERS_KEY: {
+                target_field: {SOURCES_KEY: source_fields,
+                               FUNCTION_KEY: "pass_through"}
+                for target_field, source_fields in sources_by_target.items()
+            }
+        }
+    }
+
+
+class TestBuildTransformerPlan(TestCase):
+    def test_build_transformer_plan_no_transformers(self):
+        """Test that a config without transformers for the stage gives an empty plan."""
+        obs = build_transformer_plan({}, PRE_TRANSFORMERS_KEY, ["a"])
+
+        self.assertIsInstance(obs, TransformerPlan)
+        self.assertEqual({}, obs.steps)
+        self.assertEqual({}, obs.skipped)
+        self.assertEqual((), obs.waves)
+        self.assertEqual((), obs.critical_path)
+
+    def test_build_transformer_plan_independent(self):
+        """Test that independent transformers run in config order in one wave."""
+        config_dict = _make_config_dict({"c": ["x"], "a": ["y"], "b": ["b"]})
+
+        obs = build_transformer_plan(
+            config_dict, PRE_TRANSFORMERS_KEY, ["x", "y", "b"])
+
+        self.assertEqual(["c", "a", "b"], obs.execution_order)
+        self.assertEqual(((("c",), ("a",), ("b",)),), obs.waves)
+        self.assertEqual({}, obs.skipped)
+        self.assertEqual(("c",), obs.critical_path)
+
+    def test_build_transformer_plan_steps(self):
+        """Test that each step holds its transformer's settings and dependencies."""
+        config_dict = _make_config_dict({"b": ["a", "x"], "a": ["a"]})
+        config_dict[OVERWRITE_NON_NANS_KEY] = True
+        config_dict[METADATA_TRANSFORMERS_KEY][PRE_TRANSFORMERS_KEY]["a"][
+            OVERWRITE_NON_NANS_KEY] = False
+
+        obs = build_transformer_plan(
+            config_dict, PRE_TRANSFORMERS_KEY, ["a", "x"])
+
+        self.assertIsInstance(obs.steps["b"], TransformerStep)
+        self.assertEqual(("a", "x"), obs.steps["b"].source_fields)
+        self.assertEqual("pass_through", obs.steps["b"].function_name)
+        self.assertTrue(obs.steps["b"].overwrite_non_nans)
+        self.assertEqual(("a",), obs.steps["b"].upstream_fields)
+        # a transformer's own target is not a dependency
+        self.assertFalse(obs.steps["a"].overwrite_non_nans)
+        self.assertEqual((), obs.steps["a"].upstream_fields)
+
+    def test_build_transformer_plan_dependencies(self):
+        """Test that a transformer runs after those filling its sources, whatever the config order."""
+        config_dict = _make_config_dict({
+            "d": ["b", "c"], "b": ["a"], "a": ["x"], "c": ["x"]})
+
+        obs = build_transformer_plan(
+            config_dict, PRE_TRANSFORMERS_KEY, ["x"])
+
+        self.assertEqual(["a", "b", "c", "d"], obs.execution_order)
+        self.assertEqual(
+            ((("a", "b"), ("c",)), (("d",),)), obs.waves)
+        self.assertEqual(("a", "b", "d"), obs.critical_path)
+
+    def test_build_transformer_plan_fuses_chains(self):
+        """Test that a chain of transformers each depending only on the one before is fused."""
+        config_dict = _make_config_dict({
+            "a": ["x"], "b": ["a"], "c": ["b", "y"], "d": ["a"]})
+
+        obs = build_transformer_plan(
+            config_dict, PRE_TRANSFORMERS_KEY, ["x", "y"])
+
+        # b and d both depend on a, so neither is fused with it
+        self.assertEqual(
+            ((("a",),), (("b", "c"), ("d",))), obs.waves)
+        self.assertEqual(("a", "b", "c"), obs.critical_path)
+
+    def test_build_transformer_plan_missing_sources(self):
+        """Test that transformers with missing sources, and those that depend on them, are skipped."""
+        config_dict = _make_config_dict({
+            "a": ["missing", "x"], "b": ["a"], "c": ["c"], "d": ["x"],
+            "e": ["d", "a"]})
+
+        obs = build_transformer_plan(
+            config_dict, PRE_TRANSFORMERS_KEY, ["x"])
+
+        self.assertEqual(["d"], obs.execution_order)
+        self.assertEqual(
+            {"a": ("missing",), "b": ("a",), "c": ("c",), "e": ("a",)},
+            obs.skipped)
+
+    def test_build_transformer_plan_skipped_source_present(self):
+        """Test that a source filled by a skipped transformer can still come from the metadata."""
+        config_dict = _make_config_dict({"a": ["missing"], "b": ["a"]})
+
+        obs = build_transformer_plan(
+            config_dict, PRE_TRANSFORMERS_KEY, ["a"])
+
+        self.assertEqual(["b"], obs.execution_order)
+        self.assertEqual((), obs.steps["b"].upstream_fields)
+        self.assertEqual({"a": ("missing",)}, obs.skipped)
+
+    def test_build_transformer_plan_err_cycle(self):
+        """Test that an error is raised if transformers depend on each other in a cycle."""
+        config_dict = _make_config_dict({
+            "a": ["c"], "b": ["a"], "c": ["b"], "d": ["x"]})
+
+        with self.assertRaisesRegex(
+                ValueError,
+                "pre_transformers depend on each other in a cycle: "
+                "a -> b -> c -> a"):
+            build_transformer_plan(config_dict, PRE_TRANSFORMERS_KEY, ["x"])
+
+    def test_transformer_plan_str(self):
+        """Test that a plan describes its waves, skipped transformers and critical path."""
+        config_dict = _make_config_dict({
+            "b": ["a"], "a": ["x"], "c": ["missing"]})
+
+        obs = build_transformer_plan(
+            config_dict, PRE_TRANSFORMERS_KEY, ["x"])
+
+        exp = ("pre_transformers:\n"
+               "  wave 1:\n"
+               "    a <- pass_through(x) -> b <- pass_through(a)\n"
+               "  skipped c: missing missing\n"
+               "  critical path: a -> b")
+        self.assertEqual(exp, str(obs))
+
+
+class TestGetRunnableTargets(TestCase):
+    def test_get_runnable_targets(self):
+        """Test that the targets of transformers that will run are found, in the order they run."""
+        obs = get_runnable_targets(
+            {"b": ["a"], "a": ["x"], "c": ["missing"]}, ["x"])
+        self.assertEqual(["a", "b"], obs)
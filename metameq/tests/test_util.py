@@ -3,9 +3,12 @@ import pandas
 from pandas.testing import assert_frame_equal
 import os
 import os.path as path
+import tempfile
 from unittest import TestCase
 from metameq.src.util import extract_config_dict, \
     extract_yaml_dict, extract_stds_config, deepcopy_dict, \
+    get_yaml_parse_timings, clear_yaml_cache, is_yaml_memoized, \
+    memoize_yaml_dict, \
     validate_required_columns_exist, update_metadata_df_field, get_extension, \
     load_df_with_best_fit_encoding, cast_field_to_type, \
     _try_cast_to_int, _try_cast_to_bool
@@ -114,6 +117,79 @@ class TestExtractYamlDict(UtilTestBase):
         obs = extract_yaml_dict(config_fp)
         self.assertDictEqual(self.TEST_CONFIG_DICT, obs)
 
+    def test_extract_yaml_dict_memoized(self):
+        """Test that repeat loads are served from the memo without reparsing."""
+        clear_yaml_cache()
+        config_fp = path.join(self.TEST_DIR, "data/test_config.yml")
+        resolved_fp = os.path.realpath(config_fp)
+
+        obs1 = extract_yaml_dict(config_fp)
+        obs2 = extract_yaml_dict(config_fp)
+
+        self.assertDictEqual(obs1, obs2)
+        self.assertEqual(1, len(get_yaml_parse_timings()[resolved_fp]))
+
+    def test_extract_yaml_dict_returns_private_copies(self):
+        """Test that modifying a loaded dict does not corrupt later loads."""
+        clear_yaml_cache()
+        config_fp = path.join(self.TEST_DIR, "data/test_config.yml")
+
+        obs1 = extract_yaml_dict(config_fp)
+        obs1["metadata_transformers"]["pre_transformers"].clear()
+        obs1["new_key"] = "new_val"
+        obs2 = extract_yaml_dict(config_fp)
+
+        self.assertDictEqual(self.TEST_CONFIG_DICT, obs2)
+
+    def test_extract_yaml_dict_interned(self):
+        """Test that interned loads share one immutable, equal dict."""
+        clear_yaml_cache()
+        config_fp = path.join(self.TEST_DIR, "data/test_config.yml")
+
+        obs1 = extract_yaml_dict(config_fp, interned=True)
+        obs2 = extract_yaml_dict(config_fp, interned=True)
+
+        self.assertIs(obs1, obs2)
+        self.assertDictEqual(self.TEST_CONFIG_DICT, obs1)
+        with self.assertRaises(TypeError):
+            obs1["new_key"] = "new_val"
+
+    def test_extract_yaml_dict_reparses_changed_file(self):
+        """Test that a changed file is reparsed rather than served stale."""
+        clear_yaml_cache()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yaml_fp = path.join(tmpdir, "changing.yml")
+            with open(yaml_fp, "w") as f:
+                f.write("a: 1\n")
+            self.assertDictEqual({"a": 1}, extract_yaml_dict(yaml_fp))
+
+            with open(yaml_fp, "w") as f:
+                f.write("a: 22\n")
+            self.assertDictEqual({"a": 22}, extract_yaml_dict(yaml_fp))
+
+            timings = get_yaml_parse_timings()
+            self.assertEqual(2, len(timings[os.path.realpath(yaml_fp)]))
+
+    def test_memoize_yaml_dict(self):
+        """Test that memoized contents are served without parsing until the file changes."""
+        clear_yaml_cache()
+        with tempfile.TemporaryDirectory() as tmpdir:
+            yaml_fp = path.join(tmpdir, "memoized.yml")
+            with open(yaml_fp, "w") as f:
+                f.write("a: 1\n")
+            self.assertFalse(is_yaml_memoized(yaml_fp))
+
+            memoize_yaml_dict(yaml_fp, {"a": 1})
+            self.assertTrue(is_yaml_memoized(yaml_fp))
+            self.assertDictEqual({"a": 1}, extract_yaml_dict(yaml_fp))
+            self.assertNotIn(os.path.realpath(yaml_fp),
+                             get_yaml_parse_timings())
+
+            with open(yaml_fp, "w") as f:
+                f.write("a: 22\n")
+            self.assertFalse(is_yaml_memoized(yaml_fp))
+            self.assertDictEqual({"a": 22}, extract_yaml_dict(yaml_fp))
+
 
 class TestExtractStdsConfig(UtilTestBase):
     def test_extract_stds_config_default_path(self):
@@ -559,8 +635,25 @@ class TestUpdateMetadataDfField(TestCase):
             ["latitude"], overwrite_non_nans=False)
         assert_frame_equal(exp_df, working_df)
 
-    def test_update_metadata_df_field_func_error_cleans_up_temp_col(self):
-        """Test that temp column is removed when function raises an error."""
+    def test_update_metadata_df_field_func_all_nans_into_str_col(self):
+        """Test setting a function that returns only NaNs into a string column."""
+        def no_lat(row, source_fields):
+            return np.nan
+
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2"],
+            "latitude": ["32.88", "-117.23"]
+        })
+
+        update_metadata_df_field(
+            working_df, "latitude", no_lat,
+            ["sample_name"], overwrite_non_nans=True)
+        self.assertTrue(working_df["latitude"].isna().all())
+        self.assertEqual(
+            list(working_df.columns), ["sample_name", "latitude"])
+
+    def test_update_metadata_df_field_func_error_leaves_df_unchanged(self):
+        """Test that the df is left unchanged when function raises an error."""
         def bad_func(row, source_fields):
             raise ValueError("intentional error")
 
@@ -568,15 +661,193 @@ class TestUpdateMetadataDfField(TestCase):
             "sample_name": ["s1", "s2"],
             "latitude": ["32.88", "-117.23"]
         })
+        exp_df = working_df.copy()
 
         with self.assertRaisesRegex(ValueError, "intentional error"):
             update_metadata_df_field(
                 working_df, "latitude", bad_func,
                 ["latitude"], overwrite_non_nans=True)
 
-        # The temp column should have been cleaned up by the finally block
-        self.assertEqual(
-            list(working_df.columns), ["sample_name", "latitude"])
+        assert_frame_equal(exp_df, working_df)
+
+    def test_update_metadata_df_field_no_overwrite_no_nan_keeps_dtype(self):
+        """Test that a column with no NaNs to fill is not touched at all."""
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2"],
+            "count": [1, 2]
+        })
+        exp_df = working_df.copy()
+
+        update_metadata_df_field(
+            working_df, "count", "not an int", overwrite_non_nans=False)
+        assert_frame_equal(exp_df, working_df)
+
+    def test_update_metadata_df_field_partial_mask_non_range_index(self):
+        """Test that masked function values land on the right rows."""
+        def add_suffix(row, source_fields):
+            return f"{row[source_fields[0]]}_x"
+
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2", "s3"],
+            "latitude": [np.nan, "-117.23", np.nan]
+        }, index=[7, 2, 5])
+        exp_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2", "s3"],
+            "latitude": ["s1_x", "-117.23", "s3_x"]
+        }, index=[7, 2, 5])
+
+        update_metadata_df_field(
+            working_df, "latitude", add_suffix,
+            ["sample_name"], overwrite_non_nans=False)
+        assert_frame_equal(exp_df, working_df)
+
+    def test_update_metadata_df_field_categorical_column(self):
+        """Test that new values can be set in a compact (categorical) column."""
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2", "s3"],
+            "body_site": pandas.Categorical(["gut", np.nan, "gut"])
+        })
+        exp_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2", "s3"],
+            "body_site": ["gut", "skin", "gut"]
+        })
+
+        update_metadata_df_field(
+            working_df, "body_site", "skin", overwrite_non_nans=False)
+        assert_frame_equal(exp_df, working_df)
+
+    def test_update_metadata_df_field_vectorized_func(self):
+        """Test that a vectorized function is used for all rows at once, and its values turned into strings."""
+        def test_func(row, source_fields):
+            raise AssertionError("row-wise function should not be called")
+
+        def test_vectorized_func(rows_df, source_fields):
+            return rows_df[source_fields[0]].str.len()
+
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "sample2", "s3"],
+            "name_len": [np.nan, "x", np.nan]
+        })
+        exp_df = pandas.DataFrame({
+            "sample_name": ["s1", "sample2", "s3"],
+            "name_len": ["2", "x", "2"]
+        })
+
+        update_metadata_df_field(
+            working_df, "name_len", test_func, ["sample_name"],
+            overwrite_non_nans=False, vectorized_func=test_vectorized_func)
+        assert_frame_equal(exp_df, working_df)
+
+    def test_update_metadata_df_field_pure_func_called_once_per_combination(self):
+        """Test that a pure function is called once per distinct combination of source values."""
+        called_for = []
+
+        def test_func(row, source_fields):
+            called_for.append(row.name)
+            return f"{row[source_fields[0]]}_{row[source_fields[1]]}"
+
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2", "s3", "s4", "s5"],
+            "site": ["gut", "gut", "skin", "gut", np.nan],
+            "year": ["2020", "2020", "2020", "2021", np.nan]
+        })
+        exp_df = working_df.copy()
+        exp_df["site_year"] = \
+            ["gut_2020", "gut_2020", "skin_2020", "gut_2021", "nan_nan"]
+
+        update_metadata_df_field(
+            working_df, "site_year", test_func, ["site", "year"],
+            is_pure=True)
+        assert_frame_equal(exp_df, working_df)
+        # called on the first row with each combination, in row order
+        self.assertEqual([0, 2, 3, 4], called_for)
+
+    def test_update_metadata_df_field_pure_func_error_for_first_bad_row(self):
+        """Test that a pure function raises for the first offending row, as when called on every row."""
+        def test_func(row, source_fields):
+            if row[source_fields[0]].startswith("bad"):
+                raise ValueError(f"bad value in row {row.name}")
+            return row[source_fields[0]]
+
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2", "s3", "s4"],
+            "site": ["gut", "bad2", "gut", "bad1"]
+        })
+
+        with self.assertRaisesRegex(ValueError, "bad value in row 1"):
+            update_metadata_df_field(
+                working_df, "new_site", test_func, ["site"], is_pure=True)
+
+    def test_update_metadata_df_field_pure_func_mixed_types(self):
+        """Test that a pure function is called on every row whose source values mix types."""
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2", "s3"],
+            "count": pandas.Series([1, 1.0, True], dtype=object)
+        })
+        exp_df = working_df.copy()
+        exp_df["count_repr"] = ["1", "1.0", "True"]
+
+        update_metadata_df_field(
+            working_df, "count_repr",
+            lambda row, source_fields: repr(row[source_fields[0]]),
+            ["count"], is_pure=True)
+        assert_frame_equal(exp_df, working_df)
+
+    def test_update_metadata_df_field_row_view(self):
+        """Test that a function can be passed each row as a view of its source field values."""
+        rows = []
+
+        def test_func(row, source_fields):
+            rows.append(row)
+            return f"{row.name}_{row[source_fields[0]]}_{row[source_fields[1]]}"
+
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2"],
+            "site": ["gut", np.nan],
+            "count": [1, 2]
+        }, index=["r1", "r2"])
+        exp_df = working_df.copy()
+        exp_df["site_count"] = ["r1_gut_1", "r2_nan_2"]
+
+        update_metadata_df_field(
+            working_df, "site_count", test_func, ["site", "count"],
+            use_row_view=True)
+        assert_frame_equal(exp_df, working_df)
+        self.assertNotIsInstance(rows[0], pandas.Series)
+        self.assertEqual({"site": "gut", "count": 1}, dict(rows[0]))
+        self.assertIsInstance(rows[0]["count"], int)
+
+    def test_update_metadata_df_field_row_view_non_source_field(self):
+        """Test that a row view does not give access to fields that are not sources."""
+        working_df = pandas.DataFrame({
+            "sample_name": ["s1", "s2"],
+            "site": ["gut", "skin"]
+        })
+
+        with self.assertRaisesRegex(KeyError, "'sample_name' is not a source field"):
+            update_metadata_df_field(
+                working_df, "new_site",
+                lambda row, source_fields: row["sample_name"], ["site"],
+                use_row_view=True)
+
+    def test_update_metadata_df_field_row_view_same_type_cols(self):
+        """Test that rows are passed as Series when the row Series would not hold the values as is."""
+        rows = []
+
+        def test_func(row, source_fields):
+            rows.append(row)
+            return row[source_fields[0]]
+
+        # all-numeric rows are upcast to float, as apply would do
+        working_df = pandas.DataFrame({"count": [1, 2], "size": [1.5, 2.5]})
+        exp_df = working_df.copy()
+        exp_df["new_count"] = ["1.0", "2.0"]
+
+        update_metadata_df_field(
+            working_df, "new_count", test_func, ["count"],
+            use_row_view=True)
+        assert_frame_equal(exp_df, working_df)
+        self.assertIsInstance(rows[0], pandas.Series)
 
 
 class TestCastFieldToType(TestCase):
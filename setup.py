@@ -25,8 +25,9 @@ setup(name='metameq',
       # NB: if changing here, also change the environment.yml
       install_requires=[
           'click>=8.0.0',
+          'numpy>=1.20.0',
           'openpyxl>=3.0.0',
-          'pandas>=1.3.0',
+          'pandas>=1.5.0',
           'PyYAML>=5.4.0',
           'Cerberus>=1.3.4',
       ],